@@ -1,15 +1,20 @@
 import logging
 import os
 from datetime import datetime
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Iterable, Optional, Tuple
 
 from google.oauth2.service_account import Credentials
 from gspread_asyncio import (
-    AsyncioGspreadClientManager,
     AsyncioGspreadSpreadsheet,
     AsyncioGspreadClient
 )
 
+from api.nats_publisher import publisher
+from api.sheet_index import SheetIndex, SheetIndexCache, column_letter
+from api.sheets_limiter import (
+    KV_BUCKET, NatsTokenBucket, SheetsClientManager, SheetsPriority,
+    SheetsRateLimiter, sheets_priority)
+from api.spreadsheet_cache import CredentialsRefresher, SpreadsheetCache
 from db import BaseTicket
 from db.enum import TicketStatus
 from db.models import CustomMadeEvent
@@ -29,19 +34,44 @@ googlesheets_logger = logging.getLogger('bot.googlesheets')
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 
 
+_creds: Optional[Credentials] = None
+
+
 def get_creds():
-    creds = Credentials.from_service_account_file(creds_file)
-    scoped = creds.with_scopes(SCOPES)
-    return scoped
+    # Один объект credentials на процесс: его токен обновляет
+    # _creds_refresher, и все клиенты gspread видят новый токен
+    global _creds
+    if _creds is None:
+        creds = Credentials.from_service_account_file(creds_file)
+        _creds = creds.with_scopes(SCOPES)
+    return _creds
 
 
-_agcm = AsyncioGspreadClientManager(get_creds)
+_sheets_limiter = SheetsRateLimiter(NatsTokenBucket(
+    lambda: publisher.key_value(KV_BUCKET, history=1)))
+_agcm = SheetsClientManager(get_creds, _sheets_limiter)
+_sheet_indexes = SheetIndexCache()
+_spreadsheets = SpreadsheetCache()
+_creds_refresher = CredentialsRefresher(get_creds)
 
 
-async def _open_spreadsheet(spreadsheet_id: str) -> AsyncioGspreadSpreadsheet:
+async def _fetch_spreadsheet(
+        spreadsheet_id: str) -> AsyncioGspreadSpreadsheet:
     agc: AsyncioGspreadClient = await _agcm.authorize()
-    ss: AsyncioGspreadSpreadsheet = await agc.open_by_key(spreadsheet_id)
-    return ss
+    return await agc.open_by_key(spreadsheet_id)
+
+
+async def _open_spreadsheet(spreadsheet_id: str) -> AsyncioGspreadSpreadsheet:
+    _creds_refresher.maybe_refresh()
+    return await _spreadsheets.open(spreadsheet_id, _fetch_spreadsheet)
+
+
+def get_sheets_client_stats() -> Dict[str, Any]:
+    return {
+        **_spreadsheets.stats(),
+        **_creds_refresher.stats(),
+        **_agcm.limiter.stats(),
+    }
 
 
 async def _get_values(
@@ -68,24 +98,135 @@ async def _get_data_from_spreadsheet(
     return values
 
 
-async def _get_column_info(spreadsheet_id: str, name_sheet: str):
-    data_column_name = await _get_data_from_spreadsheet(
-        spreadsheet_id, RANGE_NAME[name_sheet] + '2:2')
+def _get_column_map(header: List[Any]) -> Dict[int | str, int]:
     dict_column_name: Dict[int | str, int] = {}
-    for i, item in enumerate(data_column_name[0]):
+    for i, item in enumerate(header):
         if item == '':
             item = i
         dict_column_name[item] = i
 
-    if len(dict_column_name) != len(data_column_name[0]):
+    if len(dict_column_name) != len(header):
         googlesheets_logger.warning(
             'dict_column_name, len(data_column_name[0]) не равны')
         googlesheets_logger.warning(
-            f"{len(dict_column_name)} != {len(data_column_name[0])}")
+            f"{len(dict_column_name)} != {len(header)}")
 
+    return dict_column_name
+
+
+async def _get_column_info(spreadsheet_id: str, name_sheet: str):
+    data_column_name = await _get_data_from_spreadsheet(
+        spreadsheet_id, RANGE_NAME[name_sheet] + '2:2')
+    dict_column_name = _get_column_map(data_column_name[0])
     return dict_column_name, len(data_column_name[0])
 
 
+async def _load_sheet_index(
+        spreadsheet_id: str,
+        name_sheet: str,
+        key_column: str
+) -> SheetIndex:
+    dict_column_name, len_col = await _get_column_info(
+        spreadsheet_id, name_sheet)
+    if key_column not in dict_column_name:
+        raise ValueError(f'На листе {name_sheet} нет колонки {key_column}')
+
+    column = column_letter(dict_column_name[key_column] + 1)
+    values = await _get_data_from_spreadsheet(
+        spreadsheet_id,
+        RANGE_NAME[name_sheet] + f'{column}:{column}',
+        value_render_option='UNFORMATTED_VALUE'
+    )
+    keys = [row[0] if row else None for row in values]
+    index = SheetIndex(dict_column_name, len_col, key_column, keys)
+    _sheet_indexes.put(spreadsheet_id, name_sheet, index)
+    googlesheets_logger.info(
+        f'Индекс листа {name_sheet} по {key_column} построен: '
+        f'{index.last_row} строк')
+    return index
+
+
+async def _get_sheet_index(
+        spreadsheet_id: str,
+        name_sheet: str,
+        key_column: str,
+        columns: Iterable[str] = ()
+) -> SheetIndex:
+    index = _sheet_indexes.get(spreadsheet_id, name_sheet, key_column)
+    if index is None or not index.has_columns(columns):
+        index = await _load_sheet_index(spreadsheet_id, name_sheet, key_column)
+    if not index.has_columns(columns):
+        raise ValueError(f'На листе {name_sheet} нет колонок {columns}')
+    return index
+
+
+async def _row_has_key(
+        spreadsheet_id: str,
+        name_sheet: str,
+        index: SheetIndex,
+        row: int,
+        key: Any
+) -> bool:
+    """
+    Сверяет ключевую ячейку строки из кэша с key, если строку не
+    проверяли дольше ROW_CHECK_AFTER. При расхождении индекс сбрасывается.
+    """
+    if index.is_row_checked(row):
+        return True
+    column = column_letter(index.headers[index.key_column] + 1)
+    values = await _get_values(
+        spreadsheet_id, RANGE_NAME[name_sheet] + f'{column}{row}',
+        value_render_option='UNFORMATTED_VALUE')
+    if values and values[0] and values[0][0] == key:
+        index.mark_checked(row)
+        return True
+    googlesheets_logger.warning(
+        f'Строка {row} листа {name_sheet} уже не {index.key_column}={key}, '
+        f'индекс перестраивается')
+    _sheet_indexes.invalidate(spreadsheet_id, name_sheet)
+    return False
+
+
+async def _find_row(
+        spreadsheet_id: str,
+        name_sheet: str,
+        key_column: str,
+        key: Any,
+        columns: Iterable[str] = ()
+) -> Tuple[SheetIndex, Optional[int]]:
+    """
+    Возвращает индекс листа и номер строки с ключом key.
+    Если в кэше нет ключа или нужных колонок или строка из кэша
+    сдвинулась, индекс перечитывается.
+    """
+    columns = tuple(columns)
+    index = _sheet_indexes.get(spreadsheet_id, name_sheet, key_column)
+    if index is not None and index.has_columns(columns):
+        row = index.get_row(key)
+        if row is not None and await _row_has_key(
+                spreadsheet_id, name_sheet, index, row, key):
+            return index, row
+    index = await _load_sheet_index(spreadsheet_id, name_sheet, key_column)
+    if not index.has_columns(columns):
+        raise ValueError(f'На листе {name_sheet} нет колонок {columns}')
+    return index, index.get_row(key)
+
+
+def _register_appended_rows(
+        spreadsheet_id: str,
+        name_sheet: str,
+        key_column: str,
+        response: Optional[dict],
+        keys: List[Any]
+) -> None:
+    if response is None:
+        _sheet_indexes.invalidate(spreadsheet_id, name_sheet)
+        return
+    updated_range = response.get('updates', {}).get('updatedRange', '')
+    _sheet_indexes.add_rows(
+        spreadsheet_id, name_sheet, key_column, updated_range, keys)
+
+
 def _get_flags_by_ticket_status(ticket_status_value):
     flag_exclude = False
     flag_transfer = False
@@ -108,6 +249,46 @@ def _get_flags_by_ticket_status(ticket_status_value):
     return flag_exclude, flag_exclude_place_sum, flag_transfer
 
 
+def _get_sheet_range(name_sh: str) -> str:
+    """Диапазон на весь лист: имя листа из RANGE_NAME без '!'."""
+    return RANGE_NAME[name_sh].rstrip('!')
+
+
+def _parse_sheet_values(
+        values: List[List[Any]],
+        name_sh: str,
+) -> Tuple[List[List[Any]], Dict[int | str, int]]:
+    """
+    Разбирает значения всего листа так же, как раньше это делали три
+    запроса: заголовки во 2-й строке, число строк по последней заполненной
+    ячейке колонки A, число колонок по заголовкам.
+
+    Возвращает кортеж (data, dict_column_name), data начинается со строки
+    заголовков.
+    """
+    if len(values) < 2 or not values[1]:
+        googlesheets_logger.info(f'No data found: {name_sh}')
+        raise ValueError('No data found')
+
+    header = values[1]
+    dict_column_name = _get_column_map(header)
+    len_col = len(header)
+
+    len_row = 0
+    for i, row in enumerate(values):
+        if row and row[0] not in ('', None):
+            len_row = i + 1
+
+    data = []
+    for row in values[1:len_row]:
+        row = row[:len_col]
+        # API не возвращает пустые ячейки в конце строки
+        while row and row[-1] == '':
+            row.pop()
+        data.append(row)
+    return data, dict_column_name
+
+
 async def load_from_gspread(
         sheet_id: str,
         name_sh: str,
@@ -123,20 +304,147 @@ async def load_from_gspread(
 
     Возвращает кортеж (data, dict_column_name).
     """
-    dict_column_name, len_col = await _get_column_info(sheet_id, name_sh)
+    with sheets_priority(SheetsPriority.BULK):
+        values = await _get_values(
+            sheet_id,
+            _get_sheet_range(name_sh),
+            value_render_option=value_render_option
+        )
+    return _parse_sheet_values(values, name_sh)
 
-    first_col = await _get_data_from_spreadsheet(
-        sheet_id, RANGE_NAME[name_sh] + 'A:A')
 
-    len_row = len(first_col)
-    sheet_range = f"{RANGE_NAME[name_sh]}R2C1:R{len_row}C{len_col}"
+async def load_many_from_gspread(
+        sheet_id: str,
+        names_sh: Iterable[str],
+        value_render_option: str = 'FORMATTED_VALUE',
+) -> Dict[str, Tuple[List[List[Any]], Dict[int | str, int]]]:
+    """
+    Загружает несколько листов одной таблицы одним запросом values:batchGet.
 
-    data = await _get_data_from_spreadsheet(
-        sheet_id,
-        sheet_range,
-        value_render_option=value_render_option
-    )
-    return data, dict_column_name
+    Возвращает словарь {name_sh: (data, dict_column_name)}, значения такие
+    же, как у load_from_gspread.
+    """
+    names_sh = list(names_sh)
+    with sheets_priority(SheetsPriority.BULK):
+        ss: AsyncioGspreadSpreadsheet = await _open_spreadsheet(sheet_id)
+        response = await ss.values_batch_get(
+            [_get_sheet_range(name_sh) for name_sh in names_sh],
+            params={'valueRenderOption': value_render_option})
+    value_ranges = response.get('valueRanges', [])
+    googlesheets_logger.info(f'values_batch_get done: {names_sh}')
+
+    return {
+        name_sh: _parse_sheet_values(value_range.get('values', []), name_sh)
+        for name_sh, value_range in zip(names_sh, value_ranges)
+    }
+
+
+class SheetWriteBatch:
+    """
+    Накопитель точечных записей в одну таблицу.
+    Для каждой ячейки остается последнее записанное значение, поэтому
+    несколько изменений одного события уходят в таблицу одной записью.
+    """
+
+    def __init__(self):
+        self.cells: Dict[Tuple[str, int, int], Any] = {}
+        self.priority = SheetsPriority.DEFAULT
+
+    def __len__(self):
+        return len(self.cells)
+
+    def set_values(
+            self,
+            name_sheet: str,
+            row: int,
+            first_col: int,
+            values: List[Any]
+    ) -> None:
+        for i, value in enumerate(values):
+            self.cells[(name_sheet, row, first_col + i)] = value
+
+    @property
+    def sheets(self):
+        return {name_sheet for name_sheet, _, _ in self.cells}
+
+    def to_data(self) -> List[dict]:
+        """Соседние ячейки одной строки объединяются в один диапазон."""
+        data = []
+        run = []
+        for key in sorted(self.cells):
+            if run and key != (run[-1][0], run[-1][1], run[-1][2] + 1):
+                data.append(self._range(run))
+                run = []
+            run.append(key)
+        if run:
+            data.append(self._range(run))
+        return data
+
+    def _range(self, run) -> dict:
+        name_sheet, row, col1 = run[0]
+        col2 = run[-1][2]
+        range_sheet = f"{RANGE_NAME[name_sheet]}R{row}C{col1}"
+        if col2 != col1:
+            range_sheet += f":R{row}C{col2}"
+        return {
+            'range': range_sheet,
+            'majorDimension': 'ROWS',
+            'values': [[self.cells[key] for key in run]],
+        }
+
+
+async def write_batch(spreadsheet_id: str, batch: SheetWriteBatch) -> None:
+    """Отправляет все накопленные записи одним values_batch_update."""
+    if not batch:
+        return
+    try:
+        with sheets_priority(batch.priority):
+            await _write_data_to_batch_update(
+                batch.to_data(), spreadsheet_id, 'RAW')
+    except Exception:
+        for name_sheet in batch.sheets:
+            _sheet_indexes.invalidate(spreadsheet_id, name_sheet)
+        raise
+
+
+async def add_data_reserve(
+        batch: SheetWriteBatch,
+        spreadsheet_id: str,
+        event_id: int,
+        numbers: List[int],
+        option: int = 1
+) -> None:
+    match option:
+        case 1:
+            columns = ('qty_child_free_seat', 'qty_child_nonconfirm_seat',
+                       'qty_adult_free_seat', 'qty_adult_nonconfirm_seat')
+        case 2:
+            columns = ('qty_child_nonconfirm_seat', 'qty_adult_nonconfirm_seat')
+        case 3:
+            columns = ('qty_child_free_seat', 'qty_adult_free_seat')
+        case _:
+            return
+
+    await add_seat_counts(
+        batch, spreadsheet_id, event_id, dict(zip(columns, numbers)))
+
+
+async def add_seat_counts(
+        batch: SheetWriteBatch,
+        spreadsheet_id: str,
+        event_id: int,
+        seats: Dict[str, int]
+) -> None:
+    """Добавляет в batch счетчики мест {колонка: значение} мероприятия."""
+    index, row_event = await _find_row(
+        spreadsheet_id, 'База спектаклей_', 'event_id', event_id, seats)
+    if row_event is None:
+        raise ValueError(f'Событие {event_id} не найдено в гугл-таблице')
+    for name, number in seats.items():
+        batch.set_values('База спектаклей_',
+                         row_event,
+                         index.headers[name] + 1,
+                         [number])
 
 
 async def write_data_reserve(
@@ -146,146 +454,148 @@ async def write_data_reserve(
         option: int = 1
 ) -> None:
     try:
-        dict_column_name, _ = await _get_column_info(
-            spreadsheet_id, 'База спектаклей_')
-        values = await _get_values(
-            spreadsheet_id,
-            f"{RANGE_NAME['База спектаклей_']}" + 'A:AA',
-            value_render_option='UNFORMATTED_VALUE'
-        )
-        if not values:
-            googlesheets_logger.info('No data found')
-            raise ValueError
-        row_event = 0
-        for i, row in enumerate(values):
-            if event_id == row[dict_column_name['event_id']]:
-                row_event = i + 1
-        value_input_option = 'RAW'
-        major_dimension = 'ROWS'
-        data = []
-        match option:
-            case 1:
-                col1 = dict_column_name['qty_child_free_seat'] + 1
-                col2 = dict_column_name['qty_child_nonconfirm_seat'] + 1
-                range_sheet = (
-                    f"{RANGE_NAME['База спектаклей_']}" f"R{row_event}C{col1}:R{row_event}C{col2}")
-                data.append(
-                    {'range': range_sheet, 'majorDimension': major_dimension,
-                     'values': [numbers[0:2]]})
-                col1 = dict_column_name['qty_adult_free_seat'] + 1
-                col2 = dict_column_name['qty_adult_nonconfirm_seat'] + 1
-                range_sheet = (
-                    f"{RANGE_NAME['База спектаклей_']}" f"R{row_event}C{col1}:R{row_event}C{col2}")
-                data.append(
-                    {'range': range_sheet, 'majorDimension': major_dimension,
-                     'values': [numbers[2:4]]})
-            case 2:
-                col = dict_column_name['qty_child_nonconfirm_seat'] + 1
-                range_sheet = (
-                    f"{RANGE_NAME['База спектаклей_']}" f"R{row_event}C{col}")
-                data.append(
-                    {'range': range_sheet, 'majorDimension': major_dimension,
-                     'values': [[numbers[0]]]})
-                col = dict_column_name['qty_adult_nonconfirm_seat'] + 1
-                range_sheet = (
-                    f"{RANGE_NAME['База спектаклей_']}" f"R{row_event}C{col}")
-                data.append(
-                    {'range': range_sheet, 'majorDimension': major_dimension,
-                     'values': [[numbers[1]]]})
-            case 3:
-                col = dict_column_name['qty_child_free_seat'] + 1
-                range_sheet = (
-                    f"{RANGE_NAME['База спектаклей_']}" f"R{row_event}C{col}")
-                data.append({
-                    'range': range_sheet,
-                    'majorDimension': major_dimension,
-                    'values': [[numbers[0]]]
-                })
-                col = dict_column_name['qty_adult_free_seat'] + 1
-                range_sheet = (
-                    f"{RANGE_NAME['База спектаклей_']}" f"R{row_event}C{col}")
-                data.append({
-                    'range': range_sheet,
-                    'majorDimension': major_dimension,
-                    'values': [[numbers[1]]]
-                })
-
-        await _write_data_to_batch_update(
-            data, spreadsheet_id, value_input_option)
-
+        batch = SheetWriteBatch()
+        await add_data_reserve(batch, spreadsheet_id, event_id, numbers, option)
+        await write_batch(spreadsheet_id, batch)
     except Exception as err:
+        _sheet_indexes.invalidate(spreadsheet_id, 'База спектаклей_')
         googlesheets_logger.error(err)
 
 
-async def write_client_reserve(
-        spreadsheet_id,
+# Значение колонки из листа 'Расписание' по event_id строки и заголовку
+# колонки во второй строке
+EVENT_FORMULA = (
+    '=VLOOKUP('
+    'INDIRECT("R"&ROW()&"C"&MATCH("event_id";$2:$2;0);FALSE);'
+    'INDIRECT("\'Расписание\'!R1C1:C"&MATCH('
+    'INDIRECT("R2C"&COLUMN();FALSE);\'Расписание\'!$2:$2;0);FALSE);'
+    'MATCH(INDIRECT("R2C"&COLUMN();FALSE);\'Расписание\'!$2:$2;0);'
+    '0)'
+)
+THEATER_NAME_FORMULA = (
+    '=VLOOKUP('
+    'INDEX($A:$Z;ROW();MATCH("theater_event_id";$2:$2;0));'
+    '\'Репертуар\'!$A$3:$F;'
+    'MATCH("name";\'Репертуар\'!$2:$2;0)'
+    ')'
+)
+# Колонок мероприятия после event_id
+EVENT_CELLS = 5
+BACKFILL_BATCH_SIZE = 500
+
+
+def _get_event_columns(headers: Dict[int | str, int]) -> List[Any]:
+    """Заголовки колонок мероприятия, которые идут после event_id."""
+    if 'event_id' not in headers:
+        return [None] * EVENT_CELLS
+    names = {column: name for name, column in headers.items()}
+    first = headers['event_id'] + 1
+    return [names.get(column) for column in range(first, first + EVENT_CELLS)]
+
+
+def _get_event_values(
+        event_values: Optional[Dict[Any, Dict[str, Any]]]
+) -> Dict[int, Dict[str, Any]]:
+    # После JSON ключи словаря приходят строками
+    return {int(event_id): values
+            for event_id, values in (event_values or {}).items()}
+
+
+def _get_event_cells(
+        event_columns: List[Any],
+        values: Optional[Dict[str, Any]]
+) -> List[Any]:
+    """
+    Ячейки колонок мероприятия: значения из get_sheet_event_values, если
+    они переданы и известны для заголовка колонки, иначе формулы.
+    """
+    values = values or {}
+    return [values[name] if name in values else EVENT_FORMULA
+            for name in event_columns]
+
+
+def _get_client_reserve_rows(
         reserve_user_data: dict,
         chat_id: int,
         base_ticket_dto: dict,
-        ticket_status_value: str
-) -> int:
+        ticket_status_value: str,
+        event_values: Optional[Dict[Any, Dict[str, Any]]] = None,
+        event_columns: Optional[List[Any]] = None
+) -> List[List[Any]]:
     # TODO Заменить на запись в другой лист
     chose_price = reserve_user_data['chose_price']
     client_data: dict = reserve_user_data['client_data']
     ticket_ids = reserve_user_data['ticket_ids']
     event_ids = reserve_user_data['choose_schedule_event_ids']
+    event_values = _get_event_values(event_values)
+    if event_columns is None:
+        event_columns = [None] * EVENT_CELLS
+
+    values: List[Any] = []
+
+    for i, event_id in enumerate(event_ids):
+        values.append([])
+        values[i].append(ticket_ids[i])
+        values[i].append(chat_id)
+        values[i].append(client_data['name_adult'])
+        values[i].append(client_data['phone'])
+        values[i].append(
+            ' | '.join([i[0] for i in client_data['data_children']]))
+        values[i].append('')
+        values[i].append(
+            ' | '.join([i[1] for i in client_data['data_children']]))
+
+        # Спектакль
+        values[i].append(event_id)
+        values[i].extend(_get_event_cells(
+            event_columns, event_values.get(int(event_id))))
+        values[i].append(datetime.now().strftime('%y%m%d %H:%M:%S'))
+
+        # add ticket info
+        base_ticket = BaseTicket(**base_ticket_dto)
+        values[i].append(base_ticket.base_ticket_id)
+        values[i].append(base_ticket.name)
+        values[i].append(int(chose_price))
+        values[i].append(base_ticket.quality_of_children)
+        values[i].append(base_ticket.quality_of_adult +
+                         base_ticket.quality_of_add_adult)
+
+        (flag_exclude,
+         flag_exclude_place_sum,
+         flag_transfer) = _get_flags_by_ticket_status(ticket_status_value)
+
+        values[i].append(flag_exclude)
+        values[i].append(flag_transfer)
+        values[i].append(flag_exclude_place_sum)
+        values[i].append(ticket_status_value)
 
-    try:
-        values_column = await _get_values(
-            spreadsheet_id,
-            RANGE_NAME['База клиентов_'] + 'A:A'
-        )
+    return values
 
-        if not values_column:
-            googlesheets_logger.info('No data found')
-            return 0
+
+async def write_client_reserves(
+        spreadsheet_id,
+        reserves: List[dict]
+) -> int:
+    """
+    Добавляет в клиентскую базу строки нескольких броней одним запросом.
+    reserves — список аргументов write_client_reserve (без spreadsheet_id).
+    """
+    try:
+        with sheets_priority(SheetsPriority.PAYMENT):
+            index = await _get_sheet_index(
+                spreadsheet_id, 'База клиентов_', 'ticket_id')
+        event_columns = _get_event_columns(index.headers)
 
         value_input_option = 'USER_ENTERED'
         response_value_render_option = 'FORMATTED_VALUE'
-        values: List[Any] = []
-
-        for i, event_id in enumerate(event_ids):
-            values.append([])
-            values[i].append(ticket_ids[i])
-            values[i].append(chat_id)
-            values[i].append(client_data['name_adult'])
-            values[i].append(client_data['phone'])
-            values[i].append(
-                ' | '.join([i[0] for i in client_data['data_children']]))
-            values[i].append('')
-            values[i].append(
-                ' | '.join([i[1] for i in client_data['data_children']]))
-
-            # Спектакль
-            values[i].append(event_id)
-            for j in range(5):
-                values[i].append(
-                    f'=VLOOKUP('
-                    f'INDIRECT("R"&ROW()&"C"&MATCH("event_id";$2:$2;0);FALSE);'
-                    f'INDIRECT("\'Расписание\'!R1C1:C"&MATCH('
-                    f'INDIRECT("R2C"&COLUMN();FALSE);\'Расписание\'!$2:$2;0);FALSE);'
-                    f'MATCH(INDIRECT("R2C"&COLUMN();FALSE);\'Расписание\'!$2:$2;0);'
-                    f'0)'
-                )
-            values[i].append(datetime.now().strftime('%y%m%d %H:%M:%S'))
-
-            # add ticket info
-            base_ticket = BaseTicket(**base_ticket_dto)
-            values[i].append(base_ticket.base_ticket_id)
-            values[i].append(base_ticket.name)
-            values[i].append(int(chose_price))
-            values[i].append(base_ticket.quality_of_children)
-            values[i].append(base_ticket.quality_of_adult +
-                             base_ticket.quality_of_add_adult)
-
-            (flag_exclude,
-             flag_exclude_place_sum,
-             flag_transfer) = _get_flags_by_ticket_status(ticket_status_value)
-
-            values[i].append(flag_exclude)
-            values[i].append(flag_transfer)
-            values[i].append(flag_exclude_place_sum)
-            values[i].append(ticket_status_value)
+        values: List[List[Any]] = []
+        ticket_ids = []
+        for reserve in reserves:
+            rows = _get_client_reserve_rows(
+                **reserve, event_columns=event_columns)
+            values.extend(rows)
+            ticket_ids.extend(
+                reserve['reserve_user_data']['ticket_ids'][:len(rows)])
 
         googlesheets_logger.info(values)
 
@@ -298,17 +608,41 @@ async def write_client_reserve(
         range_sheet = (RANGE_NAME['База клиентов_'] +
                        f'R1C1:R1C{end_column_index}')
 
-        await _execute_append_googlesheet(spreadsheet_id,
-                                          range_sheet,
-                                          value_input_option,
-                                          response_value_render_option,
-                                          value_range_body)
+        with sheets_priority(SheetsPriority.PAYMENT):
+            response = await _execute_append_googlesheet(
+                spreadsheet_id,
+                range_sheet,
+                value_input_option,
+                response_value_render_option,
+                value_range_body
+            )
+        _register_appended_rows(
+            spreadsheet_id, 'База клиентов_', 'ticket_id', response,
+            ticket_ids)
         return 1
     except Exception as err:
+        _sheet_indexes.invalidate(spreadsheet_id, 'База клиентов_')
         googlesheets_logger.error(err)
         return 0
 
 
+async def write_client_reserve(
+        spreadsheet_id,
+        reserve_user_data: dict,
+        chat_id: int,
+        base_ticket_dto: dict,
+        ticket_status_value: str,
+        event_values: Optional[Dict[Any, Dict[str, Any]]] = None
+) -> int:
+    return await write_client_reserves(spreadsheet_id, [{
+        'reserve_user_data': reserve_user_data,
+        'chat_id': chat_id,
+        'base_ticket_dto': base_ticket_dto,
+        'ticket_status_value': ticket_status_value,
+        'event_values': event_values,
+    }])
+
+
 async def _write_data_to_batch_update(
         data,
         spreadsheet_id,
@@ -321,7 +655,7 @@ async def _write_data_to_batch_update(
     ss = await _open_spreadsheet(spreadsheet_id)
 
     try:
-        responses = await ss.agcm._call(ss.ss.values_batch_update,
+        responses = await ss.cm._call(ss.ss.values_batch_update,
                                        body=value_range_body)
         googlesheets_logger.info(
             f"spreadsheetId: {responses.get('spreadsheetId', '')}")
@@ -330,23 +664,17 @@ async def _write_data_to_batch_update(
                 ['updatedRange: ', response.get('updatedRange', '')]))
     except TimeoutError:
         googlesheets_logger.error(value_range_body)
+        raise
 
 
 async def write_client_cme(
         spreadsheet_id,
-        custom_made_event: CustomMadeEvent
+        custom_made_event: CustomMadeEvent,
+        name_theater: Optional[str] = None
 ) -> None:
-    dict_column_name, _ = await _get_column_info(
-        spreadsheet_id, 'База ДР_')
-
-    values_column = await _get_values(
-        spreadsheet_id,
-        RANGE_NAME['База ДР_'] + 'A:A'
-    )
-
-    if not values_column:
-        googlesheets_logger.info('No data found.')
-        return
+    index = await _get_sheet_index(
+        spreadsheet_id, 'База ДР_', 'id', ('created_at',))
+    dict_column_name = index.headers
 
     value_input_option = 'USER_ENTERED'
     response_value_render_option = 'FORMATTED_VALUE'
@@ -364,13 +692,7 @@ async def write_client_cme(
                 case _:
                     values[0].append(cme[key])
         elif key == 'name_theater':
-            values[0].append(
-                '=VLOOKUP('
-                'INDEX($A:$Z;ROW();MATCH("theater_event_id";$2:$2;0));'
-                '\'Репертуар\'!$A$3:$F;'
-                'MATCH("name";\'Репертуар\'!$2:$2;0)'
-                ')'
-            )
+            values[0].append(name_theater or THEATER_NAME_FORMULA)
         else:
             values[0].append('')
 
@@ -387,18 +709,30 @@ async def write_client_cme(
     range_sheet = (RANGE_NAME['База ДР_'] +
                    f'R1C1:R1C{end_column_index}')
 
-    await _execute_append_googlesheet(spreadsheet_id,
-                                      range_sheet,
-                                      value_input_option,
-                                      response_value_render_option,
-                                      value_range_body)
+    response = await _execute_append_googlesheet(
+        spreadsheet_id,
+        range_sheet,
+        value_input_option,
+        response_value_render_option,
+        value_range_body
+    )
+    _register_appended_rows(
+        spreadsheet_id, 'База ДР_', 'id', response, [custom_made_event.id])
 
 
 async def write_client_list_waiting(
         spreadsheet_id,
-        context: dict
+        context: dict,
+        event_values: Optional[Dict[Any, Dict[str, Any]]] = None
 ):
     try:
+        event_columns = [None] * EVENT_CELLS
+        event_values = _get_event_values(event_values)
+        if event_values:
+            index = await _get_sheet_index(
+                spreadsheet_id, 'Лист ожидания_', 'event_id')
+            event_columns = _get_event_columns(index.headers)
+
         value_input_option = 'USER_ENTERED'
         response_value_render_option = 'FORMATTED_VALUE'
         values: List[List[Any]] = [[]]
@@ -416,15 +750,8 @@ async def write_client_list_waiting(
         values[0].append(phone)
         values[0].append(date)
         values[0].append(schedule_event_id)
-        for i in range(5):
-            values[0].append(
-                f'=VLOOKUP('
-                f'INDIRECT("R"&ROW()&"C"&MATCH("event_id";$2:$2;0);FALSE);'
-                f'INDIRECT("\'Расписание\'!R1C1:C"&MATCH('
-                f'INDIRECT("R2C"&COLUMN();FALSE);\'Расписание\'!$2:$2;0);FALSE);'
-                f'MATCH(INDIRECT("R2C"&COLUMN();FALSE);\'Расписание\'!$2:$2;0);'
-                f'0)'
-            )
+        values[0].extend(_get_event_cells(
+            event_columns, event_values.get(int(schedule_event_id))))
         values[0].append(
             '=if(INDIRECT("R"&ROW()&"C"&MATCH("flag_reserve";$2:$2;0);False);'
             '"Бронь";'
@@ -453,64 +780,101 @@ async def write_client_list_waiting(
 
     except Exception as err:
         googlesheets_logger.error(err)
+        raise
 
 
-async def update_ticket_in_gspread(
+def _is_event_formula(value: Any) -> bool:
+    return (isinstance(value, str) and
+            value.upper().startswith('=VLOOKUP(') and
+            ("'Расписание'!" in value or "'Репертуар'!" in value))
+
+
+async def backfill_event_formulas(
+        spreadsheet_id: str,
+        name_sheet: str,
+        batch_size: int = BACKFILL_BATCH_SIZE
+) -> int:
+    """
+    Разово заменяет формулы мероприятия (VLOOKUP по 'Расписание' и
+    'Репертуар') их текущими значениями. Лист читается два раза: формулы и
+    отображаемые значения. Ячейки с ошибкой (#N/A) остаются формулами.
+    Запись идет пачками по batch_size диапазонов, одна строка — один
+    диапазон. Возвращает число замененных ячеек.
+    """
+    with sheets_priority(SheetsPriority.BULK):
+        formulas = await _get_values(
+            spreadsheet_id, _get_sheet_range(name_sheet), 'FORMULA')
+        values = await _get_values(
+            spreadsheet_id, _get_sheet_range(name_sheet), 'FORMATTED_VALUE')
+
+    batch = SheetWriteBatch()
+    for row, (row_formulas, row_values) in enumerate(
+            zip(formulas, values), start=1):
+        for col, (formula, value) in enumerate(
+                zip(row_formulas, row_values), start=1):
+            if _is_event_formula(formula) and not str(value).startswith('#'):
+                batch.set_values(name_sheet, row, col, [value])
+
+    data = batch.to_data()
+    for start in range(0, len(data), batch_size):
+        with sheets_priority(SheetsPriority.BULK):
+            await _write_data_to_batch_update(
+                data[start:start + batch_size], spreadsheet_id,
+                'USER_ENTERED')
+        googlesheets_logger.info(
+            f'{name_sheet}: формулы заменены, диапазонов '
+            f'{min(start + batch_size, len(data))} из {len(data)}')
+    return len(batch)
+
+
+async def add_ticket_update(
+        batch: SheetWriteBatch,
         spreadsheet_id,
         ticket_id: int,
         ticket_status,
         option: int = 1
 ) -> None:
-    try:
-        dict_column_name, _ = await _get_column_info(
-            spreadsheet_id, 'База клиентов_')
-
-        values = await _get_values(
+    if option != 1:
+        return
+    # Статусы билетов меняются при оплате, они идут раньше остальных записей
+    batch.priority = SheetsPriority.PAYMENT
+    with sheets_priority(SheetsPriority.PAYMENT):
+        index, row_event = await _find_row(
             spreadsheet_id,
-            f"{RANGE_NAME['База клиентов_']}" + 'A:A',
-            value_render_option='UNFORMATTED_VALUE'
+            'База клиентов_',
+            'ticket_id',
+            ticket_id,
+            ('flag_exclude', 'ticket_status')
         )
+    if row_event is None or row_event <= 1:
+        raise ValueError('Билет удален из гугл-таблицы')
 
-        if not values:
-            googlesheets_logger.info('No data found')
-            raise ValueError
-
-        row_event = 0
-        for i, row in enumerate(values):
-            if ticket_id == row[dict_column_name['ticket_id']]:
-                row_event = i + 1
-        if row_event <= 1:
-            raise ValueError('Билет удален из гугл-таблицы')
-
-        value_input_option = 'RAW'
-        major_dimension = 'ROWS'
-        data = []
+    (flag_exclude,
+     flag_exclude_place_sum,
+     flag_transfer) = _get_flags_by_ticket_status(ticket_status)
+    # Колонки от flag_exclude до ticket_status идут подряд
+    batch.set_values('База клиентов_',
+                     row_event,
+                     index.headers['flag_exclude'] + 1,
+                     [flag_exclude,
+                      flag_transfer,
+                      flag_exclude_place_sum,
+                      ticket_status])
 
-        match option:
-            case 1:
-                (flag_exclude,
-                 flag_exclude_place_sum,
-                 flag_transfer) = _get_flags_by_ticket_status(ticket_status)
-
-                col1 = dict_column_name['flag_exclude'] + 1
-                col2 = dict_column_name['ticket_status'] + 1
-                range_sheet = (f"{RANGE_NAME['База клиентов_']}"
-                               f"R{row_event}C{col1}:R{row_event}C{col2}")
-                data.append({
-                    'range': range_sheet,
-                    'majorDimension': major_dimension,
-                    'values': [[
-                        flag_exclude,
-                        flag_transfer,
-                        flag_exclude_place_sum,
-                        ticket_status,
-                    ]]
-                })
-
-        await _write_data_to_batch_update(
-            data, spreadsheet_id, value_input_option)
 
+async def update_ticket_in_gspread(
+        spreadsheet_id,
+        ticket_id: int,
+        ticket_status,
+        option: int = 1
+) -> None:
+    try:
+        batch = SheetWriteBatch()
+        await add_ticket_update(
+            batch, spreadsheet_id, ticket_id, ticket_status, option)
+        await write_batch(spreadsheet_id, batch)
     except Exception as err:
+        _sheet_indexes.invalidate(spreadsheet_id, 'База клиентов_')
         googlesheets_logger.error(err)
 
 
@@ -519,24 +883,11 @@ async def update_cme_in_gspread(
         cme_id,
         status
 ) -> None:
-    dict_column_name, _ = await _get_column_info(
-        spreadsheet_id, 'База ДР_')
-    values = await _get_values(
-        spreadsheet_id,
-        f"{RANGE_NAME['База ДР_']}" + 'A:A',
-        value_render_option='UNFORMATTED_VALUE'
-    )
-
-    if not values:
-        googlesheets_logger.info('No data found')
-        raise ValueError
-
-    row_cme = 0
-    for i, row in enumerate(values):
-        if int(cme_id) == row[dict_column_name['id']]:
-            row_cme = i + 1
-    if row_cme == 0:
+    index, row_cme = await _find_row(
+        spreadsheet_id, 'База ДР_', 'id', int(cme_id), ('status',))
+    if row_cme is None:
         raise ValueError('Билет удален из гугл-таблицы')
+    dict_column_name = index.headers
 
     value_input_option = 'USER_ENTERED'
     response_value_render_option = 'FORMATTED_VALUE'
@@ -552,11 +903,15 @@ async def update_cme_in_gspread(
     range_sheet = (f"{RANGE_NAME['База ДР_']}"
                    f"R{row_cme}C{col1}:R{row_cme}C{col2}")
 
-    await _execute_update_googlesheet(spreadsheet_id,
-                                      range_sheet,
-                                      value_input_option,
-                                      response_value_render_option,
-                                      value_range_body)
+    try:
+        await _execute_update_googlesheet(spreadsheet_id,
+                                          range_sheet,
+                                          value_input_option,
+                                          response_value_render_option,
+                                          value_range_body)
+    except Exception:
+        _sheet_indexes.invalidate(spreadsheet_id, 'База ДР_')
+        raise
 
 
 async def _execute_update_googlesheet(
@@ -581,6 +936,7 @@ async def _execute_update_googlesheet(
     except TimeoutError as err:
         googlesheets_logger.error(err)
         googlesheets_logger.error(value_range_body)
+        raise
 
 
 async def _execute_append_googlesheet(
@@ -604,6 +960,8 @@ async def _execute_append_googlesheet(
             'spreadsheetId: ', response.get('spreadsheetId', ''), '\n',
             'tableRange: ', response.get('tableRange', '')
         ]))
+        return response
     except TimeoutError as err:
         googlesheets_logger.error(err)
         googlesheets_logger.error(value_range_body)
+        raise
@@ -0,0 +1,85 @@
+"""
+Очередь недоставленных задач gspread (dead-letter).
+
+Задача, которую обработчик очереди не смог записать в Google Sheets за
+MAX_DELIVER доставок, публикуется в 'gspread_failed' в конверте с
+числом повторов, последней ошибкой и временем следующей попытки.
+Повторы выполняет сам обработчик очереди: конверты забираются пачками и
+записываются через process_gspread_tasks вместе, с объединением записей
+в одну ячейку. Неудачный повтор откладывается с растущей паузой, после
+MAX_REPLAYS неудачных повторов (около суток) задача снимается с
+повторов и остается только в логе.
+Сообщение в 'gspread_replay' (из команды администратора) запускает
+повтор всех задач сразу, не дожидаясь пауз.
+"""
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Optional
+
+DLQ_SUBJECT = 'gspread_failed'
+DLQ_DURABLE = 'gspread_replay'
+REPLAY_SUBJECT = 'gspread_replay'
+REPLAY_BATCH_SIZE = 50
+REPLAY_DELAY = 60.0
+REPLAY_DELAY_MAX = 30 * 60.0
+MAX_REPLAYS = 48
+# Не чаще, чем раз в REPLAY_POLL, отложенный конверт возвращается в
+# обработку: так принудительный повтор срабатывает без ожидания паузы
+REPLAY_POLL = 30.0
+ERROR_MAX_LEN = 500
+
+
+def replay_delay(replays: int) -> float:
+    return min(REPLAY_DELAY_MAX, REPLAY_DELAY * 2 ** replays)
+
+
+@dataclass
+class DeadLetter:
+    task: Dict[str, Any]
+    error: str = ''
+    replays: int = 0
+    first_failed_at: float = field(default_factory=time.time)
+    # Время последней неудачной попытки
+    failed_at: float = field(default_factory=time.time)
+    not_before: float = 0.0
+
+    @classmethod
+    def from_message(cls, data: Dict[str, Any]) -> 'DeadLetter':
+        if 'task' not in data:
+            # Задача без конверта, как ее публиковали раньше
+            return cls(task=data)
+        return cls(**data)
+
+    @classmethod
+    def new(cls, task: Dict[str, Any], error: Optional[str]) -> 'DeadLetter':
+        now = time.time()
+        return cls(task=task, error=(error or '')[:ERROR_MAX_LEN],
+                   first_failed_at=now, failed_at=now,
+                   not_before=now + replay_delay(0))
+
+    def retry_later(self, error: Optional[str]) -> 'DeadLetter':
+        """Конверт для следующего повтора после неудачного."""
+        now = time.time()
+        replays = self.replays + 1
+        return DeadLetter(
+            task=self.task,
+            error=(error or self.error)[:ERROR_MAX_LEN],
+            replays=replays,
+            first_failed_at=self.first_failed_at,
+            failed_at=now,
+            not_before=now + replay_delay(replays),
+        )
+
+    @property
+    def exhausted(self) -> bool:
+        """Повторы исчерпаны, задачу больше не повторять."""
+        return self.replays >= MAX_REPLAYS
+
+    def wait(self, now: Optional[float] = None) -> float:
+        """Сколько секунд осталось до следующей попытки."""
+        if now is None:
+            now = time.time()
+        return max(0.0, self.not_before - now)
+
+    def to_message(self) -> Dict[str, Any]:
+        return asdict(self)
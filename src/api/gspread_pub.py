@@ -1,17 +1,19 @@
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-from faststream.nats import NatsBroker
-
-from settings.settings import nats_url
+from api.nats_publisher import PublishNotConfirmed, publisher
 
 gspread_pub_logger = logging.getLogger('bot.gspread_pub')
 
 
 async def _publish_message(message: Dict[str, Any]):
-    async with NatsBroker(nats_url) as broker:
-        await broker.publish(message, subject='gspread', stream='baby_domik')
-        gspread_pub_logger.info(f'Published gspread task: {message}')
+    try:
+        await publisher.publish(message, subject='gspread')
+    except PublishNotConfirmed as e:
+        # Сообщение могло быть сохранено: прямая запись может его задвоить
+        gspread_pub_logger.error(f'{e} | payload={message}')
+        return
+    gspread_pub_logger.info(f'Published gspread task: {message}')
 
 
 async def publish_update_ticket(
@@ -57,19 +59,29 @@ async def publish_write_data_reserve(
     Публикует задачу обновления свободных мест на мероприятие в Google Sheets в
     топик 'gspread'.
     """
-    message: Dict[str, Any] = {
+    message = write_data_reserve_message(sheet_id, event_id, numbers, option)
+    await _publish_message(message)
+
+
+def write_data_reserve_message(
+        sheet_id: str,
+        event_id: int,
+        numbers: List[int],
+        option: int = 1
+) -> Dict[str, Any]:
+    return {
         'action': 'write_data_reserve',
         'sheet_id': sheet_id,
         'event_id': event_id,
         'numbers': numbers,
         'option': option,
     }
-    await _publish_message(message)
 
 
 async def publish_write_client_list_waiting(
         sheet_id: str,
         context: dict,
+        event_values: Optional[Dict[int, Dict[str, Any]]] = None,
 ) -> None:
     """
     Публикует задачу обновления свободных мест на мероприятие в Google Sheets в
@@ -80,6 +92,8 @@ async def publish_write_client_list_waiting(
         'sheet_id': sheet_id,
         'context': context,
     }
+    if event_values:
+        message['event_values'] = event_values
     await _publish_message(message)
 
 
@@ -89,12 +103,27 @@ async def publish_write_client_reserve(
         reserve_user_data: dict,
         chat_id: int,
         base_ticket_dto: dict,
-        ticket_status_value: str
+        ticket_status_value: str,
+        event_values: Optional[Dict[int, Dict[str, Any]]] = None
 ) -> None:
     """
     Публикует задачу записи билета в клиентскую базу в Google Sheets в
     топик 'gspread'.
     """
+    message = write_client_reserve_message(
+        sheet_id, reserve_user_data, chat_id, base_ticket_dto,
+        ticket_status_value, event_values)
+    await _publish_message(message)
+
+
+def write_client_reserve_message(
+        sheet_id: str,
+        reserve_user_data: dict,
+        chat_id: int,
+        base_ticket_dto: dict,
+        ticket_status_value: str,
+        event_values: Optional[Dict[int, Dict[str, Any]]] = None
+) -> Dict[str, Any]:
     chose_price = reserve_user_data['chose_price']
     client_data: dict = reserve_user_data['client_data']
     ticket_ids = reserve_user_data['ticket_ids']
@@ -113,4 +142,6 @@ async def publish_write_client_reserve(
         'base_ticket_dto': base_ticket_dto,
         'ticket_status_value': ticket_status_value,
     }
-    await _publish_message(message)
+    if event_values:
+        message['event_values'] = event_values
+    return message
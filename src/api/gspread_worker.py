@@ -1,15 +1,21 @@
 import asyncio
 import logging
-from typing import Any, Dict
+import time
+from collections import defaultdict
+from typing import Annotated, Any, Dict, List, Optional
 
-from faststream import FastStream, Depends, Logger
-from faststream.nats import JStream, NatsBroker, PullSub, NatsMessage
+from faststream import Context, FastStream, Depends, Logger
+from faststream.nats import JStream, NatsBroker, PullSub
+from faststream.nats.message import NatsBatchMessage as _NatsBatchMessage
 from nats.js.api import DeliverPolicy, ConsumerConfig
 
 from api.googlesheets import (
-    update_ticket_in_gspread, update_cme_in_gspread,
-    write_data_reserve, write_client_reserve, write_client_list_waiting
+    SheetWriteBatch, add_data_reserve, add_ticket_update, write_batch,
+    update_cme_in_gspread, write_client_reserves, write_client_list_waiting
 )
+from api.gspread_dlq import (
+    DLQ_DURABLE, DLQ_SUBJECT, REPLAY_BATCH_SIZE, REPLAY_POLL, REPLAY_SUBJECT,
+    DeadLetter)
 from settings.settings import nats_url
 
 gspread_worker_logger = logging.getLogger('bot.gspread_worker')
@@ -17,9 +23,15 @@ gspread_worker_logger = logging.getLogger('bot.gspread_worker')
 broker = NatsBroker(nats_url)
 stream = JStream(name='baby_domik', max_msgs=100, max_age=60*60*24*7, declare=False)
 MSG_PROCESSING_TIME = 60
+BATCH_SIZE = 50
+BATCH_TIMEOUT = 1.0
+MAX_DELIVER = 5
+NAK_DELAY = 10
 
+NatsBatchMessage = Annotated[_NatsBatchMessage, Context('message')]
 
-async def progress_sender(message: NatsMessage):
+
+async def progress_sender(message: NatsBatchMessage):
     async def in_progress_task():
         while True:
             await asyncio.sleep(5.0)
@@ -30,83 +42,313 @@ async def progress_sender(message: NatsMessage):
     task.cancel()
 
 
+def _reserve_kwargs(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'reserve_user_data': data['reserve_user_data'],
+        'chat_id': data['chat_id'],
+        'base_ticket_dto': data['base_ticket_dto'],
+        'ticket_status_value': data['ticket_status_value'],
+        'event_values': data.get('event_values'),
+    }
+
+
+async def _write_separately(
+        write,
+        sheet_id: str,
+        tasks: List[Dict[str, Any]],
+        error: str,
+        logger: Logger
+) -> Dict[int, str]:
+    """
+    Повторяет задачи по одной после ошибки общего запроса, чтобы в
+    очередь вернулись только те, которые не удается записать.
+    """
+    if len(tasks) == 1:
+        return {0: error}
+    logger.warning(f'gspread: retrying {len(tasks)} tasks one by one')
+    errors = {}
+    for i, data in enumerate(tasks):
+        failed = await write(sheet_id, [data], logger)
+        if failed:
+            errors[i] = failed[0]
+    return errors
+
+
+async def _write_client_reserves(
+        sheet_id: str,
+        tasks: List[Dict[str, Any]],
+        logger: Logger
+) -> Dict[int, str]:
+    """
+    Добавляет брони одним values_append.
+    Возвращает тексты ошибок по номерам задач, которые не записаны.
+    """
+    try:
+        res = await write_client_reserves(
+            sheet_id, [_reserve_kwargs(data) for data in tasks])
+        if res != 1:
+            raise RuntimeError('Не удалось добавить брони в клиентскую базу')
+    except Exception as e:
+        logger.exception(f'Failed to write gspread reserves: {e}')
+        return await _write_separately(
+            _write_client_reserves, sheet_id, tasks,
+            f'{type(e).__name__}: {e}', logger)
+    for data in tasks:
+        reserve_user_data = data['reserve_user_data']
+        ticket_ids = reserve_user_data['ticket_ids']
+        event_ids = reserve_user_data['choose_schedule_event_ids']
+        logger.info(
+            f'gspread:write_client_reserve done | {event_ids=} {ticket_ids=}')
+    return {}
+
+
+async def _write_cells(
+        sheet_id: str,
+        tasks: List[Dict[str, Any]],
+        logger: Logger
+) -> Dict[int, str]:
+    """
+    Собирает записи мест и статусов билетов в один values_batch_update.
+    Для одной ячейки побеждает последнее сообщение.
+    Возвращает тексты ошибок по номерам задач, которые не записаны
+    (например, строки билета еще нет в таблице) и должны повториться.
+    """
+    errors = {}
+    batch = SheetWriteBatch()
+    for i, data in enumerate(tasks):
+        action = data['action']
+        option = int(data.get('option', 1))
+        try:
+            if action == 'write_data_reserve':
+                await add_data_reserve(
+                    batch, sheet_id, data['event_id'], data['numbers'], option)
+            else:
+                await add_ticket_update(
+                    batch, sheet_id, int(data['ticket_id']), data['status'],
+                    option)
+        except Exception as e:
+            logger.error(f'gspread:{action} failed: {e} | payload={data}')
+            errors[i] = f'{type(e).__name__}: {e}'
+
+    try:
+        await write_batch(sheet_id, batch)
+    except Exception as e:
+        logger.exception(f'Failed to write gspread batch: {e}')
+        rest = [i for i in range(len(tasks)) if i not in errors]
+        failed = await _write_separately(
+            _write_cells, sheet_id, [tasks[i] for i in rest],
+            f'{type(e).__name__}: {e}', logger)
+        errors.update({rest[j]: error for j, error in failed.items()})
+        return errors
+    logger.info(f'gspread:batch_update done | '
+                f'{len(tasks) - len(errors)} tasks -> {len(batch)} cells')
+    return errors
+
+
+async def _handle_single_task(data: Dict[str, Any], logger: Logger) -> None:
+    action = data.get('action')
+    sheet_id = str(data['sheet_id'])
+    status = data.get('status', None)
+
+    log_text = ''
+    if action == 'update_cme':
+        cme_id = int(data['cme_id'])
+        await update_cme_in_gspread(sheet_id, cme_id, status)
+        log_text = f'{cme_id=} {status=}'
+
+    elif action == 'write_client_list_waiting':
+        context = data['context']
+        await write_client_list_waiting(
+            sheet_id, context, data.get('event_values'))
+        log_text = f'{context=}'
+
+    else:
+        logger.warning(f'Unknown gspread action: {action} | payload={data}')
+        return
+
+    logger.info(f'gspread:{action} done | ' + log_text)
+
+
+async def process_gspread_tasks(
+        tasks: List[Dict[str, Any]],
+        logger: Logger,
+        errors: Optional[Dict[int, str]] = None,
+) -> List[bool]:
+    """
+    Выполняет пачку задач записи в Google Sheets.
+
+    Брони одной таблицы добавляются одним values_append, записи мест
+    и статусов билетов — одним values_batch_update (после добавления
+    броней, чтобы новые билеты уже были в индексе строк). Если общий
+    запрос не прошел, задачи повторяются по одной.
+    Возвращает для каждой задачи True, если сообщение можно подтвердить,
+    и False, если его нужно повторить. В errors (если передан)
+    записывается текст ошибки по номеру задачи.
+    """
+    if errors is None:
+        errors = {}
+    results = [True] * len(tasks)
+    reserves = defaultdict(list)
+    cells = defaultdict(list)
+    singles = []
+    for i, data in enumerate(tasks):
+        action = data.get('action')
+        if action == 'write_client_reserve':
+            reserves[str(data['sheet_id'])].append(i)
+        elif action in ('write_data_reserve', 'update_ticket'):
+            cells[str(data['sheet_id'])].append(i)
+        else:
+            singles.append(i)
+
+    for sheet_id, indexes in reserves.items():
+        failed = await _write_client_reserves(
+            sheet_id, [tasks[i] for i in indexes], logger)
+        for j, error in failed.items():
+            results[indexes[j]] = False
+            errors[indexes[j]] = error
+
+    for sheet_id, indexes in cells.items():
+        failed = await _write_cells(
+            sheet_id, [tasks[i] for i in indexes], logger)
+        for j, error in failed.items():
+            results[indexes[j]] = False
+            errors[indexes[j]] = error
+
+    for i in singles:
+        try:
+            await _handle_single_task(tasks[i], logger)
+        except Exception as e:
+            logger.exception(
+                f'Failed to handle gspread task: {e} | payload={tasks[i]}')
+            results[i] = False
+            errors[i] = f'{type(e).__name__}: {e}'
+
+    return results
+
+
+async def dead_letter(letter: DeadLetter, logger: Logger) -> None:
+    await broker.publish(
+        letter.to_message(), subject=DLQ_SUBJECT, stream='baby_domik')
+    logger.warning(
+        f'gspread:{letter.task.get("action")} -> {DLQ_SUBJECT} | '
+        f'replays={letter.replays} error={letter.error}')
+
+
 @broker.subscriber(
     subject='gspread',
     durable='gspread',
     config=ConsumerConfig(ack_wait=MSG_PROCESSING_TIME),
     deliver_policy=DeliverPolicy.NEW,
-    pull_sub=PullSub(),
+    pull_sub=PullSub(batch_size=BATCH_SIZE, timeout=BATCH_TIMEOUT, batch=True),
     stream=stream,
     dependencies=[Depends(progress_sender)]
 )
-async def handle_gspread_task(data: Dict[str, Any], logger: Logger):
+async def handle_gspread_task(
+        tasks: List[Dict[str, Any]],
+        logger: Logger,
+        message: NatsBatchMessage
+):
     """
     Обработчик задач записи в Google Sheets.
-    Первая поддерживаемая операция: update_ticket → update_ticket_in_gspread
+    Сообщения забираются пачкой, подтверждаются или возвращаются в очередь
+    по отдельности.
     """
-    try:
-        action = data.get('action')
-        sheet_id = str(data['sheet_id'])
-        status = data.get('status', None)
-        option = int(data.get('option', 1))
+    logger.info(f'gspread: batch of {len(tasks)} tasks started')
+    errors = {}
+    results = await process_gspread_tasks(tasks, logger, errors)
+    for i, (raw_message, done) in enumerate(zip(message.raw_message, results)):
+        if done:
+            await raw_message.ack()
+        elif raw_message.metadata.num_delivered >= MAX_DELIVER:
+            await dead_letter(DeadLetter.new(tasks[i], errors.get(i)), logger)
+            await raw_message.ack()
+        else:
+            await raw_message.nak(delay=NAK_DELAY)
+
+
+# Конверты, последняя попытка которых была не позже этого времени,
+# повторяются без паузы
+_replay_requested_at = 0.0
 
-        logger.info(f'gspread:{action} started')
-        log_text = ''
-        if action == 'update_ticket':
-            ticket_id = int(data['ticket_id'])
-            await update_ticket_in_gspread(sheet_id, ticket_id, status, option)
-            log_text = f'{ticket_id=} {status=}'
-
-        elif action == 'update_cme':
-            cme_id = int(data['cme_id'])
-            await update_cme_in_gspread(sheet_id, cme_id, status)
-            log_text = f'{cme_id=} {status=}'
-
-        elif action == 'write_data_reserve':
-            event_id = data['event_id']
-            numbers = data['numbers']
-            await write_data_reserve(sheet_id, event_id, numbers, option)
-            log_text = f'{event_id=} {numbers=}'
-
-        elif action == 'write_client_list_waiting':
-            context = data['context']
-            await write_client_list_waiting(sheet_id, context)
-            log_text = f'{context=}'
-
-        elif action == 'write_client_reserve':
-            reserve_user_data = data['reserve_user_data']
-            chat_id = data['chat_id']
-            base_ticket_dto = data['base_ticket_dto']
-            ticket_status_value = data['ticket_status_value']
-
-            res = await write_client_reserve(sheet_id,
-                                             reserve_user_data,
-                                             chat_id,
-                                             base_ticket_dto,
-                                             ticket_status_value)
-            if res == 1:
-                ticket_ids = reserve_user_data['ticket_ids']
-                event_ids = reserve_user_data['choose_schedule_event_ids']
-                log_text = f'{event_ids=} {ticket_ids=}'
-
-            elif res == 0:
-                message: Dict[str, Any] = {
-                    'action': 'write_client_reserve',
-                    'sheet_id': sheet_id,
-                    'reserve_user_data': reserve_user_data,
-                    'chat_id': chat_id,
-                    'base_ticket_dto': base_ticket_dto,
-                    'ticket_status_value': ticket_status_value,
-                }
-                await broker.publish(
-                    message, subject='gspread_failed', stream='baby_domik')
-                logger.info(f'Published gspread task: {message}')
+
+async def replay_dead_letters(
+        letters: List[DeadLetter],
+        logger: Logger,
+) -> List[Optional[DeadLetter]]:
+    """
+    Повторяет задачи, для которых подошло время (или запрошен повтор
+    всех), одной пачкой. Возвращает для каждого конверта None, если
+    задача записана или повторы исчерпаны, или конверт, который нужно
+    вернуть в очередь.
+    """
+    now = time.time()
+    due = [i for i, letter in enumerate(letters)
+           if letter.wait(now) == 0
+           or letter.failed_at <= _replay_requested_at]
+    pending: List[Optional[DeadLetter]] = list(letters)
+    if not due:
+        return pending
+
+    errors = {}
+    results = await process_gspread_tasks(
+        [letters[i].task for i in due], logger, errors)
+    replayed = 0
+    for j, (i, done) in enumerate(zip(due, results)):
+        if done:
+            pending[i] = None
+            replayed += 1
+            continue
+        letter = letters[i].retry_later(errors.get(j))
+        if letter.exhausted:
+            logger.error(
+                f'{DLQ_SUBJECT}: gave up after {letter.replays} replays | '
+                f'error={letter.error} payload={letter.task}')
+            letter = None
+        pending[i] = letter
+    logger.info(f'{DLQ_SUBJECT}: replayed {replayed} of {len(due)} tasks, '
+                f'{len(letters) - len(due)} waiting')
+    return pending
+
+
+@broker.subscriber(
+    subject=DLQ_SUBJECT,
+    durable=DLQ_DURABLE,
+    config=ConsumerConfig(ack_wait=MSG_PROCESSING_TIME),
+    deliver_policy=DeliverPolicy.ALL,
+    pull_sub=PullSub(batch_size=REPLAY_BATCH_SIZE, timeout=BATCH_TIMEOUT,
+                     batch=True),
+    stream=stream,
+    dependencies=[Depends(progress_sender)]
+)
+async def handle_dead_letters(
+        tasks: List[Dict[str, Any]],
+        logger: Logger,
+        message: NatsBatchMessage
+):
+    """
+    Повтор задач из очереди недоставленных. Конверты, время которых не
+    подошло, возвращаются в очередь не дольше чем на REPLAY_POLL.
+    """
+    letters = [DeadLetter.from_message(data) for data in tasks]
+    pending = await replay_dead_letters(letters, logger)
+    now = time.time()
+    for raw_message, letter, left in zip(
+            message.raw_message, letters, pending):
+        if left is None:
+            await raw_message.ack()
+        elif left is letter:
+            await raw_message.nak(delay=min(letter.wait(now), REPLAY_POLL))
         else:
-            logger.warning(f'Unknown gspread action: {action} | payload={data}')
+            await dead_letter(left, logger)
+            await raw_message.ack()
 
-        logger.info(f'gspread:{action} done | ' + log_text)
-    except Exception as e:
-        logger.exception(f'Failed to handle gspread task: {e} | payload={data}')
+
+@broker.subscriber(subject=REPLAY_SUBJECT)
+async def handle_replay_request(data: Dict[str, Any], logger: Logger):
+    """Команда администратора: повторить все недоставленные задачи."""
+    global _replay_requested_at
+    _replay_requested_at = time.time()
+    logger.info(f'{DLQ_SUBJECT}: replay requested by {data.get("user_id")}')
 
 
 fast_stream = FastStream(broker)
@@ -0,0 +1,272 @@
+"""
+Долгоживущий издатель сообщений в JetStream.
+
+Одно соединение с NATS на процесс (бот, веб) вместо подключения на каждое
+сообщение. Публикации идут через publish_async: параллельные вызовы
+отправляются по одному соединению, а число неподтвержденных сообщений
+ограничено. Соединение переподключается само; пока его нет, publish
+сразу поднимает PublisherUnavailable, и вызывающий код выполняет запись
+напрямую. Если не пришло подтверждение, сообщение могло быть сохранено,
+поэтому оно отправляется повторно с тем же Nats-Msg-Id (дубль JetStream
+отбросит), а не пишется напрямую.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Any, Dict, Optional
+
+import nats
+from nats.aio.client import Client
+from nats.errors import Error as NatsError
+from nats.js import JetStreamContext
+from nats.js.api import ConsumerInfo
+from nats.js.errors import BucketNotFoundError
+from nats.js.kv import KeyValue
+
+from settings.settings import nats_url
+
+nats_publisher_logger = logging.getLogger('bot.nats_publisher')
+
+STREAM = 'baby_domik'
+MAX_PENDING_ACKS = 256
+ACK_TIMEOUT = 5.0
+ACK_ATTEMPTS = 3
+CONNECT_TIMEOUT = 2.0
+RECONNECT_TIME_WAIT = 2.0
+# Пауза между попытками первичного подключения, чтобы при недоступном
+# брокере каждая публикация не ждала CONNECT_TIMEOUT
+CONNECT_RETRY_DELAY = 30.0
+LATENCY_WINDOW = 1000
+
+
+class PublisherUnavailable(ConnectionError):
+    """Брокер недоступен: сообщение не принято JetStream."""
+
+
+class PublishNotConfirmed(Exception):
+    """
+    Сообщение отправлено, но подтверждение JetStream не пришло.
+    Оно могло быть сохранено: писать напрямую нельзя, повторять — только
+    с тем же msg_id.
+    """
+
+
+class PublishStats:
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.published = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=window)
+
+    def add(self, latency: float) -> None:
+        self.published += 1
+        self.latencies.append(latency)
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(len(values) * q))]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'published': self.published,
+            'failed': self.failed,
+            'latency_p50_ms': round(self.percentile(0.5) * 1000, 1),
+            'latency_p95_ms': round(self.percentile(0.95) * 1000, 1),
+            'latency_max_ms': round(
+                max(self.latencies, default=0.0) * 1000, 1),
+        }
+
+
+class NatsPublisher:
+    def __init__(
+            self,
+            url: str,
+            *,
+            max_pending_acks: int = MAX_PENDING_ACKS,
+            ack_timeout: float = ACK_TIMEOUT,
+    ):
+        self.url = url
+        self.max_pending_acks = max_pending_acks
+        self.ack_timeout = ack_timeout
+        self.stats = PublishStats()
+        self._nc: Optional[Client] = None
+        self._js: Optional[JetStreamContext] = None
+        self._lock = asyncio.Lock()
+        self._next_connect_at = 0.0
+
+    @property
+    def is_connected(self) -> bool:
+        return self._nc is not None and self._nc.is_connected
+
+    async def start(self) -> None:
+        async with self._lock:
+            if self._nc is not None and not self._nc.is_closed:
+                return
+            if time.monotonic() < self._next_connect_at:
+                raise PublisherUnavailable('Нет соединения с NATS')
+            try:
+                # С max_reconnect_attempts=-1 nats.connect сам не сдается,
+                # поэтому первичное подключение ограничено по времени
+                self._nc = await asyncio.wait_for(nats.connect(
+                    self.url,
+                    connect_timeout=CONNECT_TIMEOUT,
+                    reconnect_time_wait=RECONNECT_TIME_WAIT,
+                    max_reconnect_attempts=-1,
+                    disconnected_cb=self._on_disconnected,
+                    reconnected_cb=self._on_reconnected,
+                ), CONNECT_TIMEOUT * 2)
+            except (NatsError, OSError, asyncio.TimeoutError):
+                self._next_connect_at = time.monotonic() + CONNECT_RETRY_DELAY
+                raise
+            self._js = self._nc.jetstream(
+                publish_async_max_pending=self.max_pending_acks)
+            nats_publisher_logger.info(f'Издатель NATS подключен к {self.url}')
+
+    async def stop(self) -> None:
+        """Дожидается подтверждения отправленных сообщений и закрывает соединение."""
+        async with self._lock:
+            if self._nc is None:
+                return
+            nc, js = self._nc, self._js
+            self._nc, self._js = None, None
+        try:
+            if nc.is_connected:
+                await asyncio.wait_for(
+                    js.publish_async_completed(), self.ack_timeout)
+        except asyncio.TimeoutError:
+            nats_publisher_logger.warning(
+                f'Не дождались подтверждения '
+                f'{js.publish_async_pending()} сообщений')
+        await nc.close()
+        nats_publisher_logger.info('Издатель NATS остановлен')
+
+    async def key_value(self, bucket: str, **config) -> KeyValue:
+        """Хранилище NATS KV на том же соединении, создается при отсутствии."""
+        js = await self._jetstream()
+        try:
+            return await js.key_value(bucket)
+        except BucketNotFoundError:
+            return await js.create_key_value(bucket=bucket, **config)
+
+    async def consumer_info(self, stream: str, durable: str) -> ConsumerInfo:
+        """Состояние durable-потребителя JetStream (размер очереди и т.п.)."""
+        js = await self._jetstream()
+        return await js.consumer_info(stream, durable)
+
+    async def publish_core(self, subject: str, message: Dict[str, Any]):
+        """Сообщение в core NATS, без сохранения в потоке."""
+        await self._jetstream()
+        payload = json.dumps(message, ensure_ascii=False).encode()
+        await self._nc.publish(subject, payload)
+        await self._nc.flush(timeout=self.ack_timeout)
+
+    async def _jetstream(self) -> JetStreamContext:
+        if self._nc is None or self._nc.is_closed:
+            await self.start()
+        js = self._js
+        if js is None or not self._nc.is_connected:
+            raise PublisherUnavailable('Нет соединения с NATS')
+        return js
+
+    async def _on_disconnected(self):
+        nats_publisher_logger.warning('Соединение с NATS потеряно')
+
+    async def _on_reconnected(self):
+        nats_publisher_logger.info('Соединение с NATS восстановлено')
+
+    async def publish(
+            self,
+            message: Dict[str, Any],
+            subject: str,
+            stream: str = STREAM,
+            msg_id: Optional[str] = None,
+    ) -> None:
+        """
+        Публикует сообщение и ждет подтверждения JetStream.
+        Повтор сообщения с тем же msg_id JetStream отбрасывает; без msg_id
+        он создается на время вызова.
+        Если сообщение не принято (нет соединения, ошибка JetStream),
+        поднимается PublisherUnavailable: на нее вызывающий код пишет
+        напрямую. Неподтвержденное сообщение отправляется повторно с тем
+        же msg_id, после ACK_ATTEMPTS попыток — PublishNotConfirmed.
+        """
+        payload = json.dumps(message, ensure_ascii=False).encode()
+        if msg_id is None:
+            msg_id = uuid.uuid4().hex
+        headers = {'content-type': 'application/json', 'Nats-Msg-Id': msg_id}
+        start = time.perf_counter()
+        for attempt in range(1, ACK_ATTEMPTS + 1):
+            try:
+                await self._publish_once(subject, payload, stream, headers)
+                break
+            # Таймаут подтверждения проверяется раньше OSError: в Python 3.11
+            # asyncio.TimeoutError — наследник OSError
+            except asyncio.TimeoutError:
+                nats_publisher_logger.warning(
+                    f'Нет подтверждения сообщения {msg_id} в {subject}, '
+                    f'попытка {attempt} из {ACK_ATTEMPTS}')
+            # Ошибки JetStream (APIError, NoStreamResponseError,
+            # TooManyStalledMsgsError) — наследники NatsError
+            except (NatsError, OSError) as e:
+                self.stats.failed += 1
+                if isinstance(e, PublisherUnavailable):
+                    raise
+                raise PublisherUnavailable(f'{type(e).__name__}: {e}') from e
+        else:
+            self.stats.failed += 1
+            raise PublishNotConfirmed(
+                f'Нет подтверждения сообщения {msg_id} в {subject}')
+        self.stats.add(time.perf_counter() - start)
+
+    async def _publish_once(
+            self,
+            subject: str,
+            payload: bytes,
+            stream: str,
+            headers: Dict[str, str],
+    ) -> None:
+        if self._nc is None or self._nc.is_closed:
+            try:
+                await self.start()
+            except (NatsError, OSError, asyncio.TimeoutError) as e:
+                if isinstance(e, PublisherUnavailable):
+                    raise
+                # Таймаут подключения — не таймаут подтверждения
+                raise PublisherUnavailable(f'{type(e).__name__}: {e}') from e
+        nc, js = self._nc, self._js
+        if nc is None or not nc.is_connected:
+            raise PublisherUnavailable('Нет соединения с NATS')
+        future = await js.publish_async(
+            subject,
+            payload,
+            wait_stall=self.ack_timeout,
+            stream=stream,
+            headers=headers,
+        )
+        await asyncio.wait_for(future, self.ack_timeout)
+
+
+publisher = NatsPublisher(nats_url)
+
+
+async def start_publisher() -> None:
+    try:
+        await publisher.start()
+    except (NatsError, OSError, asyncio.TimeoutError) as e:
+        # Подключимся при первой публикации
+        nats_publisher_logger.error(f'Издатель NATS не подключен: {e}')
+
+
+async def stop_publisher() -> None:
+    await publisher.stop()
+
+
+def get_publisher_stats() -> Dict[str, Any]:
+    return {
+        'connected': publisher.is_connected,
+        **publisher.stats.as_dict(),
+    }
@@ -1,17 +1,19 @@
 import logging
 from typing import Any, Dict
 
-from faststream.nats import NatsBroker
-
-from settings.settings import nats_url
+from api.nats_publisher import PublishNotConfirmed, publisher
 
 sales_pub_logger = logging.getLogger('bot.sales_pub')
 
 
 async def _publish_message(message: Dict[str, Any]):
-    async with NatsBroker(nats_url) as broker:
-        await broker.publish(message, subject='sales', stream='baby_domik')
-        sales_pub_logger.info(f'Published sales task: {message}')
+    try:
+        await publisher.publish(message, subject='sales')
+    except PublishNotConfirmed as e:
+        # Сообщение могло быть сохранено: прямая запись может его задвоить
+        sales_pub_logger.error(f'{e} | payload={message}')
+        return
+    sales_pub_logger.info(f'Published sales task: {message}')
 
 
 async def publish_sales(campaign_id: int) -> None:
@@ -12,19 +12,21 @@ from telegram import Bot, MessageEntity
 from telegram.error import Forbidden, RetryAfter, BadRequest, TimedOut, \
     NetworkError
 
-from db import create_sessionmaker_and_engine, db_postgres
+from db import db_postgres, dispose_engines
+from db.invalidation import start_invalidation_bus, stop_invalidation_bus
 from db.models import SalesCampaign, SalesCampaignSchedule, ScheduleEvent
 from db.sales_crud import (
     iter_recipients_for_send, mark_recipient_status, get_free_places,
 )
 from settings.config_loader import parse_settings
 from settings.settings import DICT_CONVERT_WEEKDAY_NUMBER_TO_STR, nats_url
+from utilities.utl_db import get_sessionmaker
 from utilities.utl_func import get_full_name_event
 
 sales_worker_logger = logging.getLogger('bot.sales_worker')
 
 _settings = parse_settings()
-_sessionmaker = create_sessionmaker_and_engine(str(_settings.postgres.db_url))
+_sessionmaker = get_sessionmaker(_settings)
 
 broker = NatsBroker(nats_url)
 stream = JStream(name='baby_domik', max_msgs=100, max_age=60 * 60 * 24 * 7,
@@ -338,5 +340,16 @@ async def handle_sales_task(data: Dict[str, Any], logger: Logger):
 
 fast_stream = FastStream(broker)
 
+
+@fast_stream.after_startup
+async def start_db_listeners():
+    start_invalidation_bus(_sessionmaker)
+
+
+@fast_stream.after_shutdown
+async def dispose_db_engines():
+    await stop_invalidation_bus()
+    await dispose_engines()
+
 if __name__ == "__main__":
     asyncio.run(fast_stream.run())
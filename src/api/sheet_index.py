@@ -0,0 +1,139 @@
+"""
+Кэш заголовков и позиций строк листов Google Sheets.
+
+Для точечной записи (статус билета, места в расписании, статус заявки ДР)
+нужно знать номер колонки по имени из 2-й строки и номер строки по ключу
+(ticket_id, event_id, id). Индекс строится лениво один раз на
+(таблица, лист, ключевая колонка), дополняется после добавления строк
+и сбрасывается, если заголовок или ключ не найден, запись упала или
+истек TTL (строки в таблице могут двигать вручную). Строку, которую не
+проверяли дольше ROW_CHECK_AFTER, перед записью сверяют по ключевой
+ячейке.
+"""
+import logging
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+sheet_index_logger = logging.getLogger('bot.sheet_index')
+
+SHEET_INDEX_TTL = 5 * 60
+ROW_CHECK_AFTER = 30
+
+_RANGE_START_ROW = re.compile(r'![A-Z]*(\d+)')
+
+
+def column_letter(column: int) -> str:
+    """Номер колонки (с 1) в буквенное обозначение A1: 1 -> A, 27 -> AA."""
+    letters = ''
+    while column > 0:
+        column, rest = divmod(column - 1, 26)
+        letters = chr(ord('A') + rest) + letters
+    return letters
+
+
+def get_start_row(updated_range: str) -> Optional[int]:
+    """Первая строка из диапазона ответа API: 'Лист'!A120:X121 -> 120."""
+    match = _RANGE_START_ROW.search(updated_range or '')
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+class SheetIndex:
+    def __init__(
+            self,
+            headers: Dict[int | str, int],
+            len_col: int,
+            key_column: str,
+            keys: List[Any],
+    ):
+        self.headers = headers
+        self.len_col = len_col
+        self.key_column = key_column
+        self.rows: Dict[Any, int] = {}
+        self.loaded_at = time.monotonic()
+        self.checked_at: Dict[int, float] = {}
+        # Как и при линейном поиске, при дублях побеждает последняя строка
+        for i, key in enumerate(keys, start=1):
+            if key not in (None, ''):
+                self.rows[key] = i
+        self.last_row = len(keys)
+
+    def is_expired(self, ttl: float = SHEET_INDEX_TTL) -> bool:
+        return time.monotonic() - self.loaded_at > ttl
+
+    def get_row(self, key) -> Optional[int]:
+        return self.rows.get(key)
+
+    def is_row_checked(
+            self, row: int, max_age: float = ROW_CHECK_AFTER) -> bool:
+        """Строку сверяли с таблицей (или читали) не дольше max_age назад."""
+        checked_at = self.checked_at.get(row, self.loaded_at)
+        return time.monotonic() - checked_at <= max_age
+
+    def mark_checked(self, row: int) -> None:
+        self.checked_at[row] = time.monotonic()
+
+    def has_columns(self, names: Iterable[str]) -> bool:
+        return all(name in self.headers for name in names)
+
+    def add_rows(self, first_row: int, keys: List[Any]) -> None:
+        for i, key in enumerate(keys):
+            self.rows[key] = first_row + i
+            self.mark_checked(first_row + i)
+        self.last_row = max(self.last_row, first_row + len(keys) - 1)
+
+
+class SheetIndexCache:
+    def __init__(self, ttl: float = SHEET_INDEX_TTL):
+        self.ttl = ttl
+        self._indexes: Dict[Tuple[str, str, str], SheetIndex] = {}
+
+    def get(
+            self,
+            spreadsheet_id: str,
+            name_sheet: str,
+            key_column: str
+    ) -> Optional[SheetIndex]:
+        key = (spreadsheet_id, name_sheet, key_column)
+        index = self._indexes.get(key)
+        if index is not None and index.is_expired(self.ttl):
+            del self._indexes[key]
+            return None
+        return index
+
+    def put(
+            self,
+            spreadsheet_id: str,
+            name_sheet: str,
+            index: SheetIndex
+    ) -> None:
+        self._indexes[(spreadsheet_id, name_sheet, index.key_column)] = index
+
+    def add_rows(
+            self,
+            spreadsheet_id: str,
+            name_sheet: str,
+            key_column: str,
+            updated_range: str,
+            keys: List[Any],
+    ) -> None:
+        """Учитывает строки, добавленные values_append."""
+        index = self.get(spreadsheet_id, name_sheet, key_column)
+        if index is None:
+            return
+        first_row = get_start_row(updated_range)
+        if first_row is None:
+            self.invalidate(spreadsheet_id, name_sheet)
+            return
+        index.add_rows(first_row, keys)
+
+    def invalidate(self, spreadsheet_id: str, name_sheet: str) -> None:
+        for key in list(self._indexes):
+            if key[:2] == (spreadsheet_id, name_sheet):
+                del self._indexes[key]
+                sheet_index_logger.info(f'Индекс листа {key} сброшен')
+
+    def clear(self) -> None:
+        self._indexes.clear()
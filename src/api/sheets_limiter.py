@@ -0,0 +1,304 @@
+"""
+Общий лимит запросов к Google Sheets API.
+
+Квота — 60 запросов в минуту на сервисный аккаунт, а обращаются к API
+бот, обработчик очереди gspread и веб. Все вызовы gspread_asyncio идут
+через SheetsClientManager: перед запросом берется токен из ведра, общего
+для всех процессов (состояние хранится в NATS KV), ответы 429 и 5xx
+повторяются с экспоненциальной задержкой. Ожидающие токен запросы
+обслуживаются по приоритету: записи по оплатам раньше массовых загрузок.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import gspread
+import requests
+from gspread_asyncio import AsyncioGspreadClientManager
+from nats.errors import Error as NatsError
+from nats.js.errors import KeyNotFoundError, KeyWrongLastSequenceError
+from nats.js.kv import KeyValue
+
+sheets_limiter_logger = logging.getLogger('bot.sheets_limiter')
+
+QUOTA_PER_MINUTE = 60
+BUCKET_CAPACITY = 10
+KV_BUCKET = 'sheets_quota'
+KV_KEY = 'tokens'
+KV_TIMEOUT = 1.0
+CAS_ATTEMPTS = 5
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 32.0
+
+
+class SheetsPriority(IntEnum):
+    PAYMENT = 0
+    DEFAULT = 1
+    BULK = 2
+
+
+_priority: ContextVar[SheetsPriority] = ContextVar(
+    'sheets_priority', default=SheetsPriority.DEFAULT)
+
+
+@contextmanager
+def sheets_priority(priority: SheetsPriority):
+    """Приоритет всех запросов к Sheets внутри блока."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def is_retryable_status(code: int) -> bool:
+    return code == 429 or code >= 500
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE) -> float:
+    """Экспоненциальная задержка с разбросом, чтобы процессы не совпадали."""
+    return min(BACKOFF_MAX, base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+@dataclass
+class BucketState:
+    tokens: float
+    updated_at: float
+    blocked_until: float = 0.0
+
+    def take(self, now: float, rate: float, capacity: float) -> float:
+        """Берет токен. Возвращает 0 или сколько секунд ждать следующего."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.tokens = min(
+            capacity, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+    def block(self, now: float, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0.0
+        self.updated_at = now
+
+
+class LocalTokenBucket:
+    def __init__(
+            self,
+            quota_per_minute: float = QUOTA_PER_MINUTE,
+            capacity: float = BUCKET_CAPACITY,
+            clock: Callable[[], float] = time.time,
+    ):
+        self.rate = quota_per_minute / 60
+        self.capacity = capacity
+        self.clock = clock
+        self.state = BucketState(capacity, clock())
+
+    async def take(self) -> float:
+        return self.state.take(self.clock(), self.rate, self.capacity)
+
+    async def block(self, seconds: float) -> None:
+        self.state.block(self.clock(), seconds)
+
+
+class NatsTokenBucket(LocalTokenBucket):
+    """
+    Ведро в NATS KV, изменения через compare-and-set по ревизии ключа.
+    Пока NATS недоступен, работает локальное ведро процесса.
+    """
+
+    def __init__(
+            self,
+            get_kv: Callable[[], Awaitable[KeyValue]],
+            **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.get_kv = get_kv
+        self._kv: Optional[KeyValue] = None
+        self._use_local = False
+
+    async def take(self) -> float:
+        return await self._change(
+            lambda state, now: state.take(now, self.rate, self.capacity),
+            local=super().take,
+        )
+
+    async def block(self, seconds: float) -> None:
+        await self._change(
+            lambda state, now: state.block(now, seconds),
+            local=lambda: super(NatsTokenBucket, self).block(seconds),
+        )
+
+    async def _change(self, change, local):
+        try:
+            result = await asyncio.wait_for(
+                self._change_shared(change), KV_TIMEOUT)
+        except (NatsError, OSError, asyncio.TimeoutError) as e:
+            self._kv = None
+            if not self._use_local:
+                sheets_limiter_logger.warning(
+                    f'Лимит Sheets считается локально, NATS KV '
+                    f'недоступен: {type(e).__name__}: {e}')
+                self._use_local = True
+            return await local()
+        if result is None:
+            return await local()
+        if self._use_local:
+            sheets_limiter_logger.info('Лимит Sheets снова общий')
+            self._use_local = False
+        return result[0]
+
+    async def _change_shared(self, change) -> Optional[Tuple[Any]]:
+        if self._kv is None:
+            self._kv = await self.get_kv()
+        kv = self._kv
+        for _ in range(CAS_ATTEMPTS):
+            now = self.clock()
+            try:
+                entry = await kv.get(KV_KEY)
+                state = BucketState(**json.loads(entry.value))
+                revision = entry.revision
+            except KeyNotFoundError:
+                state = BucketState(self.capacity, now)
+                revision = None
+
+            result = change(state, now)
+            if result:
+                # Токена нет: состояние не менялось, писать нечего
+                return result,
+            payload = json.dumps(asdict(state)).encode()
+            try:
+                if revision is None:
+                    await kv.create(KV_KEY, payload)
+                else:
+                    await kv.update(KV_KEY, payload, last=revision)
+                return result,
+            except KeyWrongLastSequenceError:
+                # Ведро изменил другой процесс
+                continue
+        sheets_limiter_logger.warning(
+            'Не удалось изменить общий лимит Sheets, используется локальный')
+        return None
+
+
+class SheetsRateLimiter:
+    """
+    Выдает разрешения на запросы к API по одному, в порядке приоритета
+    (при равном — в порядке обращения).
+    """
+
+    def __init__(self, bucket: LocalTokenBucket):
+        self.bucket = bucket
+        self.acquired = 0
+        self.waited = 0.0
+        self.throttled = 0
+        self.retries = 0
+        self._queue: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._condition: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+        return self._condition
+
+    async def acquire(self, priority: Optional[SheetsPriority] = None):
+        if priority is None:
+            priority = _priority.get()
+        ticket = (int(priority), next(self._seq))
+        heapq.heappush(self._queue, ticket)
+        condition = self._get_condition()
+        start = time.monotonic()
+        try:
+            async with condition:
+                await condition.wait_for(lambda: self._queue[0] == ticket)
+            while (wait := await self.bucket.take()) > 0:
+                await asyncio.sleep(wait)
+        finally:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            async with condition:
+                condition.notify_all()
+        self.acquired += 1
+        self.waited += time.monotonic() - start
+
+    async def throttle(self, seconds: float) -> None:
+        """После 429 останавливает запросы всех процессов на seconds."""
+        self.throttled += 1
+        await self.bucket.block(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'sheets_requests': self.acquired,
+            'sheets_wait_s': round(self.waited, 1),
+            'sheets_429': self.throttled,
+            'sheets_retries': self.retries,
+            'sheets_queue': len(self._queue),
+        }
+
+
+class SheetsClientManager(AsyncioGspreadClientManager):
+    """
+    Менеджер gspread_asyncio с общим лимитом и повторами.
+    Вместо глобальной блокировки и паузы gspread_delay между запросами
+    каждый запрос ждет токен лимитера.
+    """
+
+    def __init__(
+            self,
+            credentials_fn,
+            limiter: SheetsRateLimiter,
+            *,
+            max_retries: int = MAX_RETRIES,
+            backoff_base: float = BACKOFF_BASE,
+            **kwargs,
+    ):
+        super().__init__(credentials_fn, **kwargs)
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+    async def _call(self, method, *args, **kwargs):
+        api_call_count = kwargs.pop('api_call_count', 1)
+        attempt = 0
+        while True:
+            for _ in range(api_call_count):
+                await self.limiter.acquire()
+            await self.before_gspread_call(method, args, kwargs)
+            try:
+                return await asyncio.to_thread(method, *args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                code = e.response.status_code
+                if not is_retryable_status(code) or attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base)
+                if code == 429:
+                    await self.limiter.throttle(delay)
+                error = f'HTTP {code}'
+            except requests.RequestException as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base)
+                error = f'{type(e).__name__}: {e}'
+
+            attempt += 1
+            self.limiter.retries += 1
+            sheets_limiter_logger.warning(
+                f'{method.__name__}: {error}, повтор {attempt} '
+                f'через {delay:.1f} с')
+            await asyncio.sleep(delay)
@@ -0,0 +1,134 @@
+"""
+Кэш открытых таблиц Google Sheets и фоновое обновление токена.
+
+open_by_key каждый раз запрашивает метаданные таблицы, хотя для чтения и
+записи значений нужен только ее id. Открытая таблица хранится в процессе
+(бот, обработчик очереди gspread, веб) и переиспользуется всеми вызовами
+до истечения TTL. Токен сервисного аккаунта обновляется заранее в фоне,
+поэтому запросы не ждут его обновления при истечении.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from google.auth.transport.requests import Request
+
+spreadsheet_cache_logger = logging.getLogger('bot.spreadsheet_cache')
+
+SPREADSHEET_TTL = 60 * 60
+CREDENTIALS_REFRESH_MARGIN = 5 * 60
+
+
+class SpreadsheetCache:
+    def __init__(self, ttl: float = SPREADSHEET_TTL):
+        self.ttl = ttl
+        self.fetches = 0
+        self.saved_fetches = 0
+        self._handles: Dict[str, Tuple[float, Any]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def get(self, spreadsheet_id: str) -> Optional[Any]:
+        item = self._handles.get(spreadsheet_id)
+        if item is None:
+            return None
+        loaded_at, handle = item
+        if time.monotonic() - loaded_at > self.ttl:
+            del self._handles[spreadsheet_id]
+            return None
+        return handle
+
+    def put(self, spreadsheet_id: str, handle: Any) -> None:
+        self._handles[spreadsheet_id] = (time.monotonic(), handle)
+
+    async def open(
+            self,
+            spreadsheet_id: str,
+            fetch: Callable[[str], Awaitable[Any]],
+    ) -> Any:
+        """
+        Возвращает таблицу из кэша или открывает ее через fetch.
+        Одновременные вызовы для одной таблицы открывают ее один раз.
+        """
+        handle = self.get(spreadsheet_id)
+        if handle is None:
+            lock = self._locks.setdefault(spreadsheet_id, asyncio.Lock())
+            async with lock:
+                handle = self.get(spreadsheet_id)
+                if handle is None:
+                    handle = await fetch(spreadsheet_id)
+                    self.fetches += 1
+                    self.put(spreadsheet_id, handle)
+                    spreadsheet_cache_logger.info(
+                        f'Таблица {spreadsheet_id} открыта')
+                    return handle
+        self.saved_fetches += 1
+        return handle
+
+    def clear(self) -> None:
+        self._handles.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'spreadsheets': len(self._handles),
+            'fetches': self.fetches,
+            'saved_fetches': self.saved_fetches,
+        }
+
+
+class CredentialsRefresher:
+    """
+    Обновляет токен заранее, за margin секунд до истечения.
+    Все клиенты gspread работают с одним объектом credentials, поэтому
+    обновленный токен сразу используется всеми запросами.
+    """
+
+    def __init__(
+            self,
+            get_credentials: Callable[[], Any],
+            margin: float = CREDENTIALS_REFRESH_MARGIN,
+    ):
+        self.get_credentials = get_credentials
+        self.margin = margin
+        self.refreshes = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def expires_in(self) -> Optional[float]:
+        expiry = self.get_credentials().expiry
+        if expiry is None:
+            return None
+        # google-auth хранит expiry как naive datetime в UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return (expiry - now) / timedelta(seconds=1)
+
+    def needs_refresh(self) -> bool:
+        expires_in = self.expires_in()
+        # Первый токен получает сам первый запрос
+        return expires_in is not None and expires_in < self.margin
+
+    def maybe_refresh(self) -> None:
+        """Запускает фоновое обновление, если токен скоро истечет."""
+        if self._task is not None and not self._task.done():
+            return
+        if not self.needs_refresh():
+            return
+        self._task = asyncio.create_task(self.refresh())
+
+    async def refresh(self) -> None:
+        try:
+            await asyncio.to_thread(self.get_credentials().refresh, Request())
+        except Exception as e:
+            # Запрос gspread обновит токен сам, если он истечет
+            spreadsheet_cache_logger.error(f'Не удалось обновить токен: {e}')
+            return
+        self.refreshes += 1
+        spreadsheet_cache_logger.info('Токен сервисного аккаунта обновлен')
+
+    def stats(self) -> Dict[str, Any]:
+        expires_in = self.expires_in()
+        return {
+            'credentials_refreshes': self.refreshes,
+            'token_expires_in_s': (
+                None if expires_in is None else int(expires_in)),
+        }
@@ -12,7 +12,8 @@ Configuration.configure(settings.yookassa.account_id, settings.yookassa.secret_k
 MOSCOW_TZ = pytz.timezone('Europe/Moscow')
 session_factory = create_sessionmaker_and_engine(
     db_url=str(settings.postgres.db_url),
-    echo=False
+    echo=False,
+    **settings.postgres.engine_options()
 )
 templates = Jinja2Templates(directory='templates')
 templates.env.globals['bot_username'] = URL_BOT.split('/')[-1]
@@ -8,7 +8,11 @@ from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 
-from .config import broker
+from .config import broker, session_factory
+from api.nats_publisher import start_publisher, stop_publisher
+from db.database import dispose_engines
+from db.invalidation import start_invalidation_bus, stop_invalidation_bus
+from db.reference_cache import load_reference_cache
 from .logger import logger
 from .services.booking_service import cleanup_expired_bookings
 from .routes.pages import router as pages_router
@@ -20,6 +24,10 @@ from .routes.auth import router as auth_router
 async def lifespan(app: FastAPI):
     # Подключение к NATS
     await broker.connect()
+    await start_publisher()
+    # Подписка на изменения справочных данных из других процессов
+    start_invalidation_bus(session_factory)
+    await load_reference_cache(session_factory)
     # Запуск фоновой задачи очистки просроченных броней
     cleanup_task = asyncio.create_task(cleanup_expired_bookings())
     yield
@@ -29,8 +37,12 @@ async def lifespan(app: FastAPI):
         await cleanup_task
     except asyncio.CancelledError:
         pass
+    await stop_invalidation_bus()
     # Отключение от NATS
+    await stop_publisher()
     await broker.close()
+    # Закрытие пула соединений с БД
+    await dispose_engines()
 
 app = FastAPI(lifespan=lifespan)
 
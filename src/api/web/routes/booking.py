@@ -10,11 +10,15 @@ from ..deps import get_session
 from ..logger import logger
 from ..services.booking_service import (
     get_ticket_price_for_web,
+    get_ticket_prices_for_web,
     check_promo_restrictions_web,
     compute_discounted_price_web,
 )
 from db.models import ScheduleEvent, Adult, Child, Person, Ticket, PersonTicket, UserTicket
 from db.enum import AgeType, TicketStatus, UserRole
+from db.loaders import ScheduleLoad, UserLoad
+from db.seat_ledger import SeatDelta, apply_seat_delta
+from db.sheet_values import get_sheet_event_values
 from db.db_postgres import (
     get_schedule_event,
     get_base_tickets_by_event_or_all,
@@ -42,13 +46,13 @@ async def _get_booking_form_context(request: Request, s: ScheduleEvent, session:
         dt = dt.replace(tzinfo=timezone.utc)
     dt_moscow = dt.astimezone(MOSCOW_TZ)
     
+    prices = await get_ticket_prices_for_web(session, base_tickets, s, t_e)
     tickets_data = []
     for bt in base_tickets:
-        price = await get_ticket_price_for_web(session, bt, s, t_e)
         tickets_data.append({
             'id': bt.base_ticket_id,
             'name': bt.name,
-            'price': price,
+            'price': prices[bt.base_ticket_id],
             'quality_of_children': bt.quality_of_children,
             'quality_of_adult': bt.quality_of_adult,
             'quality_of_add_adult': bt.quality_of_add_adult,
@@ -88,7 +92,7 @@ async def _get_booking_form_context(request: Request, s: ScheduleEvent, session:
 
 @router.get('/booking/{schedule_id}')
 async def show_booking_form(request: Request, schedule_id: int, session: AsyncSession = Depends(get_session)):
-    s = await get_schedule_event(session, schedule_id)
+    s = await get_schedule_event(session, schedule_id, ScheduleLoad.WITH_PRICING)
     if s is None:
         raise HTTPException(status_code=404, detail="Сеанс не найден")
     
@@ -119,7 +123,7 @@ async def post_booking_form(
     if len(phone) > 10:
         phone = phone[-10:]
 
-    s = await get_schedule_event(session, schedule_id)
+    s = await get_schedule_event(session, schedule_id, ScheduleLoad.WITH_PRICING)
     if s is None:
         logger.warning(f"Schedule event {schedule_id} not found")
         raise HTTPException(status_code=404, detail="Сеанс не найден")
@@ -218,13 +222,35 @@ async def post_booking_form(
     if user_session:
         found_chat_id = user_session.get('id', 0)
     else:
-        found_user = await get_user_by_phone(session, phone)
+        found_user = await get_user_by_phone(session, phone, UserLoad.WITH_STATUS)
         if found_user:
             if found_user.status and found_user.status.role == UserRole.ADMIN:
                 found_chat_id = 0
             else:
                 found_chat_id = found_user.user_id
 
+    # Места резервируются атомарно до создания билета: параллельные брони
+    # с сайта и из бота не уведут счетчики в минус
+    seat_counts = await apply_seat_delta(
+        session, s.id, SeatDelta.reserve(ticket_type_obj), commit=False)
+    if seat_counts is None:
+        logger.warning(f"Seats for schedule {schedule_id} were taken concurrently. Ticket type: {ticket_type}")
+        context = await _get_booking_form_context(request, s, session)
+        context.update({
+            'error_message': 'Извините, свободные места на этот сеанс закончились.',
+            'form_data': {
+                'ticket_type': ticket_type,
+                'adult_name': adult_name,
+                'phone': phone,
+                'email': email,
+                'child_name': child_name,
+                'child_age': child_age,
+                'promo_code': promo_code,
+                'applied_promo_id': applied_promo_id,
+            }
+        })
+        return templates.TemplateResponse(request=request, name='booking_form.html', context=context, status_code=400)
+
     person_adult = Person(name=adult_name, age_type=AgeType.adult, user_id=found_chat_id if found_chat_id else None)
     session.add(person_adult)
     await session.flush()
@@ -263,20 +289,11 @@ async def post_booking_form(
     if found_chat_id:
         session.add(UserTicket(user_id=found_chat_id, ticket_id=ticket.id))
 
-    q_child = ticket_type_obj.quality_of_children
-    q_adult = ticket_type_obj.quality_of_adult
-    q_add_adult = ticket_type_obj.quality_of_add_adult
-
-    s.qty_child_free_seat -= q_child
-    s.qty_child_nonconfirm_seat += q_child
-    s.qty_adult_free_seat -= (q_adult + q_add_adult)
-    s.qty_adult_nonconfirm_seat += (q_adult + q_add_adult)
-
     await session.commit()
     
     try:
-        numbers = [s.qty_child_free_seat, s.qty_child_nonconfirm_seat, s.qty_adult_free_seat, s.qty_adult_nonconfirm_seat]
-        await publish_write_data_reserve(settings.sheets.sheet_id_domik, s.id, numbers)
+        if not settings.sheets.seat_mirror:
+            await publish_write_data_reserve(settings.sheets.sheet_id_domik, s.id, list(seat_counts))
         
         reserve_user_data_gs = {
             'chose_price': final_price,
@@ -288,12 +305,16 @@ async def post_booking_form(
             'ticket_ids': [ticket.id],
             'choose_schedule_event_ids': [s.id],
         }
+        event_values = None
+        if settings.sheets.computed_event_fields:
+            event_values = await get_sheet_event_values(session, [s.id])
         await publish_write_client_reserve(
             settings.sheets.sheet_id_domik,
             reserve_user_data_gs,
             found_chat_id,
             ticket_type_obj.to_dto(),
-            str(TicketStatus.CREATED.value)
+            str(TicketStatus.CREATED.value),
+            event_values
         )
     except Exception as gs_err:
         logger.error(f"Failed to publish gspread tasks: {gs_err}")
@@ -5,6 +5,7 @@ from ..config import MOSCOW_TZ, templates
 from ..deps import get_session
 from ..logger import logger
 from db.db_postgres import get_all_theater_events_actual, get_theater_event, get_afishas
+from db.loaders import TheaterLoad
 from settings.settings import (
     DICT_CONVERT_WEEKDAY_NUMBER_TO_STR,
     PUBLIC_TYPE_EVENT_IDS,
@@ -28,7 +29,7 @@ async def show_index(
     if type_id is not None and type_id not in PUBLIC_TYPE_EVENT_IDS:
         type_id = None
 
-    events_db = await get_all_theater_events_actual(session)
+    events_db = await get_all_theater_events_actual(session, TheaterLoad.WITH_SCHEDULE)
     events = []
     now = datetime.now(timezone.utc)
 
@@ -170,7 +171,7 @@ async def show_index(
 @router.get('/event/{event_id}')
 async def show_event_details(request: Request, event_id: int, session: AsyncSession = Depends(get_session)):
     logger.info(f"Showing details for event {event_id}")
-    e = await get_theater_event(session, event_id)
+    e = await get_theater_event(session, event_id, TheaterLoad.WITH_SCHEDULE)
     if e is None:
         logger.warning(f"Event {event_id} not found")
         raise HTTPException(status_code=404, detail="Event not found")
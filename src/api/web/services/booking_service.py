@@ -1,17 +1,21 @@
 import asyncio
 from datetime import datetime, timezone
+from typing import Sequence
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..config import session_factory, MOSCOW_TZ, settings
 from ..logger import logger
 from db.models import BaseTicket, ScheduleEvent, TheaterEvent, Promotion
-from db.enum import PriceType, PromotionDiscountType, TicketStatus
+from db.enum import PromotionDiscountType, TicketStatus
 from db.db_postgres import (
     get_expired_tickets,
-    get_base_ticket,
     get_schedule_event,
-    get_special_ticket_price,
 )
-from api.gspread_pub import publish_write_data_reserve
+from db.outbox import add_outbox_message
+from db.reference_cache import reference_cache
+from db.seat_ledger import SeatDelta, apply_seat_delta
+from db.ticket_prices import (
+    get_price_option, get_type_ticket_price, resolve_ticket_prices)
+from api.gspread_pub import write_data_reserve_message
 
 async def cleanup_expired_bookings():
     """
@@ -29,33 +33,33 @@ async def cleanup_expired_bookings():
                 logger.info(f"Found {len(expired_tickets)} expired tickets. Starting cleanup.")
                 for ticket in expired_tickets:
                     try:
-                        bt = await get_base_ticket(session, ticket.base_ticket_id)
-                        s = await get_schedule_event(session, ticket.schedule_event_id)
-                        
-                        if bt and s:
-                            q_child = bt.quality_of_children
-                            q_adult = bt.quality_of_adult
-                            q_add_adult = bt.quality_of_add_adult
-                            
-                            s.qty_child_free_seat += q_child
-                            s.qty_child_nonconfirm_seat -= q_child
-                            s.qty_adult_free_seat += (q_adult + q_add_adult)
-                            s.qty_adult_nonconfirm_seat -= (q_adult + q_add_adult)
-                            
-                            logger.info(f"Returning seats for ticket {ticket.id} on schedule {s.id}")
-                            
-                            numbers = [
-                                s.qty_child_free_seat,
-                                s.qty_child_nonconfirm_seat,
-                                s.qty_adult_free_seat,
-                                s.qty_adult_nonconfirm_seat
-                            ]
-                            await publish_write_data_reserve(settings.sheets.sheet_id_domik, s.id, numbers)
-                        
+                        bt = await reference_cache.get_base_ticket(
+                            session, ticket.base_ticket_id)
+                        counts = None
+                        if bt and ticket.schedule_event_id:
+                            counts = await apply_seat_delta(
+                                session,
+                                ticket.schedule_event_id,
+                                SeatDelta.release_reserve(bt),
+                                commit=False,
+                            )
+                            if counts is None:
+                                logger.warning(
+                                    f"Seats for ticket {ticket.id} were not returned: "
+                                    f"schedule {ticket.schedule_event_id} has fewer nonconfirmed seats")
+                            else:
+                                logger.info(f"Returning seats for ticket {ticket.id} on schedule {ticket.schedule_event_id}")
+
+                        if counts is not None and not settings.sheets.seat_mirror:
+                            add_outbox_message(session, write_data_reserve_message(
+                                settings.sheets.sheet_id_domik, ticket.schedule_event_id, list(counts)))
+
+                        # Возврат мест, отмена билета и запись мест в таблицу
+                        # (через outbox) фиксируются одной транзакцией
                         ticket.status = TicketStatus.CANCELED
                         await session.commit()
                         logger.info(f"Ticket {ticket.id} marked as CANCELED")
-                        
+
                     except Exception as ticket_err:
                         logger.error(f"Error cleaning up ticket {ticket.id}: {ticket_err}")
                         await session.rollback()
@@ -65,53 +69,37 @@ async def cleanup_expired_bookings():
         except Exception as e:
             logger.exception(f"Error in cleanup_expired_bookings loop: {e}")
 
-async def get_ticket_price_for_web(
+async def get_ticket_prices_for_web(
     session: AsyncSession,
-    ticket: BaseTicket,
+    tickets: Sequence[BaseTicket],
     schedule_event: ScheduleEvent,
     theater_event: TheaterEvent
-):
-    option = ''
-    if schedule_event.flag_gift:
-        option = 'Подарок'
-    if schedule_event.flag_christmas_tree:
-        option = 'Ёлка'
-
-    if not option:
-        price_type = theater_event.price_type
-        if price_type == PriceType.INDIVIDUAL:
-            option = str(theater_event.id)
-        else:
-            option = price_type.value
-
+) -> dict[int, int]:
     dt = schedule_event.datetime_event
     if dt.tzinfo is None:
         dt = dt.replace(tzinfo=timezone.utc)
     dt_moscow = dt.astimezone(MOSCOW_TZ)
-    type_ticket_price = schedule_event.ticket_price_type.value
-    if not type_ticket_price:
-        date_for_price = dt_moscow.date()
-        if date_for_price.weekday() in range(5):
-            type_ticket_price = 'будни'
-        else:
-            type_ticket_price = 'выходные'
-
-    date_for_price = dt_moscow.date()
-    price, _ = ticket.get_price_from_date(date_for_price)
-
-    if theater_event.flag_indiv_cost:
-        special_price = await get_special_ticket_price(
-            session,
-            option=option,
-            base_ticket_id=ticket.base_ticket_id,
-            type_ticket_price=type_ticket_price
-        )
-        if special_price is not None:
-            price = special_price
-        else:
-            logger.error(f"Special price not found for ticket {ticket.base_ticket_id}, option {option}, type {type_ticket_price}")
-
-    return int(price)
+
+    ticket_prices = await resolve_ticket_prices(
+        session, schedule_event, theater_event, tickets, dt_moscow)
+    prices = {}
+    for base_ticket_id, ticket_price in ticket_prices.items():
+        if ticket_price.special_missing:
+            logger.error(f"Special price not found for ticket {base_ticket_id}, "
+                         f"option {get_price_option(schedule_event, theater_event)}, "
+                         f"type {get_type_ticket_price(schedule_event, dt_moscow)}")
+        prices[base_ticket_id] = int(ticket_price.price)
+    return prices
+
+async def get_ticket_price_for_web(
+    session: AsyncSession,
+    ticket: BaseTicket,
+    schedule_event: ScheduleEvent,
+    theater_event: TheaterEvent
+):
+    prices = await get_ticket_prices_for_web(
+        session, [ticket], schedule_event, theater_event)
+    return prices[ticket.base_ticket_id]
 
 async def check_promo_restrictions_web(
         promo: Promotion,
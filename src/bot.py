@@ -9,11 +9,18 @@ from faststream import FastStream
 from yookassa.domain.notification import WebhookNotificationFactory
 
 from api.broker_nats import connect_to_nats
+from api.nats_publisher import start_publisher, stop_publisher
+from db import dispose_engines
+from db.outbox import start_outbox_relay, stop_outbox_relay
+from db.invalidation import start_invalidation_bus, stop_invalidation_bus
+from db.reference_cache import load_reference_cache
+from db.seat_mirror import start_seat_mirror, stop_seat_mirror
 from db.pickle_persistence import pickle_persistence
 from db.jobpersistence import PTBSQLAlchemyJobStore
 from handlers.set_handlers import set_handlers
 from log.logging_conf import setup_logs
 from settings.config_loader import parse_settings
+from utilities.utl_db import get_sessionmaker
 from utilities.utl_post_init import post_init
 
 bot_logger = setup_logs()
@@ -48,6 +55,14 @@ broker = connect_to_nats(application, webhook_notification_factory)
 @asynccontextmanager
 async def lifespan():
     set_handlers(application, config)
+    await start_publisher()
+    start_outbox_relay(get_sessionmaker(config))
+    start_invalidation_bus(get_sessionmaker(config))
+    await load_reference_cache(get_sessionmaker(config))
+    if config.sheets.seat_mirror:
+        start_seat_mirror(get_sessionmaker(config),
+                          config.sheets.sheet_id_domik,
+                          config.sheets.seat_mirror_interval)
     await application.initialize()
     await post_init(application, config)
     bot_logger.info('=====Setup Бота произведен, переходим к запуску =====')
@@ -60,6 +75,11 @@ async def lifespan():
     await application.stop()
     bot_logger.info('Бот остановлен')
     await application.shutdown()
+    await stop_seat_mirror()
+    await stop_invalidation_bus()
+    await stop_outbox_relay()
+    await stop_publisher()
+    await dispose_engines()
 
 
 fast_stream = FastStream(broker, lifespan=lifespan)
@@ -7,7 +7,7 @@ from handlers import support_hl, promotion_hl, schedule_hl
 from handlers.sub_hl import (
     update_base_ticket_data, update_theater_event_data,
     update_special_ticket_price, update_schedule_event_data,
-    update_custom_made_format_data, update_promotion_data
+    update_custom_made_format_data, update_promotion_data, update_all_data
 )
 from conv_hl import (
     F_text_and_no_command, cancel_callback_handler, back_callback_handler,
@@ -32,6 +32,7 @@ states = {
         CallbackQueryHandler(update_special_ticket_price, COMMAND_DICT['UP_SPEC_PRICE'][0]),
         CallbackQueryHandler(update_custom_made_format_data, COMMAND_DICT['UP_CMF_DATA'][0]),
         CallbackQueryHandler(update_promotion_data, COMMAND_DICT['UP_PROM_DATA'][0]),
+        CallbackQueryHandler(update_all_data, '^update_all_data$'),
         CallbackQueryHandler(promotion_hl.ask_promotion_summary, '^skip_to_confirm$'),
         # CallbackQueryHandler(update_ticket_data, COMMAND_DICT['UP_TICKET_DATA'][0]),
     ],
@@ -1,7 +1,9 @@
 from .base import BaseModel, BaseModelTimed
-from .database import create_sessionmaker_and_engine
+from .database import (create_sessionmaker_and_engine, dispose_engines,
+                       get_pool_stats)
 from .models import (User, Person, Child, Ticket, TypeEvent, TheaterEvent,
                      ScheduleEvent, Adult, BaseTicket, Promotion,
                      SalesCampaign, SalesCampaignSchedule, SalesRecipient,
                      TelegramUpdate, BotSettings, UserStatus, FeedbackTopic,
-                     FeedbackMessage, SpecialTicketPrice)
+                     FeedbackMessage, SpecialTicketPrice, OutboxMessage,
+                     ScheduleEventOccupancy)
@@ -0,0 +1,136 @@
+"""
+Пакетная запись строк из Google Sheets в Postgres.
+
+Вместо session.merge на каждую строку (SELECT + UPDATE) весь список
+отправляется в INSERT ... ON CONFLICT DO UPDATE. Обновление применяется
+только к строкам, содержимое которых действительно изменилось
+(IS DISTINCT FROM), поэтому неизмененные строки не блокируются и не
+получают новый updated_at.
+"""
+import logging
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Type
+
+from sqlalchemy import func, or_, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.base import BaseModel
+
+bulk_upsert_logger = logging.getLogger('bot.db.bulk_upsert')
+
+# У Postgres ограничение 65535 параметров на запрос
+MAX_PARAMS_PER_STATEMENT = 30000
+
+
+class UpsertResult(NamedTuple):
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+    def __add__(self, other: 'UpsertResult') -> 'UpsertResult':
+        return UpsertResult(*(a + b for a, b in zip(self, other)))
+
+    @property
+    def changed(self) -> int:
+        return self.inserted + self.updated
+
+    def summary(self) -> str:
+        return (f'добавлено: {self.inserted}, '
+                f'изменено: {self.updated}, '
+                f'без изменений: {self.unchanged}')
+
+
+def dialect_insert(session: AsyncSession, model):
+    """insert() диалекта сессии: с on_conflict_do_* для Postgres и SQLite."""
+    if session.get_bind().dialect.name == 'sqlite':
+        return sqlite.insert(model)
+    return postgresql.insert(model)
+
+
+def _chunks(rows: Sequence[dict], size: int) -> Iterable[Sequence[dict]]:
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+async def bulk_upsert(
+        session: AsyncSession,
+        model: Type[BaseModel],
+        rows: Sequence[dict],
+        *,
+        update_columns: Optional[List[str]] = None,
+) -> UpsertResult:
+    """
+    Вставляет или обновляет строки model по первичному ключу.
+    Объекты этих строк, уже загруженные в сессию, обновляются
+    (populate_existing). Коммит выполняет вызывающий код.
+    """
+    if not rows:
+        return UpsertResult()
+
+    table = model.__table__
+    pk_columns = list(table.primary_key.columns)
+    pk_names = [column.key for column in pk_columns]
+
+    # Повторяющиеся ключи в одном INSERT ... ON CONFLICT недопустимы,
+    # как и при merge побеждает последняя строка
+    unique_rows = {}
+    for row in rows:
+        unique_rows[tuple(row[name] for name in pk_names)] = row
+    rows = list(unique_rows.values())
+
+    columns = list(rows[0].keys())
+    if update_columns is None:
+        update_columns = [name for name in columns if name not in pk_names]
+    chunk_size = max(1, MAX_PARAMS_PER_STATEMENT // len(columns))
+
+    if len(pk_columns) == 1:
+        pk_expr = pk_columns[0]
+    else:
+        pk_expr = tuple_(*pk_columns)
+
+    result = UpsertResult()
+    for chunk in _chunks(rows, chunk_size):
+        keys = [tuple(row[name] for name in pk_names) for row in chunk]
+        if len(pk_columns) == 1:
+            key_values = [key[0] for key in keys]
+        else:
+            key_values = keys
+        existing = await session.execute(
+            select(*pk_columns).where(pk_expr.in_(key_values)))
+        existing_keys = {tuple(row) for row in existing}
+
+        stmt = dialect_insert(session, model).values(list(chunk))
+        excluded = stmt.excluded
+        set_ = {name: excluded[name] for name in update_columns}
+        if 'updated_at' in table.c and 'updated_at' not in columns:
+            set_['updated_at'] = func.now()
+        if update_columns:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=pk_columns,
+                set_=set_,
+                where=or_(*(
+                    table.c[name].is_distinct_from(excluded[name])
+                    for name in update_columns
+                )),
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=pk_columns)
+
+        changed = await session.scalars(
+            stmt.returning(model),
+            execution_options={'populate_existing': True},
+        )
+        changed_keys = {
+            tuple(getattr(obj, name) for name in pk_names)
+            for obj in changed
+        }
+        inserted = len(changed_keys - existing_keys)
+        result += UpsertResult(
+            inserted=inserted,
+            updated=len(changed_keys) - inserted,
+            unchanged=len(chunk) - len(changed_keys),
+        )
+
+    bulk_upsert_logger.info(
+        f'{table.name}: {result.summary()}')
+    return result
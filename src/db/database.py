@@ -1,13 +1,103 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-
-
-def create_sessionmaker_and_engine(db_url, echo=False):
-    async_engine = create_async_engine(
-        url=db_url,
-        echo=echo,
-        connect_args={"options": "-c timezone=utc"},
-    )
-    return async_sessionmaker(
-        async_engine,
-        expire_on_commit=False
-    )
+import logging
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine, create_async_engine, async_sessionmaker)
+
+database_logger = logging.getLogger('bot.db.database')
+
+DEFAULT_ENGINE_OPTIONS = {
+    'pool_size': 10,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True,
+}
+
+# Реестр движков процесса: один AsyncEngine (и один пул соединений) на DSN
+_engines: Dict[str, AsyncEngine] = {}
+_sessionmakers: Dict[str, async_sessionmaker] = {}
+_pool_counters: Dict[str, Dict[str, int]] = {}
+
+
+def _register_pool_counters(db_url: str, async_engine: AsyncEngine):
+    counters = _pool_counters.setdefault(db_url, {
+        'connects': 0,
+        'checkouts': 0,
+        'checkins': 0,
+        'invalidations': 0,
+    })
+
+    def _on(name):
+        def listener(*_):
+            counters[name] += 1
+        return listener
+
+    pool = async_engine.sync_engine.pool
+    event.listen(pool, 'connect', _on('connects'))
+    event.listen(pool, 'checkout', _on('checkouts'))
+    event.listen(pool, 'checkin', _on('checkins'))
+    event.listen(pool, 'invalidate', _on('invalidations'))
+
+
+def get_engine(db_url: str, echo=False, **engine_options) -> AsyncEngine:
+    """
+    Возвращает общий для процесса AsyncEngine для db_url.
+    Параметры пула учитываются только при первом создании движка.
+    """
+    db_url = str(db_url)
+    async_engine = _engines.get(db_url)
+    if async_engine is None:
+        options = {**DEFAULT_ENGINE_OPTIONS, **engine_options}
+        async_engine = create_async_engine(
+            url=db_url,
+            echo=echo,
+            connect_args={"options": "-c timezone=utc"},
+            **options,
+        )
+        _register_pool_counters(db_url, async_engine)
+        _engines[db_url] = async_engine
+        database_logger.info(
+            f'Создан движок БД {async_engine.url!r} с пулом {options}')
+    return async_engine
+
+
+def create_sessionmaker_and_engine(db_url, echo=False, **engine_options):
+    db_url = str(db_url)
+    sessionmaker = _sessionmakers.get(db_url)
+    if sessionmaker is None:
+        sessionmaker = async_sessionmaker(
+            get_engine(db_url, echo=echo, **engine_options),
+            expire_on_commit=False
+        )
+        _sessionmakers[db_url] = sessionmaker
+    return sessionmaker
+
+
+def get_pool_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Счетчики использования пулов по каждому движку процесса.
+    Ключ — DSN без пароля.
+    """
+    stats = {}
+    for db_url, async_engine in _engines.items():
+        pool = async_engine.sync_engine.pool
+        stats[async_engine.url.render_as_string(hide_password=True)] = {
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            **_pool_counters.get(db_url, {}),
+        }
+    return stats
+
+
+async def dispose_engines():
+    """Закрывает все пулы соединений процесса (вызывается при остановке)."""
+    while _engines:
+        db_url, async_engine = _engines.popitem()
+        _sessionmakers.pop(db_url, None)
+        _pool_counters.pop(db_url, None)
+        await async_engine.dispose()
+        database_logger.info(f'Движок БД {async_engine.url!r} закрыт')
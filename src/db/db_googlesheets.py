@@ -1,19 +1,24 @@
+import asyncio
 import logging
 import datetime
+from dataclasses import dataclass, field
 
 from typing import List, Tuple, Dict, Type, Any, Optional, Callable, TypeVar
 
-from pydantic import ValidationError
 from telegram.ext import ContextTypes
 
-from api.googlesheets import load_from_gspread, write_data_reserve
-from api.gspread_pub import publish_write_data_reserve
+from api.googlesheets import load_from_gspread, load_many_from_gspread
+from api.gspread_pub import write_data_reserve_message
 from db import db_postgres
+from db.outbox import add_outbox_message, outbox_relay
+from db.seat_ledger import SeatDelta, apply_seat_delta
+from db.sheet_mapper import RowMapper
 from settings import parse_settings
 from utilities.schemas import (
     CustomMadeFormatDTO, ScheduleEventDTO, TheaterEventDTO, BaseTicketDTO
 )
 from utilities.schemas.promotion import PromotionDTO
+from utilities.utl_date import convert_sheets_datetime
 
 db_googlesheets_logger = logging.getLogger('bot.db.googlesheets')
 config = parse_settings()
@@ -21,87 +26,24 @@ sheet_id_domik = config.sheets.sheet_id_domik
 sheet_id_cme = config.sheets.sheet_id_cme
 
 T = TypeVar('T')
-
-
-def _map_row_to_dict(
-        row: list,
-        column_map: dict,
-        field_names: list
-) -> dict:
-    row_dict = {}
-    for field in field_names:
-        try:
-            row_dict[field] = row[column_map[field]]
-        except KeyError as exc:
-            if exc.args and exc.args[0] != "date_show_tmp":
-                db_googlesheets_logger.error(
-                    "Missing column mapping for field")
-                db_googlesheets_logger.error("row=%s", row)
-                db_googlesheets_logger.error("error=%s", exc)
-        except IndexError as exc:
-            db_googlesheets_logger.error("Row is shorter than expected")
-            db_googlesheets_logger.error("row=%s", row)
-            db_googlesheets_logger.error("error=%s", exc)
-    return row_dict
-
-
-def _process_row(
-        dto_cls: Type[Any],
-        row_dict: dict,
-        *,
-        only_active: bool = False,
-        active_attr: str = None,
-        only_actual: bool = False,
-        date_getter: Optional[Callable[[Any], datetime.date]] = None,
-) -> Any | None:
-    """
-    Универсальная обработка строки, создаёт DTO класса dto_cls из row_dict,
-    логирует ValidationError и выполняет общие фильтры.
-
-    Параметры:
-      - dto_cls: класс Pydantic DTO (например, BaseTicketDTO или ScheduleEventDTO)
-      - row_dict: словарь с полями для DTO
-      - only_active: если True — применяется фильтр по активности (если active_attr указан)
-      - active_attr: имя атрибута в DTO, указывающего активность (например, 'flag_active' или 'flag_turn_on_off')
-      - only_actual: если True — применяется фильтр по дате (только для DTO, у которых есть date_getter)
-      - date_getter: callable(dto) -> date, функция/метод для получения даты события (возвращает datetime.date или datetime.datetime)
-
-    Возвращает экземпляр dto_cls или None (если валидация не прошла или запись отфильтрована).
-    """
-    try:
-        obj = dto_cls(**row_dict)
-    except ValidationError as exc:
-        err_type = repr(exc.errors()[0]["type"])
-        db_googlesheets_logger.error("Validation error: %s", err_type)
-        db_googlesheets_logger.error("Invalid row dict: %s", row_dict)
-        return None
-
-    # Фильтрация по активности (если задано имя атрибута)
-    if only_active and active_attr:
-        if not getattr(obj, active_attr, False):
-            return None
-
-    # Фильтрация по дате (если требуется и передан date_getter)
-    if only_actual and date_getter:
-        event_date = date_getter(obj)
-        # если возврат — datetime, привести к date
-        if hasattr(event_date, "date"):
-            event_date = event_date.date()
-        if event_date < datetime.date.today():
-            return None
-
-    return obj
-
-
-async def _publish_write_data_reserve(
-        event_id, numbers: List[int], option: int = 1):
-    try:
-        await publish_write_data_reserve(
-            sheet_id_domik, event_id, numbers, option)
-    except Exception as e:
-        db_googlesheets_logger.exception(
-            f"Failed to publish gspread task, fallback to direct call: {e}")
-        await write_data_reserve(sheet_id_domik, event_id, numbers, option)
+SheetData = Tuple[List[List[Any]], Dict[int | str, int]]
+
+# Листы справочников, которые загружаются при полном обновлении:
+# {sheet_id: {value_render_option: [name_sh, ...]}}
+REFERENCE_SHEETS = {
+    sheet_id_domik: {
+        'FORMATTED_VALUE': ['Варианты стоимости_'],
+        'UNFORMATTED_VALUE': [
+            'Список спектаклей_',
+            'База спектаклей_',
+            'Промокоды_',
+            'Индив стоимости_',
+        ],
+    },
+    sheet_id_cme: {
+        'UNFORMATTED_VALUE': ['База ФЗМ_'],
+    },
+}
 
 
 async def load_entities_from_sheet(
@@ -113,39 +55,39 @@ async def load_entities_from_sheet(
         only_active: bool = False,
         active_attr: Optional[str] = None,
         only_actual: bool = False,
-        date_getter: Optional[Callable[[Any], datetime.date]] = None,
+        date_field: Optional[str] = None,
+        parse_date: Optional[Callable[[Any], datetime.date]] = None,
+        sheet_data: Optional[SheetData] = None,
 ) -> List[T]:
     """
     Универсальный загрузчик записей из Google Sheets.
-    Параметризуется DTO-классом, именем листа и общими фильтрами.
+    Параметризуется DTO-классом, именем листа и общими фильтрами:
+      - only_active: только строки с включенным флагом active_attr
+      - only_actual: только строки, у которых дата в колонке date_field
+        (parse_date переводит ячейку в дату) не раньше сегодняшней
+    Если передан sheet_data (уже загруженный лист), запроса к API нет.
     """
-    data, dict_column_name = await load_from_gspread(
-        sheet_id,
-        name_sh,
-        value_render_option=value_render_option
-    )
-
-    field_names = list(dto_cls.model_fields.keys())
-    result: List[T] = []
-
-    for row in data[1:]:
-        row_dict = _map_row_to_dict(row, dict_column_name, field_names)
-        entity = _process_row(
-            dto_cls,
-            row_dict,
-            only_active=only_active,
-            active_attr=active_attr,
-            only_actual=only_actual,
-            date_getter=date_getter
+    if sheet_data is None:
+        sheet_data = await load_from_gspread(
+            sheet_id,
+            name_sh,
+            value_render_option=value_render_option
         )
-        if entity is None:
-            continue
-        result.append(entity)
-
-    return result
+    data, dict_column_name = sheet_data
+
+    mapper = RowMapper(dto_cls, dict_column_name, name_sh)
+    return mapper.load(
+        data[1:],
+        active_attr=active_attr if only_active else None,
+        date_field=date_field if only_actual else None,
+        parse_date=parse_date,
+    )
 
 
-async def load_base_tickets(only_active=True) -> List[BaseTicketDTO]:
+async def load_base_tickets(
+        only_active=True,
+        sheet_data: Optional[SheetData] = None,
+) -> List[BaseTicketDTO]:
     name_sh = 'Варианты стоимости_'
     tickets = await load_entities_from_sheet(
         BaseTicketDTO,
@@ -154,6 +96,7 @@ async def load_base_tickets(only_active=True) -> List[BaseTicketDTO]:
         value_render_option='FORMATTED_VALUE',
         only_active=only_active,
         active_attr='flag_active',
+        sheet_data=sheet_data,
     )
     db_googlesheets_logger.info('Список билетов загружен')
     return tickets
@@ -161,7 +104,8 @@ async def load_base_tickets(only_active=True) -> List[BaseTicketDTO]:
 
 async def load_schedule_events(
         only_active: bool = True,
-        only_actual: bool = True
+        only_actual: bool = True,
+        sheet_data: Optional[SheetData] = None,
 ) -> List[ScheduleEventDTO]:
     """
     Загружает события из Google Sheets и возвращает список ScheduleEventDTO.
@@ -178,31 +122,39 @@ async def load_schedule_events(
         only_active=only_active,
         active_attr='flag_turn_on_off',
         only_actual=only_actual,
-        date_getter=lambda e: e.get_date_event(),
+        date_field='date_show',
+        parse_date=convert_sheets_datetime,
+        sheet_data=sheet_data,
     )
     db_googlesheets_logger.info("Список мероприятий загружен")
     return events
 
 
-async def load_theater_events() -> List[TheaterEventDTO]:
+async def load_theater_events(
+        sheet_data: Optional[SheetData] = None,
+) -> List[TheaterEventDTO]:
     name_sh = 'Список спектаклей_'
     events = await load_entities_from_sheet(
         TheaterEventDTO,
         sheet_id=sheet_id_domik,
         name_sh=name_sh,
         value_render_option='UNFORMATTED_VALUE',
+        sheet_data=sheet_data,
     )
     db_googlesheets_logger.info('Список репертуара загружен')
     return events
 
 
-async def load_custom_made_format() -> List[CustomMadeFormatDTO]:
+async def load_custom_made_format(
+        sheet_data: Optional[SheetData] = None,
+) -> List[CustomMadeFormatDTO]:
     name_sh = 'База ФЗМ_'
     cmfs = await load_entities_from_sheet(
         CustomMadeFormatDTO,
         sheet_id=sheet_id_cme,
         name_sh=name_sh,
         value_render_option='UNFORMATTED_VALUE',
+        sheet_data=sheet_data,
     )
     db_googlesheets_logger.info('Список репертуара загружен')
     return cmfs
@@ -244,17 +196,21 @@ def _parse_datetime(val) -> datetime.datetime | None:
                 return None
 
 
-async def load_promotions() -> List[PromotionDTO]:
+async def load_promotions(
+        sheet_data: Optional[SheetData] = None,
+) -> List[PromotionDTO]:
     name_sh = 'Промокоды_'
-    try:
-        data, dict_column_name = await load_from_gspread(
-            sheet_id_domik,
-            name_sh,
-            value_render_option='UNFORMATTED_VALUE'
-        )
-    except Exception as e:
-        db_googlesheets_logger.exception(f"Не удалось загрузить лист '{name_sh}': {e}")
-        return []
+    if sheet_data is None:
+        try:
+            sheet_data = await load_from_gspread(
+                sheet_id_domik,
+                name_sh,
+                value_render_option='UNFORMATTED_VALUE'
+            )
+        except Exception as e:
+            db_googlesheets_logger.exception(f"Не удалось загрузить лист '{name_sh}': {e}")
+            return []
+    data, dict_column_name = sheet_data
 
     # Expected columns (fallback to optional names)
     col_code = dict_column_name.get('Код') or dict_column_name.get('code')
@@ -301,12 +257,16 @@ async def load_promotions() -> List[PromotionDTO]:
     return promotions
 
 
-async def load_special_ticket_price() -> Dict:
+async def load_special_ticket_price(
+        sheet_data: Optional[SheetData] = None,
+) -> Dict:
     name_sh = 'Индив стоимости_'
-    data, dict_column_name = await load_from_gspread(
-        sheet_id_domik,
-        name_sh,
-        value_render_option='UNFORMATTED_VALUE')
+    if sheet_data is None:
+        sheet_data = await load_from_gspread(
+            sheet_id_domik,
+            name_sh,
+            value_render_option='UNFORMATTED_VALUE')
+    data, dict_column_name = sheet_data
 
     special_ticket_price = {}
     for item in data[1:]:
@@ -323,6 +283,58 @@ async def load_special_ticket_price() -> Dict:
     return special_ticket_price
 
 
+@dataclass
+class ReferenceData:
+    base_tickets: List[BaseTicketDTO] = field(default_factory=list)
+    theater_events: List[TheaterEventDTO] = field(default_factory=list)
+    schedule_events: List[ScheduleEventDTO] = field(default_factory=list)
+    custom_made_formats: List[CustomMadeFormatDTO] = field(
+        default_factory=list)
+    promotions: List[PromotionDTO] = field(default_factory=list)
+    special_ticket_price: Dict = field(default_factory=dict)
+
+
+async def load_reference_sheets(
+        sheets: Optional[Dict[str, Dict[str, List[str]]]] = None,
+) -> Dict[str, SheetData]:
+    """
+    Загружает все листы справочников: по одному запросу values:batchGet на
+    таблицу и формат значений, запросы выполняются параллельно.
+    """
+    if sheets is None:
+        sheets = REFERENCE_SHEETS
+    requests = [
+        load_many_from_gspread(sheet_id, names_sh, value_render_option)
+        for sheet_id, options in sheets.items()
+        for value_render_option, names_sh in options.items()
+    ]
+    loaded: Dict[str, SheetData] = {}
+    for result in await asyncio.gather(*requests):
+        loaded.update(result)
+    return loaded
+
+
+async def load_reference_data() -> ReferenceData:
+    """
+    Загружает и разбирает все справочники для полного обновления.
+    Фильтры такие же, как у отдельных команд обновления.
+    """
+    sheets = await load_reference_sheets()
+    return ReferenceData(
+        base_tickets=await load_base_tickets(
+            False, sheet_data=sheets['Варианты стоимости_']),
+        theater_events=await load_theater_events(
+            sheet_data=sheets['Список спектаклей_']),
+        schedule_events=await load_schedule_events(
+            False, True, sheet_data=sheets['База спектаклей_']),
+        custom_made_formats=await load_custom_made_format(
+            sheet_data=sheets['База ФЗМ_']),
+        promotions=await load_promotions(sheet_data=sheets['Промокоды_']),
+        special_ticket_price=await load_special_ticket_price(
+            sheet_data=sheets['Индив стоимости_']),
+    )
+
+
 async def load_clients_wait_data(
         event_ids: List[int]
 ) -> Tuple[List[List[str]], Dict[int | str, int]]:
@@ -339,116 +351,78 @@ async def load_clients_wait_data(
     return data_clients_data, dict_column_name
 
 
-async def increase_free_and_decrease_nonconfirm_seat(
+async def _apply_seat_delta(
         context: 'ContextTypes.DEFAULT_TYPE',
         event_id,
-        chose_base_ticket_id,
+        delta: SeatDelta,
+        option: int,
+        error_text: str,
 ):
-    schedule_event = await db_postgres.get_schedule_event(
-        context.session, event_id)
-    chose_base_ticket = await db_postgres.get_base_ticket(
-        context.session, chose_base_ticket_id)
-
-    q_child_free_seat = schedule_event.qty_child_free_seat
-    q_child_nonconfirm_seat = schedule_event.qty_child_nonconfirm_seat
-    q_adult_free_seat = schedule_event.qty_adult_free_seat
-    q_adult_nonconfirm_seat = schedule_event.qty_adult_nonconfirm_seat
-
-    q_child = chose_base_ticket.quality_of_children
-    q_adult = chose_base_ticket.quality_of_adult
-    q_add_adult = chose_base_ticket.quality_of_add_adult
-
-    qty_child_free_seat_new = (
-            q_child_free_seat + q_child)
-    qty_child_nonconfirm_seat_new = (
-            q_child_nonconfirm_seat - q_child)
-    qty_adult_free_seat_new = (
-            q_adult_free_seat + (q_adult + q_add_adult))
-    qty_adult_nonconfirm_seat_new = (
-            q_adult_nonconfirm_seat - (q_adult + q_add_adult))
-
-    numbers = [
-        qty_child_free_seat_new,
-        qty_child_nonconfirm_seat_new,
-        qty_adult_free_seat_new,
-        qty_adult_nonconfirm_seat_new
-    ]
-
-    try:
-        await _publish_write_data_reserve(event_id, numbers)
-        await db_postgres.update_schedule_event(
-            context.session,
-            int(event_id),
-            qty_child_free_seat=qty_child_free_seat_new,
-            qty_child_nonconfirm_seat=qty_child_nonconfirm_seat_new,
-            qty_adult_free_seat=qty_adult_free_seat_new,
-            qty_adult_nonconfirm_seat=qty_adult_nonconfirm_seat_new,
-        )
-        return 1
-    except TimeoutError as e:
-        db_googlesheets_logger.error(e)
+    """
+    Атомарно меняет места в БД и в той же транзакции ставит запись новых
+    значений в таблицу в outbox. В режиме зеркала мест таблицу обновляет
+    SeatMirror, задача не нужна.
+    option как у write_data_reserve: 1 — все 4 счетчика,
+    2 — неподтвержденные, 3 — свободные.
+    """
+    counts = await apply_seat_delta(
+        context.session, int(event_id), delta, commit=False)
+    if counts is None:
         await context.bot.send_message(
             chat_id=context.config.bot.developer_chat_id,
-            text=f'Не уменьшились свободные места и не увеличились '
-                 f'неподтвержденные места у {event_id=} в расписании')
+            text=f'{error_text}: недостаточно мест')
         return 0
 
+    if context.config.sheets.seat_mirror:
+        await context.session.commit()
+        return 1
 
-async def decrease_free_and_increase_nonconfirm_seat(
+    if option == 2:
+        numbers = [counts.qty_child_nonconfirm_seat,
+                   counts.qty_adult_nonconfirm_seat]
+    elif option == 3:
+        numbers = [counts.qty_child_free_seat,
+                   counts.qty_adult_free_seat]
+    else:
+        numbers = list(counts)
+
+    add_outbox_message(context.session, write_data_reserve_message(
+        sheet_id_domik, int(event_id), numbers, option))
+    await context.session.commit()
+    outbox_relay.wake()
+    return 1
+
+
+async def increase_free_and_decrease_nonconfirm_seat(
         context: 'ContextTypes.DEFAULT_TYPE',
         event_id,
         chose_base_ticket_id,
 ):
-    schedule_event = await db_postgres.get_schedule_event(
-        context.session, event_id)
     chose_base_ticket = await db_postgres.get_base_ticket(
         context.session, chose_base_ticket_id)
+    return await _apply_seat_delta(
+        context,
+        event_id,
+        SeatDelta.release_reserve(chose_base_ticket),
+        1,
+        f'Не увеличились свободные места и не уменьшились '
+        f'неподтвержденные места у {event_id=} в расписании')
 
-    q_child_free_seat = schedule_event.qty_child_free_seat
-    q_child_nonconfirm_seat = schedule_event.qty_child_nonconfirm_seat
-    q_adult_free_seat = schedule_event.qty_adult_free_seat
-    q_adult_nonconfirm_seat = schedule_event.qty_adult_nonconfirm_seat
-
-    q_child = chose_base_ticket.quality_of_children
-    q_adult = chose_base_ticket.quality_of_adult
-    q_add_adult = chose_base_ticket.quality_of_add_adult
-
-    qty_child_free_seat_new = (
-            q_child_free_seat - q_child)
-    qty_child_nonconfirm_seat_new = (
-            q_child_nonconfirm_seat + q_child)
-    qty_adult_free_seat_new = (
-            q_adult_free_seat - (q_adult + q_add_adult))
-    qty_adult_nonconfirm_seat_new = (
-            q_adult_nonconfirm_seat + (q_adult + q_add_adult))
-
-    numbers = [
-        qty_child_free_seat_new,
-        qty_child_nonconfirm_seat_new,
-        qty_adult_free_seat_new,
-        qty_adult_nonconfirm_seat_new
-    ]
 
-    try:
-        await _publish_write_data_reserve(event_id, numbers)
-        await db_postgres.update_schedule_event(
-            context.session,
-            int(event_id),
-            qty_child_free_seat=qty_child_free_seat_new,
-            qty_child_nonconfirm_seat=qty_child_nonconfirm_seat_new,
-            qty_adult_free_seat=qty_adult_free_seat_new,
-            qty_adult_nonconfirm_seat=qty_adult_nonconfirm_seat_new,
-        )
-        return 1
-    except TimeoutError as e:
-        db_googlesheets_logger.error(e)
-        db_googlesheets_logger.error(
-            f'{event_id=} Ошибка при обновлении данных')
-        await context.bot.send_message(
-            chat_id=context.config.bot.developer_chat_id,
-            text=f'Не уменьшились свободные места и не увеличились '
-                 f'неподтвержденные места у {event_id=} в расписании')
-        return 0
+async def decrease_free_and_increase_nonconfirm_seat(
+        context: 'ContextTypes.DEFAULT_TYPE',
+        event_id,
+        chose_base_ticket_id,
+):
+    chose_base_ticket = await db_postgres.get_base_ticket(
+        context.session, chose_base_ticket_id)
+    return await _apply_seat_delta(
+        context,
+        event_id,
+        SeatDelta.reserve(chose_base_ticket),
+        1,
+        f'Не уменьшились свободные места и не увеличились '
+        f'неподтвержденные места у {event_id=} в расписании')
 
 
 async def increase_free_seat(
@@ -456,44 +430,14 @@ async def increase_free_seat(
         event_id,
         chose_base_ticket_id,
 ):
-    schedule_event = await db_postgres.get_schedule_event(
-        context.session, event_id)
     chose_base_ticket = await db_postgres.get_base_ticket(
         context.session, chose_base_ticket_id)
-
-    q_child_free_seat = schedule_event.qty_child_free_seat
-    q_adult_free_seat = schedule_event.qty_adult_free_seat
-
-    q_child = chose_base_ticket.quality_of_children
-    q_adult = chose_base_ticket.quality_of_adult
-    q_add_adult = chose_base_ticket.quality_of_add_adult
-
-    qty_child_free_seat_new = (
-            q_child_free_seat + q_child)
-    qty_adult_free_seat_new = (
-            q_adult_free_seat + (q_adult + q_add_adult))
-
-    numbers = [
-        qty_child_free_seat_new,
-        qty_adult_free_seat_new,
-    ]
-
-    try:
-        await _publish_write_data_reserve(event_id, numbers, 3)
-        await db_postgres.update_schedule_event(
-            context.session,
-            int(event_id),
-            qty_child_free_seat=qty_child_free_seat_new,
-            qty_adult_free_seat=qty_adult_free_seat_new,
-        )
-        return 1
-    except TimeoutError as e:
-        db_googlesheets_logger.error(e)
-        await context.bot.send_message(
-            chat_id=context.config.bot.developer_chat_id,
-            text=f'Не увеличились свободные места у {event_id=}'
-                 f' в расписании')
-        return 0
+    return await _apply_seat_delta(
+        context,
+        event_id,
+        SeatDelta.return_free(chose_base_ticket),
+        3,
+        f'Не увеличились свободные места у {event_id=} в расписании')
 
 
 async def decrease_free_seat(
@@ -501,44 +445,14 @@ async def decrease_free_seat(
         event_id,
         chose_base_ticket_id,
 ):
-    schedule_event = await db_postgres.get_schedule_event(
-        context.session, event_id)
     chose_base_ticket = await db_postgres.get_base_ticket(
         context.session, chose_base_ticket_id)
-
-    q_child_free_seat = schedule_event.qty_child_free_seat
-    q_adult_free_seat = schedule_event.qty_adult_free_seat
-
-    q_child = chose_base_ticket.quality_of_children
-    q_adult = chose_base_ticket.quality_of_adult
-    q_add_adult = chose_base_ticket.quality_of_add_adult
-
-    qty_child_free_seat_new = (
-            q_child_free_seat - q_child)
-    qty_adult_free_seat_new = (
-            q_adult_free_seat - (q_adult + q_add_adult))
-
-    numbers = [
-        qty_child_free_seat_new,
-        qty_adult_free_seat_new,
-    ]
-
-    try:
-        await _publish_write_data_reserve(event_id, numbers, 3)
-        await db_postgres.update_schedule_event(
-            context.session,
-            int(event_id),
-            qty_child_free_seat=qty_child_free_seat_new,
-            qty_adult_free_seat=qty_adult_free_seat_new,
-        )
-        return 1
-    except TimeoutError as e:
-        db_googlesheets_logger.error(e)
-        await context.bot.send_message(
-            chat_id=context.config.bot.developer_chat_id,
-            text=f'Не уменьшились свободные места у {event_id=}'
-                 f' в расписании')
-        return 0
+    return await _apply_seat_delta(
+        context,
+        event_id,
+        SeatDelta.take_free(chose_base_ticket),
+        3,
+        f'Не уменьшились свободные места у {event_id=} в расписании')
 
 
 async def decrease_nonconfirm_seat(
@@ -546,44 +460,14 @@ async def decrease_nonconfirm_seat(
         event_id,
         chose_base_ticket_id
 ):
-    schedule_event = await db_postgres.get_schedule_event(
-        context.session, event_id)
     chose_base_ticket = await db_postgres.get_base_ticket(
         context.session, chose_base_ticket_id)
-
-    q_child_nonconfirm_seat = schedule_event.qty_child_nonconfirm_seat
-    q_adult_nonconfirm_seat = schedule_event.qty_adult_nonconfirm_seat
-
-    q_child = chose_base_ticket.quality_of_children
-    q_adult = chose_base_ticket.quality_of_adult
-    q_add_adult = chose_base_ticket.quality_of_add_adult
-
-    qty_child_nonconfirm_seat_new = (
-            q_child_nonconfirm_seat - q_child)
-    qty_adult_nonconfirm_seat_new = (
-            q_adult_nonconfirm_seat - (q_adult + q_add_adult))
-
-    numbers = [
-        qty_child_nonconfirm_seat_new,
-        qty_adult_nonconfirm_seat_new
-    ]
-
-    try:
-        await _publish_write_data_reserve(event_id, numbers, 2)
-        await db_postgres.update_schedule_event(
-            context.session,
-            int(event_id),
-            qty_child_nonconfirm_seat=qty_child_nonconfirm_seat_new,
-            qty_adult_nonconfirm_seat=qty_adult_nonconfirm_seat_new,
-        )
-        return 1
-    except TimeoutError as e:
-        db_googlesheets_logger.error(e)
-        await context.bot.send_message(
-            chat_id=context.config.bot.developer_chat_id,
-            text=f'Не уменьшились неподтвержденные места у {event_id=}'
-                 f' в расписании')
-        return 0
+    return await _apply_seat_delta(
+        context,
+        event_id,
+        SeatDelta.confirm(chose_base_ticket),
+        2,
+        f'Не уменьшились неподтвержденные места у {event_id=} в расписании')
 
 
 async def update_free_seat(
@@ -592,52 +476,13 @@ async def update_free_seat(
         old_base_ticket_id,
         new_base_ticket_id
 ):
-    schedule_event = await db_postgres.get_schedule_event(
-        context.session, event_id)
     old_base_ticket = await db_postgres.get_base_ticket(
         context.session, old_base_ticket_id)
     new_base_ticket = await db_postgres.get_base_ticket(
         context.session, new_base_ticket_id)
-
-    q_child_free_seat = schedule_event.qty_child_free_seat
-    q_adult_free_seat = schedule_event.qty_adult_free_seat
-
-    q_child_old = old_base_ticket.quality_of_children
-    q_adult_old = old_base_ticket.quality_of_adult
-    q_add_adult_old = old_base_ticket.quality_of_add_adult
-
-    q_child_new = new_base_ticket.quality_of_children
-    q_adult_new = new_base_ticket.quality_of_adult
-    q_add_adult_new = new_base_ticket.quality_of_add_adult
-
-    qty_child_free_seat_new = (
-            q_child_free_seat
-            + q_child_old
-            - q_child_new
-    )
-    qty_adult_free_seat_new = (
-            q_adult_free_seat
-            + (q_adult_old + q_add_adult_old)
-            - (q_adult_new + q_add_adult_new)
-    )
-
-    numbers = [
-        qty_child_free_seat_new,
-        qty_adult_free_seat_new,
-    ]
-
-    try:
-        await _publish_write_data_reserve(event_id, numbers, 3)
-        await db_postgres.update_schedule_event(
-            context.session,
-            int(event_id),
-            qty_child_free_seat=qty_child_free_seat_new,
-            qty_adult_free_seat=qty_adult_free_seat_new,
-        )
-        return 1
-    except TimeoutError as e:
-        db_googlesheets_logger.error(e)
-        await context.bot.send_message(
-            chat_id=context.config.bot.developer_chat_id,
-            text=f'Не обновились свободные места у {event_id=} в расписании')
-        return 0
+    return await _apply_seat_delta(
+        context,
+        event_id,
+        SeatDelta.change_ticket(old_base_ticket, new_base_ticket),
+        3,
+        f'Не обновились свободные места у {event_id=} в расписании')
@@ -11,9 +11,35 @@ from db import (
     FeedbackTopic, FeedbackMessage, SpecialTicketPrice)
 from db.enum import (
     PriceType, TicketStatus, TicketPriceType, AgeType, CustomMadeStatus, UserRole)
+from db.bulk_upsert import UpsertResult, bulk_upsert, dialect_insert
+from db.seat_ledger import SeatCounts
+from db.loaders import (
+    LoadProfile, UserLoad, PersonLoad, TicketLoad, ScheduleLoad, TheaterLoad,
+    PromotionLoad)
 from db.models import CustomMadeFormat, CustomMadeEvent, PersonTicket, Afisha
 
 
+async def _get_with_load(
+        session: AsyncSession,
+        model,
+        pk_column,
+        pk_value,
+        load: LoadProfile,
+):
+    """
+    Получение объекта по первичному ключу с явным профилем загрузки связей.
+    Для минимального профиля используется session.get (identity map).
+    """
+    if load.is_minimal:
+        return await session.get(model, pk_value)
+    result = await session.execute(
+        select(model)
+        .where(pk_column == pk_value)
+        .options(*load.options)
+    )
+    return result.scalar_one_or_none()
+
+
 async def attach_user_and_people_to_ticket(
         session: AsyncSession,
         ticket_id,
@@ -23,7 +49,7 @@ async def attach_user_and_people_to_ticket(
     result = await (session.execute(
         select(Ticket)
         .where(Ticket.id == ticket_id)
-        .options(selectinload(Ticket.people))
+        .options(selectinload(Ticket.people), selectinload(Ticket.user))
     ))
     ticket = result.scalar_one()
     for person_id in people_ids:
@@ -36,35 +62,50 @@ async def attach_user_and_people_to_ticket(
     await session.commit()
 
 
-async def update_base_tickets_from_googlesheets(session: AsyncSession, tickets):
-    for _ticket in tickets:
-        dto_model = _ticket.to_dto()
-        await session.merge(BaseTicket(**dto_model))
+async def update_base_tickets_from_googlesheets(
+        session: AsyncSession, tickets) -> UpsertResult:
+    result = await bulk_upsert(
+        session, BaseTicket, [_ticket.to_dto() for _ticket in tickets])
     await session.commit()
+    return result
 
 
 async def update_theater_events_from_googlesheets(
-        session: AsyncSession, theater_events):
-    for _event in theater_events:
-        dto_model = _event.to_dto()
-        await session.merge(TheaterEvent(**dto_model))
+        session: AsyncSession, theater_events) -> UpsertResult:
+    result = await bulk_upsert(
+        session, TheaterEvent, [_event.to_dto() for _event in theater_events])
     await session.commit()
+    return result
 
 
 async def update_custom_made_format_from_googlesheets(
-        session: AsyncSession, custom_made_formats):
-    for _format in custom_made_formats:
-        dto_model = _format.to_dto()
-        await session.merge(CustomMadeFormat(**dto_model))
+        session: AsyncSession, custom_made_formats) -> UpsertResult:
+    result = await bulk_upsert(
+        session,
+        CustomMadeFormat,
+        [_format.to_dto() for _format in custom_made_formats])
     await session.commit()
+    return result
 
 
 async def update_schedule_events_from_googlesheets(
-        session: AsyncSession, schedule_events):
-    for _event in schedule_events:
-        dto_model = _event.to_dto()
-        await session.merge(ScheduleEvent(**dto_model))
+        session: AsyncSession,
+        schedule_events,
+        keep_seats: bool = False
+) -> UpsertResult:
+    """
+    keep_seats — не перезаписывать счетчики мест у существующих событий:
+    в режиме зеркала мест таблица может отставать от БД.
+    """
+    rows = [_event.to_dto() for _event in schedule_events]
+    update_columns = None
+    if keep_seats and rows:
+        update_columns = [name for name in rows[0]
+                          if name != 'id' and name not in SeatCounts._fields]
+    result = await bulk_upsert(
+        session, ScheduleEvent, rows, update_columns=update_columns)
     await session.commit()
+    return result
 
 
 async def get_email(session: AsyncSession, user_id):
@@ -187,13 +228,18 @@ async def get_adult_person_id_by_phone(session: AsyncSession, phone: str):
     return res.scalars().first()
 
 
-async def get_user_by_phone(session: AsyncSession, phone: str) -> User | None:
+async def get_user_by_phone(
+        session: AsyncSession,
+        phone: str,
+        load: UserLoad = UserLoad.MINIMAL,
+) -> User | None:
     """Возвращает объект User по номеру телефона взрослого"""
     result = await session.execute(
         select(User)
         .join(Person, User.user_id == Person.user_id)
         .join(Adult, Person.id == Adult.person_id)
         .where(Adult.phone == phone)
+        .options(*load.options)
         .limit(1)
     )
     return result.scalars().first()
@@ -223,6 +269,7 @@ async def create_people(
             Person.age_type == AgeType.adult,
             Person.user_id == user_id,
         )
+        .options(*PersonLoad.WITH_DETAILS.options)
     )
     res = await session.execute(query)
     res = res.scalars().all()
@@ -231,9 +278,9 @@ async def create_people(
         adult = person.adult
         adult.phone = phone
     else:
-        person = Person(name=name_adult, age_type=AgeType.adult)
+        person = Person(
+            name=name_adult, age_type=AgeType.adult, user_id=user_id)
         session.add(person)
-        user.people.append(person)
         adult = Adult(phone=phone)
         session.add(adult)
         person.adult = adult
@@ -252,6 +299,7 @@ async def create_people(
                 Person.age_type == AgeType.child,
                 Person.user_id == user_id,
             )
+            .options(*PersonLoad.WITH_DETAILS.options)
         )
         res = await session.execute(query)
         res = res.scalars().all()
@@ -265,10 +313,10 @@ async def create_people(
             person = Person(
                 name=name_child,
                 age_type=AgeType.child,
-                parent_id=parent_id
+                parent_id=parent_id,
+                user_id=user_id,
             )
             session.add(person)
-            user.people.append(person)
             child = Child(age=age)
             session.add(child)
             person.child = child
@@ -302,14 +350,39 @@ async def create_user(
     return user
 
 
+async def ensure_user(
+        session: AsyncSession,
+        user_id,
+        chat_id,
+        *,
+        username=None,
+) -> bool:
+    """
+    Добавляет пользователя, если его еще нет, одним
+    INSERT ... ON CONFLICT DO NOTHING.
+    Возвращает True, если пользователь добавлен.
+    """
+    stmt = (
+        dialect_insert(session, User)
+        .values(user_id=user_id, chat_id=chat_id, username=username)
+        .on_conflict_do_nothing(index_elements=[User.user_id])
+        .returning(User.user_id)
+    )
+    result = await session.execute(stmt)
+    created = result.scalar_one_or_none() is not None
+    await session.commit()
+    return created
+
+
 async def create_person(session: AsyncSession, user_id, name, age_type, parent_id=None):
     user: Type[User] | None = await session.get(User, user_id)
 
     if user is None:
         raise ValueError(f"User with ID {user_id} does not exist")
 
-    person = Person(name=name, age_type=age_type, parent_id=parent_id)
-    user.people.append(person)
+    person = Person(name=name, age_type=age_type, parent_id=parent_id,
+                    user_id=user_id)
+    session.add(person)
 
     await session.commit()
     return person
@@ -317,9 +390,8 @@ async def create_person(session: AsyncSession, user_id, name, age_type, parent_i
 
 async def create_adult(session: AsyncSession, user_id, name, phone):
     person = await create_person(session, user_id, name, AgeType.adult)
-    await session.refresh(person)
-    adult = Adult(phone=phone)
-    person.adult = adult
+    adult = Adult(phone=phone, person_id=person.id)
+    session.add(adult)
 
     await session.commit()
     return adult
@@ -335,9 +407,8 @@ async def create_child(
 ):
     person = await create_person(
         session, user_id, name, AgeType.child, parent_id=parent_id)
-    await session.refresh(person)
-    child = Child(age=age, birthdate=birthdate)
-    person.child = child
+    child = Child(age=age, birthdate=birthdate, person_id=person.id)
+    session.add(child)
 
     await session.commit()
     return child
@@ -562,13 +633,15 @@ async def create_custom_made_event(
 
 
 async def get_user(session: AsyncSession,
-                   user_id: int):
-    return await session.get(User, user_id)
+                   user_id: int,
+                   load: UserLoad = UserLoad.MINIMAL):
+    return await _get_with_load(session, User, User.user_id, user_id, load)
 
 
 async def get_person(session: AsyncSession,
-                      person_id: int):
-    return await session.get(Person, person_id)
+                     person_id: int,
+                     load: PersonLoad = PersonLoad.MINIMAL):
+    return await _get_with_load(session, Person, Person.id, person_id, load)
 
 
 async def get_base_ticket(session: AsyncSession,
@@ -577,17 +650,9 @@ async def get_base_ticket(session: AsyncSession,
 
 
 async def get_ticket(session: AsyncSession,
-                     ticket_id: int):
-    result = await session.execute(
-        select(Ticket)
-        .where(Ticket.id == ticket_id)
-        .options(
-            selectinload(Ticket.people).selectinload(Person.adult),
-            selectinload(Ticket.people).selectinload(Person.child),
-            selectinload(Ticket.user),
-        )
-    )
-    return result.scalar_one_or_none()
+                     ticket_id: int,
+                     load: TicketLoad = TicketLoad.WITH_PEOPLE):
+    return await _get_with_load(session, Ticket, Ticket.id, ticket_id, load)
 
 
 async def get_type_event(
@@ -603,30 +668,20 @@ async def get_type_event(
 
 async def get_theater_event(
         session: AsyncSession,
-        theater_event_id: Mapped[int] | int
+        theater_event_id: Mapped[int] | int,
+        load: TheaterLoad = TheaterLoad.MINIMAL,
 ) -> TheaterEvent | None:
-    result = await session.execute(
-        select(TheaterEvent)
-        .where(TheaterEvent.id == theater_event_id)
-        .options(selectinload(TheaterEvent.schedule_events))
-    )
-    return result.scalar_one_or_none()
+    return await _get_with_load(
+        session, TheaterEvent, TheaterEvent.id, theater_event_id, load)
 
 
 async def get_schedule_event(
         session: AsyncSession,
-        schedule_event_id: Mapped[int] | int
+        schedule_event_id: Mapped[int] | int,
+        load: ScheduleLoad = ScheduleLoad.MINIMAL,
 ) -> ScheduleEvent | None:
-    result = await session.execute(
-        select(ScheduleEvent)
-        .where(ScheduleEvent.id == schedule_event_id)
-        .options(
-            selectinload(ScheduleEvent.theater_event).selectinload(TheaterEvent.base_tickets),
-            selectinload(ScheduleEvent.type_event).selectinload(TypeEvent.base_tickets),
-            selectinload(ScheduleEvent.base_tickets)
-        )
-    )
-    return result.scalar_one_or_none()
+    return await _get_with_load(
+        session, ScheduleEvent, ScheduleEvent.id, schedule_event_id, load)
 
 
 async def get_users_by_ids(session: AsyncSession,
@@ -678,16 +733,13 @@ async def get_schedule_events_by_ids(session: AsyncSession,
     return result.scalars().all()
 
 
-async def get_promotion(session: AsyncSession,
-                        promotion_id: int):
-    query = select(Promotion).where(Promotion.id == promotion_id).options(
-        selectinload(Promotion.type_events),
-        selectinload(Promotion.theater_events),
-        selectinload(Promotion.base_tickets),
-        selectinload(Promotion.schedule_events)
-    )
-    result = await session.execute(query)
-    return result.scalar_one_or_none()
+async def get_promotion(
+        session: AsyncSession,
+        promotion_id: int,
+        load: PromotionLoad = PromotionLoad.WITH_RESTRICTIONS,
+):
+    return await _get_with_load(
+        session, Promotion, Promotion.id, promotion_id, load)
 
 
 async def get_custom_made_format(session: AsyncSession,
@@ -725,12 +777,13 @@ async def get_all_theater_events(session: AsyncSession):
     return result.scalars().all()
 
 
-async def get_all_theater_events_actual(session: AsyncSession):
+async def get_all_theater_events_actual(
+        session: AsyncSession,
+        load: TheaterLoad = TheaterLoad.MINIMAL,
+):
     query = select(TheaterEvent).where(
         or_(TheaterEvent.flag_active_repertoire == True, TheaterEvent.flag_active_bd == True),
-    ).options(
-        selectinload(TheaterEvent.schedule_events),
-    )
+    ).options(*load.options)
     result = await session.execute(query)
     return result.scalars().all()
 
@@ -741,22 +794,36 @@ async def get_all_type_events(session: AsyncSession):
     return result.scalars().all()
 
 
-async def get_all_schedule_events(session: AsyncSession):
-    query = select(ScheduleEvent).options(
-        selectinload(ScheduleEvent.theater_event),
-        selectinload(ScheduleEvent.type_event)
-    )
+async def get_all_schedule_events(
+        session: AsyncSession,
+        load: ScheduleLoad = ScheduleLoad.WITH_EVENTS,
+):
+    query = select(ScheduleEvent).options(*load.options)
     result = await session.execute(query)
     return result.scalars().all()
 
 
-async def get_all_schedule_events_actual(session: AsyncSession):
+async def get_schedule_event_fingerprints(session: AsyncSession):
+    """
+    Возвращает {id: (datetime_event, flag_turn_in_bot)} для всех событий,
+    чтобы при синхронизации определить, какие напоминания надо менять.
+    """
+    result = await session.execute(select(
+        ScheduleEvent.id,
+        ScheduleEvent.datetime_event,
+        ScheduleEvent.flag_turn_in_bot,
+    ))
+    return {row.id: (row.datetime_event, row.flag_turn_in_bot)
+            for row in result}
+
+
+async def get_all_schedule_events_actual(
+        session: AsyncSession,
+        load: ScheduleLoad = ScheduleLoad.WITH_EVENTS,
+):
     query = select(ScheduleEvent).where(
         ScheduleEvent.datetime_event >= datetime.now()
-    ).options(
-        selectinload(ScheduleEvent.theater_event),
-        selectinload(ScheduleEvent.type_event)
-    ).order_by(ScheduleEvent.datetime_event)
+    ).options(*load.options).order_by(ScheduleEvent.datetime_event)
     result = await session.execute(query)
     return result.scalars().all()
 
@@ -765,12 +832,10 @@ async def get_schedule_events_filtered(
         session: AsyncSession,
         actual_only: bool = True,
         type_id: int | str | None = None,
-        month: int | str | None = None
+        month: int | str | None = None,
+        load: ScheduleLoad = ScheduleLoad.WITH_EVENTS,
 ):
-    query = select(ScheduleEvent).options(
-        selectinload(ScheduleEvent.theater_event),
-        selectinload(ScheduleEvent.type_event)
-    )
+    query = select(ScheduleEvent).options(*load.options)
     if actual_only:
         query = query.where(ScheduleEvent.datetime_event >= datetime.now())
 
@@ -785,14 +850,13 @@ async def get_schedule_events_filtered(
     return result.scalars().all()
 
 
-async def get_promotion_by_code(session: AsyncSession,
-                               code: str):
+async def get_promotion_by_code(
+        session: AsyncSession,
+        code: str,
+        load: PromotionLoad = PromotionLoad.WITH_RESTRICTIONS,
+):
     query = select(Promotion).where(Promotion.code == code).options(
-        selectinload(Promotion.type_events),
-        selectinload(Promotion.theater_events),
-        selectinload(Promotion.base_tickets),
-        selectinload(Promotion.schedule_events)
-    )
+        *load.options)
     result = await session.execute(query)
     return result.scalar_one_or_none()
 
@@ -828,7 +892,8 @@ async def get_promotion_usage_count_by_user(session: AsyncSession, promotion_id:
     return result.scalar() or 0
 
 
-async def update_promotions_from_googlesheets(session: AsyncSession, promotions):
+async def update_promotions_from_googlesheets(
+        session: AsyncSession, promotions) -> UpsertResult:
     # Обновляем только простые поля промоакций, ограничения по связям не загружаем из таблиц
     allowed_fields = {
         'id', 'name', 'code', 'discount', 'start_date', 'expire_date',
@@ -837,10 +902,13 @@ async def update_promotions_from_googlesheets(session: AsyncSession, promotions)
         'min_purchase_sum', 'description_user', 'requires_verification',
         'verification_text', 'discount_type'
     }
-    for _promotion in promotions:
-        dto_model = {k: v for k, v in _promotion.to_dto().items() if k in allowed_fields}
-        await session.merge(Promotion(**dto_model))
+    rows = [
+        {k: v for k, v in _promotion.to_dto().items() if k in allowed_fields}
+        for _promotion in promotions
+    ]
+    result = await bulk_upsert(session, Promotion, rows)
     await session.commit()
+    return result
 
 
 async def update_special_ticket_prices_from_googlesheets(
@@ -946,13 +1014,9 @@ async def create_promotion(session: AsyncSession, promotion_data: dict):
 
 
 async def update_promotion(session: AsyncSession, promotion_id: int, promotion_data: dict):
-    # Используем selectinload для загрузки связей
+    # Связи загружаются явно: они будут перезаписаны ниже
     query = select(Promotion).where(Promotion.id == promotion_id).options(
-        selectinload(Promotion.type_events),
-        selectinload(Promotion.theater_events),
-        selectinload(Promotion.base_tickets),
-        selectinload(Promotion.schedule_events)
-    )
+        *PromotionLoad.WITH_RESTRICTIONS.options)
     result = await session.execute(query)
     promotion = result.scalar_one_or_none()
 
@@ -1104,15 +1168,14 @@ async def get_actual_schedule_events_by_date(
 
 async def get_schedule_theater_base_tickets(context, choice_event_id: int):
     schedule_event = await get_schedule_event(context.session,
-                                              int(choice_event_id))
+                                              int(choice_event_id),
+                                              ScheduleLoad.WITH_PRICING)
     if not schedule_event:
         raise ValueError("Schedule event not found")
-    theater_event = await get_theater_event(context.session,
-                                            schedule_event.theater_event_id)
+    theater_event = schedule_event.theater_event
     if not theater_event:
         raise ValueError("Theater event not found")
-    type_event = await get_type_event(context.session,
-                                      schedule_event.type_event_id)
+    type_event = schedule_event.type_event
     if not type_event:
         raise ValueError("Type event not found")
     base_tickets = await get_base_tickets_by_event_or_all(schedule_event,
@@ -1193,9 +1256,13 @@ async def update_schedule_event(
         schedule_event_id,
         **kwargs
 ):
-    schedule_event = await session.get(ScheduleEvent, schedule_event_id)
-
     base_ticket_ids = kwargs.pop('base_ticket_ids', None)
+    # Коллекцию base_tickets загружаем только если она будет перезаписана
+    load = (ScheduleLoad.MINIMAL if base_ticket_ids is None
+            else ScheduleLoad.WITH_BASE_TICKETS)
+    schedule_event = await get_schedule_event(
+        session, schedule_event_id, load)
+
     for key, value in kwargs.items():
         setattr(schedule_event, key, value)
 
@@ -1343,6 +1410,23 @@ async def get_or_create_user_status(
     return status
 
 
+async def get_user_status_flags(
+        session: AsyncSession,
+        user_id: int
+):
+    """
+    (is_blacklisted, is_blocked_by_user, is_blocked_by_admin) или None,
+    если у пользователя нет статуса.
+    """
+    result = await session.execute(
+        select(UserStatus.is_blacklisted,
+               UserStatus.is_blocked_by_user,
+               UserStatus.is_blocked_by_admin)
+        .where(UserStatus.user_id == user_id)
+    )
+    return result.one_or_none()
+
+
 async def update_user_status(
         session: AsyncSession,
         user_id: int,
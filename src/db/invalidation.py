@@ -0,0 +1,273 @@
+"""
+Шина инвалидации кэшей справочных данных через LISTEN/NOTIFY.
+
+Бот, web и sales worker читают расписание, базовые билеты, акции,
+настройки и статусы пользователей из одной базы. Кэшировать их в
+процессе можно, только если процесс узнает об изменениях, сделанных
+остальными:
+
+- хуки сессии (install_session_hooks) отмечают изменения таблиц из
+  TRACKED_TABLES и в той же транзакции выполняют
+  pg_notify('<таблица>_changed', <json со списком id или ''>).
+  Postgres доставит уведомление только после коммита, а одинаковые
+  уведомления одной транзакции объединит;
+- после коммита подписчики своего процесса вызываются сразу,
+  не дожидаясь уведомления;
+- InvalidationBus держит отдельное соединение с LISTEN на все каналы
+  и вызывает подписчиков при уведомлениях от других процессов.
+
+Подписчик получает frozenset id измененных строк или None, если
+изменились неизвестные строки (UPDATE/DELETE по условию, переподключение
+LISTEN) и сбросить надо все.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from itertools import chain
+from typing import (
+    Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set)
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.orm import Session
+
+invalidation_logger = logging.getLogger('bot.db.invalidation')
+
+TRACKED_TABLES = (
+    'schedule_events',
+    'base_tickets',
+    'type_events',
+    'theater_events',
+    'promotions',
+    'special_ticket_prices',
+    'bot_settings',
+    'user_statuses',
+)
+# Для этих таблиц уведомление шлет триггер в БД (rev_27)
+TRIGGER_TABLES = ('schedule_events',)
+
+RECONNECT_DELAY = 5.0
+# Максимальный размер payload у NOTIFY — 8000 байт
+MAX_PAYLOAD = 7900
+
+Ids = Optional[FrozenSet[Any]]
+Callback = Callable[[Ids], None]
+
+_CHANGES_KEY = 'invalidation_changes'
+
+
+def channel_for(table: str) -> str:
+    return f'{table}_changed'
+
+
+def _encode_ids(ids: Ids) -> str:
+    if ids is None:
+        return ''
+    payload = json.dumps(sorted(ids, key=str))
+    return payload if len(payload) <= MAX_PAYLOAD else ''
+
+
+def _decode_ids(payload: str) -> Ids:
+    if not payload:
+        return None
+    try:
+        return frozenset(json.loads(payload))
+    except ValueError:
+        return None
+
+
+class InvalidationBus:
+    def __init__(self, tables: Iterable[str] = TRACKED_TABLES):
+        self.tables = tuple(tables)
+        self.listening = False
+        self.published = 0
+        self.received = 0
+        self.dispatched = 0
+        self.failed = 0
+        self._subscribers: Dict[str, List[Callback]] = defaultdict(list)
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, table: str, callback: Callback) -> None:
+        if table not in self.tables:
+            raise ValueError(f'Таблица {table} не отслеживается шиной')
+        self._subscribers[table].append(callback)
+
+    def unsubscribe(self, table: str, callback: Callback) -> None:
+        if callback in self._subscribers.get(table, []):
+            self._subscribers[table].remove(callback)
+
+    def dispatch(self, table: str, ids: Ids) -> None:
+        for callback in list(self._subscribers.get(table, [])):
+            try:
+                callback(ids)
+                self.dispatched += 1
+            except Exception as e:
+                self.failed += 1
+                invalidation_logger.exception(
+                    f'Ошибка подписчика {callback!r} на {table}: {e}')
+
+    def dispatch_all(self) -> None:
+        for table in self.tables:
+            self.dispatch(table, None)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self.received += 1
+        table = channel[:-len('_changed')]
+        self.dispatch(table, _decode_ids(payload))
+
+    def start(self, sessionmaker: async_sessionmaker) -> None:
+        install_session_hooks()
+        engine: AsyncEngine = sessionmaker.kw['bind']
+        if engine.dialect.name != 'postgresql':
+            invalidation_logger.info(
+                f'LISTEN недоступен для {engine.dialect.name}, кэши '
+                f'узнают только об изменениях своего процесса')
+            return
+        self._task = asyncio.create_task(self._listen(engine))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        invalidation_logger.info('Шина инвалидации остановлена')
+
+    async def _listen(self, engine: AsyncEngine) -> None:
+        while True:
+            try:
+                async with engine.connect() as conn:
+                    raw = await conn.get_raw_connection()
+                    await self._listen_connection(raw.driver_connection)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                invalidation_logger.exception(f'Ошибка LISTEN: {e}')
+            finally:
+                self.listening = False
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _listen_connection(self, connection) -> None:
+        closed = asyncio.Event()
+        connection.add_termination_listener(lambda _: closed.set())
+        channels = [channel_for(table) for table in self.tables]
+        for channel in channels:
+            await connection.add_listener(channel, self._on_notify)
+        try:
+            self.listening = True
+            # Уведомления, пришедшие без подписки, потеряны
+            self.dispatch_all()
+            invalidation_logger.info(f'LISTEN запущен: {channels}')
+            await closed.wait()
+            invalidation_logger.warning(
+                'Соединение LISTEN закрыто, переподключение')
+        finally:
+            if not connection.is_closed():
+                for channel in channels:
+                    await connection.remove_listener(
+                        channel, self._on_notify)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'invalidation_listening': self.listening,
+            'invalidation_published': self.published,
+            'invalidation_received': self.received,
+            'invalidation_dispatched': self.dispatched,
+            'invalidation_failed': self.failed,
+        }
+
+
+invalidation_bus = InvalidationBus()
+
+
+def _mark_changed(session: Session, table: str, ids: Ids) -> None:
+    changes: Dict[str, Optional[Set[Any]]] = session.info.setdefault(
+        _CHANGES_KEY, {})
+    if ids is None or (table in changes and changes[table] is None):
+        changes[table] = None
+    else:
+        changes.setdefault(table, set()).update(ids)
+
+
+def _notify(session: Session, table: str, ids: Ids) -> None:
+    if table in TRIGGER_TABLES:
+        return
+    connection = session.connection()
+    if connection.dialect.name != 'postgresql':
+        return
+    connection.execute(select(func.pg_notify(
+        channel_for(table), _encode_ids(ids))))
+    invalidation_bus.published += 1
+
+
+def _after_flush(session: Session, flush_context) -> None:
+    changed: Dict[str, Set[Any]] = defaultdict(set)
+    for obj in chain(session.new, session.dirty, session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table not in invalidation_bus.tables:
+            continue
+        state = inspect(obj)
+        identity = state.mapper.primary_key_from_instance(obj)
+        if len(identity) != 1 or identity[0] is None:
+            changed[table] = None
+        elif changed[table] is not None:
+            changed[table].add(identity[0])
+    for table, ids in changed.items():
+        ids = frozenset(ids) if ids is not None else None
+        _mark_changed(session, table, ids)
+        _notify(session, table, ids)
+
+
+def _do_orm_execute(orm_execute_state) -> None:
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or
+            orm_execute_state.is_delete):
+        return
+    table = getattr(getattr(orm_execute_state.statement, 'table', None),
+                    'name', None)
+    if table not in invalidation_bus.tables:
+        return
+    # Какие строки изменит оператор, заранее неизвестно
+    session = orm_execute_state.session
+    _mark_changed(session, table, None)
+    _notify(session, table, None)
+
+
+def _after_commit(session: Session) -> None:
+    changes = session.info.pop(_CHANGES_KEY, None)
+    for table, ids in (changes or {}).items():
+        invalidation_bus.dispatch(
+            table, frozenset(ids) if ids is not None else None)
+
+
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_CHANGES_KEY, None)
+
+
+_SESSION_HOOKS = (
+    ('after_flush', _after_flush),
+    ('do_orm_execute', _do_orm_execute),
+    ('after_commit', _after_commit),
+    ('after_rollback', _after_rollback),
+)
+
+
+def install_session_hooks() -> None:
+    """
+    Включает учет изменений отслеживаемых таблиц во всех сессиях
+    процесса. Повторный вызов ничего не меняет.
+    """
+    for name, fn in _SESSION_HOOKS:
+        if not event.contains(Session, name, fn):
+            event.listen(Session, name, fn)
+
+
+def start_invalidation_bus(sessionmaker: async_sessionmaker) -> None:
+    invalidation_bus.start(sessionmaker)
+
+
+async def stop_invalidation_bus() -> None:
+    await invalidation_bus.stop()
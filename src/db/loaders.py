@@ -0,0 +1,113 @@
+"""
+Профили загрузки связей для запросов db_postgres.
+
+Все relationship в моделях по умолчанию lazy='raise_on_sql': обращение
+к незагруженной связи, требующее SQL, завершается ошибкой, а не тихим
+N+1 запросом. Каждый геттер явно выбирает профиль, например
+UserLoad.MINIMAL или ScheduleLoad.WITH_PRICING.
+"""
+from enum import Enum
+from typing import Tuple
+
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.interfaces import LoaderOption
+
+from db.models import (
+    User, Person, Ticket, ScheduleEvent, TheaterEvent, TypeEvent, Promotion)
+
+
+class LoadProfile(Enum):
+    """Базовый класс профилей: значение — кортеж опций загрузки."""
+
+    @property
+    def options(self) -> Tuple[LoaderOption, ...]:
+        return self.value[1]
+
+    @property
+    def is_minimal(self) -> bool:
+        return not self.options
+
+
+class UserLoad(LoadProfile):
+    MINIMAL = ('minimal', ())
+    WITH_STATUS = ('with_status', (
+        selectinload(User.status),
+    ))
+    WITH_PEOPLE = ('with_people', (
+        selectinload(User.people).selectinload(Person.adult),
+        selectinload(User.people).selectinload(Person.child),
+    ))
+    WITH_TICKETS = ('with_tickets', (
+        selectinload(User.tickets),
+    ))
+
+
+class PersonLoad(LoadProfile):
+    MINIMAL = ('minimal', ())
+    WITH_DETAILS = ('with_details', (
+        selectinload(Person.adult),
+        selectinload(Person.child),
+    ))
+    WITH_PARENT = ('with_parent', (
+        selectinload(Person.adult),
+        selectinload(Person.child),
+        selectinload(Person.parent).selectinload(Person.adult),
+    ))
+
+
+class TicketLoad(LoadProfile):
+    MINIMAL = ('minimal', ())
+    WITH_USER = ('with_user', (
+        selectinload(Ticket.user).selectinload(User.status),
+    ))
+    WITH_PEOPLE = ('with_people', (
+        selectinload(Ticket.people).selectinload(Person.adult),
+        selectinload(Ticket.people).selectinload(Person.child),
+        selectinload(Ticket.user),
+    ))
+
+
+class ScheduleLoad(LoadProfile):
+    MINIMAL = ('minimal', ())
+    WITH_EVENTS = ('with_events', (
+        selectinload(ScheduleEvent.theater_event),
+        selectinload(ScheduleEvent.type_event),
+    ))
+    WITH_BASE_TICKETS = ('with_base_tickets', (
+        selectinload(ScheduleEvent.base_tickets),
+    ))
+    WITH_PRICING = ('with_pricing', (
+        selectinload(ScheduleEvent.theater_event).selectinload(
+            TheaterEvent.base_tickets),
+        selectinload(ScheduleEvent.type_event).selectinload(
+            TypeEvent.base_tickets),
+        selectinload(ScheduleEvent.base_tickets),
+    ))
+    WITH_TICKETS = ('with_tickets', (
+        selectinload(ScheduleEvent.theater_event),
+        selectinload(ScheduleEvent.type_event),
+        selectinload(ScheduleEvent.tickets)
+        .selectinload(Ticket.user).selectinload(User.status),
+        selectinload(ScheduleEvent.tickets)
+        .selectinload(Ticket.people).selectinload(Person.adult),
+        selectinload(ScheduleEvent.tickets)
+        .selectinload(Ticket.people).selectinload(Person.child),
+    ))
+
+
+class TheaterLoad(LoadProfile):
+    MINIMAL = ('minimal', ())
+    WITH_SCHEDULE = ('with_schedule', (
+        selectinload(TheaterEvent.schedule_events)
+        .selectinload(ScheduleEvent.type_event),
+    ))
+
+
+class PromotionLoad(LoadProfile):
+    MINIMAL = ('minimal', ())
+    WITH_RESTRICTIONS = ('with_restrictions', (
+        selectinload(Promotion.type_events),
+        selectinload(Promotion.theater_events),
+        selectinload(Promotion.base_tickets),
+        selectinload(Promotion.schedule_events),
+    ))
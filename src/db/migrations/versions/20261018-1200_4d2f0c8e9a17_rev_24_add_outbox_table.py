@@ -0,0 +1,66 @@
+"""rev_24_add_outbox_table
+
+Revision ID: 4d2f0c8e9a17
+Revises: ac6b69749afa
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "4d2f0c8e9a17"
+down_revision = "ac6b69749afa"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "outbox",
+        sa.Column("id", sa.BIGINT(), nullable=False),
+        sa.Column("subject", sa.String(), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("dedup_key", sa.String(), nullable=False),
+        sa.Column("attempts", sa.BIGINT(), nullable=False),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column(
+            "available_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("sent_at", sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk__outbox")),
+        sa.UniqueConstraint("dedup_key", name=op.f("uq__outbox__dedup_key")),
+    )
+    op.create_index(
+        "ix__outbox__pending",
+        "outbox",
+        ["available_at", "id"],
+        unique=False,
+        postgresql_where=sa.text("sent_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix__outbox__pending",
+        table_name="outbox",
+        postgresql_where=sa.text("sent_at IS NULL"),
+    )
+    op.drop_table("outbox")
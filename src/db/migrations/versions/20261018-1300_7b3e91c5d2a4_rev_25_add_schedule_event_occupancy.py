@@ -0,0 +1,123 @@
+"""rev_25_add_schedule_event_occupancy
+
+Revision ID: 7b3e91c5d2a4
+Revises: 4d2f0c8e9a17
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7b3e91c5d2a4"
+down_revision = "4d2f0c8e9a17"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "schedule_event_occupancy",
+        sa.Column("schedule_event_id", sa.BIGINT(), autoincrement=False,
+                  nullable=False),
+        sa.Column("taken_child", sa.BIGINT(), nullable=False),
+        sa.Column("taken_adult", sa.BIGINT(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["schedule_event_id"],
+            ["schedule_events.id"],
+            name=op.f(
+                "fk__schedule_event_occupancy__schedule_event_id__schedule_events"
+            ),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint(
+            "schedule_event_id", name=op.f("pk__schedule_event_occupancy")),
+    )
+    # Занятые места меняются, когда билет становится или перестает быть
+    # оплаченным/подтвержденным, переносится на другое мероприятие или
+    # меняет базовый билет
+    op.execute(
+        """
+        CREATE FUNCTION schedule_event_occupancy_add(
+            event_id bigint, base_ticket bigint, sign integer)
+        RETURNS void AS $$
+        BEGIN
+            IF event_id IS NULL THEN
+                RETURN;
+            END IF;
+            INSERT INTO schedule_event_occupancy AS o
+                (schedule_event_id, taken_child, taken_adult)
+            SELECT event_id,
+                   sign * b.quality_of_children,
+                   sign * (b.quality_of_adult + b.quality_of_add_adult)
+            FROM base_tickets b
+            WHERE b.base_ticket_id = base_ticket
+            ON CONFLICT (schedule_event_id) DO UPDATE
+            SET taken_child = o.taken_child + EXCLUDED.taken_child,
+                taken_adult = o.taken_adult + EXCLUDED.taken_adult;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE FUNCTION tickets_occupancy() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' THEN
+                IF NEW.status IS NOT DISTINCT FROM OLD.status
+                   AND NEW.schedule_event_id
+                       IS NOT DISTINCT FROM OLD.schedule_event_id
+                   AND NEW.base_ticket_id = OLD.base_ticket_id THEN
+                    RETURN NULL;
+                END IF;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                IF OLD.status IN ('PAID', 'APPROVED') THEN
+                    PERFORM schedule_event_occupancy_add(
+                        OLD.schedule_event_id, OLD.base_ticket_id, -1);
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                IF NEW.status IN ('PAID', 'APPROVED') THEN
+                    PERFORM schedule_event_occupancy_add(
+                        NEW.schedule_event_id, NEW.base_ticket_id, 1);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER tickets_occupancy
+        AFTER INSERT OR DELETE
+            OR UPDATE OF status, schedule_event_id, base_ticket_id
+        ON tickets
+        FOR EACH ROW EXECUTE FUNCTION tickets_occupancy()
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO schedule_event_occupancy
+            (schedule_event_id, taken_child, taken_adult)
+        SELECT t.schedule_event_id,
+               SUM(b.quality_of_children),
+               SUM(b.quality_of_adult + b.quality_of_add_adult)
+        FROM tickets t
+        JOIN base_tickets b ON b.base_ticket_id = t.base_ticket_id
+        WHERE t.schedule_event_id IS NOT NULL
+          AND t.status IN ('PAID', 'APPROVED')
+        GROUP BY t.schedule_event_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER tickets_occupancy ON tickets")
+    op.execute("DROP FUNCTION tickets_occupancy()")
+    op.execute(
+        "DROP FUNCTION schedule_event_occupancy_add(bigint, bigint, integer)")
+    op.drop_table("schedule_event_occupancy")
@@ -0,0 +1,77 @@
+"""rev_26_add_hot_lookup_indexes
+
+Revision ID: 9c4a7e2b1f60
+Revises: 7b3e91c5d2a4
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9c4a7e2b1f60"
+down_revision = "7b3e91c5d2a4"
+branch_labels = None
+depends_on = None
+
+# (имя, таблица, колонки, условие частичного индекса)
+INDEXES = [
+    ("ix__tickets__status_created_at", "tickets",
+     ["status", "created_at"], None),
+    ("ix__tickets__promo_id", "tickets",
+     ["promo_id"], "promo_id IS NOT NULL"),
+    ("ix__users_tickets__ticket_id", "users_tickets",
+     ["ticket_id"], None),
+    ("ix__people_tickets__ticket_id", "people_tickets",
+     ["ticket_id"], None),
+    ("ix__schedule_events__datetime_event", "schedule_events",
+     ["datetime_event"], None),
+    ("ix__schedule_events__type_event_id_datetime_event", "schedule_events",
+     ["type_event_id", "datetime_event"], None),
+    ("ix__schedule_events__theater_event_id_datetime_event",
+     "schedule_events",
+     ["theater_event_id", "datetime_event"], None),
+    ("ix__people__user_id_age_type", "people",
+     ["user_id", "age_type"], None),
+    ("ix__people__parent_id", "people",
+     ["parent_id"], "parent_id IS NOT NULL"),
+    ("ix__adults__phone", "adults",
+     ["phone"], "phone IS NOT NULL"),
+    ("ix__adults__person_id", "adults",
+     ["person_id"], None),
+    ("ix__children__person_id", "children",
+     ["person_id"], None),
+    ("ix__sales_recipients__campaign_id_status", "sales_recipients",
+     ["campaign_id", "status"], None),
+    ("ix__tg_updates__user_id_created_at", "tg_updates",
+     ["user_id", "created_at"], None),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в tickets и tg_updates на время
+    # построения, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+            )
+    for table in sorted({table for _, table, _, _ in INDEXES}):
+        op.execute(f"ANALYZE {table}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+            )
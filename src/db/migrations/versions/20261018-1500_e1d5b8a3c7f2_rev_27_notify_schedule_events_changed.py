@@ -0,0 +1,44 @@
+"""rev_27_notify_schedule_events_changed
+
+Revision ID: e1d5b8a3c7f2
+Revises: 9c4a7e2b1f60
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "e1d5b8a3c7f2"
+down_revision = "9c4a7e2b1f60"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Одно уведомление на оператор: загрузка расписания из таблицы
+    # одним upsert не рассылает уведомление на каждую строку.
+    # NOTIFY доставляется после коммита и отбрасывается при откате
+    op.execute(
+        """
+        CREATE FUNCTION notify_schedule_events_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('schedule_events_changed', '');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER schedule_events_changed
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON schedule_events
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_schedule_events_changed()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER schedule_events_changed ON schedule_events")
+    op.execute("DROP FUNCTION notify_schedule_events_changed()")
@@ -1,7 +1,9 @@
 from datetime import datetime, date, time
 from typing import Optional, List
 
-from sqlalchemy import ForeignKey, BigInteger, Numeric, JSON, UniqueConstraint, Enum, String
+from sqlalchemy import (
+    ForeignKey, BigInteger, Numeric, JSON, UniqueConstraint, Enum, String,
+    Index, func, text)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from db import BaseModel, BaseModelTimed
@@ -23,14 +25,14 @@ class User(BaseModelTimed):
     agreement_received: Mapped[Optional[date]]
     is_privilege: Mapped[Optional[bool]]
 
-    people: Mapped[List['Person']] = relationship(lazy='selectin')
+    people: Mapped[List['Person']] = relationship(lazy='raise_on_sql')
     tickets: Mapped[List['Ticket']] = relationship(
-        back_populates='user', secondary='users_tickets', lazy='selectin')
+        back_populates='user', secondary='users_tickets', lazy='raise_on_sql')
     custom_made_events: Mapped[List['CustomMadeEvent']] = relationship(
-        lazy='selectin')
+        lazy='raise_on_sql')
 
     status: Mapped[Optional['UserStatus']] = relationship(
-        back_populates='user', uselist=False, lazy='selectin')
+        back_populates='user', uselist=False, lazy='raise_on_sql')
 
 
 class Person(BaseModelTimed):
@@ -47,21 +49,28 @@ class Person(BaseModelTimed):
         ForeignKey('people.id', ondelete='SET NULL'))
 
     child: Mapped['Child'] = relationship(
-        cascade="all, delete-orphan", lazy='selectin')
+        cascade="all, delete-orphan", lazy='raise_on_sql')
     adult: Mapped['Adult'] = relationship(
-        cascade="all, delete-orphan", lazy='selectin')
+        cascade="all, delete-orphan", lazy='raise_on_sql')
     tickets: Mapped[List['Ticket']] = relationship(
-        back_populates='people', secondary='people_tickets', lazy='selectin')
+        back_populates='people', secondary='people_tickets', lazy='raise_on_sql')
 
     children: Mapped[List['Person']] = relationship(
         'Person',
         back_populates='parent',
-        lazy='selectin')
+        lazy='raise_on_sql')
     parent: Mapped[Optional['Person']] = relationship(
         'Person',
         back_populates='children',
         remote_side=[id],
-        lazy='selectin')
+        lazy='raise_on_sql')
+
+    __table_args__ = (
+        Index('ix__people__user_id_age_type', 'user_id', 'age_type'),
+        Index('ix__people__parent_id', 'parent_id',
+              postgresql_where=text('parent_id IS NOT NULL'),
+              sqlite_where=text('parent_id IS NOT NULL')),
+    )
 
 
 class Child(BaseModel):
@@ -72,7 +81,7 @@ class Child(BaseModel):
     birthdate: Mapped[Optional[date]]
 
     person_id: Mapped[int] = mapped_column(
-        ForeignKey('people.id', ondelete='CASCADE'))
+        ForeignKey('people.id', ondelete='CASCADE'), index=True)
 
 
 class Adult(BaseModel):
@@ -82,7 +91,13 @@ class Adult(BaseModel):
     phone: Mapped[Optional[str]]
 
     person_id: Mapped[int] = mapped_column(
-        ForeignKey('people.id', ondelete='CASCADE'))
+        ForeignKey('people.id', ondelete='CASCADE'), index=True)
+
+    __table_args__ = (
+        Index('ix__adults__phone', 'phone',
+              postgresql_where=text('phone IS NOT NULL'),
+              sqlite_where=text('phone IS NOT NULL')),
+    )
 
 
 class UserTicket(BaseModelTimed):
@@ -91,7 +106,8 @@ class UserTicket(BaseModelTimed):
     user_id: Mapped[int] = mapped_column(
         ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
     ticket_id: Mapped[int] = mapped_column(
-        ForeignKey('tickets.id', ondelete='CASCADE'), primary_key=True)
+        ForeignKey('tickets.id', ondelete='CASCADE'), primary_key=True,
+        index=True)
 
 
 class PersonTicket(BaseModelTimed):
@@ -100,7 +116,8 @@ class PersonTicket(BaseModelTimed):
     person_id: Mapped[int] = mapped_column(
         ForeignKey('people.id', ondelete='CASCADE'), primary_key=True)
     ticket_id: Mapped[int] = mapped_column(
-        ForeignKey('tickets.id', ondelete='CASCADE'), primary_key=True)
+        ForeignKey('tickets.id', ondelete='CASCADE'), primary_key=True,
+        index=True)
 
 
 class BaseTicket(BaseModelTimed):
@@ -127,15 +144,15 @@ class BaseTicket(BaseModelTimed):
     type_events: Mapped[List['TypeEvent']] = relationship(
         back_populates='base_tickets',
         secondary='base_tickets_type_events',
-        lazy='selectin')
+        lazy='raise_on_sql')
     theater_events: Mapped[List['TheaterEvent']] = relationship(
         back_populates='base_tickets',
         secondary='base_tickets_theater_events',
-        lazy='selectin')
+        lazy='raise_on_sql')
     schedule_events: Mapped[List['ScheduleEvent']] = relationship(
         back_populates='base_tickets',
         secondary='base_tickets_schedule_events',
-        lazy='selectin')
+        lazy='raise_on_sql')
 
     def get_price_from_date(self, _date: date = date.today()):
         flag_set_period_price = False
@@ -211,11 +228,18 @@ class Ticket(BaseModelTimed):
         ForeignKey('promotions.id'))
 
     user: Mapped['User'] = relationship(
-        secondary='users_tickets', back_populates='tickets', lazy='selectin')
+        secondary='users_tickets', back_populates='tickets', lazy='raise_on_sql')
     people: Mapped[List['Person']] = relationship(
-        secondary='people_tickets', back_populates='tickets', lazy='selectin')
+        secondary='people_tickets', back_populates='tickets', lazy='raise_on_sql')
     custom_made_event: Mapped[Optional['CustomMadeEvent']] = relationship(
-        lazy='selectin')
+        lazy='raise_on_sql')
+
+    __table_args__ = (
+        Index('ix__tickets__status_created_at', 'status', 'created_at'),
+        Index('ix__tickets__promo_id', 'promo_id',
+              postgresql_where=text('promo_id IS NOT NULL'),
+              sqlite_where=text('promo_id IS NOT NULL')),
+    )
 
 
 class TypeEvent(BaseModel):
@@ -228,11 +252,11 @@ class TypeEvent(BaseModel):
     notes: Mapped[Optional[str]]
 
     schedule_events: Mapped[List['ScheduleEvent']] = relationship(
-        back_populates='type_event', lazy='selectin')
+        back_populates='type_event', lazy='raise_on_sql')
     base_tickets: Mapped[List['BaseTicket']] = relationship(
         secondary='base_tickets_type_events',
         back_populates='type_events',
-        lazy='selectin')
+        lazy='raise_on_sql')
 
 
 class BaseTicketTypeEvent(BaseModelTimed):
@@ -264,11 +288,11 @@ class TheaterEvent(BaseModel):
     link: Mapped[Optional[str]]
 
     schedule_events: Mapped[List['ScheduleEvent']] = relationship(
-        back_populates='theater_event', lazy='selectin')
+        back_populates='theater_event', lazy='raise_on_sql')
     base_tickets: Mapped[List['BaseTicket']] = relationship(
         secondary='base_tickets_theater_events',
         back_populates='theater_events',
-        lazy='selectin')
+        lazy='raise_on_sql')
 
 
 class BaseTicketTheaterEvent(BaseModelTimed):
@@ -289,12 +313,12 @@ class ScheduleEvent(BaseModelTimed):
     theater_event_id: Mapped[int] = mapped_column(
         ForeignKey('theater_events.id'))
     flag_turn_in_bot: Mapped[bool] = mapped_column(default=False)
-    datetime_event: Mapped[datetime]
+    datetime_event: Mapped[datetime] = mapped_column(index=True)
 
     type_event: Mapped['TypeEvent'] = relationship(
-        back_populates='schedule_events', lazy='selectin')
+        back_populates='schedule_events', lazy='raise_on_sql')
     theater_event: Mapped['TheaterEvent'] = relationship(
-        back_populates='schedule_events', lazy='selectin')
+        back_populates='schedule_events', lazy='raise_on_sql')
 
     qty_child: Mapped[int]
     qty_child_free_seat: Mapped[int]
@@ -311,11 +335,18 @@ class ScheduleEvent(BaseModelTimed):
         Enum(TicketPriceType, name='ticket_price_type'),
         default=TicketPriceType.NONE)
 
-    tickets: Mapped[List['Ticket']] = relationship(lazy='selectin')
+    tickets: Mapped[List['Ticket']] = relationship(lazy='raise_on_sql')
     base_tickets: Mapped[List['BaseTicket']] = relationship(
         secondary='base_tickets_schedule_events',
         back_populates='schedule_events',
-        lazy='selectin')
+        lazy='raise_on_sql')
+
+    __table_args__ = (
+        Index('ix__schedule_events__type_event_id_datetime_event',
+              'type_event_id', 'datetime_event'),
+        Index('ix__schedule_events__theater_event_id_datetime_event',
+              'theater_event_id', 'datetime_event'),
+    )
 
 
 class BaseTicketScheduleEvent(BaseModelTimed):
@@ -375,13 +406,13 @@ class Promotion(BaseModelTimed):
     expire_date: Mapped[Optional[datetime]]
 
     type_events: Mapped[List['TypeEvent']] = relationship(
-        secondary='promotions_type_events', lazy='selectin')
+        secondary='promotions_type_events', lazy='raise_on_sql')
     theater_events: Mapped[List['TheaterEvent']] = relationship(
-        secondary='promotions_theater_events', lazy='selectin')
+        secondary='promotions_theater_events', lazy='raise_on_sql')
     base_tickets: Mapped[List['BaseTicket']] = relationship(
-        secondary='promotions_base_tickets', lazy='selectin')
+        secondary='promotions_base_tickets', lazy='raise_on_sql')
     schedule_events: Mapped[List['ScheduleEvent']] = relationship(
-        secondary='promotions_schedule_events', lazy='selectin')
+        secondary='promotions_schedule_events', lazy='raise_on_sql')
 
     for_who_discount: Mapped[GroupOfPeopleByDiscountType] = mapped_column(
         Enum(GroupOfPeopleByDiscountType, name='group_of_people_by_discount_type')
@@ -401,7 +432,7 @@ class Promotion(BaseModelTimed):
     verification_text: Mapped[Optional[str]]
     weekdays: Mapped[Optional[int]]
 
-    tickets: Mapped[List['Ticket']] = relationship(lazy='selectin')
+    tickets: Mapped[List['Ticket']] = relationship(lazy='raise_on_sql')
 
 
 class CustomMadeFormat(BaseModelTimed):
@@ -467,11 +498,11 @@ class SalesCampaign(BaseModelTimed):
 
     extra_payload: Mapped[Optional[dict]] = mapped_column(JSON)
 
-    theater_event: Mapped['TheaterEvent'] = relationship(lazy='selectin')
+    theater_event: Mapped['TheaterEvent'] = relationship(lazy='raise_on_sql')
     schedules: Mapped[List['SalesCampaignSchedule']] = relationship(
-        back_populates='campaign', lazy='selectin')
+        back_populates='campaign', lazy='raise_on_sql')
     recipients: Mapped[List['SalesRecipient']] = relationship(
-        back_populates='campaign', lazy='selectin')
+        back_populates='campaign', lazy='raise_on_sql')
 
 
 class SalesCampaignSchedule(BaseModelTimed):
@@ -487,8 +518,8 @@ class SalesCampaignSchedule(BaseModelTimed):
         UniqueConstraint('campaign_id', 'schedule_event_id'),
     )
 
-    campaign: Mapped['SalesCampaign'] = relationship(back_populates='schedules', lazy='selectin')
-    schedule_event: Mapped['ScheduleEvent'] = relationship(lazy='selectin')
+    campaign: Mapped['SalesCampaign'] = relationship(back_populates='schedules', lazy='raise_on_sql')
+    schedule_event: Mapped['ScheduleEvent'] = relationship(lazy='raise_on_sql')
 
 
 class SalesRecipient(BaseModelTimed):
@@ -505,9 +536,11 @@ class SalesRecipient(BaseModelTimed):
 
     __table_args__ = (
         UniqueConstraint('campaign_id', 'chat_id'),
+        Index('ix__sales_recipients__campaign_id_status',
+              'campaign_id', 'status'),
     )
 
-    campaign: Mapped['SalesCampaign'] = relationship(back_populates='recipients', lazy='selectin')
+    campaign: Mapped['SalesCampaign'] = relationship(back_populates='recipients', lazy='raise_on_sql')
 
 
 class TelegramUpdate(BaseModelTimed):
@@ -549,6 +582,10 @@ class TelegramUpdate(BaseModelTimed):
     reply_to_message_id: Mapped[Optional[int]] = mapped_column(BigInteger)
     message_thread_id: Mapped[Optional[int]] = mapped_column(BigInteger)
 
+    __table_args__ = (
+        Index('ix__tg_updates__user_id_created_at', 'user_id', 'created_at'),
+    )
+
 
 class BotSettings(BaseModelTimed):
     __tablename__ = 'bot_settings'
@@ -572,7 +609,7 @@ class UserStatus(BaseModelTimed):
     is_blocked_by_admin: Mapped[bool] = mapped_column(default=False)
     blocked_by_admin_id: Mapped[Optional[int]] = mapped_column(BigInteger)
 
-    user: Mapped['User'] = relationship(back_populates='status', lazy='selectin')
+    user: Mapped['User'] = relationship(back_populates='status', lazy='raise_on_sql')
 
 
 class FeedbackTopic(BaseModelTimed):
@@ -621,3 +658,40 @@ class Afisha(BaseModelTimed):
     __table_args__ = (
         UniqueConstraint('month', 'year', name='uq_afisha_month_year'),
     )
+
+
+class OutboxMessage(BaseModelTimed):
+    """
+    Сообщение для NATS, записанное в одной транзакции с изменением данных.
+    Отправляет его db.outbox.OutboxRelay.
+    """
+    __tablename__ = 'outbox'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    subject: Mapped[str]
+    payload: Mapped[dict] = mapped_column(JSON)
+    dedup_key: Mapped[str] = mapped_column(unique=True)
+    attempts: Mapped[int] = mapped_column(default=0)
+    last_error: Mapped[Optional[str]]
+    available_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    sent_at: Mapped[Optional[datetime]]
+
+    __table_args__ = (
+        Index('ix__outbox__pending', 'available_at', 'id',
+              postgresql_where=text('sent_at IS NULL')),
+    )
+
+
+class ScheduleEventOccupancy(BaseModel):
+    """
+    Места, занятые оплаченными и подтвержденными билетами мероприятия.
+    Строку ведет триггер tickets_occupancy в Postgres (миграция rev_25),
+    расхождения с билетами исправляет db.occupancy.reconcile_occupancy.
+    """
+    __tablename__ = 'schedule_event_occupancy'
+
+    schedule_event_id: Mapped[int] = mapped_column(
+        ForeignKey('schedule_events.id', ondelete='CASCADE'),
+        primary_key=True, autoincrement=False)
+    taken_child: Mapped[int] = mapped_column(default=0)
+    taken_adult: Mapped[int] = mapped_column(default=0)
@@ -0,0 +1,106 @@
+"""
+Занятые места по мероприятиям (schedule_event_occupancy).
+
+Таблицу ведет триггер tickets_occupancy на tickets, поэтому свободные
+места читаются по первичному ключу, без суммы по всем билетам.
+reconcile_occupancy сверяет таблицу с суммой по билетам и исправляет
+расхождения: например, после изменения кол-ва мест в базовом билете,
+по которому уже продавали.
+"""
+import logging
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.bulk_upsert import bulk_upsert
+from db.enum import TicketStatus
+from db.models import BaseTicket, ScheduleEventOccupancy, Ticket
+
+occupancy_logger = logging.getLogger('bot.db.occupancy')
+
+TAKEN_STATUSES = (TicketStatus.PAID, TicketStatus.APPROVED)
+
+
+class Taken(NamedTuple):
+    child: int
+    adult: int
+
+
+class OccupancyMismatch(NamedTuple):
+    schedule_event_id: int
+    stored: Taken
+    actual: Taken
+
+
+async def get_taken_seats(
+        session: AsyncSession,
+        schedule_ids: Optional[Sequence[int]] = None
+) -> Dict[int, Taken]:
+    """Сумма мест по оплаченным и подтвержденным билетам."""
+    query = (
+        select(
+            Ticket.schedule_event_id,
+            func.sum(BaseTicket.quality_of_children),
+            func.sum(BaseTicket.quality_of_adult +
+                     BaseTicket.quality_of_add_adult),
+        )
+        .join(BaseTicket, BaseTicket.base_ticket_id == Ticket.base_ticket_id)
+        .where(Ticket.schedule_event_id.is_not(None),
+               Ticket.status.in_(TAKEN_STATUSES))
+        .group_by(Ticket.schedule_event_id)
+    )
+    if schedule_ids is not None:
+        query = query.where(Ticket.schedule_event_id.in_(schedule_ids))
+    return {sid: Taken(int(child), int(adult))
+            for sid, child, adult in (await session.execute(query)).all()}
+
+
+async def get_stored_occupancy(
+        session: AsyncSession,
+        schedule_ids: Optional[Sequence[int]] = None,
+        lock: bool = False
+) -> Dict[int, Taken]:
+    query = select(ScheduleEventOccupancy.schedule_event_id,
+                   ScheduleEventOccupancy.taken_child,
+                   ScheduleEventOccupancy.taken_adult)
+    if schedule_ids is not None:
+        query = query.where(
+            ScheduleEventOccupancy.schedule_event_id.in_(schedule_ids))
+    if lock:
+        query = query.with_for_update()
+    return {sid: Taken(child, adult)
+            for sid, child, adult in (await session.execute(query)).all()}
+
+
+async def reconcile_occupancy(
+        session: AsyncSession,
+        schedule_ids: Optional[Sequence[int]] = None
+) -> List[OccupancyMismatch]:
+    """
+    Сверяет schedule_event_occupancy с суммой по билетам и записывает
+    правильные значения. Возвращает найденные расхождения.
+    """
+    # Сначала блокируются строки: триггер в незавершенной транзакции
+    # дождется сверки и добавит свое изменение к исправленному значению
+    stored = await get_stored_occupancy(session, schedule_ids, lock=True)
+    actual = await get_taken_seats(session, schedule_ids)
+    empty = Taken(0, 0)
+    mismatches = [
+        OccupancyMismatch(sid, stored.get(sid, empty), actual.get(sid, empty))
+        for sid in sorted(actual.keys() | stored.keys())
+        if stored.get(sid, empty) != actual.get(sid, empty)
+    ]
+    if mismatches:
+        await bulk_upsert(session, ScheduleEventOccupancy, [
+            {'schedule_event_id': item.schedule_event_id,
+             'taken_child': item.actual.child,
+             'taken_adult': item.actual.adult}
+            for item in mismatches
+        ])
+    await session.commit()
+    if mismatches:
+        occupancy_logger.warning(
+            f'Занятые места исправлены у мероприятий: '
+            f'{[item.schedule_event_id for item in mismatches]}')
+    return mismatches
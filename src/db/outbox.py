@@ -0,0 +1,252 @@
+"""
+Транзакционный outbox для задач в NATS.
+
+Обработчик записывает сообщение в таблицу outbox в той же транзакции,
+что и изменение мест или билета, и не ждет ни NATS, ни Google Sheets.
+OutboxRelay в фоне забирает неотправленные сообщения пачками и публикует
+их в JetStream с Nats-Msg-Id = dedup_key: доставка как минимум один раз,
+повтор после сбоя JetStream отбрасывает. Пока NATS недоступен, сообщения
+ждут с растущей паузой, а после нескольких неудач задачи gspread
+выполняются напрямую. Неподтвержденное сообщение только повторяется.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api.nats_publisher import (
+    PublishNotConfirmed, PublisherUnavailable, publisher)
+from db.models import OutboxMessage
+
+outbox_logger = logging.getLogger('bot.db.outbox')
+
+BATCH_SIZE = 100
+POLL_INTERVAL = 5.0
+RETRY_DELAY = 2.0
+RETRY_DELAY_MAX = 60.0
+FALLBACK_AFTER = 3
+RETENTION = timedelta(days=1)
+PURGE_INTERVAL = 60 * 60
+
+Publish = Callable[[OutboxMessage], Awaitable[None]]
+Fallback = Callable[[List[Dict[str, Any]]], Awaitable[List[bool]]]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def add_outbox_message(
+        session: AsyncSession,
+        message: Dict[str, Any],
+        subject: str = 'gspread',
+        dedup_key: Optional[str] = None,
+) -> OutboxMessage:
+    """
+    Добавляет сообщение в текущую транзакцию сессии, без commit.
+    Значения, которых нет в JSON (Decimal, datetime), сохраняются строкой.
+    """
+    item = OutboxMessage(
+        subject=subject,
+        payload=json.loads(json.dumps(message, ensure_ascii=False,
+                                      default=str)),
+        dedup_key=dedup_key or uuid.uuid4().hex,
+        attempts=0,
+        available_at=_now(),
+    )
+    session.add(item)
+    return item
+
+
+async def _publish(item: OutboxMessage) -> None:
+    await publisher.publish(
+        item.payload, subject=item.subject, msg_id=item.dedup_key)
+
+
+class OutboxRelay:
+    def __init__(
+            self,
+            publish: Publish = _publish,
+            fallback: Optional[Fallback] = None,
+            *,
+            batch_size: int = BATCH_SIZE,
+            poll_interval: float = POLL_INTERVAL,
+            fallback_after: int = FALLBACK_AFTER,
+    ):
+        self.publish = publish
+        self.fallback = fallback
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.fallback_after = fallback_after
+        self.sessionmaker: Optional[async_sessionmaker] = None
+        self.sent = 0
+        self.failed = 0
+        self.fallback_sent = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._purged_at = float('-inf')
+
+    def wake(self) -> None:
+        """Сообщает, что в outbox есть новые сообщения."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self, sessionmaker: async_sessionmaker) -> None:
+        self.sessionmaker = sessionmaker
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        outbox_logger.info('Отправка outbox запущена')
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        outbox_logger.info('Отправка outbox остановлена')
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.drain()
+                await self._maybe_purge()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                outbox_logger.exception(f'Ошибка отправки outbox: {e}')
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def drain(self) -> int:
+        """Отправляет пачки, пока есть готовые к отправке сообщения."""
+        total = 0
+        while True:
+            sent, has_more = await self.relay_batch()
+            total += sent
+            if not has_more:
+                return total
+
+    async def relay_batch(self) -> Tuple[int, bool]:
+        """
+        Отправляет одну пачку по порядку id. Строки блокируются
+        (SKIP LOCKED), поэтому бот и веб могут отправлять outbox вместе.
+        Возвращает число отправленных и есть ли смысл брать следующую пачку.
+        """
+        now = _now()
+        async with self.sessionmaker() as session:
+            items = (await session.execute(
+                select(OutboxMessage)
+                .where(OutboxMessage.sent_at.is_(None),
+                       OutboxMessage.available_at <= now)
+                .order_by(OutboxMessage.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )).scalars().all()
+            if not items:
+                return 0, False
+
+            sent = 0
+            for i, item in enumerate(items):
+                try:
+                    await self.publish(item)
+                except PublisherUnavailable as e:
+                    # Порядок важен: остальные сообщения пачки ждут вместе
+                    # с этим
+                    sent += await self._postpone(items[i:], e)
+                    await session.commit()
+                    return sent, False
+                except PublishNotConfirmed as e:
+                    # Сообщение могло быть сохранено: только повтор с тем же
+                    # dedup_key, без прямой записи
+                    await self._postpone(items[i:], e, fallback=False)
+                    await session.commit()
+                    return sent, False
+                item.sent_at = _now()
+                self.sent += 1
+                sent += 1
+            await session.commit()
+        return sent, len(items) == self.batch_size
+
+    async def _postpone(
+            self,
+            items: List[OutboxMessage],
+            error: Exception,
+            fallback: bool = True,
+    ) -> int:
+        self.failed += 1
+        for item in items:
+            item.attempts += 1
+            item.last_error = str(error)[:500]
+            delay = min(RETRY_DELAY_MAX, RETRY_DELAY * 2 ** item.attempts)
+            item.available_at = _now() + timedelta(seconds=delay)
+        outbox_logger.warning(
+            f'Outbox: {len(items)} сообщений не отправлено, '
+            f'повтор позже: {error}')
+
+        if (not fallback or self.fallback is None
+                or items[0].attempts < self.fallback_after):
+            return 0
+        tasks = [item for item in items if item.subject == 'gspread']
+        if not tasks:
+            return 0
+        results = await self.fallback([item.payload for item in tasks])
+        done = 0
+        for item, ok in zip(tasks, results):
+            if ok:
+                item.sent_at = _now()
+                done += 1
+        self.fallback_sent += done
+        outbox_logger.info(
+            f'Outbox: {done} из {len(tasks)} задач gspread выполнено напрямую')
+        return done
+
+    async def _maybe_purge(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop.time() - self._purged_at < PURGE_INTERVAL:
+            return
+        self._purged_at = loop.time()
+        async with self.sessionmaker() as session:
+            result = await session.execute(
+                delete(OutboxMessage)
+                .where(OutboxMessage.sent_at < _now() - RETENTION))
+            await session.commit()
+        if result.rowcount:
+            outbox_logger.info(
+                f'Outbox: удалено отправленных сообщений {result.rowcount}')
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'outbox_sent': self.sent,
+            'outbox_failed_batches': self.failed,
+            'outbox_fallback_sent': self.fallback_sent,
+        }
+
+
+async def _process_gspread_tasks(tasks: List[Dict[str, Any]]) -> List[bool]:
+    # Воркер тянет за собой клиент Google Sheets. Веб только добавляет
+    # сообщения в outbox, и ему эти зависимости не нужны
+    from api.gspread_worker import process_gspread_tasks
+    return await process_gspread_tasks(tasks, outbox_logger)
+
+
+outbox_relay = OutboxRelay(fallback=_process_gspread_tasks)
+
+
+def start_outbox_relay(sessionmaker: async_sessionmaker) -> None:
+    outbox_relay.start(sessionmaker)
+
+
+async def stop_outbox_relay() -> None:
+    await outbox_relay.stop()
@@ -0,0 +1,283 @@
+"""
+Кэш справочников процесса: базовые билеты, типы мероприятий, спектакли
+и индивидуальные цены.
+
+Бронирование читает эти строки много раз, а меняются они несколько раз
+в месяц (загрузка из таблицы, правка админом). Кэш хранит неизменяемые
+снимки строк (не ORM-объекты, привязанные к сессии) и загружает каждую
+таблицу целиком одним запросом. Таблица перечитывается после
+уведомления шины инвалидации (db.invalidation) об ее изменении, а пока
+LISTEN не работает — не реже раза в max_age секунд.
+
+Снимки повторяют колонки моделей, поэтому их можно передавать в код,
+который только читает атрибуты. Для изменения строки нужен ORM-объект
+из db_postgres.
+"""
+import logging
+import time
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime, time as time_
+from typing import (
+    Any, Dict, Generic, Iterable, List, Optional, Tuple, Type, TypeVar)
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from db.enum import PriceType
+from db.invalidation import Ids, InvalidationBus, invalidation_bus
+from db.models import BaseTicket, SpecialTicketPrice, TheaterEvent, TypeEvent
+
+reference_cache_logger = logging.getLogger('bot.db.reference_cache')
+
+REFERENCE_MAX_AGE = 60.0
+
+
+@dataclass(frozen=True)
+class BaseTicketRef:
+    base_ticket_id: int
+    flag_active: bool
+    flag_individual: Optional[bool]
+    flag_season_ticket: Optional[bool]
+    name: str
+    cost_main: float
+    cost_privilege: float
+    period_start_change_price: Optional[datetime]
+    period_end_change_price: Optional[datetime]
+    cost_main_in_period: float
+    cost_privilege_in_period: float
+    quality_of_children: int
+    quality_of_adult: int
+    quality_of_add_adult: int
+    quality_visits: int
+
+    get_price_from_date = BaseTicket.get_price_from_date
+    to_dto = BaseTicket.to_dto
+
+
+@dataclass(frozen=True)
+class TypeEventRef:
+    id: int
+    name: str
+    name_alias: str
+    base_price_gift: Optional[int]
+    notes: Optional[str]
+
+
+@dataclass(frozen=True)
+class TheaterEventRef:
+    id: int
+    name: str
+    flag_premier: bool
+    min_age_child: int
+    max_age_child: Optional[int]
+    show_emoji: Optional[str]
+    duration: Optional[time_]
+    flag_active_repertoire: bool
+    flag_active_bd: bool
+    max_num_child_bd: int
+    max_num_adult_bd: int
+    flag_indiv_cost: bool
+    price_type: PriceType
+    note: Optional[str]
+    link: Optional[str]
+
+    def model_dump(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass(frozen=True)
+class SpecialTicketPriceRef:
+    option: str
+    base_ticket_id: int
+    price_weekday: Optional[int]
+    price_weekend: Optional[int]
+
+    def price(self, type_ticket_price: str) -> Optional[int]:
+        if type_ticket_price == 'будни':
+            return self.price_weekday
+        return self.price_weekend
+
+
+K = TypeVar('K')
+R = TypeVar('R')
+
+
+class _Table(Generic[K, R]):
+    """Все строки одной таблицы в виде снимков по ключу."""
+
+    def __init__(self, model, ref: Type[R], key_fields: Tuple[str, ...]):
+        self.model = model
+        self.ref = ref
+        self.key_fields = key_fields
+        self.rows: Optional[Dict[K, R]] = None
+        self.hits = 0
+        self.misses = 0
+        self._loaded_at = 0.0
+        # Растет при каждой инвалидации: строки, прочитанные до нее,
+        # не считаются свежими
+        self._version = 0
+
+    def invalidate(self, ids: Ids = None) -> None:
+        self._version += 1
+        self.rows = None
+
+    def _key(self, row: R) -> K:
+        if len(self.key_fields) == 1:
+            return getattr(row, self.key_fields[0])
+        return tuple(getattr(row, name) for name in self.key_fields)
+
+    async def get_rows(
+            self,
+            session: AsyncSession,
+            max_age: Optional[float]
+    ) -> Dict[K, R]:
+        rows = self.rows
+        if rows is not None and (
+                max_age is None or
+                time.monotonic() - self._loaded_at < max_age):
+            self.hits += 1
+            return rows
+        self.misses += 1
+        version = self._version
+        loaded_at = time.monotonic()
+        columns = [getattr(self.model, field.name)
+                   for field in fields(self.ref)]
+        result = await session.execute(select(*columns))
+        rows = {}
+        for values in result.all():
+            row = self.ref(*values)
+            rows[self._key(row)] = row
+        if version == self._version:
+            self.rows = rows
+            self._loaded_at = loaded_at
+        return rows
+
+
+class ReferenceCache:
+    def __init__(
+            self,
+            bus: InvalidationBus = invalidation_bus,
+            *,
+            max_age: float = REFERENCE_MAX_AGE,
+    ):
+        self.bus = bus
+        self.max_age = max_age
+        self.base_tickets: _Table[int, BaseTicketRef] = _Table(
+            BaseTicket, BaseTicketRef, ('base_ticket_id',))
+        self.type_events: _Table[int, TypeEventRef] = _Table(
+            TypeEvent, TypeEventRef, ('id',))
+        self.theater_events: _Table[int, TheaterEventRef] = _Table(
+            TheaterEvent, TheaterEventRef, ('id',))
+        self.special_prices: _Table[
+            Tuple[str, int], SpecialTicketPriceRef] = _Table(
+            SpecialTicketPrice, SpecialTicketPriceRef,
+            ('option', 'base_ticket_id'))
+        for table in self._tables():
+            bus.subscribe(table.model.__tablename__, table.invalidate)
+
+    def _tables(self) -> List[_Table]:
+        return [self.base_tickets, self.type_events, self.theater_events,
+                self.special_prices]
+
+    def _max_age(self) -> Optional[float]:
+        return None if self.bus.listening else self.max_age
+
+    async def load(self, session: AsyncSession) -> None:
+        """Загружает все справочники (при запуске процесса)."""
+        for table in self._tables():
+            table.invalidate()
+            await table.get_rows(session, self._max_age())
+
+    def invalidate(self) -> None:
+        for table in self._tables():
+            table.invalidate()
+
+    async def get_base_ticket(
+            self,
+            session: AsyncSession,
+            base_ticket_id: int
+    ) -> Optional[BaseTicketRef]:
+        rows = await self.base_tickets.get_rows(session, self._max_age())
+        return rows.get(base_ticket_id)
+
+    async def get_all_base_tickets(
+            self, session: AsyncSession) -> List[BaseTicketRef]:
+        rows = await self.base_tickets.get_rows(session, self._max_age())
+        return [rows[key] for key in sorted(rows)]
+
+    async def get_type_event(
+            self,
+            session: AsyncSession,
+            type_event_id: int
+    ) -> Optional[TypeEventRef]:
+        rows = await self.type_events.get_rows(session, self._max_age())
+        return rows.get(type_event_id)
+
+    async def get_theater_event(
+            self,
+            session: AsyncSession,
+            theater_event_id: int
+    ) -> Optional[TheaterEventRef]:
+        rows = await self.theater_events.get_rows(session, self._max_age())
+        return rows.get(theater_event_id)
+
+    async def get_special_ticket_price(
+            self,
+            session: AsyncSession,
+            option: str,
+            base_ticket_id: int,
+            type_ticket_price: str
+    ) -> Optional[int]:
+        """То же, что db_postgres.get_special_ticket_price."""
+        rows = await self.special_prices.get_rows(session, self._max_age())
+        special_price = rows.get((str(option), base_ticket_id))
+        if special_price is None:
+            return None
+        return special_price.price(type_ticket_price)
+
+    async def get_special_ticket_prices(
+            self,
+            session: AsyncSession,
+            option: str,
+            base_ticket_ids: Iterable[int],
+            type_ticket_price: str
+    ) -> Dict[int, Optional[int]]:
+        """Индивидуальные цены нескольких билетов для одной опции."""
+        rows = await self.special_prices.get_rows(session, self._max_age())
+        option = str(option)
+        prices = {}
+        for base_ticket_id in base_ticket_ids:
+            special_price = rows.get((option, base_ticket_id))
+            prices[base_ticket_id] = (
+                None if special_price is None
+                else special_price.price(type_ticket_price))
+        return prices
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {}
+        for table in self._tables():
+            name = table.model.__tablename__
+            stats[f'reference_{name}_hits'] = table.hits
+            stats[f'reference_{name}_misses'] = table.misses
+            stats[f'reference_{name}_rows'] = len(table.rows or ())
+        return stats
+
+
+reference_cache = ReferenceCache()
+
+
+async def load_reference_cache(sessionmaker: async_sessionmaker) -> None:
+    """
+    Предзагрузка при запуске. Если БД недоступна, процесс все равно
+    стартует: незагруженные справочники читаются при первом обращении.
+    """
+    try:
+        async with sessionmaker() as session:
+            await reference_cache.load(session)
+    except Exception as e:
+        reference_cache_logger.error(
+            f'Справочники не загружены в кэш при запуске, будут загружены '
+            f'при первом обращении: {e}')
+        return
+    reference_cache_logger.info(
+        f'Справочники загружены в кэш: {reference_cache.stats()}')
@@ -7,8 +7,9 @@ from typing import Iterable, List, Optional, Tuple
 from sqlalchemy import select, delete, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.enum import TicketStatus
-from db.models import SalesCampaign, SalesCampaignSchedule, SalesRecipient, ScheduleEvent, Ticket, BaseTicket
+from db.models import (
+    SalesCampaign, SalesCampaignSchedule, SalesRecipient, ScheduleEvent,
+    ScheduleEventOccupancy)
 
 
 async def create_campaign(session: AsyncSession, *,
@@ -93,40 +94,24 @@ async def mark_recipient_status(session: AsyncSession, recipient_id: int, status
 
 async def get_free_places(session: AsyncSession, schedule_ids: List[int]):
     """Return mapping schedule_id -> (free_child, free_adult).
-    Accurate calculation based on tickets: free = total - taken, clamped to 0.
-    taken_child = SUM(BaseTicket.quality_of_children) over PAID/APPROVED tickets
-    taken_adult = SUM(BaseTicket.quality_of_adult + BaseTicket.quality_of_add_adult)
+    free = total - taken, clamped to 0. Taken seats of PAID/APPROVED tickets
+    are read from schedule_event_occupancy by primary key.
     """
     if not schedule_ids:
         return {}
 
     ids = list({int(s) for s in schedule_ids})
 
-    # Aggregate taken seats per schedule from tickets joined to base tickets
-    agg = (
-        select(
-            Ticket.schedule_event_id.label('sid'),
-            func.coalesce(func.sum(BaseTicket.quality_of_children), 0).label('taken_child'),
-            func.coalesce(func.sum(BaseTicket.quality_of_adult + BaseTicket.quality_of_add_adult), 0).label('taken_adult'),
-        )
-        .join(BaseTicket, BaseTicket.base_ticket_id == Ticket.base_ticket_id)
-        .where(Ticket.schedule_event_id.in_(ids))
-        .where(Ticket.status.in_([TicketStatus.PAID, TicketStatus.APPROVED]))
-        .group_by(Ticket.schedule_event_id)
-        .subquery()
-    )
-
     q = (
         select(
             ScheduleEvent.id,
-            func.greatest(
-                ScheduleEvent.qty_child - func.coalesce(agg.c.taken_child, 0), 0
-            ).label('free_child'),
-            func.greatest(
-                ScheduleEvent.qty_adult - func.coalesce(agg.c.taken_adult, 0), 0
-            ).label('free_adult'),
+            ScheduleEvent.qty_child - func.coalesce(
+                ScheduleEventOccupancy.taken_child, 0),
+            ScheduleEvent.qty_adult - func.coalesce(
+                ScheduleEventOccupancy.taken_adult, 0),
         )
-        .outerjoin(agg, agg.c.sid == ScheduleEvent.id)
+        .outerjoin(ScheduleEventOccupancy,
+                   ScheduleEventOccupancy.schedule_event_id == ScheduleEvent.id)
         .where(ScheduleEvent.id.in_(ids))
     )
 
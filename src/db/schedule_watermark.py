@@ -0,0 +1,77 @@
+"""
+Время последнего изменения расписания для reserve_check.
+
+check_reserve_actual_middleware на каждом нажатии кнопки сравнивает
+время последнего действия пользователя с max(schedule_events.updated_at).
+Значение хранится в памяти процесса и перечитывается из БД только после
+изменения расписания. Об изменениях сообщает шина инвалидации
+(db.invalidation): своего процесса — после коммита, других процессов —
+через NOTIFY schedule_events_changed от триггера из миграции rev_27.
+Пока LISTEN не работает (sqlite, обрыв соединения), значение
+перечитывается не чаще раза в max_age секунд.
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.db_postgres import get_last_schedule_update_time
+from db.invalidation import InvalidationBus, Ids, invalidation_bus
+
+WATERMARK_MAX_AGE = 30.0
+
+
+class ScheduleWatermark:
+    def __init__(
+            self,
+            bus: InvalidationBus = invalidation_bus,
+            *,
+            max_age: float = WATERMARK_MAX_AGE,
+    ):
+        self.bus = bus
+        self.max_age = max_age
+        self.value: Optional[datetime] = None
+        self.hits = 0
+        self.loads = 0
+        self.invalidations = 0
+        self._loaded_at: Optional[float] = None
+        # Растет при каждой инвалидации: значение, прочитанное до нее,
+        # не считается свежим
+        self._version = 0
+        bus.subscribe('schedule_events', self.invalidate)
+
+    def invalidate(self, ids: Ids = None) -> None:
+        self._version += 1
+        self._loaded_at = None
+        self.invalidations += 1
+
+    def _is_fresh(self) -> bool:
+        if self._loaded_at is None:
+            return False
+        return (self.bus.listening or
+                time.monotonic() - self._loaded_at < self.max_age)
+
+    async def get(self, session: AsyncSession) -> datetime:
+        """Время последнего изменения расписания."""
+        if self._is_fresh():
+            self.hits += 1
+            return self.value
+        version = self._version
+        loaded_at = time.monotonic()
+        value = await get_last_schedule_update_time(session)
+        self.loads += 1
+        self.value = value
+        if version == self._version:
+            self._loaded_at = loaded_at
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'schedule_watermark_hits': self.hits,
+            'schedule_watermark_loads': self.loads,
+            'schedule_watermark_invalidations': self.invalidations,
+        }
+
+
+schedule_watermark = ScheduleWatermark()
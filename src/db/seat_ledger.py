@@ -0,0 +1,144 @@
+"""
+Атомарный учет мест в расписании (ScheduleEvent).
+
+Каждое изменение применяется одним условным запросом
+UPDATE ... SET qty = qty + delta WHERE qty + delta >= 0 RETURNING ...,
+поэтому параллельные бронирования из бота и с сайта не перетирают друг
+друга, а счетчики не уходят в минус.
+"""
+import logging
+from typing import NamedTuple, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import BaseTicket, ScheduleEvent
+
+seat_ledger_logger = logging.getLogger('bot.db.seat_ledger')
+
+
+class SeatCounts(NamedTuple):
+    qty_child_free_seat: int
+    qty_child_nonconfirm_seat: int
+    qty_adult_free_seat: int
+    qty_adult_nonconfirm_seat: int
+
+
+class SeatDelta(NamedTuple):
+    child_free: int = 0
+    child_nonconfirm: int = 0
+    adult_free: int = 0
+    adult_nonconfirm: int = 0
+
+    def __add__(self, other: 'SeatDelta') -> 'SeatDelta':
+        return SeatDelta(*(a + b for a, b in zip(self, other)))
+
+    def __neg__(self) -> 'SeatDelta':
+        return SeatDelta(*(-a for a in self))
+
+    @staticmethod
+    def _seats(base_ticket: BaseTicket):
+        q_child = base_ticket.quality_of_children
+        q_adult = base_ticket.quality_of_adult + base_ticket.quality_of_add_adult
+        return q_child, q_adult
+
+    @classmethod
+    def reserve(cls, base_ticket: BaseTicket) -> 'SeatDelta':
+        """Свободные -> неподтвержденные (бронь до оплаты)."""
+        q_child, q_adult = cls._seats(base_ticket)
+        return cls(-q_child, q_child, -q_adult, q_adult)
+
+    @classmethod
+    def release_reserve(cls, base_ticket: BaseTicket) -> 'SeatDelta':
+        """Неподтвержденные -> свободные (отмена неоплаченной брони)."""
+        return -cls.reserve(base_ticket)
+
+    @classmethod
+    def take_free(cls, base_ticket: BaseTicket) -> 'SeatDelta':
+        q_child, q_adult = cls._seats(base_ticket)
+        return cls(child_free=-q_child, adult_free=-q_adult)
+
+    @classmethod
+    def return_free(cls, base_ticket: BaseTicket) -> 'SeatDelta':
+        return -cls.take_free(base_ticket)
+
+    @classmethod
+    def confirm(cls, base_ticket: BaseTicket) -> 'SeatDelta':
+        """Списание неподтвержденных мест после оплаты."""
+        q_child, q_adult = cls._seats(base_ticket)
+        return cls(child_nonconfirm=-q_child, adult_nonconfirm=-q_adult)
+
+    @classmethod
+    def change_ticket(
+            cls,
+            old_base_ticket: BaseTicket,
+            new_base_ticket: BaseTicket
+    ) -> 'SeatDelta':
+        """Замена типа билета: вернуть места старого, занять места нового."""
+        return (cls.return_free(old_base_ticket)
+                + cls.take_free(new_base_ticket))
+
+
+_COLUMNS = {
+    'child_free': ScheduleEvent.qty_child_free_seat,
+    'child_nonconfirm': ScheduleEvent.qty_child_nonconfirm_seat,
+    'adult_free': ScheduleEvent.qty_adult_free_seat,
+    'adult_nonconfirm': ScheduleEvent.qty_adult_nonconfirm_seat,
+}
+
+
+def _build_update(schedule_event_id: int, delta: SeatDelta):
+    values = {}
+    guards = []
+    for name, value in delta._asdict().items():
+        if not value:
+            continue
+        column = _COLUMNS[name]
+        values[column.key] = column + value
+        if value < 0:
+            guards.append(column >= -value)
+    return (
+        update(ScheduleEvent)
+        .where(ScheduleEvent.id == schedule_event_id, *guards)
+        .values(**values)
+        .returning(*_COLUMNS.values())
+        .execution_options(synchronize_session='fetch')
+    )
+
+
+async def _execute(
+        session: AsyncSession,
+        schedule_event_id: int,
+        delta: SeatDelta
+) -> Optional[SeatCounts]:
+    if any(delta):
+        statement = _build_update(schedule_event_id, delta)
+    else:
+        statement = (select(*_COLUMNS.values())
+                     .where(ScheduleEvent.id == schedule_event_id))
+    result = await session.execute(statement)
+    row = result.one_or_none()
+    if row is None:
+        seat_ledger_logger.warning(
+            f'Не применено изменение мест {delta} у {schedule_event_id=}: '
+            f'недостаточно мест или событие не найдено')
+        return None
+    return SeatCounts(*row)
+
+
+async def apply_seat_delta(
+        session: AsyncSession,
+        schedule_event_id: int,
+        delta: SeatDelta,
+        *,
+        commit: bool = True,
+) -> Optional[SeatCounts]:
+    """
+    Применяет изменение мест одним запросом.
+    Возвращает новые значения счетчиков или None, если мест недостаточно.
+    """
+    counts = await _execute(session, int(schedule_event_id), delta)
+    if counts is not None and commit:
+        await session.commit()
+    return counts
+
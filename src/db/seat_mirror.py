@@ -0,0 +1,183 @@
+"""
+Зеркало мест из Postgres в 'База спектаклей_'.
+
+В режиме зеркала (sheets.seat_mirror) изменения мест не ставят задачи
+write_data_reserve на каждую бронь. Вместо этого SeatMirror раз в
+interval секунд читает счетчики мест всех будущих мероприятий, сравнивает
+их с последним записанным снимком и записывает только изменившиеся
+ячейки одним values_batch_update. Сразу после запуска снимка нет, и
+первый проход записывает места всех будущих мероприятий. Источник
+истины для мест — Postgres, а число запросов к таблице не зависит от
+скорости продаж.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from api.googlesheets import SheetWriteBatch, add_seat_counts, write_batch
+from db.models import ScheduleEvent
+from db.seat_ledger import SeatCounts
+
+seat_mirror_logger = logging.getLogger('bot.db.seat_mirror')
+
+MIRROR_INTERVAL = 15.0
+
+SeatCells = Dict[int, Dict[str, int]]
+Write = Callable[[str, SeatCells], Awaitable[List[int]]]
+
+
+async def read_seat_counts(
+        sessionmaker: async_sessionmaker) -> Dict[int, SeatCounts]:
+    """Счетчики мест всех мероприятий, которые еще не прошли."""
+    async with sessionmaker() as session:
+        result = await session.execute(
+            select(ScheduleEvent.id,
+                   *(getattr(ScheduleEvent, name)
+                     for name in SeatCounts._fields))
+            .where(ScheduleEvent.datetime_event >= datetime.now())
+        )
+        return {row[0]: SeatCounts(*row[1:]) for row in result.all()}
+
+
+def diff_seat_counts(
+        snapshot: Dict[int, SeatCounts],
+        current: Dict[int, SeatCounts]
+) -> SeatCells:
+    """Изменившиеся счетчики: {event_id: {колонка: значение}}."""
+    cells = {}
+    unknown = (None,) * len(SeatCounts._fields)
+    for event_id, seats in current.items():
+        old = snapshot.get(event_id, unknown)
+        changed = {name: value
+                   for name, value, was in zip(SeatCounts._fields, seats, old)
+                   if value != was}
+        if changed:
+            cells[event_id] = changed
+    return cells
+
+
+async def write_seat_counts(
+        spreadsheet_id: str,
+        cells: SeatCells
+) -> List[int]:
+    """
+    Записывает счетчики одним values_batch_update.
+    Возвращает id мероприятий, которых нет в таблице.
+    """
+    batch = SheetWriteBatch()
+    missing = []
+    for event_id, seats in cells.items():
+        try:
+            await add_seat_counts(batch, spreadsheet_id, event_id, seats)
+        except ValueError:
+            missing.append(event_id)
+    await write_batch(spreadsheet_id, batch)
+    return missing
+
+
+class SeatMirror:
+    def __init__(
+            self,
+            write: Write = write_seat_counts,
+            *,
+            interval: float = MIRROR_INTERVAL,
+    ):
+        self.write = write
+        self.interval = interval
+        self.sessionmaker: Optional[async_sessionmaker] = None
+        self.spreadsheet_id: Optional[str] = None
+        # Что сейчас записано в таблице, по данным последних записей
+        self.snapshot: Dict[int, SeatCounts] = {}
+        self.runs = 0
+        self.cells_written = 0
+        self.failed = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(
+            self,
+            sessionmaker: async_sessionmaker,
+            spreadsheet_id: str
+    ) -> None:
+        self.sessionmaker = sessionmaker
+        self.spreadsheet_id = spreadsheet_id
+        self._task = asyncio.create_task(self._run())
+        seat_mirror_logger.info(
+            f'Зеркало мест запущено, интервал {self.interval} с')
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        seat_mirror_logger.info('Зеркало мест остановлено')
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.mirror_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                seat_mirror_logger.exception(
+                    f'Не удалось записать места в таблицу: {e}')
+            await asyncio.sleep(self.interval)
+
+    async def mirror_once(self) -> int:
+        """
+        Записывает мероприятия, у которых места изменились с прошлого
+        раза. При ошибке записи снимок не меняется, и все изменения уйдут
+        в следующий раз. Возвращает число записанных мероприятий.
+        """
+        current = await read_seat_counts(self.sessionmaker)
+        changed = diff_seat_counts(self.snapshot, current)
+        self.runs += 1
+        if not changed:
+            self.snapshot = current
+            return 0
+
+        missing = await self.write(self.spreadsheet_id, changed)
+        if missing:
+            # Повторять каждый раз бесполезно: индекс листа перечитывался
+            # бы на каждом запуске. Запишутся при следующем изменении мест
+            seat_mirror_logger.warning(
+                f'Мероприятий нет в таблице, места не записаны: {missing}')
+        self.snapshot = current
+        written = len(changed) - len(missing)
+        self.cells_written += sum(
+            len(seats) for event_id, seats in changed.items()
+            if event_id not in missing)
+        seat_mirror_logger.info(f'Места записаны в таблицу: {written}')
+        return written
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'seat_mirror_runs': self.runs,
+            'seat_mirror_cells': self.cells_written,
+            'seat_mirror_failed': self.failed,
+            'seat_mirror_events': len(self.snapshot),
+        }
+
+
+seat_mirror = SeatMirror()
+
+
+def start_seat_mirror(
+        sessionmaker: async_sessionmaker,
+        spreadsheet_id: str,
+        interval: float = MIRROR_INTERVAL,
+) -> None:
+    seat_mirror.interval = interval
+    seat_mirror.start(sessionmaker, spreadsheet_id)
+
+
+async def stop_seat_mirror() -> None:
+    await seat_mirror.stop()
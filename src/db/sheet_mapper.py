@@ -0,0 +1,206 @@
+"""
+Разбор строк листа Google Sheets в DTO.
+
+Индексы колонок для полей DTO вычисляются один раз на загрузку листа,
+короткие строки дополняются до последней колонки, строки отсеиваются по
+активности и дате до создания DTO, оставшиеся проверяются одним вызовом
+TypeAdapter. Ошибки по листу пишутся в лог одной записью.
+"""
+import datetime
+import logging
+from functools import lru_cache
+from operator import itemgetter
+from typing import (
+    Any, Callable, Dict, Generic, List, Optional, Sequence, Tuple, Type,
+    TypeVar)
+
+from pydantic import TypeAdapter, ValidationError
+
+sheet_mapper_logger = logging.getLogger('bot.db.sheet_mapper')
+
+T = TypeVar('T')
+MAX_LOGGED_ERRORS = 5
+
+# Ячейка, которой нет в строке (API не возвращает пустые ячейки в конце
+# строки), у поля со значением по умолчанию: в DTO поле не передается
+_OMITTED = object()
+
+_bool_adapter = TypeAdapter(bool)
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(dto_cls: Type[T]) -> TypeAdapter:
+    return TypeAdapter(List[dto_cls])
+
+
+def _parse_flag(value: Any) -> Optional[bool]:
+    """Значение флага по правилам pydantic, None — если это не флаг."""
+    try:
+        return _bool_adapter.validate_python(value)
+    except ValidationError:
+        return None
+
+
+class RowMapper(Generic[T]):
+    """
+    Сопоставление колонок листа с полями dto_cls.
+    Поля без колонки не передаются в DTO: обязательные из них попадают в
+    missing, необязательные получают значение по умолчанию.
+    """
+
+    def __init__(
+            self,
+            dto_cls: Type[T],
+            column_map: Dict[int | str, int],
+            name_sh: str = '',
+    ):
+        self.dto_cls = dto_cls
+        self.column_map = column_map
+        self.name_sh = name_sh
+
+        model_fields = dto_cls.model_fields
+        self.fields = tuple(name for name in model_fields
+                            if name in column_map)
+        self.missing = tuple(
+            name for name, info in model_fields.items()
+            if name not in column_map and info.is_required())
+        indexes = tuple(column_map[name] for name in self.fields)
+        self.width = max(indexes, default=-1) + 1
+        # Чем дополняется каждая колонка короткой строки: пустая ячейка для
+        # обязательного поля, пропуск для поля со значением по умолчанию
+        optional = {index for name, index in zip(self.fields, indexes)
+                    if not model_fields[name].is_required()}
+        optional -= {index for name, index in zip(self.fields, indexes)
+                     if model_fields[name].is_required()}
+        self._tail: List[Any] = [_OMITTED if index in optional else ''
+                                 for index in range(self.width)]
+        if len(indexes) == 1:
+            self._get_values = lambda row: (row[indexes[0]],)
+        elif indexes:
+            self._get_values = itemgetter(*indexes)
+        else:
+            self._get_values = lambda row: ()
+
+    def pad(self, rows: Sequence[List[Any]]) -> List[List[Any]]:
+        """
+        Дополняет короткие строки до последней колонки: обязательные поля
+        получают пустую ячейку, поля со значением по умолчанию в DTO не
+        передаются, как если бы строка была прочитана по одной ячейке.
+        """
+        width = self.width
+        tail = self._tail
+        return [row if len(row) >= width else row + tail[len(row):]
+                for row in rows]
+
+    def to_dicts(self, rows: Sequence[List[Any]]) -> List[Dict[str, Any]]:
+        fields = self.fields
+        return [
+            dict(zip(fields, values)) if _OMITTED not in values
+            else {name: value for name, value in zip(fields, values)
+                  if value is not _OMITTED}
+            for values in map(self._get_values, rows)]
+
+    def _cell(self, row: List[Any], name: str) -> Any:
+        """Значение поля в дополненной строке для фильтров."""
+        value = row[self.column_map[name]]
+        if value is _OMITTED:
+            return self.dto_cls.model_fields[name].get_default(
+                call_default_factory=True)
+        return value
+
+    def validate(
+            self,
+            rows: Sequence[List[Any]],
+            row_numbers: Sequence[int],
+    ) -> List[T]:
+        """
+        Создает DTO из дополненных строк. Строки с ошибками пропускаются,
+        ошибки пишутся в лог одной записью с номерами строк листа.
+        """
+        items = self.to_dicts(rows)
+        adapter = _list_adapter(self.dto_cls)
+        try:
+            return adapter.validate_python(items)
+        except ValidationError as exc:
+            errors = exc.errors()
+
+        # Ошибки собраны по всем строкам сразу, повторная проверка — только
+        # для корректных строк
+        bad_rows: Dict[int, List[Dict[str, Any]]] = {}
+        for error in errors:
+            bad_rows.setdefault(error['loc'][0], []).append(error)
+        self._log_errors(bad_rows, row_numbers)
+        return adapter.validate_python(
+            [item for i, item in enumerate(items) if i not in bad_rows])
+
+    def _log_errors(
+            self,
+            bad_rows: Dict[int, List[Dict[str, Any]]],
+            row_numbers: Sequence[int],
+    ) -> None:
+        # Об отсутствующих колонках уже сказано один раз на лист
+        reported = {(name,) for name in self.missing}
+        details = []
+        for i, errors in list(bad_rows.items())[:MAX_LOGGED_ERRORS]:
+            fields = ', '.join(
+                f'{".".join(map(str, error["loc"][1:]))}: {error["type"]}'
+                for error in errors
+                if error['type'] != 'missing'
+                or error['loc'][1:] not in reported)
+            details.append(f'строка {row_numbers[i]} ({fields})')
+        if len(bad_rows) > MAX_LOGGED_ERRORS:
+            details.append(f'и еще {len(bad_rows) - MAX_LOGGED_ERRORS}')
+        sheet_mapper_logger.error(
+            f'{self.name_sh}: пропущено строк с ошибками {len(bad_rows)}: '
+            + '; '.join(details))
+
+    def load(
+            self,
+            data: Sequence[List[Any]],
+            *,
+            active_attr: Optional[str] = None,
+            date_field: Optional[str] = None,
+            parse_date: Optional[Callable[[Any], datetime.date]] = None,
+    ) -> List[T]:
+        """
+        Разбирает строки листа без заголовков (data[0] — 3-я строка листа).
+        active_attr — отбросить строки с выключенным флагом;
+        date_field и parse_date — отбросить строки с прошедшей датой.
+        Фильтры смотрят на ячейки до создания DTO, строки с нераспознанным
+        значением не отбрасываются и проверяются вместе с остальными.
+        """
+        if self.missing:
+            sheet_mapper_logger.error(
+                f'{self.name_sh}: нет колонок {", ".join(self.missing)}')
+
+        rows = self.pad(data)
+        row_numbers = range(3, 3 + len(rows))
+        selected: List[Tuple[int, List[Any]]] = list(zip(row_numbers, rows))
+
+        if active_attr in self.column_map:
+            selected = [(number, row) for number, row in selected
+                        if _parse_flag(self._cell(row, active_attr))
+                        is not False]
+
+        if date_field in self.column_map and parse_date is not None:
+            today = datetime.date.today()
+            selected = [(number, row) for number, row in selected
+                        if not _is_past(self._cell(row, date_field),
+                                        parse_date, today)]
+
+        return self.validate([row for _, row in selected],
+                             [number for number, _ in selected])
+
+
+def _is_past(
+        value: Any,
+        parse_date: Callable[[Any], datetime.date],
+        today: datetime.date,
+) -> bool:
+    try:
+        event_date = parse_date(value)
+    except (TypeError, ValueError, OverflowError):
+        return False
+    if isinstance(event_date, datetime.datetime):
+        event_date = event_date.date()
+    return event_date < today
@@ -0,0 +1,80 @@
+"""
+Значения полей мероприятия для клиентских листов Google Sheets.
+
+Раньше каждая строка 'База клиентов_' и 'Лист ожидания_' получала пять
+формул VLOOKUP(INDIRECT(...)) по листу 'Расписание', а строка 'База ДР_'
+еще одну по 'Репертуар'. Формулы пересчитываются на каждое изменение
+таблицы, поэтому при нескольких тысячах строк таблица тормозит. Здесь
+значения берутся из Postgres в момент записи; колонка определяется по
+заголовку во второй строке листа, как и в формуле. Для колонок, которых
+нет в SHEET_EVENT_FIELDS, запись оставляет формулу.
+"""
+from datetime import datetime, timezone
+from typing import Any, Callable, Collection, Dict
+
+import pytz
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import ScheduleEvent, TheaterEvent
+
+TZ = pytz.timezone('Europe/Moscow')
+
+
+def _local(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(TZ)
+
+
+SHEET_EVENT_FIELDS: Dict[str, Callable[[ScheduleEvent, str], Any]] = {
+    'event_id': lambda event, name: event.id,
+    'event_type': lambda event, name: event.type_event_id,
+    'theater_event_id': lambda event, name: event.theater_event_id,
+    'name': lambda event, name: name,
+    'date_show': lambda event, name: _local(
+        event.datetime_event).strftime('%d.%m.%Y'),
+    'time_show': lambda event, name: _local(
+        event.datetime_event).strftime('%H:%M'),
+    'qty_child': lambda event, name: event.qty_child,
+    'qty_adult': lambda event, name: event.qty_adult,
+    'flag_gift': lambda event, name: event.flag_gift,
+    'flag_christmas_tree': lambda event, name: event.flag_christmas_tree,
+    'flag_santa': lambda event, name: event.flag_santa,
+    'ticket_price_type': lambda event, name: (
+        event.ticket_price_type.value or ''),
+}
+
+
+async def get_sheet_event_values(
+        session: AsyncSession,
+        event_ids: Collection[int]
+) -> Dict[int, Dict[str, Any]]:
+    """
+    Возвращает {event_id: {заголовок колонки: значение}} одним запросом.
+    Мероприятий, которых нет в базе, в ответе нет: для них в таблицу
+    пишутся формулы.
+    """
+    if not event_ids:
+        return {}
+    result = await session.execute(
+        select(ScheduleEvent, TheaterEvent.name)
+        .join(TheaterEvent,
+              TheaterEvent.id == ScheduleEvent.theater_event_id)
+        .where(ScheduleEvent.id.in_(set(event_ids)))
+    )
+    return {
+        event.id: {key: get_value(event, name)
+                   for key, get_value in SHEET_EVENT_FIELDS.items()}
+        for event, name in result.all()
+    }
+
+
+async def get_theater_event_name(
+        session: AsyncSession,
+        theater_event_id: int | None
+) -> str | None:
+    if theater_event_id is None:
+        return None
+    return await session.scalar(
+        select(TheaterEvent.name).where(TheaterEvent.id == theater_event_id))
@@ -0,0 +1,100 @@
+"""
+Цены базовых билетов на сеанс.
+
+Список билетов в боте и форма бронирования на сайте показывают цены
+всех билетов сеанса. resolve_ticket_prices считает их за один вызов:
+цену периода (BaseTicket.get_price_from_date), опцию сеанса (подарок,
+ёлка, тип цены спектакля), будни/выходные и индивидуальные цены. Все
+индивидуальные цены сеанса берутся из кэша справочников одним чтением
+special_ticket_prices, а не запросом на каждый билет.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Optional, Sequence, Union
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.enum import PriceType
+from db.models import BaseTicket, ScheduleEvent, TheaterEvent
+from db.reference_cache import BaseTicketRef, TheaterEventRef, reference_cache
+
+Price = Union[int, float, Decimal]
+
+
+@dataclass(frozen=True)
+class TicketPrice:
+    price: Price
+    price_privilege: Price
+    # Для спектакля с индивидуальной стоимостью не нашлась цена билета,
+    # в price осталась цена периода
+    special_missing: bool = False
+
+
+def get_price_option(
+        schedule_event: ScheduleEvent,
+        theater_event: Union[TheaterEvent, TheaterEventRef]
+) -> str:
+    """Опция, по которой ищется индивидуальная цена."""
+    if schedule_event.flag_christmas_tree:
+        return 'Ёлка'
+    if schedule_event.flag_gift:
+        return 'Подарок'
+    price_type = theater_event.price_type
+    if price_type == PriceType.INDIVIDUAL:
+        return str(theater_event.id)
+    return str(price_type.value)
+
+
+def get_type_ticket_price(
+        schedule_event: ScheduleEvent,
+        date_for_price: Optional[datetime] = None
+) -> str:
+    """Будни или выходные: из сеанса, иначе по дню недели."""
+    type_ticket_price = schedule_event.ticket_price_type.value
+    if not type_ticket_price:
+        if not date_for_price:
+            date_for_price = schedule_event.datetime_event
+        if date_for_price.weekday() in range(5):
+            type_ticket_price = 'будни'
+        else:
+            type_ticket_price = 'выходные'
+    return type_ticket_price
+
+
+async def resolve_ticket_prices(
+        session: AsyncSession,
+        schedule_event: ScheduleEvent,
+        theater_event: Union[TheaterEvent, TheaterEventRef],
+        base_tickets: Sequence[Union[BaseTicket, BaseTicketRef]],
+        date_for_price: Optional[datetime] = None,
+) -> Dict[int, TicketPrice]:
+    """
+    Цены билетов base_tickets на сеанс по base_ticket_id.
+
+    date_for_price — время сеанса с часовым поясом (колонки периода цены
+    в БД тоже aware), по нему выбираются цена периода и будни/выходные.
+    По умолчанию datetime_event.
+    """
+    if date_for_price is None:
+        date_for_price = schedule_event.datetime_event
+    special_prices = {}
+    if theater_event.flag_indiv_cost:
+        special_prices = await reference_cache.get_special_ticket_prices(
+            session,
+            get_price_option(schedule_event, theater_event),
+            [ticket.base_ticket_id for ticket in base_tickets],
+            get_type_ticket_price(schedule_event, date_for_price),
+        )
+
+    prices = {}
+    for ticket in base_tickets:
+        price, price_privilege = ticket.get_price_from_date(date_for_price)
+        special_price = special_prices.get(ticket.base_ticket_id)
+        if special_price is not None:
+            price = special_price
+        prices[ticket.base_ticket_id] = TicketPrice(
+            price, price_privilege,
+            special_missing=(theater_event.flag_indiv_cost and
+                             special_price is None))
+    return prices
@@ -0,0 +1,132 @@
+"""
+Кэш статусов пользователей для middleware user_status.
+
+Middleware на каждом обновлении проверяет, не в черном ли списке
+пользователь и не заблокировал ли он бота. Статусы меняются редко:
+командой /set_user_status, при блокировке бота (on_my_chat_member_update)
+и при ошибке отправки сообщения, — все через update_user_status.
+
+Кэш хранит флаги статуса по user_id (LRU на maxsize записей, каждая
+запись живет не дольше ttl секунд). Запись в кэше означает, что
+пользователь и его статус есть в БД, поэтому обычное обновление не
+обращается к БД вовсе. Изменения user_statuses сбрасывают записи через
+шину инвалидации (db.invalidation): своего процесса — после коммита,
+других процессов — по NOTIFY user_statuses_changed.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import db_postgres
+from db.invalidation import Ids, InvalidationBus, invalidation_bus
+
+USER_STATUS_MAXSIZE = 10000
+USER_STATUS_TTL = 300.0
+
+
+@dataclass(frozen=True)
+class UserStatusFlags:
+    is_blacklisted: bool = False
+    is_blocked_by_user: bool = False
+    is_blocked_by_admin: bool = False
+
+
+class UserStatusCache:
+    def __init__(
+            self,
+            bus: InvalidationBus = invalidation_bus,
+            *,
+            maxsize: int = USER_STATUS_MAXSIZE,
+            ttl: float = USER_STATUS_TTL,
+    ):
+        self.bus = bus
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[
+            int, Tuple[float, UserStatusFlags]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.invalidations = 0
+        # Растет при каждой инвалидации: флаги, прочитанные до нее,
+        # в кэш не попадают
+        self._version = 0
+        bus.subscribe('user_statuses', self.invalidate)
+
+    def invalidate(self, ids: Ids = None) -> None:
+        self._version += 1
+        self.invalidations += 1
+        if ids is None:
+            self._entries.clear()
+            return
+        for user_id in ids:
+            self._entries.pop(user_id, None)
+
+    def _get_cached(self, user_id: int) -> Optional[UserStatusFlags]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        loaded_at, flags = entry
+        if time.monotonic() - loaded_at >= self.ttl:
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return flags
+
+    def _put(self, user_id: int, flags: UserStatusFlags,
+             loaded_at: float) -> None:
+        self._entries[user_id] = (loaded_at, flags)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def get(
+            self,
+            session: AsyncSession,
+            user_id: int,
+            chat_id: int,
+            *,
+            username: Optional[str] = None,
+    ) -> UserStatusFlags:
+        """
+        Флаги статуса пользователя. Если пользователя или статуса нет
+        в БД, создает их.
+        """
+        flags = self._get_cached(user_id)
+        if flags is not None:
+            self.hits += 1
+            return flags
+        self.misses += 1
+        version = self._version
+        loaded_at = time.monotonic()
+        row = await db_postgres.get_user_status_flags(session, user_id)
+        if row is None:
+            if await db_postgres.ensure_user(
+                    session, user_id, chat_id, username=username):
+                self.created += 1
+            status = await db_postgres.get_or_create_user_status(
+                session, user_id)
+            row = (status.is_blacklisted, status.is_blocked_by_user,
+                   status.is_blocked_by_admin)
+            await session.commit()
+            # Статус, созданный этим коммитом, сбросил кэш через шину
+            version = self._version
+        flags = UserStatusFlags(*(bool(value) for value in row))
+        if version == self._version:
+            self._put(user_id, flags, loaded_at)
+        return flags
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'user_status_hits': self.hits,
+            'user_status_misses': self.misses,
+            'user_status_created': self.created,
+            'user_status_invalidations': self.invalidations,
+            'user_status_size': len(self._entries),
+        }
+
+
+user_status_cache = UserStatusCache()
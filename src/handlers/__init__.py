@@ -38,16 +38,14 @@ async def check_user_db(update, context: 'ContextTypes.DEFAULT_TYPE'):
     context.user_data['user'] = update.effective_user
     
     logger = logging.getLogger(__name__)
-    res = await db_postgres.get_user(context.session, update.effective_user.id)
-    if not res:
-        res = await db_postgres.create_user(
-            context.session,
-            update.effective_user.id,
-            update.effective_chat.id,
-            username=update.effective_user.username
-        )
-        if res:
-            logger.info(
-                f'Пользователь {res} начал общение с ботом')
+    created = await db_postgres.ensure_user(
+        context.session,
+        update.effective_user.id,
+        update.effective_chat.id,
+        username=update.effective_user.username
+    )
+    if created:
+        logger.info(
+            f'Пользователь {update.effective_user.id} начал общение с ботом')
     else:
         logger.info('Пользователь уже в есть в базе')
@@ -11,6 +11,7 @@ from telegram import (
 
 from db import db_postgres
 from api.googlesheets import write_client_cme
+from db.sheet_values import get_theater_event_name
 from settings.settings import (
     ADMIN_CME_GROUP,
     COMMAND_DICT,
@@ -76,7 +77,16 @@ async def get_confirm(update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
         'custom_made_event_id'] = custom_made_event.id
 
     sheet_id_cme = context.config.sheets.sheet_id_cme
-    await write_client_cme(sheet_id_cme, custom_made_event)
+    name_theater = None
+    if context.config.sheets.computed_event_fields:
+        name_theater = await get_theater_event_name(
+            context.session, custom_made_event.theater_event_id)
+    try:
+        await write_client_cme(sheet_id_cme, custom_made_event, name_theater)
+    except Exception as e:
+        birthday_hl_logger.exception(
+            f'Не удалось записать заявку {custom_made_event.id} '
+            f'в гугл-таблицу: {e}')
 
     state = ConversationHandler.END
     context.user_data['STATE'] = state
@@ -1,3 +1,3 @@
 from handlers.hooks.yookassa_hl import YookassaHookHandler
-from handlers.hooks.gspred_hl import GspreadHookHandler
+from handlers.hooks.gspred_hl import GspreadHookHandler, gspread_dlq
 from handlers.hooks.sales_hl import SalesHookHandler
\ No newline at end of file
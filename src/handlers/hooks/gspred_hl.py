@@ -1,19 +1,53 @@
 import logging
+from collections import Counter
+from typing import List
 
+from nats.errors import Error as NatsError
+from telegram import Update
 from telegram.error import BadRequest
 from telegram.ext import TypeHandler, ContextTypes
 
 from api.broker_nats import GSpreadFailedData
+from api.gspread_dlq import (
+    DLQ_DURABLE, DLQ_SUBJECT, REPLAY_SUBJECT, DeadLetter)
+from api.nats_publisher import STREAM, publisher
 from settings.settings import CHAT_ID_MIKIEREMIKI
 
 gspredhook_hl_logger = logging.getLogger('bot.gspredhook')
 
+# Новые недоставленные задачи копятся и отправляются одной сводкой
+SUMMARY_DELAY = 60
+_new_letters: List[DeadLetter] = []
+
 
 async def gspread_hook_update(
         update: GSpreadFailedData, context: 'ContextTypes.DEFAULT_TYPE'):
-    text = 'Не удачная попытка записи в гугл-таблицу\nИнфа по задаче:\n'
-    for k, v in update.data.items():
-        text += f'{k}: {v}\n'
+    letter = DeadLetter.from_message(update.data)
+    if letter.replays:
+        # О задаче уже сообщили, повторы видны в /gspread_dlq
+        gspredhook_hl_logger.info(
+            f'{DLQ_SUBJECT}: повтор {letter.replays} не удался: '
+            f'{letter.task.get("action")} {letter.error}')
+        return
+    if not _new_letters:
+        context.job_queue.run_once(send_gspread_failed_summary, SUMMARY_DELAY)
+    _new_letters.append(letter)
+
+
+async def send_gspread_failed_summary(context: 'ContextTypes.DEFAULT_TYPE'):
+    letters = list(_new_letters)
+    _new_letters.clear()
+    if not letters:
+        return
+    actions = Counter(letter.task.get('action') for letter in letters)
+    text = (f'Не удалось записать в гугл-таблицу задач: {len(letters)}\n'
+            + '\n'.join(f'{action}: {qty}' for action, qty in actions.items())
+            + f'\nПоследняя ошибка: {letters[-1].error or "нет данных"}\n'
+            f'Задачи будут повторены автоматически, '
+            f'очередь и повтор: /gspread_dlq')
+    if len(letters) == 1:
+        text += '\nИнфа по задаче:\n' + '\n'.join(
+            f'{k}: {v}' for k, v in letters[0].task.items())
     try:
         await context.bot.send_message(CHAT_ID_MIKIEREMIKI, text)
     except BadRequest as e:
@@ -21,4 +55,25 @@ async def gspread_hook_update(
         gspredhook_hl_logger.info(text)
 
 
+async def gspread_dlq(update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
+    """
+    /gspread_dlq — размер очереди недоставленных задач gspread,
+    /gspread_dlq replay — повторить все задачи сейчас.
+    """
+    try:
+        if context.args and context.args[0] == 'replay':
+            await publisher.publish_core(
+                REPLAY_SUBJECT, {'user_id': update.effective_user.id})
+            text = 'Повтор всех задач запрошен'
+        else:
+            info = await publisher.consumer_info(STREAM, DLQ_DURABLE)
+            text = (f'Недоставленных задач gspread: '
+                    f'{info.num_pending + info.num_ack_pending}\n'
+                    f'Повторить сейчас: /gspread_dlq replay')
+    except (NatsError, OSError, TimeoutError) as e:
+        gspredhook_hl_logger.error(f'{DLQ_SUBJECT}: {e}')
+        text = f'NATS недоступен: {e}'
+    await update.effective_chat.send_message(text)
+
+
 GspreadHookHandler = TypeHandler(GSpreadFailedData, gspread_hook_update)
@@ -7,6 +7,7 @@ from yookassa.domain.notification import WebhookNotification
 
 from api.googlesheets import update_ticket_in_gspread
 from api.gspread_pub import publish_update_ticket
+from api.nats_publisher import PublisherUnavailable
 from db import db_postgres
 from db.db_googlesheets import decrease_nonconfirm_seat
 from db.enum import TicketStatus
@@ -161,7 +162,7 @@ async def processing_ticket_paid(update, context: 'ContextTypes.DEFAULT_TYPE'):
                 ticket_id,
                 str(ticket_status.value),
             )
-        except Exception as e:
+        except PublisherUnavailable as e:
             webhook_hl_logger.exception(
                 f"Failed to publish gspread task, fallback to direct call: {e}")
             await update_ticket_in_gspread(
@@ -13,8 +13,15 @@ from telegram.constants import ChatType, ChatAction, ParseMode
 from telegram.error import BadRequest, TimedOut, Forbidden
 
 from api.gspread_pub import publish_update_ticket, publish_update_cme
-from db import db_postgres
+from api.nats_publisher import PublisherUnavailable, get_publisher_stats
+from db import db_postgres, get_pool_stats
 from db.enum import TicketStatus, CustomMadeStatus, UserRole
+from db.invalidation import invalidation_bus
+from db.outbox import outbox_relay
+from db.reference_cache import reference_cache
+from db.schedule_watermark import schedule_watermark
+from db.seat_mirror import seat_mirror
+from db.user_status_cache import user_status_cache
 from handlers import check_user_db
 from db.db_googlesheets import (
     decrease_nonconfirm_seat,
@@ -24,8 +31,11 @@ from db.db_googlesheets import (
 from settings.settings import (
     COMMAND_DICT, FILE_ID_RULES
 )
-from api.googlesheets import update_cme_in_gspread, update_ticket_in_gspread
+from api.googlesheets import (
+    backfill_event_formulas, get_sheets_client_stats, update_cme_in_gspread,
+    update_ticket_in_gspread)
 from utilities.utl_check import is_user_blocked
+from utilities.utl_db import session_usage
 from utilities.utl_func import (
     is_admin, is_dev, get_back_context, clean_context,
     clean_context_on_end_handler, cancel_common, del_messages,
@@ -443,7 +453,7 @@ async def update_ticket(update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
                         ticket_id,
                         str(new_ticket_status.value),
                     )
-                except Exception as e:
+                except PublisherUnavailable as e:
                     main_handlers_logger.exception(
                         f"Failed to publish gspread task, fallback to direct call: {e}")
                     await update_ticket_in_gspread(
@@ -626,7 +636,7 @@ async def confirm_reserve(update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
                     ticket_id,
                     str(ticket_status.value),
                 )
-            except Exception as e:
+            except PublisherUnavailable as e:
                 main_handlers_logger.exception(
                     f"Failed to publish gspread task, fallback to direct call: {e}")
                 await update_ticket_in_gspread(
@@ -825,7 +835,7 @@ async def reject_reserve(update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
                 ticket_id,
                 str(ticket_status.value),
             )
-        except Exception as e:
+        except PublisherUnavailable as e:
             main_handlers_logger.exception(
                 f"Failed to publish gspread task, fallback to direct call: {e}")
             await update_ticket_in_gspread(
@@ -872,6 +882,34 @@ async def reject_reserve(update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
             main_handlers_logger.info('Cообщение уже удалено')
 
 
+async def _update_cme_status_in_gspread(
+        sheet_id_cme: str,
+        cme_id,
+        cme_status: CustomMadeStatus
+) -> None:
+    """
+    Статус заявки в гугл-таблицу через воркер, а без NATS — напрямую.
+    Ошибка прямой записи только пишется в лог и не прерывает обработку
+    заявки.
+    """
+    try:
+        await publish_update_cme(
+            sheet_id_cme,
+            int(cme_id),
+            str(cme_status.value),
+        )
+    except PublisherUnavailable as e:
+        main_handlers_logger.exception(
+            f"Failed to publish gspread task, fallback to direct call: {e}")
+        try:
+            await update_cme_in_gspread(
+                sheet_id_cme, cme_id, cme_status.value)
+        except Exception as e:
+            main_handlers_logger.exception(
+                f'Не удалось обновить статус заявки {cme_id} '
+                f'в гугл-таблице: {e}')
+
+
 async def confirm_birthday(update: Update,
                            context: 'ContextTypes.DEFAULT_TYPE'):
     query = update.callback_query
@@ -913,17 +951,8 @@ async def confirm_birthday(update: Update,
         case '2':
             cme_status = CustomMadeStatus.PREPAID
 
-    sheet_id_cme = context.config.sheets.sheet_id_cme
-    try:
-        await publish_update_cme(
-            sheet_id_cme,
-            int(cme_id),
-            str(cme_status.value),
-        )
-    except Exception as e:
-        main_handlers_logger.exception(
-            f"Failed to publish gspread task, fallback to direct call: {e}")
-        await update_cme_in_gspread(sheet_id_cme, cme_id, cme_status.value)
+    await _update_cme_status_in_gspread(
+        context.config.sheets.sheet_id_cme, cme_id, cme_status)
     await message.edit_text(
         f'{message.text}\nОбновил статус в гугл-таблице {cme_status.value}')
 
@@ -1031,17 +1060,8 @@ async def reject_birthday(update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
 
     cme_status = CustomMadeStatus.REJECTED
 
-    sheet_id_cme = context.config.sheets.sheet_id_cme
-    try:
-        await publish_update_cme(
-            sheet_id_cme,
-            int(cme_id),
-            str(cme_status.value),
-        )
-    except Exception as e:
-        main_handlers_logger.exception(
-            f"Failed to publish gspread task, fallback to direct call: {e}")
-        await update_cme_in_gspread(sheet_id_cme, cme_id, cme_status.value)
+    await _update_cme_status_in_gspread(
+        context.config.sheets.sheet_id_cme, cme_id, cme_status)
     await message.edit_text(
         f'{message.text}\nОбновил статус в гугл-таблице {cme_status.value}')
 
@@ -1795,3 +1815,62 @@ async def set_user_status(update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
         f'Кем заблокирован: <code>{status.blocked_by_admin_id or "-"}</code>'
     )
     await update.effective_message.reply_text(text)
+
+
+async def send_db_pool_stats(update: Update, _: 'ContextTypes.DEFAULT_TYPE'):
+    stats = get_pool_stats()
+    if not stats:
+        text = 'Пулы соединений с БД еще не созданы'
+    else:
+        lines = []
+        for db_url, counters in stats.items():
+            lines.append(db_url)
+            for key, value in counters.items():
+                lines.append(f'  {key}: {value}')
+        stats = {**invalidation_bus.stats(), **schedule_watermark.stats(),
+                 **reference_cache.stats(), **user_status_cache.stats(),
+                 **session_usage.stats()}
+        lines += [f'{key}: {value}' for key, value in stats.items()]
+        text = '\n'.join(lines)
+    await update.effective_chat.send_message(f'<pre>{text}</pre>')
+
+
+async def send_publisher_stats(update: Update, _: 'ContextTypes.DEFAULT_TYPE'):
+    stats = {**get_publisher_stats(), **outbox_relay.stats()}
+    text = '\n'.join(f'{key}: {value}' for key, value in stats.items())
+    await update.effective_chat.send_message(f'<pre>{text}</pre>')
+
+
+async def send_sheets_client_stats(
+        update: Update, _: 'ContextTypes.DEFAULT_TYPE'):
+    stats = {**get_sheets_client_stats(), **seat_mirror.stats()}
+    text = '\n'.join(f'{key}: {value}' for key, value in stats.items())
+    await update.effective_chat.send_message(f'<pre>{text}</pre>')
+
+
+async def gspread_backfill(
+        update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
+    """
+    /gspread_backfill — разово заменить формулы мероприятия в клиентских
+    листах их значениями.
+    """
+    sheets = context.config.sheets
+    targets = [
+        (sheets.sheet_id_domik, 'База клиентов_'),
+        (sheets.sheet_id_domik, 'Лист ожидания_'),
+        (sheets.sheet_id_cme, 'База ДР_'),
+    ]
+    await update.effective_chat.send_message(
+        'Заменяю формулы значениями, это займет несколько минут...')
+    lines = []
+    for sheet_id, name_sheet in targets:
+        try:
+            qty = await backfill_event_formulas(sheet_id, name_sheet)
+            lines.append(f'{name_sheet}: заменено ячеек {qty}')
+        except Exception as e:
+            main_handlers_logger.exception(
+                f'Не удалось заменить формулы ({name_sheet}): {e}')
+            lines.append(f'{name_sheet}: ошибка {type(e).__name__}')
+    text = '\n'.join(lines)
+    main_handlers_logger.info(text)
+    await update.effective_chat.send_message(text)
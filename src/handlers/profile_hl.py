@@ -7,6 +7,7 @@ from telegram.ext import ContextTypes
 
 from db import db_postgres
 from db.enum import AgeType, TicketStatus
+from db.loaders import UserLoad
 from handlers import init_conv_hl_dialog
 from handlers.sub_hl import request_phone_number
 from utilities.utl_func import (
@@ -92,7 +93,8 @@ async def start_profile(update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
         context.user_data['common_data']['profile_user_id'] = user_id
     else:
         user_id = update.effective_user.id
-    user = await db_postgres.get_user(context.session, user_id)
+    user = await db_postgres.get_user(
+        context.session, user_id, UserLoad.WITH_PEOPLE)
     if not user:
         await db_postgres.create_user(
             context.session,
@@ -100,7 +102,8 @@ async def start_profile(update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
             update.effective_chat.id,
             username=update.effective_user.username,
         )
-        user = await db_postgres.get_user(context.session, user_id)
+        user = await db_postgres.get_user(
+            context.session, user_id, UserLoad.WITH_PEOPLE)
     persons = user.people if user else []
 
     adults: List[str] = []
@@ -388,7 +391,8 @@ async def show_tickets(update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
         user_id = context.user_data['profile_user_id']
     else:
         user_id = update.effective_user.id
-    user = await db_postgres.get_user(context.session, user_id)
+    user = await db_postgres.get_user(
+        context.session, user_id, UserLoad.WITH_TICKETS)
 
     tickets = []
     if user:
@@ -13,6 +13,7 @@ from telegram.constants import ChatAction, ChatType
 
 from db import db_postgres
 from db.db_postgres import get_schedule_theater_base_tickets
+from db.reference_cache import reference_cache
 from handlers import init_conv_hl_dialog
 from handlers.sub_hl import (
     get_theater_and_schedule_events_by_month,
@@ -598,7 +599,7 @@ async def choice_date(update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
 
     prev_state = context.user_data['STATE']
     schedule_event_ids = reserve_user_data[prev_state]['schedule_event_ids']
-    theater_event = await db_postgres.get_theater_event(
+    theater_event = await reference_cache.get_theater_event(
         context.session, theater_event_id)
     schedule_events = await db_postgres.get_schedule_events_by_ids_and_theater(
         context.session, schedule_event_ids, [theater_event_id])
@@ -883,8 +884,8 @@ async def choice_month_rep_continue(update: Update,
                        ev.datetime_event.month == int(number_of_month_str)]
 
     theater_event_id = int(reserve_user_data.get('selected_theater_event_id'))
-    theater_event = await db_postgres.get_theater_event(context.session,
-                                                        theater_event_id)
+    theater_event = await reference_cache.get_theater_event(context.session,
+                                                            theater_event_id)
 
     # Строим клавиатуру с датами
     keyboard = await create_kbd_for_date_in_reserve(schedule_events)
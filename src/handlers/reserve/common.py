@@ -3,6 +3,7 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Message, Update
 from telegram.ext import ContextTypes, ConversationHandler
 
 from db import BaseTicket, db_postgres
+from db.reference_cache import reference_cache
 from handlers.sub_hl import processing_successful_payment
 from utilities.utl_func import set_back_context
 from utilities.utl_kbd import (
@@ -113,7 +114,7 @@ async def send_msg_get_child(
 ) -> Message:
     reserve_user_data = context.user_data['reserve_user_data']
     base_ticket_id = reserve_user_data['chose_base_ticket_id']
-    base_ticket = await db_postgres.get_base_ticket(
+    base_ticket = await reference_cache.get_base_ticket(
         context.session,
         base_ticket_id,
     )
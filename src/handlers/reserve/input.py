@@ -11,8 +11,11 @@ from telegram.constants import ChatAction
 
 from api.gspread_pub import (
     publish_write_client_list_waiting)
+from api.nats_publisher import PublisherUnavailable
 
 from db import db_postgres
+from db.loaders import PersonLoad, ScheduleLoad
+from db.reference_cache import reference_cache
 from handlers.common_hl import validate_phone_or_request
 from handlers.reserve.common import (
     get_child_text_and_reply,
@@ -30,6 +33,7 @@ from utilities.utl_check import (
     check_available_ticket_by_free_seat,
     check_entered_command, is_skip_ticket
 )
+from utilities.utl_googlesheets import get_event_values_for_sheets
 from utilities.utl_func import (
     set_back_context,
     get_formatted_date_and_time_of_event,
@@ -67,7 +71,7 @@ async def get_email(update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
     price = reserve_user_data['chose_price']
     text_select_event = reserve_user_data['text_select_event']
 
-    chose_base_ticket = await db_postgres.get_base_ticket(
+    chose_base_ticket = await reference_cache.get_base_ticket(
         context.session, chose_base_ticket_id)
     text = (f'{text_select_event}<br>'
             f'Вариант бронирования:<br>'
@@ -88,10 +92,10 @@ async def get_email(update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
         context.session, schedule_event_id)
     context.session.add(schedule_event)
     await context.session.refresh(schedule_event)
-    theater_event = await db_postgres.get_theater_event(context.session,
-                                                        schedule_event.theater_event_id)
-    type_event = await db_postgres.get_type_event(context.session,
-                                                  schedule_event.type_event_id)
+    theater_event = await reference_cache.get_theater_event(context.session,
+                                                            schedule_event.theater_event_id)
+    type_event = await reference_cache.get_type_event(context.session,
+                                                      schedule_event.type_event_id)
 
     check_command = check_entered_command(context, 'reserve')
     only_child = None
@@ -251,7 +255,7 @@ async def _handle_chld_edit_callback(
         if idx is None:
             # Не удалось найти ребенка — просто обновим экран
             chose_base_ticket_id = reserve_user_data['chose_base_ticket_id']
-            chose_base_ticket = await db_postgres.get_base_ticket(
+            chose_base_ticket = await reference_cache.get_base_ticket(
                 context.session, chose_base_ticket_id)
             text, reply_markup = await get_child_text_and_reply(
                 update, chose_base_ticket, children, context)
@@ -268,7 +272,8 @@ async def _handle_chld_edit_callback(
         child = children[idx]
 
         # Получаем расширенную информацию о родителе
-        child_person = await db_postgres.get_person(context.session, person_id)
+        child_person = await db_postgres.get_person(
+            context.session, person_id, PersonLoad.WITH_PARENT)
         parent_info = ""
         if child_person and child_person.parent:
             parent = child_person.parent
@@ -323,7 +328,7 @@ async def _handle_chld_edit_callback(
 
     # Обновляем сообщение для всех случаев (EDIT, PAGE, DEL, EDIT_START)
     chose_base_ticket_id = reserve_user_data['chose_base_ticket_id']
-    chose_base_ticket = await db_postgres.get_base_ticket(
+    chose_base_ticket = await reference_cache.get_base_ticket(
         context.session, chose_base_ticket_id)
     text, reply_markup = await get_child_text_and_reply(
         update, chose_base_ticket, children, context)
@@ -452,7 +457,7 @@ async def get_children(
 
     reserve_user_data = context.user_data['reserve_user_data']
     chose_base_ticket_id = reserve_user_data['chose_base_ticket_id']
-    chose_base_ticket = await db_postgres.get_base_ticket(
+    chose_base_ticket = await reference_cache.get_base_ticket(
         context.session, chose_base_ticket_id)
 
     if query:
@@ -670,16 +675,15 @@ async def send_clients_data(
     _, callback_data = remove_intent_id(query.data)
     event_id = int(callback_data)
     schedule_event = await db_postgres.get_schedule_event(
-        context.session, event_id)
-    theater_event = await db_postgres.get_theater_event(
-        context.session, schedule_event.theater_event_id)
+        context.session, event_id, ScheduleLoad.WITH_TICKETS)
+    theater_event = schedule_event.theater_event
     date_event, time_event = await get_formatted_date_and_time_of_event(
         schedule_event)
     tickets = schedule_event.tickets
     base_ticket_and_tickets = []
     for ticket in tickets:
-        base_ticket = await db_postgres.get_base_ticket(context.session,
-                                                        ticket.base_ticket_id)
+        base_ticket = await reference_cache.get_base_ticket(context.session,
+                                                            ticket.base_ticket_id)
         if not is_skip_ticket(ticket.status):
             base_ticket_and_tickets.append((base_ticket, ticket))
 
@@ -899,12 +903,20 @@ async def _publish_write_client_list_waiting(sheet_id_domik,
         'phone': phone,
         'schedule_event_id': schedule_event_id
     }
+    event_values = await get_event_values_for_sheets(
+        context, [schedule_event_id])
     try:
-        await publish_write_client_list_waiting(sheet_id_domik, ctx)
-    except Exception as e:
+        await publish_write_client_list_waiting(
+            sheet_id_domik, ctx, event_values)
+    except PublisherUnavailable as e:
         reserve_hl_logger.exception(
             f"Failed to publish gspread task, fallback to direct call: {e}")
-        await write_client_list_waiting(sheet_id_domik, ctx)
+        try:
+            await write_client_list_waiting(
+                sheet_id_domik, ctx, event_values)
+        except Exception as e:
+            reserve_hl_logger.exception(
+                f'Не удалось записать лист ожидания в гугл-таблицу: {e}')
 
 
 async def get_phone_for_waiting(
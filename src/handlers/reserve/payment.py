@@ -12,10 +12,12 @@ from telegram.constants import ChatAction
 
 from api.gspread_pub import (
     publish_write_client_reserve)
+from api.nats_publisher import PublisherUnavailable
 
 from db import db_postgres, Promotion
 from db.db_googlesheets import decrease_free_seat
 from db.enum import TicketStatus, PromotionDiscountType
+from db.reference_cache import reference_cache
 from utilities.utl_check import (
     check_entered_command, check_available_ticket_by_free_seat)
 from handlers.reserve.common import (
@@ -39,7 +41,8 @@ from utilities.utl_func import (
     get_schedule_event_ids_studio,
     clean_context_on_end_handler,
 )
-from utilities.utl_googlesheets import update_ticket_db_and_gspread
+from utilities.utl_googlesheets import (
+    get_event_values_for_sheets, update_ticket_db_and_gspread)
 from utilities.utl_ticket import (
     cancel_tickets_db_and_gspread, create_tickets_and_people)
 from utilities.utl_kbd import add_btn_back_and_cancel
@@ -147,7 +150,7 @@ async def show_reservation_summary(update: Update,
     schedule_event_id = reserve_user_data['choose_schedule_event_id']
     schedule_event = await db_postgres.get_schedule_event(
         context.session, schedule_event_id)
-    theater_event = await db_postgres.get_theater_event(
+    theater_event = await reference_cache.get_theater_event(
         context.session, schedule_event.theater_event_id)
 
     full_name_event = get_full_name_event(theater_event)
@@ -191,7 +194,7 @@ async def show_reservation_summary(update: Update,
 
     # Обновляем текст для уведомления админа и пользователя
     chose_base_ticket_id = reserve_user_data['chose_base_ticket_id']
-    chose_base_ticket = await db_postgres.get_base_ticket(
+    chose_base_ticket = await reference_cache.get_base_ticket(
         context.session, chose_base_ticket_id)
     text_select_event = reserve_user_data['text_select_event']
     notification_text = (f'{text_select_event}<br>'
@@ -290,11 +293,11 @@ async def confirm_go_pay(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Загружаем актуальные данные из БД
         schedule_event = await db_postgres.get_schedule_event(
             context.session, schedule_event_id)
-        theater_event = await db_postgres.get_theater_event(
+        theater_event = await reference_cache.get_theater_event(
             context.session, schedule_event.theater_event_id)
-        type_event = await db_postgres.get_type_event(
+        type_event = await reference_cache.get_type_event(
             context.session, schedule_event.type_event_id)
-        base_ticket = await db_postgres.get_base_ticket(
+        base_ticket = await reference_cache.get_base_ticket(
             context.session, chose_base_ticket_id)
 
         # 1. Проверка активности мероприятия
@@ -358,7 +361,7 @@ async def confirm_admin_without_payment(update: Update,
 
     reserve_user_data = context.user_data['reserve_user_data']
     chose_base_ticket_id = reserve_user_data['chose_base_ticket_id']
-    chose_base_ticket = await db_postgres.get_base_ticket(
+    chose_base_ticket = await reference_cache.get_base_ticket(
         context.session, chose_base_ticket_id)
 
     schedule_event_id = reserve_user_data['choose_schedule_event_id']
@@ -382,22 +385,26 @@ async def confirm_admin_without_payment(update: Update,
     base_ticket_dto = chose_base_ticket.to_dto()
     ticket_status_value = str(TicketStatus.CREATED.value)
     reserve_user_data = context.user_data['reserve_user_data']
+    event_values = await get_event_values_for_sheets(
+        context, reserve_user_data['choose_schedule_event_ids'])
     try:
         await publish_write_client_reserve(
             sheet_id_domik,
             reserve_user_data,
             chat_id,
             base_ticket_dto,
-            ticket_status_value
+            ticket_status_value,
+            event_values
         )
-    except Exception as e:
+    except PublisherUnavailable as e:
         reserve_hl_logger.exception(
             f'Failed to publish gspread task, fallback to direct call: {e}')
         res = await write_client_reserve(sheet_id_domik,
                                          reserve_user_data,
                                          chat_id,
                                          base_ticket_dto,
-                                         ticket_status_value)
+                                         ticket_status_value,
+                                         event_values)
         if res:
             text += '\nЗапись успешно создана'
         else:
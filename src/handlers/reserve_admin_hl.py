@@ -7,13 +7,15 @@ from telegram.ext import ContextTypes, ConversationHandler
 
 from api.googlesheets import write_client_reserve
 from api.gspread_pub import publish_write_client_reserve
+from api.nats_publisher import PublisherUnavailable
 from db import db_postgres
 from db.enum import TicketStatus
 from db.db_googlesheets import increase_free_seat, decrease_free_seat
 from db.db_postgres import get_schedule_theater_base_tickets
 from handlers import init_conv_hl_dialog
 from handlers.sub_hl import processing_successful_payment
-from utilities.utl_googlesheets import update_ticket_db_and_gspread
+from utilities.utl_googlesheets import (
+    get_event_values_for_sheets, update_ticket_db_and_gspread)
 from utilities.utl_func import (
     set_back_context,
     create_str_info_by_schedule_event_id,
@@ -257,22 +259,26 @@ async def start_forma_info(
         base_ticket_dto = chose_base_ticket.to_dto()
         ticket_status_value = str(TicketStatus.CREATED.value)
         reserve_user_data = context.user_data['reserve_user_data']
+        event_values = await get_event_values_for_sheets(
+            context, reserve_user_data['choose_schedule_event_ids'])
         try:
             await publish_write_client_reserve(
                 sheet_id_domik,
                 reserve_user_data,
                 chat_id,
                 base_ticket_dto,
-                ticket_status_value
+                ticket_status_value,
+                event_values
             )
-        except Exception as e:
+        except PublisherUnavailable as e:
             reserve_admin_hl_logger.exception(
                 f'Failed to publish gspread task, fallback to direct call: {e}')
             res = await write_client_reserve(sheet_id_domik,
                                              reserve_user_data,
                                              chat_id,
                                              base_ticket_dto,
-                                             ticket_status_value)
+                                             ticket_status_value,
+                                             event_values)
             if res == 0:
                 await context.bot.send_message(
                     chat_id=context.config.bot.developer_chat_id,
@@ -7,6 +7,7 @@ from telegram.ext import ContextTypes
 
 from db import db_postgres
 from db.enum import TicketPriceType
+from db.loaders import ScheduleLoad
 from handlers.support_hl import choice_db_settings
 from utilities.utl_kbd import add_btn_back_and_cancel
 from utilities.utl_func import set_back_context
@@ -218,7 +219,8 @@ async def schedule_update_start(update: Update, context: ContextTypes.DEFAULT_TY
     await query.answer()
 
     sch_id = int(query.data.replace('schedule_event_edit_', ''))
-    event = await db_postgres.get_schedule_event(context.session, sch_id)
+    event = await db_postgres.get_schedule_event(
+        context.session, sch_id, ScheduleLoad.WITH_BASE_TICKETS)
 
     if not event:
         await query.edit_message_text("Событие не найдено.")
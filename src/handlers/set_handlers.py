@@ -12,6 +12,7 @@ from handlers.hooks import (
     YookassaHookHandler,
     GspreadHookHandler,
     SalesHookHandler,
+    gspread_dlq,
 )
 from handlers.error_hl import error_handler
 from handlers.timeweb_hl import get_balance
@@ -94,6 +95,15 @@ def set_handlers(application: Application, config):
         CommandHandler('clean_bd', clean_bd, filter_admin),
         CommandHandler('update_config', update_config, filter_admin),
         CommandHandler('update_settings', update_settings, filter_admin),
+        CommandHandler('db_pool', main_hl.send_db_pool_stats, filter_admin),
+        CommandHandler('nats_stats', main_hl.send_publisher_stats, filter_admin),
+        CommandHandler('gspread_stats',
+                       main_hl.send_sheets_client_stats,
+                       filter_admin),
+        CommandHandler('gspread_dlq', gspread_dlq, filter_admin),
+        CommandHandler('gspread_backfill',
+                       main_hl.gspread_backfill,
+                       filter_admin),
         CommandHandler('send_approve_msg',
                        main_hl.send_approve_msg,
                        filter_admin),
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import uuid
 from typing import List, Union, Optional
@@ -19,6 +20,7 @@ from yookassa import Payment
 
 from api.googlesheets import write_client_reserve
 from api.gspread_pub import publish_write_client_reserve
+from api.nats_publisher import PublisherUnavailable
 from api.yookassa_connect import create_param_payment
 from db import db_postgres, TheaterEvent
 from db.enum import TicketStatus
@@ -26,17 +28,20 @@ from db.db_googlesheets import (
     load_base_tickets, load_special_ticket_price,
     load_schedule_events, load_theater_events, load_custom_made_format,
     decrease_free_and_increase_nonconfirm_seat,
-    load_promotions,
+    load_promotions, load_reference_data,
 )
-from schedule.scheduler_jobs import schedule_notification_job
+from schedule.scheduler_jobs import (
+    diff_schedule_events, sync_notification_jobs)
 from settings.settings import ADMIN_GROUP, FILE_ID_RULES, OFFER
 from utilities.utl_func import (
     get_formatted_date_and_time_of_event, get_schedule_event_ids_studio,
     create_approve_and_reject_replay, set_back_context,
     clean_context_on_end_handler,
 )
+from utilities.utl_db import get_sessionmaker
 from utilities.utl_retry import retry_on_timeout
-from utilities.utl_googlesheets import update_ticket_db_and_gspread
+from utilities.utl_googlesheets import (
+    get_event_values_for_sheets, update_ticket_db_and_gspread)
 from utilities.utl_kbd import (
     create_email_confirm_btn, add_btn_back_and_cancel, create_adult_confirm_btn)
 from db.db_postgres import update_promotions_from_googlesheets
@@ -121,10 +126,10 @@ async def update_base_ticket_data(
         context: 'ContextTypes.DEFAULT_TYPE'
 ):
     ticket_list = await load_base_tickets(False)
-    await db_postgres.update_base_tickets_from_googlesheets(
+    result = await db_postgres.update_base_tickets_from_googlesheets(
         context.session, ticket_list)
 
-    text = 'Билеты обновлены'
+    text = f'Билеты обновлены\n{result.summary()}'
     await update.effective_chat.send_message(text)
 
     try:
@@ -159,10 +164,10 @@ async def update_custom_made_format_data(
         context: 'ContextTypes.DEFAULT_TYPE'
 ):
     custom_made_format_list = await load_custom_made_format()
-    await db_postgres.update_custom_made_format_from_googlesheets(
+    result = await db_postgres.update_custom_made_format_from_googlesheets(
         context.session, custom_made_format_list)
 
-    text = 'Форматы заказных мероприятий обновлены'
+    text = f'Форматы заказных мероприятий обновлены\n{result.summary()}'
     await update.effective_chat.send_message(text)
 
     sub_hl_logger.info(text)
@@ -179,9 +184,10 @@ async def update_promotion_data(
         context: 'ContextTypes.DEFAULT_TYPE'
 ):
     promotions = await load_promotions()
-    await update_promotions_from_googlesheets(context.session, promotions)
+    result = await update_promotions_from_googlesheets(
+        context.session, promotions)
 
-    text = 'Промокоды обновлены'
+    text = f'Промокоды обновлены\n{result.summary()}'
     await update.effective_chat.send_message(text)
 
     sub_hl_logger.info(text)
@@ -198,10 +204,10 @@ async def update_theater_event_data(
         context: 'ContextTypes.DEFAULT_TYPE'
 ):
     theater_event_list = await load_theater_events()
-    await db_postgres.update_theater_events_from_googlesheets(
+    result = await db_postgres.update_theater_events_from_googlesheets(
         context.session, theater_event_list)
 
-    text = 'Репертуар обновлен'
+    text = f'Репертуар обновлен\n{result.summary()}'
     await update.effective_chat.send_message(text)
 
     sub_hl_logger.info(text)
@@ -222,9 +228,13 @@ async def update_schedule_event_data(update: Update,
     except (TimedOut, BadRequest) as e:
         sub_hl_logger.error(e)
     schedule_event_list = await load_schedule_events(False, True)
+    stored = await db_postgres.get_schedule_event_fingerprints(
+        context.session)
+    changes = diff_schedule_events(schedule_event_list, stored)
     try:
-        await db_postgres.update_schedule_events_from_googlesheets(
-            context.session, schedule_event_list)
+        result = await db_postgres.update_schedule_events_from_googlesheets(
+            context.session, schedule_event_list,
+            context.config.sheets.seat_mirror)
     except IntegrityError as e:
         sub_hl_logger.error(f'Ошибка обновления расписания: {e}')
         await context.session.rollback()
@@ -232,10 +242,103 @@ async def update_schedule_event_data(update: Update,
         await update.effective_chat.send_message(text)
         return 'updates'
 
-    for event in schedule_event_list:
-        await schedule_notification_job(context, event)
+    await sync_notification_jobs(context, changes)
 
-    text = 'Расписание обновлено'
+    text = (f'Расписание обновлено\n{result.summary()}\n'
+            f'Напоминания: {changes.summary()}')
+    await update.effective_chat.send_message(text)
+
+    sub_hl_logger.info(text)
+    return 'updates'
+
+
+async def _run_update(sessionmaker, update_func, *args):
+    async with sessionmaker() as session:
+        return await update_func(session, *args)
+
+
+async def _update_schedule_events(session, schedule_event_list, keep_seats):
+    stored = await db_postgres.get_schedule_event_fingerprints(session)
+    changes = diff_schedule_events(schedule_event_list, stored)
+    result = await db_postgres.update_schedule_events_from_googlesheets(
+        session, schedule_event_list, keep_seats)
+    return result, changes
+
+
+async def update_all_data(update: Update,
+                          context: 'ContextTypes.DEFAULT_TYPE'):
+    """
+    Полное обновление справочников: все листы загружаются из Google Sheets
+    пакетными запросами, обновления в БД выполняются параллельно, каждое в
+    своей сессии.
+    """
+    query = update.callback_query
+    text = 'Начато обновление всех данных'
+    try:
+        await query.answer(text=text)
+    except (TimedOut, BadRequest) as e:
+        sub_hl_logger.error(e)
+
+    try:
+        data = await load_reference_data()
+    except Exception as e:
+        sub_hl_logger.exception(f'Не удалось загрузить данные из таблиц: {e}')
+        text = f'Не удалось загрузить данные из таблиц: {e}'
+        await update.effective_chat.send_message(text)
+        return 'updates'
+
+    sessionmaker = get_sessionmaker(context.config)
+    # Расписание и индивидуальные стоимости ссылаются на репертуар и
+    # билеты, поэтому обновляются вторым шагом
+    steps = [
+        {
+            'Репертуар': (
+                db_postgres.update_theater_events_from_googlesheets,
+                data.theater_events),
+            'Билеты': (
+                db_postgres.update_base_tickets_from_googlesheets,
+                data.base_tickets),
+            'Форматы заказных мероприятий': (
+                db_postgres.update_custom_made_format_from_googlesheets,
+                data.custom_made_formats),
+            'Промокоды': (
+                update_promotions_from_googlesheets,
+                data.promotions),
+        },
+        {
+            'Расписание': (
+                _update_schedule_events,
+                data.schedule_events,
+                context.config.sheets.seat_mirror),
+            'Индивидуальные стоимости': (
+                db_postgres.update_special_ticket_prices_from_googlesheets,
+                data.special_ticket_price),
+        },
+    ]
+    results = {}
+    for step in steps:
+        step_results = await asyncio.gather(
+            *(_run_update(sessionmaker, *args) for args in step.values()),
+            return_exceptions=True
+        )
+        results.update(zip(step, step_results))
+
+    lines = ['Обновление всех данных завершено']
+    for name, result in results.items():
+        if isinstance(result, Exception):
+            sub_hl_logger.error(f'Ошибка обновления ({name}): {result}')
+            lines.append(f'{name}: ошибка {type(result).__name__}')
+        elif name == 'Расписание':
+            result, changes = result
+            await sync_notification_jobs(context, changes)
+            lines.append(f'{name}: {result.summary()}\n'
+                         f'Напоминания: {changes.summary()}')
+        elif result is None:
+            lines.append(f'{name}: обновлено')
+        else:
+            lines.append(f'{name}: {result.summary()}')
+
+    text = '\n'.join(lines)
     await update.effective_chat.send_message(text)
 
     sub_hl_logger.info(text)
@@ -321,22 +424,26 @@ async def create_and_send_payment(
     base_ticket_dto = chose_base_ticket.to_dto()
     ticket_status_value = str(TicketStatus.CREATED.value)
     reserve_user_data = context.user_data['reserve_user_data']
+    event_values = await get_event_values_for_sheets(
+        context, reserve_user_data['choose_schedule_event_ids'])
     try:
         await publish_write_client_reserve(
             sheet_id_domik,
             reserve_user_data,
             chat_id,
             base_ticket_dto,
-            ticket_status_value
+            ticket_status_value,
+            event_values
         )
-    except Exception as e:
+    except PublisherUnavailable as e:
         sub_hl_logger.exception(
             f'Failed to publish gspread task, fallback to direct call: {e}')
         res = await write_client_reserve(sheet_id_domik,
                                          reserve_user_data,
                                          chat_id,
                                          base_ticket_dto,
-                                         ticket_status_value)
+                                         ticket_status_value,
+                                         event_values)
         if res == 0:
             await context.bot.send_message(
                 chat_id=context.config.bot.developer_chat_id,
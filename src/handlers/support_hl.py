@@ -173,9 +173,12 @@ async def get_updates_option(update: Update,
     btn_update_promotion_data = InlineKeyboardButton(
         COMMAND_DICT['UP_PROM_DATA'][1],
         callback_data=COMMAND_DICT['UP_PROM_DATA'][0])
+    btn_update_all_data = InlineKeyboardButton(
+        'Обновить всё', callback_data='update_all_data')
     button_cancel = add_btn_back_and_cancel(postfix_for_cancel='settings',
                                             postfix_for_back='1')
     keyboard = [
+        [btn_update_all_data],
         [btn_update_base_ticket_data,
          btn_update_special_ticket_price],
         [btn_update_schedule_event_data,
@@ -5,7 +5,7 @@ from telegram import Update
 from telegram.ext import (
     ContextTypes, TypeHandler, ApplicationHandlerStop, ConversationHandler)
 
-from db import db_postgres
+from db.schedule_watermark import schedule_watermark
 from handlers.reserve_hl import choice_mode, conversation_timeout
 from settings.settings import RESERVE_TIMEOUT, CHAT_ID_KOCHETKOVA
 from utilities.utl_date import to_naive
@@ -95,7 +95,8 @@ def add_reserve_check_middleware(application, config):
                 context.user_data['last_interaction_time'] = now
                 raise ApplicationHandlerStop
 
-            last_db_update = to_naive(await db_postgres.get_last_schedule_update_time(context.session))
+            last_db_update = to_naive(
+                await schedule_watermark.get(context.session))
             # 2. Проверка актуальности данных расписания
             if last_db_update and last_db_update > last_interaction:
                 reserve_check_md_logger.info(f'User {user_id} has outdated data. Resetting.')
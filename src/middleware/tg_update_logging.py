@@ -3,14 +3,15 @@ from telegram import Update
 from telegram.ext import ContextTypes, TypeHandler
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from db import TelegramUpdate, create_sessionmaker_and_engine
+from db import TelegramUpdate
+from utilities.utl_db import get_sessionmaker
 
 tg_update_md_logger = logging.getLogger('bot.md.tg_update')
 
 
 class TGUpdateLoggingMiddleware:
     def __init__(self, config):
-        self.sessionmaker = create_sessionmaker_and_engine(str(config.postgres.db_url))
+        self.sessionmaker = get_sessionmaker(config)
 
     async def log_update(self, update: Update, _: ContextTypes.DEFAULT_TYPE):
         if not update:
@@ -5,8 +5,7 @@ from telegram import Update
 from telegram.ext import (
     ContextTypes, TypeHandler, ApplicationHandlerStop, Application)
 
-from db.db_postgres import get_or_create_user_status
-from handlers import check_user_db
+from db.user_status_cache import user_status_cache
 
 user_status_md_logger = logging.getLogger('bot.md.user_status')
 
@@ -17,13 +16,16 @@ def add_user_status_middleware(application: Application, config):
 
         try:
             user_id = update.effective_user.id
-
-            # Гарантируем наличие пользователя в таблице users перед проверкой статуса
-            await check_user_db(update, context)
-
-            status = await get_or_create_user_status(context.session,
-                                                     user_id)
-            await context.session.commit()
+            context.user_data['user'] = update.effective_user
+
+            # Флаги берутся из кэша; при промахе пользователь и его статус
+            # создаются в БД, если их еще нет
+            status = await user_status_cache.get(
+                context.session,
+                user_id,
+                update.effective_chat.id,
+                username=update.effective_user.username,
+            )
             blacklisted = status.is_blacklisted
             is_blocked_by_user = status.is_blocked_by_user
 
@@ -1,14 +1,42 @@
 import logging
 from datetime import timedelta, datetime
+from typing import List, Mapping, NamedTuple, Tuple
 
 from telegram.ext import ContextTypes
 
 from schedule.worker_jobs import send_reminder
 from utilities.schemas import ScheduleEventDTO
+from utilities.utl_date import to_utc
 
 scheduler_logger = logging.getLogger('bot.scheduler_jobs')
 
 
+class ScheduleFingerprint(NamedTuple):
+    """То, от чего зависит напоминание о событии. Время — aware UTC."""
+    datetime_event: datetime
+    flag_turn_on_off: bool
+
+
+class ScheduleChanges(NamedTuple):
+    added: List[ScheduleEventDTO]
+    moved: List[ScheduleEventDTO]
+    enabled: List[ScheduleEventDTO]
+    disabled: List[ScheduleEventDTO]
+    unchanged: int
+
+    def to_reschedule(self) -> List[ScheduleEventDTO]:
+        """События, для которых нужно создать или удалить напоминание."""
+        return ([e for e in self.added + self.moved if e.flag_turn_on_off]
+                + self.enabled + self.disabled)
+
+    def summary(self) -> str:
+        return (f'новых: {len(self.added)}, '
+                f'перенесено: {len(self.moved)}, '
+                f'включено: {len(self.enabled)}, '
+                f'выключено: {len(self.disabled)}, '
+                f'без изменений: {self.unchanged}')
+
+
 def _compute_notification_times(datetime_event: datetime) -> tuple[datetime, datetime]:
     """
     Возвращает времена, используемые для планирования напоминания:
@@ -37,6 +65,47 @@ def _remove_existing_reminders(
     return True
 
 
+def diff_schedule_events(
+        events: List[ScheduleEventDTO],
+        stored: Mapping[int, Tuple[datetime, bool]]
+) -> ScheduleChanges:
+    """
+    Сравнивает события из таблицы с сохраненными в БД
+    (см. db_postgres.get_schedule_event_fingerprints). Время из таблицы
+    naive (UTC), из БД (timestamptz) — aware, поэтому обе стороны
+    приводятся к aware UTC.
+    """
+    changes = ScheduleChanges([], [], [], [], 0)
+    unchanged = 0
+    for event in events:
+        fingerprint = ScheduleFingerprint(to_utc(event.get_datetime_event()),
+                                          event.flag_turn_on_off)
+        old = stored.get(event.event_id)
+        if old is None:
+            changes.added.append(event)
+            continue
+        old = ScheduleFingerprint(to_utc(old[0]), old[1])
+        if old == fingerprint:
+            unchanged += 1
+        elif old.flag_turn_on_off and not fingerprint.flag_turn_on_off:
+            changes.disabled.append(event)
+        elif not old.flag_turn_on_off and fingerprint.flag_turn_on_off:
+            changes.enabled.append(event)
+        else:
+            changes.moved.append(event)
+    return changes._replace(unchanged=unchanged)
+
+
+async def sync_notification_jobs(
+        context: 'ContextTypes.DEFAULT_TYPE',
+        changes: ScheduleChanges
+) -> None:
+    """Пересоздает напоминания только у измененных событий."""
+    for event in changes.to_reschedule():
+        await schedule_notification_job(context, event)
+    scheduler_logger.info(f'Напоминания: {changes.summary()}')
+
+
 async def schedule_notification_job(
         context: 'ContextTypes.DEFAULT_TYPE',
         event: ScheduleEventDTO
@@ -9,6 +9,8 @@ from telegram.ext import ContextTypes
 
 from db import db_postgres, Ticket
 from db.enum import TicketStatus
+from db.loaders import ScheduleLoad
+from db.occupancy import reconcile_occupancy
 from utilities.utl_db import open_session
 from utilities.utl_func import (
     get_formatted_date_and_time_of_event, get_full_name_event)
@@ -23,9 +25,9 @@ async def send_reminder(context: 'ContextTypes.DEFAULT_TYPE') -> None:
     event_id = job.data['event_id']
     session = await open_session(context.config)
     try:
-        event = await db_postgres.get_schedule_event(session, event_id)
-        theater = await db_postgres.get_theater_event(
-            session, event.theater_event_id)
+        event = await db_postgres.get_schedule_event(
+            session, event_id, ScheduleLoad.WITH_TICKETS)
+        theater = event.theater_event
         tickets: List[Ticket] = event.tickets
 
         date_event, time_event = await get_formatted_date_and_time_of_event(event)
@@ -109,6 +111,28 @@ async def cancel_old_created_tickets(context: 'ContextTypes.DEFAULT_TYPE') -> No
         await session.close()
 
 
+async def reconcile_schedule_event_occupancy(
+        context: 'ContextTypes.DEFAULT_TYPE') -> None:
+    """
+    Сверяет занятые места, которые ведет триггер, с суммой по билетам.
+    О расхождениях сообщает разработчику.
+    """
+    worker_logger.info('Начало выполнения job reconcile_occupancy')
+    session = await open_session(context.config)
+    try:
+        mismatches = await reconcile_occupancy(session)
+    finally:
+        await session.close()
+    if not mismatches:
+        worker_logger.info('Занятые места совпадают с билетами')
+        return
+    lines = [f'{item.schedule_event_id}: было {tuple(item.stored)}, '
+             f'по билетам {tuple(item.actual)}' for item in mismatches]
+    await context.bot.send_message(
+        chat_id=context.config.bot.developer_chat_id,
+        text='Исправлены занятые места (дет, взр):\n' + '\n'.join(lines))
+
+
 async def send_remainder_msg(
         context: 'ContextTypes.DEFAULT_TYPE',
         session: AsyncSession,
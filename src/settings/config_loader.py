@@ -25,12 +25,26 @@ class TimeWebSettings(BaseModel):
 
 class PostgresSettings(BaseModel):
     db_url: PostgresDsn
+    pool_size: int = 10
+    max_overflow: int = 10
+    pool_timeout: int = 30
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+
+    def engine_options(self) -> dict:
+        return self.model_dump(exclude={'db_url'})
 
 
 class GoogleSheetsSettings(BaseModel):
     credentials_path: str
     sheet_id_domik: str
     sheet_id_cme: str
+    # Писать в клиентские листы значения из Postgres вместо формул VLOOKUP
+    computed_event_fields: bool = False
+    # Места пишутся в таблицу из Postgres раз в seat_mirror_interval секунд,
+    # а не отдельной задачей на каждое изменение
+    seat_mirror: bool = False
+    seat_mirror_interval: float = 15
 
 
 class YookassaSettings(BaseModel):
@@ -22,3 +22,13 @@ def to_naive(dt: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
     if dt.tzinfo:
         return dt.astimezone().replace(tzinfo=None)
     return dt
+
+
+def to_utc(dt: datetime.datetime) -> datetime.datetime:
+    """
+    Приводит datetime к aware UTC. Naive считается временем UTC, как
+    datetime из convert_sheets_datetime и значения, записанные в БД.
+    """
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.astimezone(datetime.timezone.utc)
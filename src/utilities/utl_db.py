@@ -1,10 +1,92 @@
-from sqlalchemy.ext.asyncio import AsyncSession
+import logging
+from typing import Any, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from db import create_sessionmaker_and_engine
 
+utl_db_logger = logging.getLogger('bot.utl_db')
+
+# Сводка по сессиям middleware пишется в DEBUG раз в столько обновлений
+SESSION_USAGE_LOG_EVERY = 100
+
+
+def get_sessionmaker(config) -> async_sessionmaker:
+    return create_sessionmaker_and_engine(
+        str(config.postgres.db_url), **config.postgres.engine_options())
+
 
 async def open_session(config) -> AsyncSession:
-    sessionmaker = create_sessionmaker_and_engine(str(config.postgres.db_url))
+    sessionmaker = get_sessionmaker(config)
 
     session = sessionmaker()
-    return session
\ No newline at end of file
+    return session
+
+
+class SessionUsage:
+    """Счетчики обновлений и открытых для них сессий."""
+
+    def __init__(self, log_every: int = SESSION_USAGE_LOG_EVERY):
+        self.log_every = log_every
+        self.updates = 0
+        self.opened = 0
+
+    def update_processed(self, active: int) -> None:
+        self.updates += 1
+        if self.updates % self.log_every == 0:
+            utl_db_logger.debug(
+                f'Обновлений: {self.updates}, '
+                f'сессий открыто: {self.opened}, активных: {active}')
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'md_db_updates': self.updates,
+            'md_db_sessions_opened': self.opened,
+        }
+
+
+session_usage = SessionUsage()
+
+
+class LazySession:
+    """
+    AsyncSession, которая создается при первом обращении к ней.
+
+    Middleware выдает ее в context.session каждому обновлению, но многим
+    обновлениям (эхо, темы, служебные) БД не нужна. Пока к сессии не
+    обращались, commit, rollback и close ничего не делают.
+    """
+
+    def __init__(self,
+                 sessionmaker: async_sessionmaker,
+                 usage: SessionUsage = session_usage):
+        self._sessionmaker = sessionmaker
+        self._usage = usage
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    def _get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._sessionmaker()
+            self._usage.opened += 1
+        return self._session
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._get(), name)
+
+    async def commit(self) -> None:
+        if self._session is not None:
+            await self._session.commit()
+
+    async def rollback(self) -> None:
+        if self._session is not None:
+            await self._session.rollback()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
@@ -620,8 +620,6 @@ async def update_settings(update: Update, context: 'ContextTypes.DEFAULT_TYPE'):
         await session.close()
 
 
-
-
 def create_approve_and_reject_replay(
         callback_name,
         data: str
@@ -975,7 +973,7 @@ async def add_qty_visitors_to_text(
 async def create_str_info_by_schedule_event_id(context, choice_event_id):
     schedule_event = await db_postgres.get_schedule_event(
         context.session, choice_event_id)
-    theater_event = await db_postgres.get_theater_event(
+    theater_event = await reference_cache.get_theater_event(
         context.session, schedule_event.theater_event_id)
     date_event, time_event = await get_formatted_date_and_time_of_event(
         schedule_event)
@@ -994,7 +992,7 @@ async def get_schedule_event_ids_studio(context):
     reserve_user_data = context.user_data['reserve_user_data']
     schedule_event_id = reserve_user_data['choose_schedule_event_id']
     chose_base_ticket_id = reserve_user_data['chose_base_ticket_id']
-    chose_base_ticket = await db_postgres.get_base_ticket(
+    chose_base_ticket = await reference_cache.get_base_ticket(
         context.session, chose_base_ticket_id)
 
     choose_schedule_event_ids = [schedule_event_id]
@@ -2,14 +2,26 @@ import logging
 
 from api.googlesheets import update_ticket_in_gspread
 from api.gspread_pub import publish_update_ticket
+from api.nats_publisher import PublisherUnavailable
 from db import db_postgres
 from db.db_googlesheets import (
     increase_free_and_decrease_nonconfirm_seat, increase_free_seat)
 from db.enum import TicketStatus
+from db.sheet_values import get_sheet_event_values
 
 utl_googlesheets_logger = logging.getLogger('bot.utl_googlesheets')
 
 
+async def get_event_values_for_sheets(context, event_ids):
+    """
+    Значения полей мероприятий для записи в клиентские листы вместо формул,
+    если это включено в настройках (sheets.computed_event_fields).
+    """
+    if not context.config.sheets.computed_event_fields:
+        return None
+    return await get_sheet_event_values(context.session, event_ids)
+
+
 async def write_to_return_seats_for_sale(context):
     reserve_user_data = context.user_data['reserve_user_data']
     ticket_ids = reserve_user_data.get('ticket_ids', None)
@@ -96,7 +108,7 @@ async def update_ticket_db_and_gspread(context, ticket_id, **kwargs):
             ticket_id,
             kwargs['status'].value,
         )
-    except Exception as e:
+    except PublisherUnavailable as e:
         utl_googlesheets_logger.exception(
             f"Failed to publish gspread task, fallback to direct call: {e}")
         await update_ticket_in_gspread(
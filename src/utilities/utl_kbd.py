@@ -11,7 +11,7 @@ from settings.settings import (
     DICT_CONVERT_MONTH_NUMBER_TO_STR)
 from utilities.utl_func import (
     get_time_with_timezone, get_formatted_date_and_time_of_event, get_emoji)
-from utilities.utl_ticket import get_spec_ticket_price
+from utilities.utl_ticket import get_spec_ticket_prices
 
 _ID_SYMS = string.digits + string.ascii_letters
 CB_SEP = '|'
@@ -127,12 +127,13 @@ async def create_kbd_and_text_tickets_for_choice(
 ):
     flag_indiv_cost_sep = False
     keyboard = []
+    prices = await get_spec_ticket_prices(
+        context, base_tickets_filtered, schedule_event, theater_event)
     for i, ticket in enumerate(base_tickets_filtered):
         ticket: BaseTicket
         ticket_id = ticket.base_ticket_id
         name_ticket = ticket.name
-        price, price_privilege = await get_spec_ticket_price(
-            context, ticket, schedule_event, theater_event)
+        price, price_privilege = prices[ticket_id]
 
         if 8 > ticket_id // 100 >= 3 and not flag_indiv_cost_sep:
             text += "__________<br>    Варианты со скидками:<br>"
@@ -3,7 +3,8 @@ from telegram.ext import Application
 from settings.settings import ADDRESS_OFFICE
 from utilities.utl_func import set_menu, set_description
 from utilities.settings_parser import load_bot_settings
-from schedule.worker_jobs import cancel_old_created_tickets
+from schedule.worker_jobs import (
+    cancel_old_created_tickets, reconcile_schedule_event_occupancy)
 
 
 async def post_init(app: Application, config):
@@ -55,6 +56,15 @@ async def post_init(app: Application, config):
         job_kwargs={'replace_existing': True, 'id': 'cancel_old_created_tickets'}
     )
 
+    # Сверка занятых мест, которые ведет триггер, с билетами
+    app.job_queue.run_repeating(
+        reconcile_schedule_event_occupancy,
+        interval=6 * 3600,
+        first=300,
+        name='reconcile_occupancy',
+        job_kwargs={'replace_existing': True, 'id': 'reconcile_occupancy'}
+    )
+
     # TODO Сделать команду для настройки списков по интенсивам
     studio = {
         'Театральный интенсив': [],
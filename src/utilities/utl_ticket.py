@@ -1,89 +1,62 @@
 import logging
+from typing import Dict, Sequence, Tuple
 
 from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
 from db import BaseTicket, ScheduleEvent, TheaterEvent, db_postgres
-from db.enum import PriceType, TicketStatus
+from db.enum import TicketStatus
+from db.reference_cache import reference_cache
+from db.ticket_prices import get_type_ticket_price, resolve_ticket_prices
 from utilities.utl_func import clean_context_on_end_handler
 from utilities.utl_googlesheets import write_to_return_seats_for_sale
 
 utl_ticket_logger = logging.getLogger('bot.utl_ticket')
 
 
-async def get_spec_ticket_price(context: 'ContextTypes.DEFAULT_TYPE',
-                                ticket: BaseTicket,
-                                schedule_event: ScheduleEvent,
-                                theater_event: TheaterEvent):
+async def get_spec_ticket_prices(
+        context: 'ContextTypes.DEFAULT_TYPE',
+        tickets: Sequence[BaseTicket],
+        schedule_event: ScheduleEvent,
+        theater_event: TheaterEvent
+) -> Dict[int, Tuple]:
+    """Цены (price, price_privilege) билетов tickets по base_ticket_id."""
     reserve_user_data = context.user_data['reserve_user_data']
 
-    option = get_option(schedule_event, theater_event)
-
-    # Переопределил дату определения цены по дате спектакля
-    date_for_price = schedule_event.datetime_event
-    price, price_privilege = ticket.get_price_from_date(date_for_price)
-    key = ticket.base_ticket_id
-    type_ticket_price = await set_type_ticket_price(schedule_event)
+    # Цена определяется по дате спектакля
+    ticket_prices = await resolve_ticket_prices(
+        context.session, schedule_event, theater_event, tickets)
+    type_ticket_price = get_type_ticket_price(schedule_event)
 
     reserve_user_data['type_ticket_price'] = type_ticket_price
-    if theater_event.flag_indiv_cost:
-        # Пытаемся получить индивидуальную стоимость из БД
-        special_price = await db_postgres.get_special_ticket_price(
-            context.session,
-            option=option,
-            base_ticket_id=key,
-            type_ticket_price=type_ticket_price
-        )
-        if special_price is not None:
-            price = special_price
-        else:
-            utl_ticket_logger.error(
-                f'{key=} - данному билету не назначена индив. цена')
-            utl_ticket_logger.error(theater_event.model_dump())
-            if key // 100 != 4:
-                text = f'{key=} - данному билету не назначена индив. цена\n'
-                text += f'{type_ticket_price=}\n'
-                text += f'{theater_event.id=}\n'
-                text += f'{schedule_event.id=}\n'
-                text += f'{schedule_event.type_event_id=}\n'
-                await context.bot.send_message(
-                    chat_id=context.config.bot.developer_chat_id,
-                    text=text,
-                )
-    return price, price_privilege
-
-
-async def set_type_ticket_price(schedule_event: ScheduleEvent,
-                                date_for_price=None):
-    type_ticket_price = schedule_event.ticket_price_type.value
-    if not type_ticket_price:
-        if not date_for_price:
-            date_for_price = schedule_event.datetime_event.date()
-        if date_for_price.weekday() in range(5):
-            type_ticket_price = 'будни'
-        else:
-            type_ticket_price = 'выходные'
-
-    return type_ticket_price
+    prices = {}
+    for key, ticket_price in ticket_prices.items():
+        prices[key] = ticket_price.price, ticket_price.price_privilege
+        if not ticket_price.special_missing:
+            continue
+        utl_ticket_logger.error(
+            f'{key=} - данному билету не назначена индив. цена')
+        utl_ticket_logger.error(theater_event.model_dump())
+        if key // 100 != 4:
+            text = f'{key=} - данному билету не назначена индив. цена\n'
+            text += f'{type_ticket_price=}\n'
+            text += f'{theater_event.id=}\n'
+            text += f'{schedule_event.id=}\n'
+            text += f'{schedule_event.type_event_id=}\n'
+            await context.bot.send_message(
+                chat_id=context.config.bot.developer_chat_id,
+                text=text,
+            )
+    return prices
 
 
-def get_option(
-        schedule_event: ScheduleEvent,
-        theater_event: TheaterEvent
-) -> str:
-    option = ''
-    if schedule_event.flag_gift:
-        option = 'Подарок'
-    if schedule_event.flag_christmas_tree:
-        option = 'Ёлка'
-
-    if not option:
-        price_type = theater_event.price_type
-        if price_type == PriceType.INDIVIDUAL:
-            option = theater_event.id
-        else:
-            option = price_type.value
-    return option
+async def get_spec_ticket_price(context: 'ContextTypes.DEFAULT_TYPE',
+                                ticket: BaseTicket,
+                                schedule_event: ScheduleEvent,
+                                theater_event: TheaterEvent):
+    prices = await get_spec_ticket_prices(
+        context, [ticket], schedule_event, theater_event)
+    return prices[ticket.base_ticket_id]
 
 
 async def get_ticket_and_price(context, base_ticket_id):
@@ -93,10 +66,10 @@ async def get_ticket_and_price(context, base_ticket_id):
 
     schedule_event = await db_postgres.get_schedule_event(
         context.session, schedule_event_id)
-    theater_event = await db_postgres.get_theater_event(
+    theater_event = await reference_cache.get_theater_event(
         context.session, theater_event_id)
 
-    ticket = await db_postgres.get_base_ticket(context.session, base_ticket_id)
+    ticket = await reference_cache.get_base_ticket(context.session, base_ticket_id)
     price, price_privilege = await get_spec_ticket_price(
         context, ticket, schedule_event, theater_event)
     return ticket, price
@@ -163,7 +136,7 @@ async def create_tickets(context, ticket_status):
     chose_price = reserve_user_data.get('discounted_price', reserve_user_data['chose_price'])
     promo_id = reserve_user_data.get('applied_promo_id')
     chose_base_ticket_id = reserve_user_data['chose_base_ticket_id']
-    chose_base_ticket = await db_postgres.get_base_ticket(
+    chose_base_ticket = await reference_cache.get_base_ticket(
         context.session, chose_base_ticket_id)
 
     for event_id in choose_schedule_event_ids:
@@ -187,7 +160,7 @@ async def check_and_set_privilege(session, ticket_id, ticket=None):
     if not ticket or ticket.status != TicketStatus.APPROVED:
         return
 
-    base_ticket = await db_postgres.get_base_ticket(session, ticket.base_ticket_id)
+    base_ticket = await reference_cache.get_base_ticket(session, ticket.base_ticket_id)
     if not base_ticket:
         return
 
@@ -0,0 +1,143 @@
+"""
+Микробенчмарк разбора листа 'База спектаклей_' в ScheduleEventDTO.
+
+Сравнивает прежний разбор (словарь и отдельная проверка pydantic на
+каждую строку, фильтры после создания DTO) с RowMapper.
+
+Запуск из корня репозитория:
+    CONFIG_PATH=config python test/bench_row_mapper.py --rows 5000
+"""
+import argparse
+import datetime
+import logging
+import random
+import time
+from typing import Any, Callable, List, Optional, Type
+
+import sheets_server  # noqa: F401 добавляет src в sys.path
+from pydantic import ValidationError
+
+from db.sheet_mapper import RowMapper
+from utilities.schemas import ScheduleEventDTO
+from utilities.utl_date import convert_sheets_datetime
+
+legacy_logger = logging.getLogger('bench.legacy_mapper')
+
+
+def build_schedule(qty_rows: int = 5000, seed: int = 1):
+    """
+    Лист расписания: половина событий в прошлом, часть выключена,
+    у каждой сотой строки ошибка в данных.
+    Возвращает (data, dict_column_name) как load_from_gspread.
+    """
+    rnd = random.Random(seed)
+    today = (datetime.date.today() - datetime.date(1899, 12, 30)).days
+    headers = list(ScheduleEventDTO.model_fields)
+    rows = []
+    for i in range(1, qty_rows + 1):
+        row = [
+            i, 1, i % 10 + 1, rnd.random() > 0.2,
+            today + rnd.randint(-60, 60), 0.5,
+            30, rnd.randint(0, 30), 0, 30, rnd.randint(0, 30), 0,
+            False, False, False, 'будни',
+        ]
+        if i % 100 == 0:
+            row[0] = 'нет'
+        if i % 7 == 0:
+            # API не возвращает пустые ячейки в конце строки
+            row[-1] = ''
+            row.pop()
+        rows.append(row)
+    return [headers, *rows], {name: i for i, name in enumerate(headers)}
+
+
+def legacy_load(
+        dto_cls: Type[Any],
+        data: List[List[Any]],
+        dict_column_name: dict,
+        *,
+        active_attr: Optional[str] = None,
+        date_getter: Optional[Callable[[Any], datetime.date]] = None,
+) -> List[Any]:
+    """Разбор строк до RowMapper."""
+    field_names = list(dto_cls.model_fields.keys())
+    result = []
+    for row in data[1:]:
+        row_dict = {}
+        for name in field_names:
+            try:
+                row_dict[name] = row[dict_column_name[name]]
+            except KeyError as exc:
+                if exc.args and exc.args[0] != 'date_show_tmp':
+                    legacy_logger.error('Missing column mapping for field')
+                    legacy_logger.error('row=%s', row)
+            except IndexError as exc:
+                legacy_logger.error('Row is shorter than expected')
+                legacy_logger.error('row=%s', row)
+                legacy_logger.error('error=%s', exc)
+        try:
+            obj = dto_cls(**row_dict)
+        except ValidationError as exc:
+            legacy_logger.error('Validation error: %s',
+                                repr(exc.errors()[0]['type']))
+            legacy_logger.error('Invalid row dict: %s', row_dict)
+            continue
+        if active_attr and not getattr(obj, active_attr, False):
+            continue
+        if date_getter:
+            event_date = date_getter(obj)
+            if hasattr(event_date, 'date'):
+                event_date = event_date.date()
+            if event_date < datetime.date.today():
+                continue
+        result.append(obj)
+    return result
+
+
+def compiled_load(dto_cls, data, dict_column_name, **kwargs):
+    mapper = RowMapper(dto_cls, dict_column_name, 'База спектаклей_')
+    return mapper.load(data[1:], **kwargs)
+
+
+def _measure(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(qty_rows: int = 5000, repeat: int = 5):
+    data, dict_column_name = build_schedule(qty_rows)
+    legacy = _measure(lambda: legacy_load(
+        ScheduleEventDTO, data, dict_column_name,
+        active_attr='flag_turn_on_off',
+        date_getter=lambda e: e.get_date_event(),
+    ), repeat)
+    compiled = _measure(lambda: compiled_load(
+        ScheduleEventDTO, data, dict_column_name,
+        active_attr='flag_turn_on_off',
+        date_field='date_show',
+        parse_date=convert_sheets_datetime,
+    ), repeat)
+    return legacy, compiled
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    # Логи ошибок пишут оба способа, на время замера они не нужны
+    logging.disable(logging.CRITICAL)
+    legacy, compiled = run(args.rows, args.repeat)
+    print(f'строк: {args.rows}, лучшее из {args.repeat}')
+    print(f'прежний разбор: {legacy * 1000:>8.1f} мс')
+    print(f'RowMapper:      {compiled * 1000:>8.1f} мс')
+    print(f'ускорение:      {legacy / compiled:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
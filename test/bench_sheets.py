@@ -0,0 +1,277 @@
+"""
+Бенчмарк работы бота с Google Sheets на SheetsServer.
+
+Проигрывает день продаж: запись мест в расписание, добавление клиентов,
+смена статусов билетов, пакеты обработчика очереди gspread и полное
+обновление справочников. По каждой операции печатает число запросов к
+API, общее время и p95.
+
+Запуск из корня репозитория:
+    CONFIG_PATH=config python test/bench_sheets.py --latency 0.05
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from sheets_server import SheetsServer, install
+
+from api import googlesheets
+from api import gspread_worker
+from db import db_googlesheets
+from utilities.schemas import (
+    BaseTicketDTO, CustomMadeFormatDTO, ScheduleEventDTO, TheaterEventDTO)
+
+RANGE_NAME = {
+    'База клиентов_': "'База клиентов'!",
+    'База спектаклей_': "'База спектаклей'!",
+    'Варианты стоимости_': "'Варианты стоимости'!",
+    'Список спектаклей_': "'Список спектаклей'!",
+    'Промокоды_': "'Промокоды'!",
+    'Индив стоимости_': "'Индив стоимости'!",
+    'База ФЗМ_': "'База ФЗМ'!",
+}
+CLIENT_HEADERS = [
+    'ticket_id', 'chat_id', 'name', 'phone', 'children', '', 'age',
+    'event_id', 'e1', 'e2', 'e3', 'e4', 'e5', 'created_at',
+    'base_ticket_id', 'base_ticket_name', 'price', 'qty_child', 'qty_adult',
+    'flag_exclude', 'flag_transfer', 'flag_exclude_place_sum',
+    'ticket_status',
+]
+BASE_TICKET = {
+    'base_ticket_id': 1, 'flag_active': True, 'flag_individual': False,
+    'flag_season_ticket': False, 'name': 'Базовый', 'cost_main': 1000,
+    'cost_privilege': 900, 'period_start_change_price': '',
+    'period_end_change_price': '', 'cost_main_in_period': 1000,
+    'cost_privilege_in_period': 900, 'quality_of_children': 1,
+    'quality_of_adult': 1, 'quality_of_add_adult': 0, 'quality_visits': 1,
+}
+SEAT_QTY = 30
+
+
+def _tab(dto_cls, rows: List[Dict[str, Any]]) -> List[List[Any]]:
+    headers = [name for name in dto_cls.model_fields
+               if name != 'date_show_tmp']
+    return [['Служебная строка'], headers,
+            *[[row.get(name, '') for name in headers] for row in rows]]
+
+
+def _sheets_date(day: datetime.date) -> int:
+    return (day - datetime.date(1899, 12, 30)).days
+
+
+def build_workbook(qty_events: int = 60, qty_clients: int = 1000):
+    """Таблицы бота с qty_events мероприятиями и qty_clients билетами."""
+    today = datetime.date.today()
+    theater_events = [{
+        'theater_event_id': i, 'name': f'Спектакль {i}',
+        'flag_active_premiere': False, 'min_age_child': 1,
+        'max_age_child': 6, 'show_emoji': '🎭', 'duration': 45,
+        'flag_active_repertoire': True, 'flag_active_bd': True,
+        'max_num_child_bd': 10, 'max_num_adult_bd': 10,
+        'flag_indiv_cost': False, 'price_type': 'Базовая стоимость',
+        'note': 'Примечание', 'link': 'https://example.com',
+    } for i in range(1, 11)]
+    schedule_events = [{
+        'event_id': i, 'event_type': 1, 'theater_event_id': i % 10 + 1,
+        'flag_turn_on_off': True,
+        'date_show': _sheets_date(today + datetime.timedelta(days=i // 3)),
+        'time_show': 0.5, 'qty_child': SEAT_QTY,
+        'qty_child_free_seat': SEAT_QTY, 'qty_child_nonconfirm_seat': 0,
+        'qty_adult': SEAT_QTY, 'qty_adult_free_seat': SEAT_QTY,
+        'qty_adult_nonconfirm_seat': 0, 'flag_gift': False,
+        'flag_christmas_tree': False, 'flag_santa': False,
+        'ticket_price_type': 'будни',
+    } for i in range(1, qty_events + 1)]
+    clients = [['Клиенты'], CLIENT_HEADERS]
+    clients += [
+        [i, 100 + i, 'Мама', '9000000000', 'Ваня', '', 5, i % qty_events + 1,
+         '', '', '', '', '', '01.01.2026', 1, 'Базовый', 1000, 1, 1,
+         False, False, False, 'Оплачен']
+        for i in range(1, qty_clients + 1)
+    ]
+    domik = {
+        'База спектаклей': _tab(ScheduleEventDTO, schedule_events),
+        'Список спектаклей': _tab(TheaterEventDTO, theater_events),
+        'Варианты стоимости': _tab(BaseTicketDTO, [BASE_TICKET]),
+        'База клиентов': clients,
+        'Промокоды': [['Промокоды'], ['id', 'Код', 'Скидка', 'Тип'],
+                      [1, 'SPRING', 10, '%']],
+        'Индив стоимости': [['Индив'], ['option', 'type', 'base_ticket_id',
+                                        'будни', 'выходные'],
+                            ['A', '', 1, 900, 1000]],
+    }
+    cme = {
+        'База ФЗМ': _tab(CustomMadeFormatDTO, [{
+            'custom_made_format_id': 1, 'name': 'Выездной',
+            'price': 10000, 'flag_outside': True,
+        }]),
+    }
+    spreadsheets = {db_googlesheets.sheet_id_domik: domik}
+    spreadsheets.setdefault(db_googlesheets.sheet_id_cme, {}).update(cme)
+    return spreadsheets
+
+
+@dataclass
+class OpStats:
+    durations: List[float] = field(default_factory=list)
+    api_calls: int = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.durations)
+
+    def percentile(self, q: float) -> float:
+        values = sorted(self.durations)
+        return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class Recorder:
+    def __init__(self, server: SheetsServer):
+        self.server = server
+        self.stats: Dict[str, OpStats] = defaultdict(OpStats)
+
+    async def run(self, name: str, coro):
+        calls = self.server.count()
+        start = time.perf_counter()
+        result = await coro
+        stats = self.stats[name]
+        stats.durations.append(time.perf_counter() - start)
+        stats.api_calls += self.server.count() - calls
+        return result
+
+
+def _reserve_user_data(ticket_id: int, event_id: int) -> Dict[str, Any]:
+    return {
+        'chose_price': 1000,
+        'client_data': {'name_adult': 'Мама', 'phone': '9000000000',
+                        'data_children': [['Ваня', '5']]},
+        'ticket_ids': [ticket_id],
+        'choose_schedule_event_ids': [event_id],
+    }
+
+
+async def replay_booking_day(
+        server: SheetsServer,
+        *,
+        qty_bookings: int = 40,
+        qty_reloads: int = 3,
+        worker_batch_size: int = 20,
+        seed: int = 1,
+) -> Dict[str, OpStats]:
+    """
+    День продаж: каждая бронь — места в расписание, строка клиента,
+    статус билета и подтверждение мест; часть броней идет пакетами через
+    обработчик очереди gspread; несколько полных обновлений справочников.
+    """
+    rnd = random.Random(seed)
+    recorder = Recorder(server)
+    sheet_id = db_googlesheets.sheet_id_domik
+    qty_events = len(server.spreadsheets[sheet_id]['База спектаклей']) - 2
+    ticket_id = len(server.spreadsheets[sheet_id]['База клиентов'])
+    worker_logger = logging.getLogger('bench.gspread_worker')
+    worker_tasks = []
+
+    for booking in range(qty_bookings):
+        ticket_id += 1
+        event_id = rnd.randint(1, qty_events)
+        free = rnd.randint(0, SEAT_QTY)
+        if qty_reloads and booking % max(1, qty_bookings // qty_reloads) == 0:
+            await recorder.run('full_reload',
+                               db_googlesheets.load_reference_data())
+
+        if booking % 2:
+            worker_tasks += [
+                {'action': 'write_client_reserve', 'sheet_id': sheet_id,
+                 'reserve_user_data': _reserve_user_data(ticket_id, event_id),
+                 'chat_id': ticket_id, 'base_ticket_dto': BASE_TICKET,
+                 'ticket_status_value': 'Создан'},
+                {'action': 'write_data_reserve', 'sheet_id': sheet_id,
+                 'event_id': event_id, 'numbers': [free, 1, free, 1],
+                 'option': 1},
+                {'action': 'update_ticket', 'sheet_id': sheet_id,
+                 'ticket_id': ticket_id, 'status': 'Оплачен'},
+            ]
+            if len(worker_tasks) >= worker_batch_size:
+                await recorder.run('worker_batch', gspread_worker
+                                   .process_gspread_tasks(worker_tasks,
+                                                          worker_logger))
+                worker_tasks = []
+            continue
+
+        await recorder.run('seat_write', googlesheets.write_data_reserve(
+            sheet_id, event_id, [free, 1, free, 1], 1))
+        await recorder.run('client_append', googlesheets.write_client_reserve(
+            sheet_id, _reserve_user_data(ticket_id, event_id), ticket_id,
+            BASE_TICKET, 'Создан'))
+        await recorder.run('status_update', googlesheets
+                           .update_ticket_in_gspread(sheet_id, ticket_id,
+                                                     'Оплачен'))
+        await recorder.run('seat_write', googlesheets.write_data_reserve(
+            sheet_id, event_id, [free, 0], 2))
+
+    if worker_tasks:
+        await recorder.run('worker_batch', gspread_worker
+                           .process_gspread_tasks(worker_tasks, worker_logger))
+    return dict(recorder.stats)
+
+
+def format_report(stats: Dict[str, OpStats], server: SheetsServer) -> str:
+    lines = [f'{"операция":<16}{"кол-во":>8}{"запросов":>10}'
+             f'{"время, с":>10}{"p95, мс":>10}']
+    for name, op in sorted(stats.items()):
+        lines.append(
+            f'{name:<16}{op.count:>8}{op.api_calls:>10}'
+            f'{sum(op.durations):>10.3f}{op.percentile(0.95) * 1000:>10.1f}')
+    by_op = defaultdict(int)
+    for call in server.calls:
+        by_op[call.op] += 1
+    lines.append('')
+    lines.append('запросы к API: ' + ', '.join(
+        f'{op}={count}' for op, count in sorted(by_op.items())))
+    lines.append(f'ошибки квоты: {server.errors}')
+    lines.append('кэш таблиц: ' + ', '.join(
+        f'{key}={value}'
+        for key, value in googlesheets._spreadsheets.stats().items()))
+    lines.append('лимит: ' + ', '.join(
+        f'{key}={value}'
+        for key, value in googlesheets._agcm.limiter.stats().items()))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--bookings', type=int, default=200)
+    parser.add_argument('--reloads', type=int, default=5)
+    parser.add_argument('--events', type=int, default=120)
+    parser.add_argument('--clients', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='задержка ответа API, с')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='доля ответов 429')
+    parser.add_argument('--quota', type=float, default=None,
+                        help='лимит запросов в минуту (по умолчанию нет)')
+    parser.add_argument('--backoff', type=float, default=0.0,
+                        help='начальная задержка повтора после 429, с')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    server = SheetsServer(build_workbook(args.events, args.clients),
+                          latency=args.latency, error_rate=args.error_rate)
+    install(googlesheets, server, quota_per_minute=args.quota,
+            backoff_base=args.backoff, range_names=RANGE_NAME)
+
+    start = time.perf_counter()
+    stats = asyncio.run(replay_booking_day(
+        server, qty_bookings=args.bookings, qty_reloads=args.reloads))
+    print(format_report(stats, server))
+    print(f'\nвсего: {time.perf_counter() - start:.3f} с')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Микробенчмарк цен билетов для списка билетов сеанса.
+
+Сравнивает прежний расчет (цена по каждому билету, для индивидуальной
+стоимости — запрос special_ticket_prices на билет) с resolve_ticket_prices.
+
+Запуск из корня репозитория:
+    python test/bench_ticket_prices.py --tickets 30
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from sql_counter import count_statements, prepared_database
+
+from db import BaseTicket, ScheduleEvent, SpecialTicketPrice, TheaterEvent
+from db import TypeEvent, db_postgres
+from db.enum import PriceType, TicketPriceType
+from db.reference_cache import reference_cache
+from db.ticket_prices import resolve_ticket_prices
+
+EVENT_DATETIME = datetime(2026, 12, 26, 11)
+
+
+async def seed(session, qty_tickets: int = 30):
+    """Спектакль с индивидуальной стоимостью и сеанс-подарок."""
+    tickets = []
+    for i in range(qty_tickets):
+        base_ticket_id = 100 + i
+        tickets.append(BaseTicket(
+            base_ticket_id=base_ticket_id, name=f'Билет {i}',
+            cost_main=1000 + i, cost_privilege=900 + i,
+            cost_main_in_period=1200 + i, cost_privilege_in_period=1100 + i,
+            quality_of_children=1, quality_of_adult=1,
+            quality_of_add_adult=0, quality_visits=1,
+            period_start_change_price=(
+                datetime(2026, 12, 20) if i % 2 else None),
+            period_end_change_price=(
+                datetime(2027, 1, 10) if i % 2 else None)))
+    session.add_all(tickets)
+    session.add_all([
+        TypeEvent(id=1, name='Спектакль', name_alias='С'),
+        TheaterEvent(id=1, name='Репка', flag_indiv_cost=True,
+                     price_type=PriceType.INDIVIDUAL),
+        TheaterEvent(id=2, name='Теремок', flag_indiv_cost=True,
+                     price_type=PriceType.OPTIONS),
+    ])
+    await session.flush()
+    for ticket in tickets:
+        # У каждого пятого билета нет индивидуальной цены
+        if ticket.base_ticket_id % 5 == 0:
+            continue
+        for option in ('1', 'Подарок', 'Ёлка', PriceType.OPTIONS.value):
+            session.add(SpecialTicketPrice(
+                option=option, base_ticket_id=ticket.base_ticket_id,
+                price_weekday=ticket.base_ticket_id * 10 + len(option),
+                price_weekend=ticket.base_ticket_id * 11 + len(option)))
+    session.add_all([
+        ScheduleEvent(
+            id=1, type_event_id=1, theater_event_id=1,
+            datetime_event=EVENT_DATETIME, qty_child=10,
+            qty_child_free_seat=10, qty_child_nonconfirm_seat=0,
+            qty_adult=10, qty_adult_free_seat=10,
+            qty_adult_nonconfirm_seat=0),
+        ScheduleEvent(
+            id=2, type_event_id=1, theater_event_id=2,
+            datetime_event=EVENT_DATETIME, qty_child=10,
+            qty_child_free_seat=10, qty_child_nonconfirm_seat=0,
+            qty_adult=10, qty_adult_free_seat=10,
+            qty_adult_nonconfirm_seat=0, flag_gift=True,
+            ticket_price_type=TicketPriceType.weekday),
+    ])
+    await session.commit()
+    return tickets
+
+
+async def legacy_prices(session, schedule_event, theater_event, tickets):
+    """Расчет до resolve_ticket_prices: запрос цены на каждый билет."""
+    prices = {}
+    for ticket in tickets:
+        option = ''
+        if schedule_event.flag_gift:
+            option = 'Подарок'
+        if schedule_event.flag_christmas_tree:
+            option = 'Ёлка'
+        if not option:
+            price_type = theater_event.price_type
+            if price_type == PriceType.INDIVIDUAL:
+                option = theater_event.id
+            else:
+                option = price_type.value
+
+        date_for_price = schedule_event.datetime_event
+        price, price_privilege = ticket.get_price_from_date(date_for_price)
+        type_ticket_price = schedule_event.ticket_price_type.value
+        if not type_ticket_price:
+            if date_for_price.weekday() in range(5):
+                type_ticket_price = 'будни'
+            else:
+                type_ticket_price = 'выходные'
+
+        if theater_event.flag_indiv_cost:
+            special_price = await db_postgres.get_special_ticket_price(
+                session,
+                option=option,
+                base_ticket_id=ticket.base_ticket_id,
+                type_ticket_price=type_ticket_price
+            )
+            if special_price is not None:
+                price = special_price
+        prices[ticket.base_ticket_id] = price, price_privilege
+    return prices
+
+
+async def batch_prices(session, schedule_event, theater_event, tickets):
+    ticket_prices = await resolve_ticket_prices(
+        session, schedule_event, theater_event, tickets)
+    return {key: (value.price, value.price_privilege)
+            for key, value in ticket_prices.items()}
+
+
+async def _measure(engine, func, repeat: int, *, cold: bool = False):
+    best = float('inf')
+    statements = 0
+    for _ in range(repeat):
+        if cold:
+            reference_cache.invalidate()
+        with count_statements(engine) as counter:
+            start = time.perf_counter()
+            await func()
+            best = min(best, time.perf_counter() - start)
+        statements = counter.count
+    return best, statements
+
+
+async def run(qty_tickets: int = 30, repeat: int = 20):
+    async with prepared_database() as (engine, sessionmaker):
+        async with sessionmaker() as session:
+            tickets = await seed(session, qty_tickets)
+        async with sessionmaker() as session:
+            schedule_event = await session.get(ScheduleEvent, 1)
+            theater_event = await session.get(TheaterEvent, 1)
+
+            def call(func):
+                return lambda: func(
+                    session, schedule_event, theater_event, tickets)
+
+            return {
+                'прежний расчет': await _measure(
+                    engine, call(legacy_prices), repeat),
+                'пакетный, кэш пуст': await _measure(
+                    engine, call(batch_prices), repeat, cold=True),
+                'пакетный, кэш прогрет': await _measure(
+                    engine, call(batch_prices), repeat),
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tickets', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args.tickets, args.repeat))
+    print(f'билетов: {args.tickets}, лучшее из {args.repeat}')
+    for name, (elapsed, statements) in results.items():
+        print(f'{name + ":":<24}{elapsed * 1000:>8.2f} мс, '
+              f'запросов: {statements}')
+
+
+if __name__ == '__main__':
+    main()
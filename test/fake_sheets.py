@@ -0,0 +1,130 @@
+"""
+Таблица Google Sheets в памяти для тестов api.googlesheets.
+
+Понимает диапазоны, которые формирует бот: весь лист ('Лист'), строка
+заголовков ('2:2'), колонка ('C:C'), ячейка ('C5'), ячейки в нотации
+R1C1, пакетное чтение и добавление строк. Каждое обращение к API
+записывается в calls. В formatted можно задать, как лист выглядит при
+FORMATTED_VALUE: иначе формулы возвращаются как есть при любом
+valueRenderOption.
+"""
+import re
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = ROOT_DIR / 'src'
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from api.sheet_index import SheetIndexCache
+
+RANGE_NAME = {
+    'База клиентов_': "'База клиентов'!",
+    'База спектаклей_': "'База спектаклей'!",
+    'База ДР_': "'База ДР'!",
+    'Варианты стоимости_': "'Варианты стоимости'!",
+    'Список спектаклей_': "'Список спектаклей'!",
+    'Промокоды_': "'Промокоды'!",
+    'Индив стоимости_': "'Индив стоимости'!",
+    'База ФЗМ_': "'База ФЗМ'!",
+    'Лист ожидания_': "'Лист ожидания'!",
+}
+
+_R1C1 = re.compile(r'R(\d+)C(\d+)(?::R(\d+)C(\d+))?$')
+
+
+def _column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+
+class FakeSpreadsheet:
+    def __init__(self, tabs):
+        self.tabs = tabs
+        self.formatted = {}
+        self.calls = []
+        self.cm = self
+        self.ss = self
+
+    def _split(self, range_name):
+        tab, _, cells = range_name.partition('!')
+        return self.tabs[tab.strip("'")], cells
+
+    async def values_get(self, range_name, params=None):
+        self.calls.append(('get', range_name))
+        return self._read(range_name, params)
+
+    async def values_batch_get(self, ranges, params=None):
+        self.calls.append(('batch_get', tuple(ranges)))
+        return {'valueRanges': [self._read(range_name)
+                                for range_name in ranges]}
+
+    def _read(self, range_name, params=None):
+        rows, cells = self._split(range_name)
+        tab = range_name.partition('!')[0].strip("'")
+        render = (params or {}).get('valueRenderOption')
+        if render == 'FORMATTED_VALUE' and tab in self.formatted:
+            rows = self.formatted[tab]
+        if not cells:
+            return {'values': [list(row) for row in rows]}
+        if cells == '2:2':
+            return {'values': [rows[1]]}
+        cell = re.fullmatch(r'([A-Z]+)(\d+)', cells)
+        if cell is not None:
+            row = rows[int(cell.group(2)) - 1]
+            col = _column_number(cell.group(1)) - 1
+            return {'values': [[row[col]]] if len(row) > col else []}
+        column = re.fullmatch(r'([A-Z]+):\1', cells).group(1)
+        col = _column_number(column) - 1
+        return {'values': [[row[col]] if len(row) > col else []
+                           for row in rows]}
+
+    async def values_append(self, range_name, params, body):
+        self.calls.append(('append', range_name))
+        rows, _ = self._split(range_name)
+        first_row = len(rows) + 1
+        rows.extend(list(row) for row in body['values'])
+        tab = range_name.split('!')[0]
+        return {'updates': {
+            'updatedRange': f'{tab}!A{first_row}:Z{len(rows)}'}}
+
+    async def values_update(self, range_name, params, body):
+        self.calls.append(('update', range_name))
+        self._write(range_name, body['values'])
+        return {}
+
+    def values_batch_update(self, body):
+        return body
+
+    async def _call(self, method, body):
+        self.calls.append(('batch_update', len(body['data'])))
+        for item in body['data']:
+            self._write(item['range'], item['values'])
+        return {}
+
+    def _write(self, range_name, values):
+        rows, cells = self._split(range_name)
+        row, col = map(int, _R1C1.match(cells).groups()[:2])
+        for i, value in enumerate(values[0]):
+            target = rows[row - 1]
+            target.extend([''] * (col + i - len(target)))
+            target[col - 1 + i] = value
+
+    def api_calls(self):
+        return [call[0] for call in self.calls]
+
+
+def install(monkeypatch, googlesheets, tabs):
+    """Подменяет таблицу в модуле api.googlesheets и сбрасывает индексы."""
+    spreadsheet = FakeSpreadsheet(tabs)
+
+    async def open_spreadsheet(spreadsheet_id):
+        return spreadsheet
+
+    monkeypatch.setattr(googlesheets, '_open_spreadsheet', open_spreadsheet)
+    monkeypatch.setattr(googlesheets, 'RANGE_NAME', RANGE_NAME)
+    monkeypatch.setattr(googlesheets, '_sheet_indexes', SheetIndexCache())
+    return spreadsheet
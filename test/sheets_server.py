@@ -0,0 +1,366 @@
+"""
+Сервер Google Sheets v4 в памяти процесса.
+
+Подставляется вместо HTTP-сессии gspread, поэтому запросы проходят весь
+путь бота: api.googlesheets -> gspread_asyncio -> gspread -> «сеть».
+Поддерживаются метаданные таблицы и values: get, batchGet, batchUpdate,
+update, append. Значения хранятся в таблицах-списках (строки с 1-й),
+задержку и ошибки квоты можно задать. Каждый запрос пишется в calls.
+"""
+import json
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = ROOT_DIR / 'src'
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+import gspread
+import requests
+from gspread_asyncio import AsyncioGspreadClient
+
+from api.sheet_index import SheetIndexCache, column_letter
+from api.sheets_limiter import (
+    LocalTokenBucket, SheetsClientManager, SheetsRateLimiter)
+from api.spreadsheet_cache import CredentialsRefresher, SpreadsheetCache
+
+_R1C1 = re.compile(r'R(\d+)C(\d+)(?::R(\d+)C(\d+))?')
+_A1 = re.compile(r'([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?')
+_PATH = re.compile(r'/v4/spreadsheets/([^/:]+)(?:/values(?:/(.+?))?)?'
+                   r'(?::(\w+))?')
+
+Bounds = Tuple[int, int, Optional[int], Optional[int]]
+
+
+def _column_number(letters: str) -> int:
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+
+def split_range(range_name: str) -> Tuple[str, Bounds]:
+    """
+    Разбирает диапазон в нотации A1 или R1C1.
+    Возвращает имя листа и границы (row1, col1, row2, col2), None — без
+    ограничения.
+    """
+    tab, _, cells = range_name.partition('!')
+    tab = tab.strip("'")
+    if not cells:
+        return tab, (1, 1, None, None)
+
+    match = _R1C1.fullmatch(cells)
+    if match:
+        r1, c1, r2, c2 = match.groups()
+        r1, c1 = int(r1), int(c1)
+        return tab, (r1, c1, int(r2 or r1), int(c2 or c1))
+
+    match = _A1.fullmatch(cells)
+    if not match:
+        raise ValueError(f'Неизвестный диапазон: {range_name}')
+    col1, row1, col2, row2 = match.groups()
+    if match.group(3) is None and match.group(4) is None:
+        # Одна ячейка
+        col2, row2 = col1, row1
+    return tab, (
+        int(row1) if row1 else 1,
+        _column_number(col1) if col1 else 1,
+        int(row2) if row2 else None,
+        _column_number(col2) if col2 else None,
+    )
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == ''
+
+
+def _format_value(value: Any) -> Any:
+    if _is_empty(value):
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _parse_user_entered(value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    if value.upper() in ('TRUE', 'FALSE'):
+        return value.upper() == 'TRUE'
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _response(status: int, body: Dict[str, Any], url: str):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body, ensure_ascii=False).encode()
+    response.headers['Content-Type'] = 'application/json'
+    response.url = url
+    return response
+
+
+@dataclass
+class Call:
+    op: str
+    spreadsheet_id: str
+    detail: Any = None
+
+
+class SheetsServer:
+    """
+    Таблицы: {spreadsheet_id: {имя листа: [[ячейки строки 1], ...]}}.
+
+    latency — задержка каждого ответа в секундах (число или функция от
+    операции), fail_next/error_rate — ответы с ошибкой квоты 429.
+    """
+
+    def __init__(
+            self,
+            spreadsheets: Dict[str, Dict[str, List[List[Any]]]],
+            *,
+            latency: float | Callable[[str], float] = 0.0,
+            error_rate: float = 0.0,
+            seed: int = 0,
+    ):
+        self.spreadsheets = spreadsheets
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls: List[Call] = []
+        self.errors = 0
+        self._fail_next: List[int] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # gspread.HTTPClient обновляет заголовки сессии
+        self.headers: Dict[str, str] = {}
+
+    def fail_next(self, count: int = 1, status: int = 429) -> None:
+        self._fail_next.extend([status] * count)
+
+    def api_calls(self) -> List[str]:
+        return [call.op for call in self.calls]
+
+    def count(self, op: Optional[str] = None) -> int:
+        if op is None:
+            return len(self.calls)
+        return sum(call.op == op for call in self.calls)
+
+    # requests.Session
+    def request(self, method, url, params=None, json=None, **kwargs):
+        spreadsheet_id, range_name, action = _PATH.fullmatch(
+            urlsplit(url).path).groups()
+        params = params or {}
+        op = self._get_op(method.upper(), range_name, action)
+        self.calls.append(Call(op, spreadsheet_id, range_name or action))
+
+        latency = self.latency(op) if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+
+        status = self._next_error()
+        if status is not None:
+            self.errors += 1
+            return _response(status, {'error': {
+                'code': status,
+                'message': 'Quota exceeded for quota metric',
+                'status': 'RESOURCE_EXHAUSTED',
+            }}, url)
+
+        with self._lock:
+            body = getattr(self, f'_{op}')(
+                spreadsheet_id,
+                unquote(range_name) if range_name else None,
+                params,
+                json,
+            )
+        return _response(200, body, url)
+
+    def _get_op(self, method, range_name, action):
+        if range_name is None and action is None:
+            return 'metadata'
+        if action == 'batchGet':
+            return 'batch_get'
+        if action == 'batchUpdate':
+            return 'batch_update'
+        if action == 'append':
+            return 'append'
+        return 'get' if method == 'GET' else 'update'
+
+    def _next_error(self) -> Optional[int]:
+        if self._fail_next:
+            return self._fail_next.pop(0)
+        if self.error_rate and self._random.random() < self.error_rate:
+            return 429
+        return None
+
+    def _tab(self, spreadsheet_id, tab):
+        return self.spreadsheets[spreadsheet_id][tab]
+
+    def _metadata(self, spreadsheet_id, range_name, params, body):
+        tabs = self.spreadsheets[spreadsheet_id]
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'properties': {'title': spreadsheet_id},
+            'sheets': [
+                {'properties': {'sheetId': i, 'title': tab, 'index': i}}
+                for i, tab in enumerate(tabs)
+            ],
+        }
+
+    def read(self, spreadsheet_id, range_name, value_render_option=None):
+        tab, (r1, c1, r2, c2) = split_range(range_name)
+        rows = self._tab(spreadsheet_id, tab)
+        formatted = value_render_option in (None, 'FORMATTED_VALUE')
+
+        values = []
+        last = r2 if r2 is not None else len(rows)
+        for row in rows[r1 - 1:last]:
+            cells = row[c1 - 1:c2]
+            if formatted:
+                cells = [_format_value(value) for value in cells]
+            else:
+                cells = ['' if _is_empty(value) else value for value in cells]
+            # API не возвращает пустые ячейки в конце строки и пустые
+            # строки в конце диапазона
+            while cells and cells[-1] == '':
+                cells.pop()
+            values.append(cells)
+        while values and not values[-1]:
+            values.pop()
+
+        result = {'range': range_name, 'majorDimension': 'ROWS'}
+        if values:
+            result['values'] = values
+        return result
+
+    def write(self, spreadsheet_id, range_name, values, value_input_option):
+        tab, (r1, c1, _, _) = split_range(range_name)
+        rows = self._tab(spreadsheet_id, tab)
+        for i, row_values in enumerate(values):
+            while len(rows) < r1 + i:
+                rows.append([])
+            row = rows[r1 - 1 + i]
+            for j, value in enumerate(row_values):
+                if value_input_option == 'USER_ENTERED':
+                    value = _parse_user_entered(value)
+                col = c1 - 1 + j
+                row.extend([''] * (col + 1 - len(row)))
+                row[col] = value
+        width = max((len(row_values) for row_values in values), default=0)
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'updatedRange': (
+                f"'{tab}'!{column_letter(c1)}{r1}:"
+                f"{column_letter(c1 + width - 1)}{r1 + len(values) - 1}"),
+            'updatedRows': len(values),
+        }
+
+    def _get(self, spreadsheet_id, range_name, params, body):
+        return self.read(
+            spreadsheet_id, range_name, params.get('valueRenderOption'))
+
+    def _batch_get(self, spreadsheet_id, range_name, params, body):
+        ranges = params['ranges']
+        if isinstance(ranges, str):
+            ranges = [ranges]
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'valueRanges': [
+                self.read(spreadsheet_id, name,
+                          params.get('valueRenderOption'))
+                for name in ranges
+            ],
+        }
+
+    def _update(self, spreadsheet_id, range_name, params, body):
+        return self.write(spreadsheet_id, range_name, body['values'],
+                          params.get('valueInputOption'))
+
+    def _batch_update(self, spreadsheet_id, range_name, params, body):
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'responses': [
+                self.write(spreadsheet_id, item['range'], item['values'],
+                           body.get('valueInputOption'))
+                for item in body['data']
+            ],
+        }
+
+    def _append(self, spreadsheet_id, range_name, params, body):
+        tab, (_, c1, _, _) = split_range(range_name)
+        rows = self._tab(spreadsheet_id, tab)
+        last = len(rows)
+        while last and all(_is_empty(value) for value in rows[last - 1]):
+            last -= 1
+        target = f"'{tab}'!R{last + 1}C{c1}"
+        update = self.write(spreadsheet_id, target, body['values'],
+                            params.get('valueInputOption'))
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'tableRange': f"'{tab}'!A1:{column_letter(c1)}{last}",
+            'updates': update,
+        }
+
+
+class SheetsServerClientManager(SheetsClientManager):
+    """
+    Менеджер клиентов бота, который ходит в SheetsServer.
+    Без quota_per_minute лимит не ограничивает запросы.
+    """
+
+    def __init__(
+            self,
+            server: SheetsServer,
+            quota_per_minute: Optional[float] = None,
+            backoff_base: float = 0.0,
+    ):
+        if quota_per_minute is None:
+            bucket = LocalTokenBucket(10 ** 9, 10 ** 9)
+        else:
+            bucket = LocalTokenBucket(quota_per_minute)
+        super().__init__(lambda: None, SheetsRateLimiter(bucket),
+                         backoff_base=backoff_base)
+        self.server = server
+
+    async def _authorize(self):
+        if self.auth_time is None:
+            self.auth_time = time.monotonic()
+            gc = gspread.Client(None, session=self.server)
+            self._client_cache[self.auth_time] = AsyncioGspreadClient(
+                self, gc)
+        return self._client_cache[self.auth_time]
+
+
+def install(googlesheets, server, *, patch=setattr, quota_per_minute=None,
+            backoff_base=0.0, range_names=None):
+    """
+    Направляет api.googlesheets в server и сбрасывает его кэши.
+    patch — monkeypatch.setattr в тестах, setattr в бенчмарке.
+    """
+    if range_names is not None:
+        patch(googlesheets, 'RANGE_NAME', range_names)
+    patch(googlesheets, '_agcm', SheetsServerClientManager(
+        server, quota_per_minute, backoff_base))
+    patch(googlesheets, '_spreadsheets', SpreadsheetCache())
+    patch(googlesheets, '_sheet_indexes', SheetIndexCache())
+    patch(googlesheets, '_creds_refresher', CredentialsRefresher(
+        lambda: SimpleNamespace(expiry=None)))
+    return server
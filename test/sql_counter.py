@@ -0,0 +1,84 @@
+"""
+Счетчик SQL-запросов для тестов загрузки связей.
+
+База берется из TEST_DATABASE_URL (Postgres), иначе используется
+sqlite+aiosqlite в памяти. Если ни то, ни другое недоступно — тест
+пропускается.
+"""
+import os
+import sys
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = ROOT_DIR / 'src'
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from sqlalchemy import BIGINT, BigInteger, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+
+from db import BaseModel
+
+
+@compiles(BigInteger, 'sqlite')
+@compiles(BIGINT, 'sqlite')
+def _compile_bigint_sqlite(type_, compiler, **kw):
+    # В SQLite автоинкремент есть только у INTEGER PRIMARY KEY
+    return 'INTEGER'
+
+
+def get_test_db_url(sqlite_path=None):
+    """
+    sqlite_path нужен тестам с несколькими соединениями:
+    база в памяти у каждого соединения своя.
+    """
+    db_url = os.environ.get('TEST_DATABASE_URL')
+    if db_url:
+        return db_url
+    pytest.importorskip('aiosqlite')
+    if sqlite_path:
+        return f'sqlite+aiosqlite:///{sqlite_path}'
+    return 'sqlite+aiosqlite://'
+
+
+class SqlCounter:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_statements(async_engine):
+    counter = SqlCounter()
+    event.listen(async_engine.sync_engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(
+            async_engine.sync_engine, 'before_cursor_execute', counter)
+
+
+@asynccontextmanager
+async def prepared_database(sqlite_path=None):
+    """Движок с чистой схемой и фабрика сессий."""
+    async_engine = create_async_engine(get_test_db_url(sqlite_path))
+    async with async_engine.begin() as conn:
+        await conn.run_sync(BaseModel.metadata.drop_all)
+        await conn.run_sync(BaseModel.metadata.create_all)
+    try:
+        yield async_engine, async_sessionmaker(
+            async_engine, expire_on_commit=False)
+    finally:
+        async with async_engine.begin() as conn:
+            await conn.run_sync(BaseModel.metadata.drop_all)
+        await async_engine.dispose()
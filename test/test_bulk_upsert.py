@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import select
+
+from sql_counter import count_statements, prepared_database
+
+from db import BaseTicket, TheaterEvent, db_postgres
+from db import bulk_upsert as bulk_upsert_module
+from db.bulk_upsert import UpsertResult, bulk_upsert
+
+OLD_DATE = datetime(2020, 1, 1)
+
+
+def _ticket_row(base_ticket_id, name='Базовый', cost_main=1000):
+    return {
+        'base_ticket_id': base_ticket_id, 'name': name,
+        'cost_main': cost_main, 'cost_privilege': 900,
+        'cost_main_in_period': 1000, 'cost_privilege_in_period': 900,
+        'quality_of_children': 1, 'quality_of_adult': 1,
+        'quality_of_add_adult': 0, 'quality_visits': 1,
+    }
+
+
+async def _seed_tickets(session, ids):
+    session.add_all(BaseTicket(**_ticket_row(i), updated_at=OLD_DATE)
+                    for i in ids)
+    await session.commit()
+
+
+def test_upsert_result_summary():
+    result = UpsertResult(1, 2, 3) + UpsertResult(inserted=1)
+    assert result == UpsertResult(2, 2, 3)
+    assert result.changed == 4
+    assert result.summary() == 'добавлено: 2, изменено: 2, без изменений: 3'
+
+
+def test_bulk_upsert_counts_and_keeps_unchanged_rows_untouched():
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                await _seed_tickets(session, [1, 2, 3])
+
+            rows = [
+                _ticket_row(1),
+                _ticket_row(2, cost_main=1500),
+                _ticket_row(3),
+                _ticket_row(4, name='Новый'),
+            ]
+            async with sessionmaker() as session:
+                with count_statements(engine) as counter:
+                    result = await bulk_upsert(session, BaseTicket, rows)
+                await session.commit()
+            # SELECT существующих ключей + INSERT ... ON CONFLICT
+            assert counter.count == 2
+            assert result == UpsertResult(inserted=1, updated=1, unchanged=2)
+
+            async with sessionmaker() as session:
+                tickets = {
+                    t.base_ticket_id: t
+                    for t in await session.scalars(select(BaseTicket))
+                }
+            assert tickets[2].cost_main == 1500
+            assert tickets[4].name == 'Новый'
+            assert tickets[1].updated_at == OLD_DATE
+            assert tickets[3].updated_at == OLD_DATE
+            assert tickets[2].updated_at != OLD_DATE
+
+    asyncio.run(main())
+
+
+def test_bulk_upsert_refreshes_objects_already_in_session():
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                await _seed_tickets(session, [1])
+            async with sessionmaker() as session:
+                ticket = await session.get(BaseTicket, 1)
+                await bulk_upsert(
+                    session, BaseTicket,
+                    [_ticket_row(1, name='Старый'), _ticket_row(1, name='Новый')])
+                assert ticket.name == 'Новый'
+
+    asyncio.run(main())
+
+
+def test_bulk_upsert_splits_large_lists_into_chunks(monkeypatch):
+    monkeypatch.setattr(bulk_upsert_module, 'MAX_PARAMS_PER_STATEMENT', 20)
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            rows = [_ticket_row(i) for i in range(1, 6)]
+            async with sessionmaker() as session:
+                with count_statements(engine) as counter:
+                    result = await bulk_upsert(session, BaseTicket, rows)
+                await session.commit()
+            # 10 колонок -> по 2 строки в запросе -> 3 пачки
+            assert counter.count == 6
+            assert result == UpsertResult(inserted=5)
+
+    asyncio.run(main())
+
+
+def test_update_from_googlesheets_returns_summary():
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            theater_events = [
+                SimpleNamespace(to_dto=lambda i=i: {'id': i, 'name': f'{i}'})
+                for i in (1, 2)
+            ]
+            async with sessionmaker() as session:
+                first = await db_postgres.update_theater_events_from_googlesheets(
+                    session, theater_events)
+                second = await db_postgres.update_theater_events_from_googlesheets(
+                    session, theater_events)
+                names = (await session.scalars(
+                    select(TheaterEvent.name).order_by(TheaterEvent.id))).all()
+            assert first == UpsertResult(inserted=2)
+            assert second == UpsertResult(unchanged=2)
+            assert names == ['1', '2']
+
+    asyncio.run(main())
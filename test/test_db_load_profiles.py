@@ -0,0 +1,209 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+
+from sql_counter import count_statements, prepared_database
+
+from db import (
+    User, Person, Adult, Child, Ticket, TheaterEvent, TypeEvent,
+    ScheduleEvent, BaseTicket, UserStatus, db_postgres)
+from db.enum import AgeType, TicketStatus
+from db.loaders import PersonLoad, ScheduleLoad, TheaterLoad, UserLoad
+
+EVENT_ID = 1
+
+
+async def _seed(session, qty_tickets):
+    session.add_all([
+        TypeEvent(id=1, name='Спектакль', name_alias='С'),
+        TheaterEvent(id=1, name='Репка'),
+        BaseTicket(
+            base_ticket_id=1, name='Базовый', cost_main=1000,
+            cost_privilege=900, cost_main_in_period=1000,
+            cost_privilege_in_period=900, quality_of_children=1,
+            quality_of_adult=1, quality_of_add_adult=0, quality_visits=1),
+    ])
+    await session.flush()
+    event = ScheduleEvent(
+        id=EVENT_ID, type_event_id=1, theater_event_id=1,
+        datetime_event=datetime.now() + timedelta(days=1),
+        qty_child=10, qty_child_free_seat=10, qty_child_nonconfirm_seat=0,
+        qty_adult=10, qty_adult_free_seat=10, qty_adult_nonconfirm_seat=0)
+    session.add(event)
+    for i in range(1, qty_tickets + 1):
+        user = User(user_id=i, chat_id=i)
+        user.status = UserStatus(user_id=i)
+        adult = Person(id=i * 10, name=f'Взрослый {i}',
+                       age_type=AgeType.adult, user_id=i)
+        adult.adult = Adult(id=i, phone=f'900000000{i}')
+        child = Person(id=i * 10 + 1, name=f'Ребенок {i}',
+                       age_type=AgeType.child, user_id=i,
+                       parent_id=i * 10)
+        child.child = Child(id=i, age=5)
+        ticket = Ticket(id=i, base_ticket_id=1, price=1000,
+                        status=TicketStatus.PAID,
+                        schedule_event_id=EVENT_ID)
+        ticket.user = user
+        ticket.people = [adult, child]
+        session.add_all([user, adult, child, ticket])
+    await session.commit()
+
+
+def _run(coro_factory, qty_tickets=1):
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                await _seed(session, qty_tickets)
+            async with sessionmaker() as session:
+                return await coro_factory(engine, session)
+    return asyncio.run(main())
+
+
+def test_get_user_minimal_is_single_statement_and_raises_on_relations():
+    async def scenario(engine, session):
+        with count_statements(engine) as counter:
+            user = await db_postgres.get_user(session, 1)
+        assert counter.count == 1
+        with pytest.raises(InvalidRequestError):
+            _ = user.tickets
+
+    _run(scenario)
+
+
+def test_get_user_profiles_load_only_requested_relations():
+    async def scenario(engine, session):
+        # Пользователь уже в identity map после check_user_db
+        minimal = await db_postgres.get_user(session, 1)
+        with count_statements(engine) as counter:
+            user = await db_postgres.get_user(
+                session, 1, UserLoad.WITH_PEOPLE)
+            assert user is minimal
+            names = sorted(p.name for p in user.people)
+            phones = [p.adult.phone for p in user.people if p.adult]
+        # users + people + adults + children
+        assert counter.count == 4
+        assert names == ['Взрослый 1', 'Ребенок 1']
+        assert phones == ['9000000001']
+
+    _run(scenario)
+
+
+def test_ticket_statements_do_not_depend_on_people_count():
+    async def scenario(engine, session):
+        with count_statements(engine) as counter:
+            ticket = await db_postgres.get_ticket(session, 1)
+            _ = [(p.adult, p.child) for p in ticket.people]
+            _ = ticket.user.chat_id
+        return counter.count
+
+    # tickets + people + adults + children + users
+    assert _run(scenario) == 5
+
+
+@pytest.mark.parametrize('qty_tickets', [1, 3])
+def test_schedule_with_tickets_has_no_n_plus_one(qty_tickets):
+    async def scenario(engine, session):
+        with count_statements(engine) as counter:
+            event = await db_postgres.get_schedule_event(
+                session, EVENT_ID, ScheduleLoad.WITH_TICKETS)
+            for ticket in event.tickets:
+                _ = ticket.user.status.is_blocked_by_user
+                _ = [(p.adult, p.child) for p in ticket.people]
+            _ = event.theater_event.name
+        assert len(event.tickets) == qty_tickets
+        return counter.count
+
+    # schedule_events + theater_events + type_events + tickets
+    # + users + user_statuses + people + adults + children
+    assert _run(scenario, qty_tickets) == 9
+
+
+def test_pricing_profile_replaces_separate_event_lookups():
+    async def scenario(engine, session):
+        context = SimpleNamespace(session=session)
+        with count_statements(engine) as counter:
+            base_tickets, schedule_event, theater_event, type_event = (
+                await db_postgres.get_schedule_theater_base_tickets(
+                    context, EVENT_ID))
+        assert theater_event is schedule_event.theater_event
+        assert [bt.base_ticket_id for bt in base_tickets] == [1]
+        return counter.count
+
+    # schedule_events + theater_events + type_events + 3 x base_tickets
+    # + запрос всех базовых билетов, т.к. ни одна связь не заполнена
+    assert _run(scenario) == 7
+
+
+def test_person_with_parent_profile():
+    async def scenario(engine, session):
+        with count_statements(engine) as counter:
+            person = await db_postgres.get_person(
+                session, 11, PersonLoad.WITH_PARENT)
+            phone = person.parent.adult.phone
+        assert phone == '9000000001'
+        return counter.count
+
+    # people + adults + children + parent + parent.adult
+    assert _run(scenario) == 5
+
+
+def test_theater_minimal_does_not_load_schedule():
+    async def scenario(engine, session):
+        with count_statements(engine) as counter:
+            theater = await db_postgres.get_theater_event(session, 1)
+        assert counter.count == 1
+        with pytest.raises(InvalidRequestError):
+            _ = theater.schedule_events
+
+        theater = await db_postgres.get_theater_event(
+            session, 1, TheaterLoad.WITH_SCHEDULE)
+        assert [s.type_event.name for s in theater.schedule_events] == [
+            'Спектакль']
+
+    _run(scenario)
+
+
+def test_mutators_work_without_implicit_loads():
+    async def scenario(engine, session):
+        adult = await db_postgres.create_adult(session, 1, 'Новый', '9111111111')
+        child = await db_postgres.create_child(
+            session, 1, 'Новый ребенок', age=3, parent_id=adult.person_id)
+        people_ids = await db_postgres.create_people(session, 1, {
+            'name_adult': 'Взрослый 1',
+            'phone': '9222222222',
+            'data_children': [['Ребенок 1', '6']],
+        })
+        assert people_ids == [10, 11]
+
+        await db_postgres.attach_user_and_people_to_ticket(
+            session, 1, 1, [child.person_id])
+        await db_postgres.update_schedule_event(
+            session, EVENT_ID, base_ticket_ids=[1])
+        await db_postgres.delete_person(session, child.person_id)
+        await db_postgres.del_ticket(session, 1)
+
+        user = await db_postgres.get_user(session, 1, UserLoad.WITH_PEOPLE)
+        assert sorted(p.name for p in user.people) == [
+            'Взрослый 1', 'Новый', 'Ребенок 1']
+
+    _run(scenario)
+
+
+def test_check_user_db_handler_statement_count():
+    pytest.importorskip('settings.settings')
+    from handlers import check_user_db
+
+    async def scenario(engine, session):
+        update = SimpleNamespace(
+            effective_user=SimpleNamespace(id=1, is_bot=False, username='u'),
+            effective_chat=SimpleNamespace(id=1),
+        )
+        context = SimpleNamespace(session=session, user_data={})
+        with count_statements(engine) as counter:
+            await check_user_db(update, context)
+        return counter.count
+
+    assert _run(scenario, qty_tickets=3) == 1
@@ -17,6 +17,8 @@ from api.web.deps import get_session
 from api.web.routes import pages, booking, api as api_route
 from api.web.services import booking_service
 from db.enum import PromotionDiscountType, UserRole
+from db.reference_cache import reference_cache
+from db.seat_ledger import SeatCounts
 from yookassa import Payment
 
 
@@ -133,9 +135,8 @@ def test_booking_page_has_add_child_button(monkeypatch):
 
     monkeypatch.setattr(booking, 'get_schedule_event', AsyncMock(return_value=mock_s_event))
     monkeypatch.setattr(booking, 'get_base_tickets_by_event_or_all', AsyncMock(return_value=[mock_ticket_type]))
-    # Убираем мок get_ticket_price_for_web в booking, чтобы проверить работу get_special_ticket_price через booking_service
-    monkeypatch.setattr(booking_service, 'get_base_ticket', AsyncMock(return_value=mock_ticket_type))
-    monkeypatch.setattr(booking_service, 'get_special_ticket_price', AsyncMock(return_value=3000))
+    # Убираем мок get_ticket_price_for_web в booking, чтобы проверить подстановку спец. цены из кэша справочников
+    monkeypatch.setattr(reference_cache, 'get_special_ticket_prices', AsyncMock(return_value={1: 3000}))
 
     with _create_client(monkeypatch) as client:
         response = client.get('/booking/101')
@@ -170,6 +171,7 @@ def test_post_booking_form_success(monkeypatch):
     monkeypatch.setattr(booking, 'check_promo_restrictions_web', AsyncMock(return_value=(True, "")))
     monkeypatch.setattr(booking, 'publish_write_data_reserve', AsyncMock())
     monkeypatch.setattr(booking, 'publish_write_client_reserve', AsyncMock())
+    monkeypatch.setattr(booking, 'apply_seat_delta', AsyncMock(return_value=SeatCounts(9, 0, 9, 0)))
 
     with _create_client(monkeypatch) as client:
         # Мокаем БД
@@ -241,6 +243,44 @@ def test_post_booking_no_seats(monkeypatch):
     assert "осталось всего 0 детских мест" in response.text
 
 
+def test_post_booking_seats_taken_concurrently(monkeypatch):
+    # Проверка по сеансу прошла, но места заняли параллельной бронью
+    mock_payment_create = MagicMock()
+    monkeypatch.setattr(Payment, "create", mock_payment_create)
+
+    mock_ticket_type = MagicMock()
+    mock_ticket_type.base_ticket_id = 1
+    mock_ticket_type.name = "1+1"
+    mock_ticket_type.quality_of_children = 1
+    mock_ticket_type.quality_of_adult = 1
+    mock_ticket_type.quality_of_add_adult = 0
+
+    mock_s_event = _create_mock_session_event(free_seats_child=10, free_seats_adult=10)
+    mock_apply_seat_delta = AsyncMock(return_value=None)
+    monkeypatch.setattr(booking, 'get_schedule_event', AsyncMock(return_value=mock_s_event))
+    monkeypatch.setattr(booking, 'get_base_tickets_by_event_or_all', AsyncMock(return_value=[mock_ticket_type]))
+    monkeypatch.setattr(booking, 'get_ticket_price_for_web', AsyncMock(return_value=2400))
+    monkeypatch.setattr(booking, 'get_ticket_prices_for_web', AsyncMock(return_value={1: 2400}))
+    monkeypatch.setattr(booking, 'get_user_by_phone', AsyncMock(return_value=None))
+    monkeypatch.setattr(booking, 'apply_seat_delta', mock_apply_seat_delta)
+
+    with _create_client(monkeypatch) as client:
+        form_data = {
+            'ticket_type': '1',
+            'adult_name': 'Анна',
+            'phone': '+79991112233',
+            'email': 'anna@example.com',
+            'child_name': ['Миша'],
+            'child_age': ['3'],
+        }
+        response = client.post('/booking/101', data=form_data)
+
+    assert response.status_code == 400
+    assert "свободные места на этот сеанс закончились" in response.text
+    mock_apply_seat_delta.assert_awaited_once()
+    mock_payment_create.assert_not_called()
+
+
 def test_negative_free_seats_shown_as_zero(monkeypatch):
     # Создаем мок-событие с отрицательным количеством мест
     mock_event = _create_mock_event(free_seats_child=-5, free_seats_adult=-2)
@@ -582,6 +622,7 @@ def test_post_booking_form_finds_chat_id_by_phone(monkeypatch):
         monkeypatch.setattr(booking, 'get_ticket_price_for_web', AsyncMock(return_value=2400))
         monkeypatch.setattr(booking, 'publish_write_data_reserve', AsyncMock())
         monkeypatch.setattr(booking, 'publish_write_client_reserve', AsyncMock())
+        monkeypatch.setattr(booking, 'apply_seat_delta', AsyncMock(return_value=SeatCounts(9, 0, 9, 0)))
 
         # Мокаем сеанс с местами
         mock_s_event = _create_mock_session_event(free_seats_child=10, free_seats_adult=10)
@@ -637,6 +678,7 @@ def test_post_booking_form_skips_chat_id_for_admin(monkeypatch):
         monkeypatch.setattr(booking, 'get_ticket_price_for_web', AsyncMock(return_value=2400))
         monkeypatch.setattr(booking, 'publish_write_data_reserve', AsyncMock())
         monkeypatch.setattr(booking, 'publish_write_client_reserve', AsyncMock())
+        monkeypatch.setattr(booking, 'apply_seat_delta', AsyncMock(return_value=SeatCounts(9, 0, 9, 0)))
 
         # Мокаем сеанс с местами
         mock_s_event = _create_mock_session_event(free_seats_child=10, free_seats_adult=10)
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+
+import pytest
+
+from fake_sheets import install
+
+pytest.importorskip('settings.settings')
+
+from api import googlesheets
+from api import gspread_worker
+from api.gspread_dlq import MAX_REPLAYS, DeadLetter
+
+logger = logging.getLogger('test.gspread_worker')
+
+SEAT_HEADERS = ['event_id', 'qty_child_free_seat', 'qty_child_nonconfirm_seat',
+                'qty_adult_free_seat', 'qty_adult_nonconfirm_seat']
+CLIENT_HEADERS = ['ticket_id', 'chat_id', 'name', 'phone', 'children', '',
+                  'age', 'event_id', 'e1', 'e2', 'e3', 'e4', 'e5',
+                  'created_at', 'base_ticket_id', 'base_ticket_name', 'price',
+                  'qty_child', 'qty_adult', 'flag_exclude', 'flag_transfer',
+                  'flag_exclude_place_sum', 'ticket_status']
+BASE_TICKET_DTO = {
+    'base_ticket_id': 1, 'name': 'Базовый', 'cost_main': 1000,
+    'cost_privilege': 900, 'cost_main_in_period': 1000,
+    'cost_privilege_in_period': 900, 'quality_of_children': 1,
+    'quality_of_adult': 1, 'quality_of_add_adult': 0, 'quality_visits': 1,
+}
+
+
+@pytest.fixture
+def spreadsheet(monkeypatch):
+    seats = [['Расписание'], SEAT_HEADERS]
+    seats += [[event_id, 10, 0, 10, 0] for event_id in (1, 2)]
+    clients = [['Клиенты'], CLIENT_HEADERS]
+    return install(monkeypatch, googlesheets, {
+        'База спектаклей': seats,
+        'База клиентов': clients,
+    })
+
+
+def _seat_task(event_id, numbers, option=1):
+    return {'action': 'write_data_reserve', 'sheet_id': 'ss',
+            'event_id': event_id, 'numbers': numbers, 'option': option}
+
+
+def _reserve_task(ticket_id, event_id):
+    return {
+        'action': 'write_client_reserve',
+        'sheet_id': 'ss',
+        'reserve_user_data': {
+            'chose_price': 1000,
+            'client_data': {'name_adult': 'Мама', 'phone': '9000000000',
+                            'data_children': [['Ваня', '5']]},
+            'ticket_ids': [ticket_id],
+            'choose_schedule_event_ids': [event_id],
+        },
+        'chat_id': 1,
+        'base_ticket_dto': BASE_TICKET_DTO,
+        'ticket_status_value': 'Создан',
+    }
+
+
+def _process(tasks):
+    return asyncio.run(gspread_worker.process_gspread_tasks(tasks, logger))
+
+
+def test_seat_writes_collapse_to_last_value_per_cell(spreadsheet):
+    tasks = [_seat_task(1, [10 - i, i, 10 - i, i]) for i in range(1, 21)]
+    tasks.append(_seat_task(2, [7, 7], option=3))
+    tasks.append(_seat_task(1, [0, 0], option=2))
+
+    assert _process(tasks) == [True] * len(tasks)
+    assert spreadsheet.api_calls() == ['get', 'get', 'batch_update']
+    assert spreadsheet.tabs['База спектаклей'][2:] == [
+        [1, -10, 0, -10, 0],
+        [2, 7, 0, 7, 0],
+    ]
+
+
+def test_reserves_are_appended_once_before_ticket_updates(spreadsheet):
+    tasks = [_reserve_task(ticket_id, 1) for ticket_id in (11, 12, 13)]
+    tasks.append({'action': 'update_ticket', 'sheet_id': 'ss',
+                  'ticket_id': 12, 'status': 'Оплачен'})
+    tasks.append(_seat_task(1, [9, 1, 9, 1]))
+
+    assert _process(tasks) == [True] * len(tasks)
+    # Индекс клиентов (2 чтения), одна вставка, индекс расписания
+    # (2 чтения), одна запись ячеек
+    assert spreadsheet.api_calls() == [
+        'get', 'get', 'append', 'get', 'get', 'batch_update']
+    clients = spreadsheet.tabs['База клиентов']
+    assert [row[0] for row in clients[2:]] == [11, 12, 13]
+    assert [row[-1] for row in clients[2:]] == ['Создан', 'Оплачен', 'Создан']
+
+
+def test_failed_batch_update_naks_only_its_messages(spreadsheet, monkeypatch):
+    async def broken_call(method, body):
+        raise ConnectionError('quota exceeded')
+
+    monkeypatch.setattr(spreadsheet, '_call', broken_call)
+    tasks = [
+        _seat_task(1, [9, 1, 9, 1]),
+        {'action': 'unknown', 'sheet_id': 'ss'},
+    ]
+    assert _process(tasks) == [False, True]
+
+
+def test_failed_batch_update_is_retried_task_by_task(spreadsheet,
+                                                    monkeypatch):
+    write = spreadsheet._call
+
+    async def protected_event_2(method, body):
+        # Строка мероприятия 2 защищена, запрос с ней отклоняется целиком
+        if any(item['range'].startswith("'База спектаклей'!R4")
+               for item in body['data']):
+            raise ConnectionError('protected range')
+        return await write(method, body)
+
+    monkeypatch.setattr(spreadsheet, '_call', protected_event_2)
+    tasks = [_seat_task(1, [9, 1, 9, 1]), _seat_task(2, [7, 7], option=3)]
+
+    assert _process(tasks) == [True, False]
+    assert spreadsheet.tabs['База спектаклей'][2:] == [
+        [1, 9, 1, 9, 1],
+        [2, 10, 0, 10, 0],
+    ]
+
+
+def test_failed_reserve_append_naks_only_bad_reserve(spreadsheet):
+    tasks = [_reserve_task(ticket_id, 1) for ticket_id in (11, 12, 13)]
+    del tasks[1]['reserve_user_data']['client_data']['phone']
+    errors = {}
+    results = asyncio.run(
+        gspread_worker.process_gspread_tasks(tasks, logger, errors))
+
+    assert results == [True, False, True]
+    assert list(errors) == [1]
+    clients = spreadsheet.tabs['База клиентов']
+    assert [row[0] for row in clients[2:]] == [11, 13]
+
+
+def test_missing_ticket_row_naks_only_its_message(spreadsheet):
+    tasks = [
+        {'action': 'update_ticket', 'sheet_id': 'ss',
+         'ticket_id': 99, 'status': 'Оплачен'},
+        _seat_task(1, [9, 1, 9, 1]),
+        _seat_task(5, [9, 1, 9, 1]),
+    ]
+    errors = {}
+    results = asyncio.run(
+        gspread_worker.process_gspread_tasks(tasks, logger, errors))
+
+    assert results == [False, True, False]
+    assert errors[0] == 'ValueError: Билет удален из гугл-таблицы'
+    assert spreadsheet.tabs['База спектаклей'][2] == [1, 9, 1, 9, 1]
+
+
+def test_sheets_timeout_naks_message(spreadsheet, monkeypatch):
+    async def timeout(*args, **kwargs):
+        raise TimeoutError('read timeout')
+
+    monkeypatch.setattr(spreadsheet, 'values_append', timeout)
+    monkeypatch.setattr(spreadsheet, '_call', timeout)
+    waiting = {'action': 'write_client_list_waiting', 'sheet_id': 'ss',
+               'context': {'user_id': 1, 'username': 'a', 'full_name': 'А',
+                           'phone': '9000000000', 'schedule_event_id': 1}}
+    tasks = [waiting, _reserve_task(11, 1), _seat_task(1, [9, 1, 9, 1])]
+    errors = {}
+    results = asyncio.run(
+        gspread_worker.process_gspread_tasks(tasks, logger, errors))
+
+    assert results == [False, False, False]
+    assert errors[0] == 'TimeoutError: read timeout'
+
+
+def test_dead_letters_are_replayed_in_one_batch(spreadsheet, monkeypatch):
+    waiting = DeadLetter.new(_seat_task(2, [5, 5], option=3), 'HTTP 503')
+    due = [DeadLetter(task=_seat_task(1, [9 - i, i, 9 - i, i]), replays=1)
+           for i in range(3)]
+    due.append(DeadLetter(task={'action': 'update_cme', 'sheet_id': 'ss',
+                                'cme_id': 1, 'status': 'Создан'}))
+
+    async def broken_update_cme(*args):
+        raise ConnectionError('quota exceeded')
+
+    monkeypatch.setattr(gspread_worker, 'update_cme_in_gspread',
+                        broken_update_cme)
+    pending = asyncio.run(gspread_worker.replay_dead_letters(
+        [waiting, *due], logger))
+
+    assert pending[0] is waiting
+    assert pending[1:4] == [None, None, None]
+    # Записи мест объединены в один запрос
+    assert spreadsheet.api_calls() == ['get', 'get', 'batch_update']
+    assert spreadsheet.tabs['База спектаклей'][2] == [1, 7, 2, 7, 2]
+    retry = pending[4]
+    assert retry.replays == 1
+    assert retry.error == 'ConnectionError: quota exceeded'
+    assert retry.wait() > 0
+
+
+def test_task_is_dropped_after_max_replays(spreadsheet, monkeypatch, caplog):
+    async def broken_update_cme(*args):
+        raise ConnectionError('quota exceeded')
+
+    monkeypatch.setattr(gspread_worker, 'update_cme_in_gspread',
+                        broken_update_cme)
+    task = {'action': 'update_cme', 'sheet_id': 'ss', 'cme_id': 1,
+            'status': 'Создан'}
+    letters = [DeadLetter(task=task, replays=MAX_REPLAYS - 2),
+               DeadLetter(task=task, replays=MAX_REPLAYS - 1)]
+    with caplog.at_level(logging.ERROR, logger=logger.name):
+        pending = asyncio.run(gspread_worker.replay_dead_letters(
+            letters, logger))
+
+    assert pending[0].replays == MAX_REPLAYS - 1
+    assert pending[1] is None
+    assert any(f'gave up after {MAX_REPLAYS} replays' in record.getMessage()
+               for record in caplog.records)
+
+
+def test_replay_request_ignores_backoff(spreadsheet, monkeypatch):
+    letter = DeadLetter.new(_seat_task(2, [5, 5], option=3), 'HTTP 503')
+    monkeypatch.setattr(gspread_worker, '_replay_requested_at',
+                        letter.failed_at)
+
+    assert asyncio.run(gspread_worker.replay_dead_letters(
+        [letter], logger)) == [None]
+    assert DeadLetter.from_message({'action': 'update_ticket'}).task == {
+        'action': 'update_ticket'}
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from sql_counter import prepared_database
+from sqlalchemy import update
+
+from db import BaseTicket, BotSettings, TypeEvent
+from db.invalidation import (
+    MAX_PAYLOAD, InvalidationBus, _decode_ids, _encode_ids,
+    install_session_hooks, invalidation_bus)
+
+
+def _base_ticket(base_ticket_id):
+    return BaseTicket(
+        base_ticket_id=base_ticket_id, name='1+1', cost_main=1000,
+        cost_privilege=900, cost_main_in_period=1000,
+        cost_privilege_in_period=900, quality_of_children=1,
+        quality_of_adult=1, quality_of_add_adult=0, quality_visits=1)
+
+
+def test_commits_dispatch_changed_ids_to_subscribers():
+    install_session_hooks()
+    received = []
+
+    def on_base_tickets(ids):
+        received.append(ids)
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                session.add_all([_base_ticket(1), _base_ticket(2)])
+                session.add(TypeEvent(id=1, name='Спектакль', name_alias='С'))
+                await session.flush()
+                await session.commit()
+            async with sessionmaker() as session:
+                ticket = await session.get(BaseTicket, 2)
+                ticket.cost_main = 1100
+                await session.commit()
+            async with sessionmaker() as session:
+                await session.execute(update(BaseTicket).values(cost_main=1))
+                await session.rollback()
+            async with sessionmaker() as session:
+                await session.execute(update(BaseTicket)
+                                      .where(BaseTicket.base_ticket_id == 1)
+                                      .values(cost_main=1200))
+                await session.commit()
+
+    invalidation_bus.subscribe('base_tickets', on_base_tickets)
+    try:
+        asyncio.run(main())
+    finally:
+        invalidation_bus.unsubscribe('base_tickets', on_base_tickets)
+    assert received == [frozenset({1, 2}), frozenset({2}), None]
+
+
+def test_notifications_from_other_processes_are_dispatched():
+    bus = InvalidationBus()
+    received = []
+    bus.subscribe('bot_settings', received.append)
+
+    bus._on_notify(None, 1, 'bot_settings_changed', '[3, 5]')
+    bus._on_notify(None, 1, 'bot_settings_changed', '')
+    bus._on_notify(None, 1, 'promotions_changed', '[1]')
+    bus.dispatch_all()
+
+    assert received == [frozenset({3, 5}), None, None]
+    assert bus.stats()['invalidation_received'] == 3
+
+
+def test_failing_subscriber_does_not_block_others():
+    bus = InvalidationBus()
+    received = []
+
+    def broken(ids):
+        raise RuntimeError('boom')
+
+    bus.subscribe('promotions', broken)
+    bus.subscribe('promotions', received.append)
+    bus.dispatch('promotions', frozenset({1}))
+
+    assert received == [frozenset({1})]
+    assert bus.failed == 1
+
+
+def test_payload_with_too_many_ids_means_all():
+    ids = frozenset(range(5))
+    assert _decode_ids(_encode_ids(ids)) == ids
+    assert _encode_ids(frozenset(range(MAX_PAYLOAD))) == ''
+    assert _decode_ids('') is None
+
+
+def test_untracked_tables_cannot_be_subscribed():
+    bus = InvalidationBus([BotSettings.__tablename__])
+    with pytest.raises(ValueError):
+        bus.subscribe('users', print)
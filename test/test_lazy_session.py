@@ -0,0 +1,43 @@
+import asyncio
+import logging
+
+from sql_counter import count_statements, prepared_database
+from sqlalchemy import select
+
+from db import User
+from utilities.utl_db import LazySession, SessionUsage
+
+
+def test_session_is_created_on_first_use_only():
+    usage = SessionUsage()
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            unused = LazySession(sessionmaker, usage)
+            with count_statements(engine) as counter:
+                await unused.commit()
+                await unused.rollback()
+                await unused.close()
+            usage.update_processed(0)
+
+            used = LazySession(sessionmaker, usage)
+            used.add(User(user_id=1, chat_id=1))
+            await used.commit()
+            users = (await used.execute(select(User.user_id))).scalars().all()
+            await used.close()
+            usage.update_processed(0)
+            return unused.opened, used.opened, counter.count, users
+
+    unused, used, count, users = asyncio.run(main())
+    assert (unused, used, count) == (False, True, 0)
+    assert users == [1]
+    assert usage.stats() == {'md_db_updates': 2, 'md_db_sessions_opened': 1}
+
+
+def test_usage_summary_is_sampled(caplog):
+    usage = SessionUsage(log_every=10)
+    with caplog.at_level(logging.DEBUG, logger='bot.utl_db'):
+        for _ in range(25):
+            usage.update_processed(1)
+    assert len(caplog.records) == 2
+    assert all(record.levelno == logging.DEBUG for record in caplog.records)
@@ -0,0 +1,139 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = ROOT_DIR / 'src'
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+pytest.importorskip('settings.settings')
+pytest.importorskip('nats')
+
+from nats.js import errors as nats_errors
+
+from api import nats_publisher
+from api.nats_publisher import (
+    ACK_ATTEMPTS, NatsPublisher, PublishNotConfirmed, PublishStats,
+    PublisherUnavailable)
+
+UNREACHABLE_URL = 'nats://127.0.0.1:1'
+
+
+def test_publish_stats_percentiles():
+    stats = PublishStats(window=100)
+    for ms in range(1, 101):
+        stats.add(ms / 1000)
+    stats.failed += 1
+
+    result = stats.as_dict()
+    assert result['published'] == 100
+    assert result['failed'] == 1
+    assert result['latency_p50_ms'] == 51.0
+    assert result['latency_p95_ms'] == 96.0
+    assert result['latency_max_ms'] == 100.0
+
+
+def test_publish_without_broker_fails_fast_and_backs_off():
+    publisher = NatsPublisher(UNREACHABLE_URL)
+
+    async def main():
+        with pytest.raises(PublisherUnavailable):
+            await publisher.publish({'action': 'test'}, subject='gspread')
+
+        # Повторная попытка не ждет подключения, пока не прошла пауза
+        start = time.perf_counter()
+        with pytest.raises(PublisherUnavailable):
+            await publisher.publish({'action': 'test'}, subject='gspread')
+        return time.perf_counter() - start
+
+    assert asyncio.run(main()) < 0.1
+    assert publisher.stats.failed == 2
+    assert not publisher.is_connected
+
+
+def test_start_publisher_does_not_raise_without_broker(monkeypatch):
+    monkeypatch.setattr(
+        nats_publisher, 'publisher', NatsPublisher(UNREACHABLE_URL))
+
+    async def main():
+        await nats_publisher.start_publisher()
+        await nats_publisher.stop_publisher()
+
+    asyncio.run(main())
+    assert nats_publisher.get_publisher_stats()['connected'] is False
+
+
+class _ConnectedClient:
+    is_connected = True
+    is_closed = False
+
+
+class _JetStream:
+    """publish_async, ответ на который задает тест."""
+
+    def __init__(self, reply=None, error=None, confirm_after=None):
+        self.reply = reply
+        self.error = error
+        # Номер попытки, на которую придет подтверждение
+        self.confirm_after = confirm_after
+        self.msg_ids = []
+
+    async def publish_async(self, subject, payload, **kwargs):
+        if self.error is not None:
+            raise self.error
+        self.msg_ids.append(kwargs['headers']['Nats-Msg-Id'])
+        future = asyncio.get_running_loop().create_future()
+        if self.reply is not None:
+            future.set_exception(self.reply)
+        elif len(self.msg_ids) == self.confirm_after:
+            future.set_result(None)
+        return future
+
+
+@pytest.mark.parametrize('js', [
+    _JetStream(reply=nats_errors.APIError(code=503, description='no leader')),
+    _JetStream(reply=nats_errors.NoStreamResponseError),
+    _JetStream(error=nats_errors.TooManyStalledMsgsError()),
+], ids=['api_error', 'no_stream', 'stalled'])
+def test_unconfirmed_publish_raises_publisher_unavailable(js):
+    publisher = NatsPublisher(UNREACHABLE_URL, ack_timeout=0.01)
+    publisher._nc, publisher._js = _ConnectedClient(), js
+
+    async def main():
+        with pytest.raises(PublisherUnavailable):
+            await publisher.publish({'action': 'test'}, subject='gspread')
+
+    asyncio.run(main())
+    assert publisher.stats.failed == 1
+    assert publisher.stats.published == 0
+
+
+def test_ack_timeout_is_retried_with_the_same_msg_id():
+    js = _JetStream(confirm_after=2)
+    publisher = NatsPublisher(UNREACHABLE_URL, ack_timeout=0.01)
+    publisher._nc, publisher._js = _ConnectedClient(), js
+
+    asyncio.run(publisher.publish({'action': 'test'}, subject='gspread'))
+    assert len(js.msg_ids) == 2
+    assert js.msg_ids[0] == js.msg_ids[1]
+    assert publisher.stats.published == 1
+    assert publisher.stats.failed == 0
+
+
+def test_unconfirmed_publish_is_not_reported_as_unavailable():
+    js = _JetStream()
+    publisher = NatsPublisher(UNREACHABLE_URL, ack_timeout=0.01)
+    publisher._nc, publisher._js = _ConnectedClient(), js
+
+    async def main():
+        with pytest.raises(PublishNotConfirmed):
+            await publisher.publish(
+                {'action': 'test'}, subject='gspread', msg_id='outbox-1')
+
+    asyncio.run(main())
+    assert js.msg_ids == ['outbox-1'] * ACK_ATTEMPTS
+    assert publisher.stats.failed == 1
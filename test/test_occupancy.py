@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sql_counter import prepared_database
+
+from db import (
+    BaseTicket, ScheduleEvent, ScheduleEventOccupancy, TheaterEvent, Ticket,
+    TypeEvent)
+from db.enum import TicketStatus
+from db.occupancy import (
+    OccupancyMismatch, Taken, get_stored_occupancy, reconcile_occupancy)
+from db.sales_crud import get_free_places
+
+
+async def _seed(session):
+    session.add_all([
+        TypeEvent(id=1, name='Спектакль', name_alias='С'),
+        TheaterEvent(id=1, name='Репка'),
+        BaseTicket(
+            base_ticket_id=1, name='1+1', cost_main=1000,
+            cost_privilege=900, cost_main_in_period=1000,
+            cost_privilege_in_period=900, quality_of_children=1,
+            quality_of_adult=1, quality_of_add_adult=1, quality_visits=1),
+    ])
+    await session.flush()
+    for event_id in (1, 2, 3):
+        session.add(ScheduleEvent(
+            id=event_id, type_event_id=1, theater_event_id=1,
+            datetime_event=datetime.now() + timedelta(days=1),
+            qty_child=5, qty_child_free_seat=5, qty_child_nonconfirm_seat=0,
+            qty_adult=10, qty_adult_free_seat=10, qty_adult_nonconfirm_seat=0))
+    await session.flush()
+    statuses = [TicketStatus.PAID, TicketStatus.APPROVED,
+                TicketStatus.CREATED, TicketStatus.CANCELED]
+    for i, status in enumerate(statuses, start=1):
+        session.add(Ticket(id=i, base_ticket_id=1, price=1000,
+                           status=status, schedule_event_id=1))
+    await session.commit()
+
+
+def test_free_places_are_read_from_occupancy():
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                await _seed(session)
+                session.add_all([
+                    ScheduleEventOccupancy(
+                        schedule_event_id=1, taken_child=2, taken_adult=4),
+                    ScheduleEventOccupancy(
+                        schedule_event_id=2, taken_child=7, taken_adult=1),
+                ])
+                await session.commit()
+                return await get_free_places(session, [1, 2, 3, 3])
+
+    assert asyncio.run(main()) == {1: (3, 6), 2: (0, 9), 3: (5, 10)}
+
+
+def test_reconcile_fixes_drift_once():
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                await _seed(session)
+                session.add_all([
+                    ScheduleEventOccupancy(
+                        schedule_event_id=1, taken_child=1, taken_adult=2),
+                    ScheduleEventOccupancy(
+                        schedule_event_id=3, taken_child=1, taken_adult=2),
+                ])
+                await session.commit()
+            async with sessionmaker() as session:
+                first = await reconcile_occupancy(session)
+            async with sessionmaker() as session:
+                second = await reconcile_occupancy(session)
+                stored = await get_stored_occupancy(session)
+            return first, second, stored
+
+    first, second, stored = asyncio.run(main())
+    assert first == [
+        OccupancyMismatch(1, Taken(1, 2), Taken(2, 4)),
+        OccupancyMismatch(3, Taken(1, 2), Taken(0, 0)),
+    ]
+    assert second == []
+    assert stored == {1: Taken(2, 4), 3: Taken(0, 0)}
@@ -0,0 +1,149 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from sql_counter import prepared_database
+from sqlalchemy import select, update
+
+from api.nats_publisher import PublishNotConfirmed, PublisherUnavailable
+from db.models import OutboxMessage
+from db.outbox import OutboxRelay, add_outbox_message
+
+
+class Broker:
+    def __init__(self):
+        self.messages = []
+        self.available = True
+        self.confirmed = True
+
+    async def publish(self, item):
+        if not self.available:
+            raise PublisherUnavailable('Нет соединения с NATS')
+        if not self.confirmed:
+            raise PublishNotConfirmed('Нет подтверждения сообщения')
+        self.messages.append((item.dedup_key, item.payload))
+
+
+async def _items(sessionmaker):
+    async with sessionmaker() as session:
+        return (await session.execute(
+            select(OutboxMessage).order_by(OutboxMessage.id))).scalars().all()
+
+
+async def _make_available(sessionmaker):
+    async with sessionmaker() as session:
+        await session.execute(update(OutboxMessage).values(
+            available_at=datetime.now(timezone.utc) - timedelta(hours=1)))
+        await session.commit()
+
+
+def test_message_is_written_with_the_transaction():
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                add_outbox_message(session, {'action': 'lost'})
+                await session.rollback()
+            async with sessionmaker() as session:
+                add_outbox_message(
+                    session, {'action': 'write_data_reserve',
+                              'price': Decimal('1000.50')},
+                    dedup_key='seat-1')
+                await session.commit()
+            return await _items(sessionmaker)
+
+    [item] = asyncio.run(main())
+    assert item.dedup_key == 'seat-1'
+    assert item.payload == {'action': 'write_data_reserve', 'price': '1000.50'}
+    assert item.sent_at is None
+
+
+def test_relay_publishes_in_order_once():
+    broker = Broker()
+    relay = OutboxRelay(broker.publish, batch_size=2)
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            relay.sessionmaker = sessionmaker
+            async with sessionmaker() as session:
+                for i in range(5):
+                    add_outbox_message(session, {'n': i}, dedup_key=f'k{i}')
+                await session.commit()
+            sent = await relay.drain()
+            again = await relay.drain()
+            return sent, again, await _items(sessionmaker)
+
+    sent, again, items = asyncio.run(main())
+    assert (sent, again) == (5, 0)
+    assert broker.messages == [(f'k{i}', {'n': i}) for i in range(5)]
+    assert all(item.sent_at is not None for item in items)
+
+
+def test_relay_waits_for_broker_then_falls_back():
+    broker = Broker()
+    broker.available = False
+    executed = []
+
+    async def fallback(tasks):
+        executed.extend(tasks)
+        return [True] * len(tasks)
+
+    relay = OutboxRelay(broker.publish, fallback, fallback_after=2)
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            relay.sessionmaker = sessionmaker
+            async with sessionmaker() as session:
+                add_outbox_message(session, {'n': 1})
+                add_outbox_message(session, {'n': 2}, subject='sales')
+                await session.commit()
+
+            first = await relay.drain()
+            # Сообщения отложены, до паузы повторов нет
+            postponed = await relay.drain()
+            after_first = await _items(sessionmaker)
+            await _make_available(sessionmaker)
+            second = await relay.drain()
+            return first, postponed, second, after_first, await _items(
+                sessionmaker)
+
+    first, postponed, second, after_first, items = asyncio.run(main())
+    assert (first, postponed) == (0, 0)
+    assert [item.attempts for item in after_first] == [1, 1]
+    assert 'Нет соединения с NATS' in after_first[0].last_error
+    # Со второй неудачи задачи gspread выполняются напрямую
+    assert second == 1
+    assert executed == [{'n': 1}]
+    assert items[0].sent_at is not None
+    assert items[1].sent_at is None and items[1].attempts == 2
+    assert relay.stats()['outbox_fallback_sent'] == 1
+
+
+def test_unconfirmed_message_is_only_retried():
+    broker = Broker()
+    broker.confirmed = False
+    executed = []
+
+    async def fallback(tasks):
+        executed.extend(tasks)
+        return [True] * len(tasks)
+
+    relay = OutboxRelay(broker.publish, fallback, fallback_after=1)
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            relay.sessionmaker = sessionmaker
+            async with sessionmaker() as session:
+                add_outbox_message(session, {'n': 1}, dedup_key='k1')
+                await session.commit()
+            first = await relay.drain()
+            await _make_available(sessionmaker)
+            broker.confirmed = True
+            second = await relay.drain()
+            return first, second, await _items(sessionmaker)
+
+    first, second, [item] = asyncio.run(main())
+    assert (first, second) == (0, 1)
+    # Прямой записи нет, сообщение ушло повтором с тем же ключом
+    assert executed == []
+    assert broker.messages == [('k1', {'n': 1})]
+    assert item.attempts == 1 and item.sent_at is not None
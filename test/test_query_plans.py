@@ -0,0 +1,255 @@
+"""
+Планы горячих запросов db_postgres на данных размера продакшена.
+
+Тест заполняет базу синтетическими данными, выполняет запросы через
+функции db_postgres, перехватывает их SQL и прогоняет через EXPLAIN
+(Postgres из TEST_DATABASE_URL) или EXPLAIN QUERY PLAN (sqlite).
+Полный просмотр большой таблицы означает, что нужного индекса нет.
+"""
+import asyncio
+import json
+import re
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sql_counter import prepared_database
+from sqlalchemy import event, insert, select
+
+from db import (
+    Adult, BaseTicket, Child, Person, Promotion, SalesCampaign,
+    SalesRecipient, ScheduleEvent, TelegramUpdate, TheaterEvent, Ticket,
+    TypeEvent, User, db_postgres)
+from db.enum import AgeType, GroupOfPeopleByDiscountType, TicketStatus
+from db.models import UserTicket
+from db.sales_crud import iter_recipients_for_send
+
+USERS = 5000
+CHILDREN_PER_USER = 2
+THEATER_EVENTS = 200
+SCHEDULE_EVENTS = 3000
+FUTURE_EVENTS = 50
+TICKETS = 30000
+CAMPAIGNS = 20
+TG_UPDATES = 20000
+
+# Маленькие справочники (type_events, base_tickets) Postgres честно
+# читает целиком, их планы не проверяются
+HOT_TABLES = {
+    'users', 'people', 'adults', 'children', 'tickets', 'users_tickets',
+    'schedule_events', 'sales_recipients', 'tg_updates',
+}
+# Редкий тип мероприятия: запрос по нему должен идти по индексу
+RARE_TYPE_ID = 2
+STATUSES = [TicketStatus.PAID] * 80 + [TicketStatus.CANCELED] * 15 + [
+    TicketStatus.APPROVED] * 4 + [TicketStatus.CREATED]
+
+
+def _phone(user_id):
+    return f'9{user_id:09d}'
+
+
+async def _insert(session, model, rows, chunk=5000):
+    for i in range(0, len(rows), chunk):
+        await session.execute(insert(model), rows[i:i + chunk])
+
+
+async def _seed(session):
+    now = datetime.now(timezone.utc)
+    await _insert(session, TypeEvent, [
+        {'id': 1, 'name': 'Спектакль', 'name_alias': 'С'},
+        {'id': RARE_TYPE_ID, 'name': 'Мастер-класс', 'name_alias': 'МК'},
+    ])
+    await _insert(session, TheaterEvent, [
+        {'id': i, 'name': f'Спектакль {i}'}
+        for i in range(1, THEATER_EVENTS + 1)])
+    await _insert(session, BaseTicket, [{
+        'base_ticket_id': 1, 'name': '1+1', 'cost_main': 1000,
+        'cost_privilege': 900, 'cost_main_in_period': 1000,
+        'cost_privilege_in_period': 900, 'quality_of_children': 1,
+        'quality_of_adult': 1, 'quality_of_add_adult': 0,
+        'quality_visits': 1}])
+    await _insert(session, Promotion, [{
+        'id': i, 'name': f'Промо {i}', 'code': f'PROMO{i}', 'discount': 10,
+        'for_who_discount': list(GroupOfPeopleByDiscountType)[0]}
+        for i in range(1, 11)])
+
+    await _insert(session, ScheduleEvent, [{
+        'id': i,
+        'type_event_id': RARE_TYPE_ID if i % 100 == 0 else 1,
+        'theater_event_id': i % THEATER_EVENTS + 1,
+        # Почти все мероприятия уже прошли
+        'datetime_event': now + timedelta(
+            days=i - (SCHEDULE_EVENTS - FUTURE_EVENTS)),
+        'qty_child': 10, 'qty_child_free_seat': 10,
+        'qty_child_nonconfirm_seat': 0, 'qty_adult': 10,
+        'qty_adult_free_seat': 10, 'qty_adult_nonconfirm_seat': 0,
+    } for i in range(1, SCHEDULE_EVENTS + 1)])
+
+    await _insert(session, User, [
+        {'user_id': i, 'chat_id': i} for i in range(1, USERS + 1)])
+    people, adults, children = [], [], []
+    person_id = 0
+    for user_id in range(1, USERS + 1):
+        person_id += 1
+        parent_id = person_id
+        people.append({'id': parent_id, 'name': f'Взрослый {user_id}',
+                       'age_type': AgeType.adult, 'user_id': user_id})
+        adults.append({'id': user_id, 'person_id': parent_id,
+                       'phone': _phone(user_id)})
+        for _ in range(CHILDREN_PER_USER):
+            person_id += 1
+            people.append({'id': person_id, 'name': f'Ребенок {person_id}',
+                           'age_type': AgeType.child, 'user_id': user_id,
+                           'parent_id': parent_id})
+            children.append({'id': len(children) + 1,
+                             'person_id': person_id, 'age': 5})
+    await _insert(session, Person, people)
+    await _insert(session, Adult, adults)
+    await _insert(session, Child, children)
+
+    await _insert(session, Ticket, [{
+        'id': i, 'base_ticket_id': 1, 'price': 1000,
+        'status': STATUSES[i % len(STATUSES)],
+        'schedule_event_id': i % SCHEDULE_EVENTS + 1,
+        'promo_id': i % 10 + 1 if i % 20 == 0 else None,
+        'payment_id': f'pay-{i}',
+        'created_at': now - timedelta(minutes=i),
+    } for i in range(1, TICKETS + 1)])
+    await _insert(session, UserTicket, [
+        {'user_id': i % USERS + 1, 'ticket_id': i}
+        for i in range(1, TICKETS + 1)])
+
+    await _insert(session, SalesCampaign, [
+        {'id': i, 'created_by_admin_id': 1, 'type': 'text',
+         'status': 'done' if i < CAMPAIGNS else 'running'}
+        for i in range(1, CAMPAIGNS + 1)])
+    await _insert(session, SalesRecipient, [
+        {'campaign_id': campaign_id, 'user_id': user_id, 'chat_id': user_id,
+         'status': 'pending' if campaign_id == CAMPAIGNS else 'sent'}
+        for campaign_id in range(1, CAMPAIGNS + 1)
+        for user_id in range(1, USERS + 1, 5)])
+
+    await _insert(session, TelegramUpdate, [
+        {'update_id': i, 'full_update': {}, 'user_id': i % USERS + 1,
+         'chat_id': i % USERS + 1,
+         'created_at': now - timedelta(seconds=i)}
+        for i in range(1, TG_UPDATES + 1)])
+    await session.commit()
+
+
+async def _tg_updates_of_user(session, user_id):
+    result = await session.execute(
+        select(TelegramUpdate)
+        .where(TelegramUpdate.user_id == user_id)
+        .order_by(TelegramUpdate.created_at.desc())
+        .limit(50))
+    return result.scalars().all()
+
+
+HOT_QUERIES = {
+    'get_expired_tickets': lambda s: db_postgres.get_expired_tickets(s),
+    'get_all_tickets_by_status': lambda s: (
+        db_postgres.get_all_tickets_by_status(s, TicketStatus.CREATED)),
+    'get_all_schedule_events_actual': lambda s: (
+        db_postgres.get_all_schedule_events_actual(s)),
+    'get_schedule_events_by_type': lambda s: (
+        db_postgres.get_schedule_events_by_type(s, [RARE_TYPE_ID])),
+    'get_schedule_events_by_type_actual': lambda s: (
+        db_postgres.get_schedule_events_by_type_actual(s, [1])),
+    'get_schedule_events_by_theater_event_ids': lambda s: (
+        db_postgres.get_schedule_events_by_theater_event_ids(s, [3, 4])),
+    'get_schedule_events_by_theater_ids_actual': lambda s: (
+        db_postgres.get_schedule_events_by_theater_ids_actual(s, [3, 4])),
+    'get_user_by_phone': lambda s: (
+        db_postgres.get_user_by_phone(s, _phone(42))),
+    'get_children_by_phone': lambda s: (
+        db_postgres.get_children_by_phone(s, _phone(42))),
+    'get_adult_person_id_by_phone': lambda s: (
+        db_postgres.get_adult_person_id_by_phone(s, _phone(42))),
+    'get_phone': lambda s: db_postgres.get_phone(s, 42),
+    'count_adult_phones': lambda s: db_postgres.count_adult_phones(s, 42),
+    'get_adult_name': lambda s: db_postgres.get_adult_name(s, 42),
+    'get_child': lambda s: db_postgres.get_child(s, 42),
+    'get_children': lambda s: db_postgres.get_children(s, 42),
+    'get_promotion_usage_count_by_user': lambda s: (
+        db_postgres.get_promotion_usage_count_by_user(s, 1, 42)),
+    'iter_recipients_for_send': lambda s: (
+        iter_recipients_for_send(s, CAMPAIGNS)),
+    'tg_updates_of_user': lambda s: _tg_updates_of_user(s, 42),
+}
+
+
+def _seq_scans_postgres(rows):
+    plan = rows[0][0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scans = []
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan':
+            scans.append(node['Relation Name'])
+        nodes.extend(node.get('Plans', []))
+    return scans
+
+
+def _seq_scans_sqlite(rows):
+    scans = []
+    for row in rows:
+        match = re.match(r'SCAN (\w+)', row[-1])
+        if match:
+            scans.append(match.group(1))
+    return scans
+
+
+async def _explain_hot_queries():
+    async with prepared_database() as (engine, sessionmaker):
+        async with sessionmaker() as session:
+            await _seed(session)
+        is_postgres = engine.dialect.name == 'postgresql'
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql('ANALYZE')
+
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context,
+                    executemany):
+            statements.append((statement, parameters))
+
+        event.listen(engine.sync_engine, 'before_cursor_execute', capture)
+        captured = {}
+        try:
+            for name, query in HOT_QUERIES.items():
+                statements.clear()
+                async with sessionmaker() as session:
+                    await query(session)
+                captured[name] = list(statements)
+        finally:
+            event.remove(engine.sync_engine, 'before_cursor_execute', capture)
+
+        prefix = ('EXPLAIN (FORMAT JSON) ' if is_postgres
+                  else 'EXPLAIN QUERY PLAN ')
+        seq_scans = _seq_scans_postgres if is_postgres else _seq_scans_sqlite
+        plans = {}
+        async with engine.connect() as conn:
+            for name, queries in captured.items():
+                scans = []
+                for statement, parameters in queries:
+                    result = await conn.exec_driver_sql(
+                        prefix + statement, parameters)
+                    scans += [table for table in seq_scans(result.all())
+                              if table in HOT_TABLES]
+                plans[name] = scans
+        return captured, plans
+
+
+@pytest.fixture(scope='module')
+def explained():
+    return asyncio.run(_explain_hot_queries())
+
+
+@pytest.mark.parametrize('name', list(HOT_QUERIES))
+def test_hot_query_uses_indexes(explained, name):
+    captured, plans = explained
+    assert captured[name], 'запрос не выполнялся'
+    assert plans[name] == [], f'{name}: полный просмотр {plans[name]}'
@@ -0,0 +1,121 @@
+import asyncio
+import dataclasses
+from datetime import datetime
+
+import pytest
+from sql_counter import count_statements, get_test_db_url, prepared_database
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from db import BaseTicket, SpecialTicketPrice, TheaterEvent, TypeEvent
+from db.enum import PriceType
+from db.invalidation import InvalidationBus, install_session_hooks
+from db.reference_cache import (
+    ReferenceCache, load_reference_cache, reference_cache)
+
+
+async def _seed(session):
+    session.add_all([
+        BaseTicket(
+            base_ticket_id=1, name='1+1', cost_main=1000,
+            cost_privilege=900, cost_main_in_period=1200,
+            cost_privilege_in_period=1100, quality_of_children=1,
+            quality_of_adult=1, quality_of_add_adult=0, quality_visits=1,
+            period_start_change_price=datetime(2026, 12, 20),
+            period_end_change_price=datetime(2027, 1, 10)),
+        BaseTicket(
+            base_ticket_id=2, name='1+2', cost_main=1500,
+            cost_privilege=1400, cost_main_in_period=1500,
+            cost_privilege_in_period=1400, quality_of_children=1,
+            quality_of_adult=2, quality_of_add_adult=0, quality_visits=1),
+        TypeEvent(id=1, name='Спектакль', name_alias='С'),
+        TheaterEvent(id=7, name='Репка', flag_indiv_cost=True,
+                     price_type=PriceType.INDIVIDUAL),
+    ])
+    await session.flush()
+    session.add(SpecialTicketPrice(option='7', base_ticket_id=1,
+                                   price_weekday=800, price_weekend=950))
+    await session.commit()
+
+
+def test_booking_lookups_read_each_table_once():
+    bus = InvalidationBus()
+    bus.listening = True
+    cache = ReferenceCache(bus)
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                await _seed(session)
+            async with sessionmaker() as session:
+                with count_statements(engine) as counter:
+                    await cache.load(session)
+                    loaded = counter.count
+                    for _ in range(3):
+                        ticket = await cache.get_base_ticket(session, 1)
+                        theater = await cache.get_theater_event(session, 7)
+                        type_event = await cache.get_type_event(session, 1)
+                        prices = [
+                            await cache.get_special_ticket_price(
+                                session, 7, 1, 'будни'),
+                            await cache.get_special_ticket_price(
+                                session, '7', 1, 'выходные'),
+                            await cache.get_special_ticket_price(
+                                session, '7', 2, 'будни'),
+                        ]
+                return (loaded, counter.count, ticket, theater, type_event,
+                        prices)
+
+    loaded, count, ticket, theater, type_event, prices = asyncio.run(main())
+    assert loaded == count == 4
+    assert ticket.get_price_from_date(datetime(2026, 12, 25, 11)) == (1200, 1100)
+    assert ticket.to_dto()['name'] == '1+1'
+    assert theater.price_type == PriceType.INDIVIDUAL
+    assert theater.model_dump()['flag_indiv_cost'] is True
+    assert type_event.name_alias == 'С'
+    assert prices == [800, 950, None]
+    assert cache.stats()['reference_base_tickets_hits'] == 3
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        ticket.name = 'другое'
+
+
+def test_commit_reloads_changed_table_only():
+    install_session_hooks()
+    reference_cache.invalidate()
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                await _seed(session)
+            async with sessionmaker() as session:
+                before = await reference_cache.get_base_ticket(session, 2)
+                await reference_cache.get_type_event(session, 1)
+                ticket = await session.get(BaseTicket, 2)
+                ticket.name = '1+2 (новый)'
+                await session.commit()
+                with count_statements(engine) as counter:
+                    after = await reference_cache.get_base_ticket(session, 2)
+                    await reference_cache.get_type_event(session, 1)
+                return before, after, counter.count
+
+    before, after, count = asyncio.run(main())
+    assert (before.name, after.name) == ('1+2', '1+2 (новый)')
+    assert count == 1
+
+
+def test_failed_preload_falls_back_to_lazy_load(tmp_path):
+    reference_cache.invalidate()
+
+    async def main():
+        # В пустой базе нет таблиц: предзагрузка падает, но не мешает старту
+        broken = create_async_engine(get_test_db_url(tmp_path / 'empty.db'))
+        try:
+            await load_reference_cache(async_sessionmaker(broken))
+        finally:
+            await broken.dispose()
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                await _seed(session)
+            async with sessionmaker() as session:
+                return await reference_cache.get_base_ticket(session, 2)
+
+    assert asyncio.run(main()).name == '1+2'
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from fake_sheets import install
+
+pytest.importorskip('settings.settings')
+
+from api import googlesheets
+from db import db_googlesheets
+
+
+def _tab(headers, *rows):
+    return [['Заголовок листа'], list(headers), *[list(row) for row in rows]]
+
+
+@pytest.fixture
+def spreadsheet(monkeypatch):
+    tabs = {
+        'Варианты стоимости': _tab(['base_ticket_id', 'name']),
+        'Список спектаклей': _tab(['id', 'name']),
+        'База спектаклей': _tab(['id', 'theater_event_id']),
+        'Промокоды': _tab(
+            ['id', 'Код', 'Скидка', 'Тип'],
+            [1, 'SPRING', 10, '%'],
+            [2, '', 5, ''],
+        ),
+        'Индив стоимости': _tab(
+            ['option', 'type', 'base_ticket_id', 'будни', 'выходные'],
+            ['A', '', 1, 900, 1000],
+            ['A', 'B', 2, 800, 850],
+        ),
+        'База ФЗМ': _tab(['id', 'name', 'price', 'flag_outside']),
+    }
+    spreadsheet = install(monkeypatch, googlesheets, tabs)
+    monkeypatch.setattr(db_googlesheets, 'REFERENCE_SHEETS', {
+        'domik': db_googlesheets.REFERENCE_SHEETS[
+            db_googlesheets.sheet_id_domik],
+        'cme': db_googlesheets.REFERENCE_SHEETS[db_googlesheets.sheet_id_cme],
+    })
+    return spreadsheet
+
+
+def test_parse_sheet_values_trims_like_ranged_reads():
+    values = [
+        ['Заголовок листа'],
+        ['id', 'name', ''],
+        [1, 'Первый', '', 'заметка'],
+        [],
+        [2, 'Второй', ''],
+        ['', 'итого'],
+    ]
+    data, dict_column_name = googlesheets._parse_sheet_values(values, 'Лист_')
+
+    assert dict_column_name == {'id': 0, 'name': 1, 2: 2}
+    assert data == [
+        ['id', 'name'],
+        [1, 'Первый'],
+        [],
+        [2, 'Второй'],
+    ]
+
+
+def test_load_from_gspread_is_one_request(spreadsheet):
+    data, dict_column_name = asyncio.run(
+        googlesheets.load_from_gspread('ss', 'Промокоды_'))
+
+    assert spreadsheet.api_calls() == ['get']
+    assert dict_column_name['Скидка'] == 2
+    assert data[1] == [1, 'SPRING', 10, '%']
+
+
+def test_full_refresh_loads_all_sheets_in_batch_requests(spreadsheet):
+    data = asyncio.run(db_googlesheets.load_reference_data())
+
+    # Один batchGet на таблицу и формат значений
+    assert spreadsheet.api_calls() == ['batch_get'] * 3
+    assert sorted(len(call[1]) for call in spreadsheet.calls) == [1, 1, 4]
+    assert [promo.code for promo in data.promotions] == ['SPRING']
+    assert data.promotions[0].discount_type == 'percentage'
+    assert data.special_ticket_price == {
+        'A': {'будни': {1: 900}, 'выходные': {1: 1000}},
+        'B': {'будни': {2: 800}, 'выходные': {2: 850}},
+    }
+    assert data.base_tickets == []
+    assert data.schedule_events == []
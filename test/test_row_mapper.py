@@ -0,0 +1,92 @@
+import datetime
+import logging
+
+from bench_row_mapper import build_schedule, compiled_load, legacy_load
+from db.sheet_mapper import RowMapper
+from utilities.schemas import (
+    BaseTicketDTO, ScheduleEventDTO, TheaterEventDTO)
+from utilities.utl_date import convert_sheets_datetime
+
+
+def test_matches_legacy_mapping_on_full_rows():
+    data, dict_column_name = build_schedule(300)
+    data = [data[0], *[row for row in data[1:] if len(row) == len(data[0])]]
+
+    legacy = legacy_load(
+        ScheduleEventDTO, data, dict_column_name,
+        active_attr='flag_turn_on_off',
+        date_getter=lambda e: e.get_date_event(),
+    )
+    compiled = compiled_load(
+        ScheduleEventDTO, data, dict_column_name,
+        active_attr='flag_turn_on_off',
+        date_field='date_show',
+        parse_date=convert_sheets_datetime,
+    )
+
+    assert compiled == legacy
+    assert all(event.flag_turn_on_off for event in compiled)
+    assert min(event.get_date_event().date()
+               for event in compiled) >= datetime.date.today()
+
+
+def test_short_rows_use_dto_defaults_like_legacy_mapping():
+    # Флаг активности в последней колонке, чтобы его ячейки тоже не было
+    headers = [name for name in BaseTicketDTO.model_fields
+               if name not in ('date_show_tmp', 'flag_active')]
+    headers.append('flag_active')
+    full = [1, False, False, 'Билет', 1000, 900, '', '', 1200, 1000,
+            1, 1, 0, 4, True]
+    data = [headers, full, full[:-1], full[:-2], full[:9], full[:5],
+            [2, *full[1:-1], False], full[:3]]
+    dict_column_name = {name: i for i, name in enumerate(headers)}
+
+    legacy = legacy_load(BaseTicketDTO, data, dict_column_name,
+                         active_attr='flag_active')
+    compiled = compiled_load(BaseTicketDTO, data, dict_column_name,
+                             active_attr='flag_active')
+
+    assert compiled == legacy
+    assert [ticket.quality_visits for ticket in compiled] == [4, 4, 0, 0, 0]
+    assert [ticket.cost_main_in_period for ticket in compiled] == [
+        1200, 1200, 1200, 1200, None]
+
+
+def test_short_rows_are_padded():
+    headers = list(TheaterEventDTO.model_fields)
+    row = [1, 'Сказка', False, 1, 6, '🎭', 45, True, True, 10, 10, False,
+           'Базовая стоимость']
+    mapper = RowMapper(TheaterEventDTO, {name: i for i, name in
+                                         enumerate(headers)})
+
+    [event] = mapper.load([row])
+
+    assert (event.note, event.link) == ('', '')
+
+
+def test_errors_are_logged_once_per_sheet(caplog):
+    data, dict_column_name = build_schedule(4)
+    del dict_column_name['ticket_price_type']
+    for row in data[1:]:
+        row[3], row[4] = True, 99999
+    data[1][0] = 'x'
+    data[2][4] = 'завтра'
+    data[3][3] = 'нет'
+    data[4][3] = False
+    mapper = RowMapper(ScheduleEventDTO, dict_column_name, 'Лист_')
+
+    with caplog.at_level(logging.ERROR, logger='bot.db.sheet_mapper'):
+        events = mapper.load(data[1:], active_attr='flag_turn_on_off',
+                             date_field='date_show',
+                             parse_date=convert_sheets_datetime)
+
+    assert events == []
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages[0] == 'Лист_: нет колонок ticket_price_type'
+    # Выключенная строка 6 отброшена до проверки, остальные с ошибками
+    assert messages[1] == (
+        'Лист_: пропущено строк с ошибками 3: '
+        'строка 3 (event_id: int_parsing); '
+        'строка 4 (date_show: int_parsing); '
+        'строка 5 (flag_turn_on_off: bool_parsing)')
+    assert len(messages) == 2
@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from sql_counter import prepared_database
+
+pytest.importorskip('settings.settings')
+
+from db import TheaterEvent, TypeEvent, db_postgres
+from schedule.scheduler_jobs import (
+    diff_schedule_events, sync_notification_jobs)
+from utilities.schemas import ScheduleEventDTO
+
+DATE_SHOW = 47000  # 2028-09-04
+
+
+def _event(event_id, flag=True, time_show=0.5):
+    return ScheduleEventDTO(
+        event_id=event_id, event_type=1, theater_event_id=1,
+        flag_turn_on_off=flag, date_show=DATE_SHOW, time_show=time_show,
+        qty_child=10, qty_child_free_seat=10, qty_child_nonconfirm_seat=0,
+        qty_adult=10, qty_adult_free_seat=10, qty_adult_nonconfirm_seat=0,
+        flag_gift=False, flag_christmas_tree=False, flag_santa=False,
+        ticket_price_type='')
+
+
+class FakeJobQueue:
+    def __init__(self):
+        self.scheduled = []
+        self.looked_up = []
+
+    def run_once(self, callback, when, data, name, job_kwargs):
+        self.scheduled.append(data['event_id'])
+        return name
+
+    def get_jobs_by_name(self, name):
+        self.looked_up.append(name)
+        return []
+
+
+def test_diff_schedule_events_classifies_changes():
+    stored = {
+        1: (_event(1).get_datetime_event(), True),
+        2: (_event(2).get_datetime_event(), True),
+        3: (_event(3).get_datetime_event(), True),
+        4: (_event(4).get_datetime_event(), False),
+    }
+    events = [
+        _event(1),
+        _event(2, time_show=0.75),
+        _event(3, flag=False),
+        _event(4),
+        _event(5),
+        _event(6, flag=False),
+    ]
+    changes = diff_schedule_events(events, stored)
+
+    assert [e.event_id for e in changes.added] == [5, 6]
+    assert [e.event_id for e in changes.moved] == [2]
+    assert [e.event_id for e in changes.enabled] == [4]
+    assert [e.event_id for e in changes.disabled] == [3]
+    assert changes.unchanged == 1
+    assert [e.event_id for e in changes.to_reschedule()] == [5, 2, 4, 3]
+    assert changes.summary() == (
+        'новых: 2, перенесено: 1, включено: 1, выключено: 1, '
+        'без изменений: 1')
+
+
+def test_aware_stored_datetimes_match_sheet_events():
+    # Postgres (timestamptz, сессия в UTC) возвращает aware значения
+    moscow = timezone(timedelta(hours=3))
+    utc = _event(1).get_datetime_event().replace(tzinfo=timezone.utc)
+    stored = {
+        1: (utc, True),
+        2: (utc.astimezone(moscow), True),
+        3: (utc + timedelta(hours=1), True),
+    }
+    changes = diff_schedule_events([_event(1), _event(2), _event(3)], stored)
+
+    assert changes.unchanged == 2
+    assert [e.event_id for e in changes.moved] == [3]
+
+
+def test_unchanged_schedule_does_not_touch_job_queue():
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            events = [_event(i) for i in range(1, 4)]
+            async with sessionmaker() as session:
+                session.add_all([
+                    TypeEvent(id=1, name='Спектакль', name_alias='С'),
+                    TheaterEvent(id=1, name='Репка'),
+                ])
+                await session.commit()
+                await db_postgres.update_schedule_events_from_googlesheets(
+                    session, events)
+                stored = await db_postgres.get_schedule_event_fingerprints(
+                    session)
+            return diff_schedule_events(events, stored)
+
+    changes = asyncio.run(main())
+    job_queue = FakeJobQueue()
+    asyncio.run(sync_notification_jobs(
+        SimpleNamespace(job_queue=job_queue), changes))
+
+    assert changes.unchanged == 3
+    assert job_queue.scheduled == []
+    assert job_queue.looked_up == []
@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sql_counter import count_statements, prepared_database
+from sqlalchemy import update
+
+from db import ScheduleEvent, TheaterEvent, TypeEvent
+from db.invalidation import InvalidationBus, install_session_hooks
+from db.schedule_watermark import ScheduleWatermark, schedule_watermark
+
+
+async def _seed(session):
+    session.add_all([
+        TypeEvent(id=1, name='Спектакль', name_alias='С'),
+        TheaterEvent(id=1, name='Репка'),
+    ])
+    await session.flush()
+    session.add(ScheduleEvent(
+        id=1, type_event_id=1, theater_event_id=1,
+        datetime_event=datetime.now() + timedelta(days=1),
+        qty_child=10, qty_child_free_seat=10, qty_child_nonconfirm_seat=0,
+        qty_adult=10, qty_adult_free_seat=10, qty_adult_nonconfirm_seat=0))
+    await session.commit()
+
+
+def test_watermark_reads_db_once_until_invalidated():
+    bus = InvalidationBus()
+    bus.listening = True
+    watermark = ScheduleWatermark(bus)
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                await _seed(session)
+                with count_statements(engine) as counter:
+                    values = [await watermark.get(session) for _ in range(5)]
+                    bus._on_notify(None, 1, 'schedule_events_changed', '')
+                    values.append(await watermark.get(session))
+                return values, counter.count
+
+    values, count = asyncio.run(main())
+    assert len(set(values)) == 1 and values[0] is not None
+    assert count == 2
+    assert watermark.stats()['schedule_watermark_hits'] == 4
+
+
+def test_watermark_expires_without_listen():
+    watermark = ScheduleWatermark(InvalidationBus(), max_age=0)
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                await _seed(session)
+                await watermark.get(session)
+                await watermark.get(session)
+
+    asyncio.run(main())
+    assert watermark.loads == 2
+
+
+def test_commits_changing_schedule_invalidate_watermark():
+    install_session_hooks()
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                await _seed(session)
+            invalidations = [schedule_watermark.invalidations]
+
+            async with sessionmaker() as session:
+                event = await session.get(ScheduleEvent, 1)
+                event.qty_child_free_seat = 9
+                await session.commit()
+            invalidations.append(schedule_watermark.invalidations)
+
+            async with sessionmaker() as session:
+                await session.execute(update(ScheduleEvent)
+                                      .where(ScheduleEvent.id == 1)
+                                      .values(qty_adult_free_seat=9))
+                await session.commit()
+            invalidations.append(schedule_watermark.invalidations)
+
+            async with sessionmaker() as session:
+                await session.execute(update(ScheduleEvent)
+                                      .where(ScheduleEvent.id == 1)
+                                      .values(qty_adult_free_seat=8))
+                await session.rollback()
+                await session.get(TypeEvent, 1)
+                await session.commit()
+            invalidations.append(schedule_watermark.invalidations)
+
+            async with sessionmaker() as session:
+                type_event = await session.get(TypeEvent, 1)
+                type_event.name = 'Спектакль!'
+                await session.commit()
+            invalidations.append(schedule_watermark.invalidations)
+            return invalidations
+
+    before, *after = asyncio.run(main())
+    assert [count - before for count in after] == [1, 2, 2, 2]
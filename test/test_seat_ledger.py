@@ -0,0 +1,130 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from sql_counter import count_statements, prepared_database
+
+from db import BaseTicket, ScheduleEvent, TheaterEvent, TypeEvent, db_postgres
+from db.seat_ledger import SeatCounts, SeatDelta, apply_seat_delta
+
+CAPACITY = 20
+
+
+def _base_ticket(children=1, adults=1, add_adults=0):
+    return BaseTicket(
+        base_ticket_id=1, name='Базовый', cost_main=1000,
+        cost_privilege=900, cost_main_in_period=1000,
+        cost_privilege_in_period=900, quality_of_children=children,
+        quality_of_adult=adults, quality_of_add_adult=add_adults,
+        quality_visits=1)
+
+
+async def _seed(session, event_ids=(1,)):
+    session.add_all([
+        TypeEvent(id=1, name='Спектакль', name_alias='С'),
+        TheaterEvent(id=1, name='Репка'),
+    ])
+    await session.flush()
+    for event_id in event_ids:
+        session.add(ScheduleEvent(
+            id=event_id, type_event_id=1, theater_event_id=1,
+            datetime_event=datetime.now() + timedelta(days=1),
+            qty_child=CAPACITY, qty_child_free_seat=CAPACITY,
+            qty_child_nonconfirm_seat=0,
+            qty_adult=CAPACITY, qty_adult_free_seat=CAPACITY,
+            qty_adult_nonconfirm_seat=0))
+    await session.commit()
+
+
+async def _counts(sessionmaker, event_id=1):
+    async with sessionmaker() as session:
+        event = await db_postgres.get_schedule_event(session, event_id)
+        return SeatCounts(
+            event.qty_child_free_seat, event.qty_child_nonconfirm_seat,
+            event.qty_adult_free_seat, event.qty_adult_nonconfirm_seat)
+
+
+def test_seat_delta_constructors():
+    bt = _base_ticket(children=2, adults=1, add_adults=1)
+    assert SeatDelta.reserve(bt) == SeatDelta(-2, 2, -2, 2)
+    assert SeatDelta.release_reserve(bt) == SeatDelta(2, -2, 2, -2)
+    assert SeatDelta.take_free(bt) == SeatDelta(-2, 0, -2, 0)
+    assert SeatDelta.confirm(bt) == SeatDelta(0, -2, 0, -2)
+    assert SeatDelta.change_ticket(bt, _base_ticket()) == SeatDelta(1, 0, 1, 0)
+
+
+def test_apply_seat_delta_is_single_statement_and_syncs_session():
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                await _seed(session)
+            async with sessionmaker() as session:
+                event = await db_postgres.get_schedule_event(session, 1)
+                with count_statements(engine) as counter:
+                    counts = await apply_seat_delta(
+                        session, 1, SeatDelta.reserve(_base_ticket()),
+                        commit=False)
+                assert counter.count == 1
+                assert counts == SeatCounts(
+                    CAPACITY - 1, 1, CAPACITY - 1, 1)
+                assert event.qty_child_free_seat == CAPACITY - 1
+                await session.commit()
+            assert await _counts(sessionmaker) == counts
+
+    asyncio.run(main())
+
+
+def test_apply_seat_delta_refuses_to_go_negative():
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                await _seed(session)
+            async with sessionmaker() as session:
+                counts = await apply_seat_delta(
+                    session, 1, SeatDelta.confirm(_base_ticket()))
+                assert counts is None
+                counts = await apply_seat_delta(
+                    session, 1,
+                    SeatDelta.take_free(_base_ticket(children=CAPACITY + 1)))
+                assert counts is None
+            assert await _counts(sessionmaker) == SeatCounts(
+                CAPACITY, 0, CAPACITY, 0)
+
+    asyncio.run(main())
+
+
+def test_concurrent_bookings_never_oversell_or_drift(tmp_path):
+    qty_workers = 60
+    bt = _base_ticket()
+
+    async def worker(sessionmaker, index):
+        await asyncio.sleep(random.random() / 100)
+        async with sessionmaker() as session:
+            reserved = await apply_seat_delta(
+                session, 1, SeatDelta.reserve(bt))
+            if reserved is None:
+                return False
+            # Часть броней отменяется, часть оплачивается
+            if index % 3 == 0:
+                await apply_seat_delta(
+                    session, 1, SeatDelta.release_reserve(bt))
+                return False
+            await apply_seat_delta(session, 1, SeatDelta.confirm(bt))
+            return True
+
+    async def main():
+        async with prepared_database(tmp_path / 'seats.db') as (
+                engine, sessionmaker):
+            async with sessionmaker() as session:
+                await _seed(session)
+            paid = await asyncio.gather(
+                *(worker(sessionmaker, i) for i in range(qty_workers)))
+            return sum(paid), await _counts(sessionmaker)
+
+    qty_paid, counts = asyncio.run(main())
+    assert counts.qty_child_nonconfirm_seat == 0
+    assert counts.qty_adult_nonconfirm_seat == 0
+    assert counts.qty_child_free_seat >= 0
+    assert counts.qty_child_free_seat == CAPACITY - qty_paid
+    assert counts.qty_adult_free_seat == CAPACITY - qty_paid
+    assert 0 < qty_paid <= CAPACITY
@@ -0,0 +1,134 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from fake_sheets import install
+from sql_counter import prepared_database
+from sqlalchemy import update
+
+pytest.importorskip('settings.settings')
+
+from api import googlesheets
+from db import ScheduleEvent, TheaterEvent, TypeEvent, db_postgres
+from db.seat_ledger import SeatCounts
+from db.seat_mirror import SeatMirror, diff_seat_counts, write_seat_counts
+from utilities.schemas import ScheduleEventDTO
+
+SEAT_HEADERS = ['event_id', 'qty_child_free_seat', 'qty_child_nonconfirm_seat',
+                'qty_adult_free_seat', 'qty_adult_nonconfirm_seat']
+
+
+async def _seed(session):
+    session.add_all([
+        TypeEvent(id=1, name='Спектакль', name_alias='С'),
+        TheaterEvent(id=1, name='Репка'),
+    ])
+    await session.flush()
+    for event_id, days in ((1, 1), (2, 2), (3, -1)):
+        session.add(ScheduleEvent(
+            id=event_id, type_event_id=1, theater_event_id=1,
+            datetime_event=datetime.now() + timedelta(days=days),
+            qty_child=10, qty_child_free_seat=10, qty_child_nonconfirm_seat=0,
+            qty_adult=10, qty_adult_free_seat=10, qty_adult_nonconfirm_seat=0))
+    await session.commit()
+
+
+async def _set_seats(sessionmaker, event_id, **values):
+    async with sessionmaker() as session:
+        await session.execute(update(ScheduleEvent)
+                              .where(ScheduleEvent.id == event_id)
+                              .values(**values))
+        await session.commit()
+
+
+def test_diff_seat_counts_keeps_only_changed_cells():
+    snapshot = {1: SeatCounts(10, 0, 10, 0), 2: SeatCounts(5, 5, 5, 5)}
+    current = {1: SeatCounts(8, 2, 10, 0), 2: SeatCounts(5, 5, 5, 5),
+               3: SeatCounts(1, 2, 3, 4)}
+
+    assert diff_seat_counts(snapshot, current) == {
+        1: {'qty_child_free_seat': 8, 'qty_child_nonconfirm_seat': 2},
+        3: dict(zip(SeatCounts._fields, (1, 2, 3, 4))),
+    }
+
+
+def test_mirror_writes_changes_and_retries_after_failure():
+    writes = []
+    fail = [False]
+
+    async def write(spreadsheet_id, cells):
+        if fail[0]:
+            raise ConnectionError('quota exceeded')
+        writes.append(cells)
+        return [2] if 2 in cells else []
+
+    mirror = SeatMirror(write)
+    mirror.spreadsheet_id = 'ss'
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            mirror.sessionmaker = sessionmaker
+            async with sessionmaker() as session:
+                await _seed(session)
+            results = [await mirror.mirror_once(), await mirror.mirror_once()]
+
+            await _set_seats(sessionmaker, 1, qty_child_free_seat=7)
+            fail[0] = True
+            with pytest.raises(ConnectionError):
+                await mirror.mirror_once()
+            fail[0] = False
+            await _set_seats(sessionmaker, 1, qty_adult_free_seat=9)
+            results.append(await mirror.mirror_once())
+            return results
+
+    results = asyncio.run(main())
+    # Прошедшее событие 3 не записывается, события 2 нет в таблице
+    assert results == [1, 0, 1]
+    assert sorted(writes[0]) == [1, 2]
+    # Изменение, не записанное из-за ошибки, ушло со следующим
+    assert writes[1] == {1: {'qty_child_free_seat': 7,
+                             'qty_adult_free_seat': 9}}
+    assert mirror.stats()['seat_mirror_cells'] == 6
+
+
+def test_write_seat_counts_uses_one_batch_update(monkeypatch):
+    seats = [['Расписание'], SEAT_HEADERS]
+    seats += [[event_id, 10, 0, 10, 0] for event_id in (1, 2)]
+    spreadsheet = install(monkeypatch, googlesheets,
+                          {'База спектаклей': seats})
+
+    missing = asyncio.run(write_seat_counts('ss', {
+        1: {'qty_child_free_seat': 8, 'qty_adult_nonconfirm_seat': 2},
+        2: {'qty_adult_free_seat': 9},
+        5: {'qty_adult_free_seat': 1},
+    }))
+
+    assert missing == [5]
+    assert spreadsheet.api_calls().count('batch_update') == 1
+    assert seats[2:] == [[1, 8, 0, 10, 2], [2, 10, 0, 9, 0]]
+
+
+def test_schedule_reload_keeps_seats_in_mirror_mode():
+    def event(event_id, free):
+        return ScheduleEventDTO(
+            event_id=event_id, event_type=1, theater_event_id=1,
+            flag_turn_on_off=True, date_show=47000, time_show=0.5,
+            qty_child=12, qty_child_free_seat=free,
+            qty_child_nonconfirm_seat=0, qty_adult=10,
+            qty_adult_free_seat=free, qty_adult_nonconfirm_seat=0,
+            flag_gift=False, flag_christmas_tree=False, flag_santa=False,
+            ticket_price_type='')
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                await _seed(session)
+                await db_postgres.update_schedule_events_from_googlesheets(
+                    session, [event(1, 3), event(4, 3)], keep_seats=True)
+                return [await db_postgres.get_schedule_event(session, i)
+                        for i in (1, 4)]
+
+    old, new = asyncio.run(main())
+    assert (old.qty_child, old.qty_child_free_seat) == (12, 10)
+    assert (new.qty_child, new.qty_child_free_seat) == (12, 3)
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from fake_sheets import install
+
+from api.sheet_index import (
+    ROW_CHECK_AFTER, SheetIndex, SheetIndexCache, column_letter, get_start_row)
+
+HEADERS = ['ticket_id', 'chat_id', 'flag_exclude', 'flag_transfer',
+           'flag_exclude_place_sum', 'ticket_status']
+
+
+def test_column_letter_and_start_row():
+    assert [column_letter(i) for i in (1, 26, 27, 52)] == [
+        'A', 'Z', 'AA', 'AZ']
+    assert get_start_row("'База клиентов'!A120:X121") == 120
+    assert get_start_row('') is None
+
+
+def test_sheet_index_rows_and_appends():
+    index = SheetIndex({'ticket_id': 0}, 1, 'ticket_id',
+                       ['Заголовок', 'ticket_id', 10, '', 11, 10])
+    assert index.get_row(10) == 6
+    assert index.get_row(11) == 5
+    assert index.last_row == 6
+
+    index.add_rows(7, [12, 13])
+    assert index.get_row(13) == 8
+    assert index.last_row == 8
+
+
+def test_sheet_index_cache_ttl_and_invalidate():
+    cache = SheetIndexCache(ttl=60)
+    index = SheetIndex({'id': 0}, 1, 'id', [1])
+    cache.put('ss', 'База ДР_', index)
+    assert cache.get('ss', 'База ДР_', 'id') is index
+
+    cache.add_rows('ss', 'База ДР_', 'id', "'База ДР'!A5:C5", [2])
+    assert index.get_row(2) == 5
+
+    cache.invalidate('ss', 'База ДР_')
+    assert cache.get('ss', 'База ДР_', 'id') is None
+
+    cache.put('ss', 'База ДР_', index)
+    index.loaded_at -= 61
+    assert cache.get('ss', 'База ДР_', 'id') is None
+
+
+@pytest.fixture
+def googlesheets(monkeypatch):
+    pytest.importorskip('settings.settings')
+    from api import googlesheets as module
+
+    rows = [['Билеты'], HEADERS]
+    rows += [[i, 100 + i, False, False, False, 'Создан']
+             for i in range(1, 4)]
+    spreadsheet = install(monkeypatch, module, {'База клиентов': rows})
+    return module, spreadsheet
+
+
+def _update(module, ticket_id, status='Оплачен'):
+    asyncio.run(module.update_ticket_in_gspread('ss', ticket_id, status))
+
+
+def test_single_cell_update_costs_one_call_when_index_is_warm(googlesheets):
+    module, spreadsheet = googlesheets
+
+    _update(module, 2)
+    assert spreadsheet.api_calls() == ['get', 'get', 'batch_update']
+    assert spreadsheet.tabs['База клиентов'][3][5] == 'Оплачен'
+
+    spreadsheet.calls.clear()
+    _update(module, 3)
+    assert spreadsheet.api_calls() == ['batch_update']
+    assert spreadsheet.tabs['База клиентов'][4][5] == 'Оплачен'
+
+
+def test_appended_rows_are_indexed_in_place(googlesheets):
+    module, spreadsheet = googlesheets
+    _update(module, 1)
+
+    response = asyncio.run(module._execute_append_googlesheet(
+        'ss', "'База клиентов'!R1C1:R1C6", 'RAW', 'FORMATTED_VALUE',
+        {'values': [[7, 107, False, False, False, 'Создан']]}))
+    module._register_appended_rows(
+        'ss', 'База клиентов_', 'ticket_id', response, [7])
+
+    spreadsheet.calls.clear()
+    _update(module, 7)
+    assert spreadsheet.api_calls() == ['batch_update']
+    assert spreadsheet.tabs['База клиентов'][5][5] == 'Оплачен'
+
+
+def test_moved_row_is_checked_and_index_rebuilt(googlesheets):
+    module, spreadsheet = googlesheets
+    _update(module, 1)
+    index = module._sheet_indexes.get('ss', 'База клиентов_', 'ticket_id')
+    index.loaded_at -= ROW_CHECK_AFTER + 1
+
+    # Билет 3 проверяется по ключевой ячейке и остается на месте
+    spreadsheet.calls.clear()
+    _update(module, 3)
+    assert spreadsheet.calls[0] == ('get', "'База клиентов'!A5")
+    assert spreadsheet.api_calls() == ['get', 'batch_update']
+
+    # Строки 3 и 4 поменяли местами вручную
+    rows = spreadsheet.tabs['База клиентов']
+    rows[3], rows[4] = rows[4], rows[3]
+    spreadsheet.calls.clear()
+    _update(module, 2, 'Отменен')
+    assert spreadsheet.api_calls() == ['get', 'get', 'get', 'batch_update']
+    assert rows[4][5] == 'Отменен'
+    assert rows[3][5] == 'Оплачен'
+
+
+def test_unknown_key_reloads_index_once(googlesheets):
+    module, spreadsheet = googlesheets
+    _update(module, 1)
+
+    # Строку добавили вручную, мимо бота
+    rows = spreadsheet.tabs['База клиентов']
+    rows.append([8, 108, False, False, False, 'Создан'])
+    spreadsheet.calls.clear()
+    _update(module, 8)
+    assert spreadsheet.api_calls() == ['get', 'get', 'batch_update']
+    assert rows[5][5] == 'Оплачен'
+
+    spreadsheet.calls.clear()
+    _update(module, 999)
+    assert spreadsheet.api_calls() == ['get', 'get']
@@ -0,0 +1,118 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from fake_sheets import install
+from sql_counter import prepared_database
+
+from db import ScheduleEvent, TheaterEvent, TypeEvent
+from db.sheet_values import get_sheet_event_values, get_theater_event_name
+
+pytest.importorskip('settings.settings')
+
+from api import googlesheets
+
+CLIENT_HEADERS = ['ticket_id', 'chat_id', 'name', 'phone', 'children', '',
+                  'age', 'event_id', 'name_show', 'date_show', 'time_show',
+                  'flag_santa', 'flag_gift', 'created_at', 'base_ticket_id',
+                  'base_ticket_name', 'price', 'qty_child', 'qty_adult',
+                  'flag_exclude', 'flag_transfer', 'flag_exclude_place_sum',
+                  'ticket_status']
+BASE_TICKET_DTO = {
+    'base_ticket_id': 1, 'name': 'Базовый', 'cost_main': 1000,
+    'cost_privilege': 900, 'cost_main_in_period': 1000,
+    'cost_privilege_in_period': 900, 'quality_of_children': 1,
+    'quality_of_adult': 1, 'quality_of_add_adult': 0, 'quality_visits': 1,
+}
+
+
+def test_event_values_are_read_in_one_query():
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                session.add_all([
+                    TypeEvent(id=1, name='Спектакль', name_alias='С'),
+                    TheaterEvent(id=1, name='Репка'),
+                ])
+                await session.flush()
+                session.add(ScheduleEvent(
+                    id=5, type_event_id=1, theater_event_id=1,
+                    datetime_event=datetime(2026, 10, 18, 8, 30),
+                    qty_child=10, qty_child_free_seat=10,
+                    qty_child_nonconfirm_seat=0, qty_adult=12,
+                    qty_adult_free_seat=12, qty_adult_nonconfirm_seat=0,
+                    flag_gift=True))
+                await session.commit()
+            async with sessionmaker() as session:
+                return (await get_sheet_event_values(session, [5, 6]),
+                        await get_theater_event_name(session, 1))
+
+    values, name = asyncio.run(main())
+    assert name == 'Репка'
+    assert list(values) == [5]
+    # Время в базе в UTC, в таблицу пишется московское
+    assert values[5]['date_show'] == '18.10.2026'
+    assert values[5]['time_show'] == '11:30'
+    assert values[5]['name'] == 'Репка'
+    assert (values[5]['qty_child'], values[5]['flag_gift']) == (10, True)
+    assert values[5]['ticket_price_type'] == ''
+
+
+@pytest.fixture
+def spreadsheet(monkeypatch):
+    return install(monkeypatch, googlesheets, {
+        'База клиентов': [['Клиенты'], CLIENT_HEADERS],
+    })
+
+
+def test_reserve_row_gets_values_instead_of_formulas(spreadsheet):
+    reserve = {
+        'reserve_user_data': {
+            'chose_price': 1000,
+            'client_data': {'name_adult': 'Мама', 'phone': '9000000000',
+                            'data_children': [['Ваня', '5']]},
+            'ticket_ids': [11, 12],
+            'choose_schedule_event_ids': [5, 6],
+        },
+        'chat_id': 1,
+        'base_ticket_dto': BASE_TICKET_DTO,
+        'ticket_status_value': 'Создан',
+        # Ключи после JSON из NATS
+        'event_values': {'5': {'date_show': '18.10.2026',
+                               'time_show': '11:30', 'flag_santa': False,
+                               'flag_gift': True}},
+    }
+
+    res = asyncio.run(googlesheets.write_client_reserves('ss', [reserve]))
+
+    assert res == 1
+    first, second = spreadsheet.tabs['База клиентов'][2:]
+    # name_show нет в значениях из базы, для нее остается формула
+    assert first[8:13] == [googlesheets.EVENT_FORMULA, '18.10.2026',
+                           '11:30', False, True]
+    assert second[8:13] == [googlesheets.EVENT_FORMULA] * 5
+
+
+def test_backfill_replaces_only_event_formulas(spreadsheet):
+    status = '=if(INDIRECT("R"&ROW()&"C"&1;False);"Бронь";)'
+    rows = spreadsheet.tabs['База клиентов']
+    formatted = [list(row) for row in rows]
+    for ticket_id in range(1, 6):
+        rows.append([ticket_id, 1, 'Мама', 5]
+                    + [googlesheets.EVENT_FORMULA] * 2 + [status])
+        formatted.append([ticket_id, 1, 'Мама', 5]
+                         + ['Репка', '18.10.2026', 'Бронь'])
+    # Для события еще нет строки в 'Расписание'
+    formatted[-1][5] = '#N/A'
+    spreadsheet.formatted['База клиентов'] = formatted
+
+    qty = asyncio.run(googlesheets.backfill_event_formulas(
+        'ss', 'База клиентов_', batch_size=2))
+
+    assert qty == 9
+    assert spreadsheet.api_calls() == [
+        'get', 'get', 'batch_update', 'batch_update', 'batch_update']
+    assert [row[4:] for row in rows[2:4]] == [
+        ['Репка', '18.10.2026', status]] * 2
+    assert rows[-1][4:] == ['Репка', googlesheets.EVENT_FORMULA, status]
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from sheets_server import SheetsServer, install, split_range
+
+pytest.importorskip('settings.settings')
+
+from bench_sheets import (
+    RANGE_NAME, build_workbook, format_report, replay_booking_day)
+from api import googlesheets
+from db import db_googlesheets
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = SheetsServer(build_workbook(qty_events=20, qty_clients=50))
+    return install(googlesheets, server, patch=monkeypatch.setattr,
+                   range_names=RANGE_NAME)
+
+
+def test_split_range_understands_bot_ranges():
+    assert split_range("'Лист'") == ('Лист', (1, 1, None, None))
+    assert split_range("'Лист'!2:2") == ('Лист', (2, 1, 2, None))
+    assert split_range("'Лист'!C:C") == ('Лист', (1, 3, None, 3))
+    assert split_range("'Лист'!R2C1:R5C6") == ('Лист', (2, 1, 5, 6))
+    assert split_range("'Лист'!A3:B") == ('Лист', (3, 1, None, 2))
+
+
+def test_server_reads_like_sheets_api():
+    server = SheetsServer({'ss': {'Лист': [
+        ['id', 'flag', 'note'],
+        [1, True, ''],
+        [],
+        [2, False, 1.0],
+        ['', '', ''],
+    ]}})
+
+    assert server.read('ss', "'Лист'!A2:C", 'FORMATTED_VALUE')['values'] == [
+        ['1', 'TRUE'], [], ['2', 'FALSE', '1']]
+    assert server.read('ss', "'Лист'!B:B", 'UNFORMATTED_VALUE')['values'] == [
+        ['flag'], [True], [], [False]]
+
+
+def test_booking_day_stays_within_api_budget(server):
+    stats = asyncio.run(replay_booking_day(
+        server, qty_bookings=12, qty_reloads=2, worker_batch_size=9))
+
+    # Таблицы открываются один раз за процесс
+    assert server.count('metadata') == 2
+    # Полное обновление — три пакетных чтения
+    assert server.count('batch_get') == 3 * stats['full_reload'].count
+    # При прогретом индексе каждая запись — один запрос
+    assert stats['status_update'].api_calls == stats['status_update'].count
+    assert stats['seat_write'].api_calls <= stats['seat_write'].count + 2
+    assert stats['worker_batch'].api_calls <= 3 * stats['worker_batch'].count
+    assert 'full_reload' in format_report(stats, server)
+
+    clients = server.spreadsheets[db_googlesheets.sheet_id_domik][
+        'База клиентов']
+    assert len(clients) == 2 + 50 + 12
+    assert {row[-1] for row in clients[-12:]} == {'Оплачен'}
+
+
+def test_quota_errors_are_retried(server):
+    server.fail_next(2)
+    asyncio.run(googlesheets.write_data_reserve(
+        db_googlesheets.sheet_id_domik, 3, [7, 1, 7, 1], 1))
+
+    assert server.errors == 2
+    rows = server.spreadsheets[db_googlesheets.sheet_id_domik][
+        'База спектаклей']
+    headers = rows[1]
+    event = rows[2 + 2]
+    assert event[headers.index('qty_child_free_seat')] == 7
+    assert event[headers.index('qty_adult_nonconfirm_seat')] == 1
@@ -0,0 +1,143 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = ROOT_DIR / 'src'
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+pytest.importorskip('gspread_asyncio')
+pytest.importorskip('nats')
+
+from nats.js.errors import KeyNotFoundError, KeyWrongLastSequenceError
+
+from api.sheets_limiter import (
+    BucketState, NatsTokenBucket, SheetsPriority,
+    SheetsRateLimiter, sheets_priority)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeKeyValue:
+    """Ключ NATS KV с ревизиями, как у JetStream."""
+
+    def __init__(self):
+        self.value = None
+        self.revision = 0
+        self.conflicts = 0
+
+    async def get(self, key):
+        if self.value is None:
+            raise KeyNotFoundError
+        return type('Entry', (), {
+            'value': self.value, 'revision': self.revision})
+
+    async def create(self, key, value):
+        if self.value is not None:
+            raise KeyWrongLastSequenceError
+        return await self._put(value)
+
+    async def update(self, key, value, last):
+        if self.conflicts:
+            # Другой процесс успел записать раньше
+            self.conflicts -= 1
+            self.revision += 1
+            raise KeyWrongLastSequenceError
+        if last != self.revision:
+            raise KeyWrongLastSequenceError
+        return await self._put(value)
+
+    async def _put(self, value):
+        self.value = value
+        self.revision += 1
+        return self.revision
+
+
+def test_bucket_state_refills_and_blocks():
+    state = BucketState(tokens=1, updated_at=0)
+    assert state.take(0, rate=1, capacity=2) == 0
+    assert state.take(0, rate=1, capacity=2) == 1
+    assert state.take(10, rate=1, capacity=2) == 0
+    assert state.tokens == 1
+
+    state.block(10, 5)
+    assert state.take(12, rate=1, capacity=2) == 3
+
+
+def test_processes_share_one_budget_through_kv():
+    kv = FakeKeyValue()
+    clock = Clock()
+
+    async def get_kv():
+        return kv
+
+    buckets = [NatsTokenBucket(get_kv, quota_per_minute=60, capacity=3,
+                               clock=clock) for _ in range(2)]
+
+    async def main():
+        kv.conflicts = 1
+        return [await buckets[i % 2].take() for i in range(4)]
+
+    assert asyncio.run(main()) == [0, 0, 0, 1]
+
+
+def test_bucket_falls_back_to_local_without_nats():
+    async def get_kv():
+        raise ConnectionRefusedError('nats down')
+
+    bucket = NatsTokenBucket(get_kv, quota_per_minute=60, capacity=1,
+                             clock=Clock())
+
+    async def main():
+        return [await bucket.take(), await bucket.take()]
+
+    assert asyncio.run(main()) == [0, 1]
+
+
+class ManualBucket:
+    """Токены выдает тест."""
+
+    def __init__(self):
+        self.tokens = 0
+
+    async def take(self):
+        if self.tokens:
+            self.tokens -= 1
+            return 0
+        return 0.001
+
+
+def test_payment_requests_go_before_bulk_ones():
+    bucket = ManualBucket()
+    limiter = SheetsRateLimiter(bucket)
+    order = []
+
+    async def request(name, priority):
+        with sheets_priority(priority):
+            await limiter.acquire()
+        order.append(name)
+
+    async def main():
+        # Первый запрос ждет токен, остальные встают за ним в очередь
+        tasks = [asyncio.create_task(request('first', SheetsPriority.DEFAULT))]
+        await asyncio.sleep(0)
+        for name, priority in (('bulk0', SheetsPriority.BULK),
+                               ('bulk1', SheetsPriority.BULK),
+                               ('payment', SheetsPriority.PAYMENT)):
+            tasks.append(asyncio.create_task(request(name, priority)))
+            await asyncio.sleep(0)
+        bucket.tokens = len(tasks)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ['first', 'payment', 'bulk0', 'bulk1']
+    assert limiter.stats()['sheets_requests'] == 4
@@ -0,0 +1,87 @@
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = ROOT_DIR / 'src'
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+pytest.importorskip('google.auth')
+
+from api.spreadsheet_cache import CredentialsRefresher, SpreadsheetCache
+
+
+class FakeCredentials:
+    def __init__(self, expires_in):
+        self.refreshed = 0
+        self._set_expiry(expires_in)
+
+    def _set_expiry(self, expires_in):
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        self.expiry = now + timedelta(seconds=expires_in)
+
+    def refresh(self, request):
+        self.refreshed += 1
+        self._set_expiry(3600)
+
+
+def test_concurrent_opens_fetch_spreadsheet_once():
+    cache = SpreadsheetCache()
+    fetched = []
+
+    async def fetch(spreadsheet_id):
+        fetched.append(spreadsheet_id)
+        await asyncio.sleep(0.01)
+        return object()
+
+    async def main():
+        handles = await asyncio.gather(
+            *(cache.open('ss', fetch) for _ in range(5)))
+        handles.append(await cache.open('ss', fetch))
+        return handles
+
+    handles = asyncio.run(main())
+    assert fetched == ['ss']
+    assert all(handle is handles[0] for handle in handles)
+    assert cache.stats() == {
+        'spreadsheets': 1, 'fetches': 1, 'saved_fetches': 5}
+
+
+def test_expired_handle_is_fetched_again():
+    cache = SpreadsheetCache(ttl=60)
+    cache.put('ss', 'old')
+    cache._handles['ss'] = (cache._handles['ss'][0] - 61, 'old')
+
+    async def fetch(spreadsheet_id):
+        return 'new'
+
+    assert asyncio.run(cache.open('ss', fetch)) == 'new'
+    assert cache.fetches == 1
+
+
+def test_token_is_refreshed_in_background_before_expiry():
+    credentials = FakeCredentials(expires_in=60)
+    refresher = CredentialsRefresher(lambda: credentials, margin=300)
+
+    async def main():
+        refresher.maybe_refresh()
+        refresher.maybe_refresh()
+        await refresher._task
+        refresher.maybe_refresh()
+
+    asyncio.run(main())
+    assert credentials.refreshed == 1
+    assert refresher.stats()['credentials_refreshes'] == 1
+    assert not refresher.needs_refresh()
+
+
+def test_first_token_is_left_to_the_first_request():
+    credentials = FakeCredentials(expires_in=0)
+    credentials.expiry = None
+    refresher = CredentialsRefresher(lambda: credentials)
+    assert not refresher.needs_refresh()
+    assert refresher.stats()['token_expires_in_s'] is None
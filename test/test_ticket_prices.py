@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bench_ticket_prices import batch_prices, legacy_prices, seed
+from sql_counter import count_statements, prepared_database
+
+from db import BaseTicket, ScheduleEvent, TheaterEvent
+from db.enum import TicketPriceType
+from db.reference_cache import reference_cache
+from db.ticket_prices import resolve_ticket_prices
+
+
+def _variants(schedule_event, theater_events):
+    """Сеанс в разных опциях: спектакль, подарок, ёлка, будни/выходные."""
+    yield schedule_event, theater_events[1]
+    yield schedule_event, theater_events[2]
+    schedule_event.flag_gift = True
+    yield schedule_event, theater_events[1]
+    schedule_event.flag_christmas_tree = True
+    yield schedule_event, theater_events[2]
+    schedule_event.ticket_price_type = TicketPriceType.weekday
+    yield schedule_event, theater_events[1]
+    theater_events[1].flag_indiv_cost = False
+    yield schedule_event, theater_events[1]
+
+
+def test_batch_prices_match_per_ticket_loop():
+    reference_cache.invalidate()
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                tickets = await seed(session, 12)
+            async with sessionmaker() as session:
+                schedule_event = await session.get(ScheduleEvent, 1)
+                theater_events = {
+                    1: await session.get(TheaterEvent, 1),
+                    2: await session.get(TheaterEvent, 2),
+                }
+                results = []
+                for event, theater_event in _variants(
+                        schedule_event, theater_events):
+                    results.append((
+                        await legacy_prices(
+                            session, event, theater_event, tickets),
+                        await batch_prices(
+                            session, event, theater_event, tickets),
+                    ))
+                return results
+
+    for legacy, batch in asyncio.run(main()):
+        assert batch == legacy
+
+
+def test_ticket_list_reads_special_prices_once():
+    reference_cache.invalidate()
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                tickets = await seed(session, 20)
+            async with sessionmaker() as session:
+                schedule_event = await session.get(ScheduleEvent, 1)
+                theater_event = await session.get(TheaterEvent, 1)
+                counts = []
+                for func in (legacy_prices, batch_prices, batch_prices):
+                    with count_statements(engine) as counter:
+                        await func(
+                            session, schedule_event, theater_event, tickets)
+                    counts.append(counter.count)
+                prices = await resolve_ticket_prices(
+                    session, schedule_event, theater_event, tickets)
+                return counts, prices
+
+    counts, prices = asyncio.run(main())
+    assert counts == [20, 1, 0]
+    missing = {key for key, price in prices.items() if price.special_missing}
+    assert missing == {100, 105, 110, 115}
+
+
+def test_web_prices_use_aware_period_dates():
+    pytest.importorskip('settings.settings')
+    from api.web.services.booking_service import get_ticket_prices_for_web
+
+    # Колонки периода и время сеанса в Postgres — timestamptz
+    period_start = datetime(2028, 9, 1, tzinfo=timezone.utc)
+    ticket = BaseTicket(
+        base_ticket_id=1, cost_main=1000, cost_privilege=900,
+        cost_main_in_period=1200, cost_privilege_in_period=1100,
+        period_start_change_price=period_start,
+        period_end_change_price=period_start + timedelta(days=10))
+    schedule_event = ScheduleEvent(
+        datetime_event=datetime(2028, 9, 4, 9, tzinfo=timezone.utc),
+        flag_gift=False, flag_christmas_tree=False,
+        ticket_price_type=TicketPriceType.NONE)
+    theater_event = TheaterEvent(flag_indiv_cost=False)
+
+    prices = asyncio.run(get_ticket_prices_for_web(
+        None, [ticket], schedule_event, theater_event))
+
+    assert prices == {1: 1200}
@@ -0,0 +1,86 @@
+import asyncio
+
+from sql_counter import count_statements, prepared_database
+
+from db import User, db_postgres
+from db.invalidation import InvalidationBus, install_session_hooks
+from db.user_status_cache import (
+    UserStatusCache, UserStatusFlags, user_status_cache)
+
+
+def test_known_user_costs_no_queries():
+    bus = InvalidationBus()
+    cache = UserStatusCache(bus)
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                with count_statements(engine) as first:
+                    created = await cache.get(session, 1, 1, username='a')
+                with count_statements(engine) as second:
+                    cached = [await cache.get(session, 1, 1)
+                              for _ in range(5)]
+                user = await session.get(User, 1)
+                return created, cached, first.count, second.count, user
+
+    created, cached, first, second, user = asyncio.run(main())
+    assert created == UserStatusFlags()
+    assert set(cached) == {created}
+    assert first > 0 and second == 0
+    assert user.username == 'a'
+    assert cache.stats()['user_status_created'] == 1
+    assert cache.stats()['user_status_hits'] == 5
+
+
+def test_update_user_status_invalidates_entry():
+    install_session_hooks()
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                await user_status_cache.get(session, 2, 2)
+                await user_status_cache.get(session, 3, 3)
+            async with sessionmaker() as session:
+                await db_postgres.update_user_status(
+                    session, 2, is_blacklisted=True)
+            async with sessionmaker() as session:
+                with count_statements(engine) as counter:
+                    blacklisted = await user_status_cache.get(session, 2, 2)
+                    other = await user_status_cache.get(session, 3, 3)
+                return blacklisted, other, counter.count
+
+    blacklisted, other, count = asyncio.run(main())
+    assert blacklisted.is_blacklisted and not other.is_blacklisted
+    assert count == 1
+
+
+def test_entries_expire_and_are_evicted():
+    bus = InvalidationBus()
+    cache = UserStatusCache(bus, maxsize=2)
+
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                for user_id in (1, 2, 1, 3):
+                    await cache.get(session, user_id, user_id)
+                evicted = sorted(cache._entries)
+                bus._on_notify(None, 1, 'user_statuses_changed', '[3]')
+                notified = sorted(cache._entries)
+                cache.ttl = 0
+                await cache.get(session, 1, 1)
+                return evicted, notified
+
+    evicted, notified = asyncio.run(main())
+    assert evicted == [1, 3]
+    assert notified == [1]
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_ensure_user_inserts_once():
+    async def main():
+        async with prepared_database() as (engine, sessionmaker):
+            async with sessionmaker() as session:
+                return [await db_postgres.ensure_user(session, 7, 7)
+                        for _ in range(2)]
+
+    assert asyncio.run(main()) == [True, False]